@@ -3,14 +3,22 @@
 
 from aiogram import Router, F
 from aiogram.filters import Command, StateFilter
-from aiogram.types import Message, Document, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import Message, Document, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
 from aiogram.fsm.context import FSMContext
+import asyncio
+import html
 import logging
 import os
 from datetime import datetime, timedelta
+from typing import Optional
 
 from core.queue import task_queue, TaskType
 from core.config import EXPORT_FOLDER
+from core.db_manager import get_db_manager
+from services.analyzer import preflight_analysis, resolve_model_tiers
+from services.quick_report import build_quick_report_async, quick_report_path
+from services.multi_prompt import PROMPT_PRESETS, resolve_prompt_specs, preflight_multi
+from services.tokens import check_user_budget, resolve_daily_budget, TokenBudgetError
 from core.chat_utils import parse_chat_identifier, get_chat_help_text, format_chat_identifier_for_display
 from bot.states.command_states import ExportAnalyzeStates
 
@@ -73,6 +81,18 @@ async def cmd_analyze(message: Message):
 
 async def _analyze_from_document(message: Message):
     """Анализ файла из прикрепленного документа"""
+    temp_path = await _download_csv(message)
+    if temp_path:
+        await _create_analyze_task(message, temp_path, message.document.file_name)
+
+
+async def _download_csv(message: Message) -> Optional[str]:
+    """
+    Скачать прикреплённый CSV в папку exports
+
+    Returns:
+        Путь к файлу или None (пользователю уже отправлена ошибка)
+    """
     document: Document = message.document
 
     # Проверить расширение файла
@@ -81,7 +101,7 @@ async def _analyze_from_document(message: Message):
             "❌ <b>Неверный формат файла</b>\n\n"
             "Пожалуйста, отправьте CSV файл с расширением .csv"
         )
-        return
+        return None
 
     try:
         # Скачать файл
@@ -93,8 +113,7 @@ async def _analyze_from_document(message: Message):
         await message.bot.download_file(file_info.file_path, temp_path)
 
         logger.info(f"File {document.file_name} downloaded to {temp_path}")
-
-        await _create_analyze_task(message, temp_path, document.file_name)
+        return temp_path
 
     except Exception as e:
         logger.error(f"Error downloading file: {e}", exc_info=True)
@@ -103,10 +122,53 @@ async def _analyze_from_document(message: Message):
             f"❌ <b>Ошибка загрузки файла</b>\n\n"
             f"Ошибка: {str(e)}"
         )
+        return None
 
 
 async def _create_analyze_task(message: Message, file_path: str, filename: str):
     """Создать задачу анализа"""
+    user_id = message.from_user.id
+
+    # Предварительная оценка токенов и проверка бюджета до постановки в очередь
+    try:
+        db = get_db_manager()
+        user = await db.get_user(user_id)
+        settings = await db.get_user_settings(user_id)
+        custom_prompt = settings.custom_prompt if settings else None
+        api_key = user.claude_api_key if user else None
+        models = resolve_model_tiers(settings)
+
+        loop = asyncio.get_event_loop()
+        estimate = await loop.run_in_executor(
+            None,
+            preflight_analysis,
+            file_path,
+            api_key,
+            custom_prompt,
+            models
+        )
+
+        used_today = await db.get_tokens_used_today(user_id)
+        check_user_budget(estimate.total_tokens, used_today, resolve_daily_budget(settings))
+
+    except TokenBudgetError as e:
+        await message.answer(
+            f"⛔ <b>Превышен бюджет токенов</b>\n\n"
+            f"📄 Файл: <code>{filename}</code>\n\n"
+            f"{e}"
+        )
+        return
+
+    except Exception as e:
+        logger.error(f"Error estimating analyze task: {e}", exc_info=True)
+
+        await message.answer(
+            f"❌ <b>Не удалось подготовить анализ</b>\n\n"
+            f"📄 Файл: <code>{filename}</code>\n"
+            f"Ошибка: {str(e)}"
+        )
+        return
+
     try:
         # Добавить задачу в очередь
         task_id = await task_queue.add_task(
@@ -123,7 +185,8 @@ async def _create_analyze_task(message: Message, file_path: str, filename: str):
             f"✅ <b>Задача анализа создана!</b>\n\n"
             f"🆔 Задача: #{task_id}\n"
             f"📄 Файл: <code>{filename}</code>\n"
-            f"🤖 Модель: Claude Sonnet 4\n\n"
+            f"🤖 Модель: <code>{models.report}</code>\n"
+            f"{estimate.describe_html()}\n\n"
             f"⏳ Анализ начнется в течение нескольких секунд.\n"
             f"Это может занять 1-3 минуты.\n\n"
             f"Я отправлю DOCX файл с результатами анализа."
@@ -490,6 +553,68 @@ async def _process_export_analyze(message: Message, state: FSMContext, chat_inpu
     await _show_exportanalyze_limit_menu(message, state)
 
 
+@router.message(Command("quickstats"))
+async def cmd_quick_stats(message: Message):
+    """
+    Обработчик команды /quickstats
+
+    Мгновенный отчёт без Claude: статистика считается локально за секунды,
+    API ключ и очередь задач не нужны.
+
+    Примеры:
+        /quickstats (+ CSV файл)
+        /quickstats my_chat_01-01-2024_now.csv
+    """
+    user_id = message.from_user.id
+    args = (message.text or message.caption or "").split(maxsplit=1)
+
+    if message.document:
+        file_path = await _download_csv(message)
+        if not file_path:
+            return
+        filename = message.document.file_name
+    elif len(args) > 1:
+        filename = args[1].strip()
+        file_path = os.path.join(EXPORT_FOLDER, filename)
+        if not os.path.exists(file_path):
+            await message.answer(f"❌ Файл <code>{filename}</code> не найден в папке exports.")
+            return
+    else:
+        await message.answer(
+            "📊 <b>Быстрая статистика без Claude</b>\n\n"
+            "<b>Использование:</b>\n"
+            "<code>/quickstats имя_файла.csv</code>\n"
+            "или прикрепите CSV файл с этой командой в подписи\n\n"
+            "Сообщения по дням и часам, отправители, время ответа, вопросы без ответа — "
+            "за секунды, токены не расходуются."
+        )
+        return
+
+    status = await message.answer(f"📊 Считаю статистику <code>{filename}</code>...")
+
+    user_output_folder = os.path.join("data", "users", str(user_id), "analysis")
+    os.makedirs(user_output_folder, exist_ok=True)
+    output_path = quick_report_path(user_output_folder, filename)
+
+    try:
+        summary = await build_quick_report_async(file_path, output_path, os.path.basename(filename))
+    except Exception as e:
+        logger.error(f"Error building quick report: {e}", exc_info=True)
+        await status.edit_text(
+            f"❌ <b>Не удалось посчитать статистику</b>\n\n"
+            f"📄 Файл: <code>{filename}</code>\n"
+            f"Ошибка: {html.escape(str(e))}"
+        )
+        return
+
+    await status.delete()
+    await message.answer_document(
+        FSInputFile(output_path),
+        caption=f"📊 <b>Статистика чата</b>\n\n{html.escape(summary)}"
+    )
+    logger.info(f"User {user_id} built quick report for {filename}")
+
+
 @router.message(F.text.startswith("/analyze"))
 async def cmd_analyze_fallback(message: Message):
     """Fallback для неправильного формата команды /analyze"""
@@ -511,3 +636,160 @@ async def cmd_exportanalyze_fallback(message: Message):
         f"{get_chat_help_text()}\n\n"
         "Подробности: /help"
     )
+
+
+@router.message(Command("resetanalysis"))
+async def cmd_reset_analysis(message: Message):
+    """
+    Обработчик команды /resetanalysis
+
+    Сбрасывает сохранённое состояние инкрементального анализа:
+    следующий /exportanalyze проанализирует чат целиком.
+
+    Примеры:
+        /resetanalysis - для всех чатов
+        /resetanalysis @support_chat - для одного чата
+    """
+    user_id = message.from_user.id
+    args = message.text.split(maxsplit=1)
+    db = get_db_manager()
+
+    if len(args) >= 2:
+        try:
+            chat_key = str(parse_chat_identifier(args[1].strip()))
+        except ValueError as e:
+            await message.answer(f"❌ {e}")
+            return
+        deleted = await db.delete_chat_state(user_id, chat_key)
+        target = f"чата <code>{format_chat_identifier_for_display(args[1].strip())}</code>"
+    else:
+        deleted = await db.delete_chat_state(user_id)
+        target = "всех чатов"
+
+    logger.info(f"User {user_id} reset incremental analysis state: {deleted} record(s)")
+    if deleted:
+        await message.answer(
+            f"🔄 История анализа {target} сброшена.\n\n"
+            f"Следующий /exportanalyze проанализирует чат целиком."
+        )
+    else:
+        await message.answer("ℹ️ Сохранённых анализов не найдено.")
+
+
+MULTI_OUTPUT_MODES = {
+    'combined': "один DOCX",
+    'separate': "отдельный DOCX на каждый отчёт",
+}
+
+
+@router.message(Command("multianalyze"))
+async def cmd_multi_analyze(message: Message):
+    """
+    Обработчик команды /multianalyze
+
+    Несколько отчётов по одному CSV за одну задачу: данные отправляются
+    в Claude один раз (кэшируемый префикс), отчёты пишутся параллельно.
+
+    Примеры:
+        /multianalyze (+ CSV файл) - все готовые отчёты одним DOCX
+        /multianalyze quality conflicts separate (+ CSV файл)
+        /multianalyze product custom my_chat.csv
+    """
+    user_id = message.from_user.id
+    args = (message.text or message.caption or "").split()[1:]
+
+    keys, filename, output = [], None, 'combined'
+    for arg in args:
+        lowered = arg.lower()
+        if lowered.endswith('.csv'):
+            filename = arg
+        elif lowered in MULTI_OUTPUT_MODES:
+            output = lowered
+        else:
+            keys.append(lowered)
+    keys = keys or list(PROMPT_PRESETS)
+
+    db = get_db_manager()
+    user = await db.get_user(user_id)
+    settings = await db.get_user_settings(user_id)
+    custom_prompt = settings.custom_prompt if settings else None
+
+    try:
+        specs = resolve_prompt_specs(keys, custom_prompt)
+    except ValueError as e:
+        await message.answer(f"❌ {e}")
+        return
+
+    if message.document:
+        file_path = await _download_csv(message)
+        if not file_path:
+            return
+        filename = message.document.file_name
+    elif filename:
+        file_path = os.path.join(EXPORT_FOLDER, filename)
+        if not os.path.exists(file_path):
+            await message.answer(f"❌ Файл <code>{filename}</code> не найден в папке exports.")
+            return
+    else:
+        presets = "\n".join(f"• <code>{key}</code> — {title}" for key, (title, _) in PROMPT_PRESETS.items())
+        await message.answer(
+            "📑 <b>Несколько отчётов по одному чату</b>\n\n"
+            "<b>Использование:</b>\n"
+            "<code>/multianalyze [отчёты] [combined|separate] имя_файла.csv</code>\n"
+            "или прикрепите CSV файл с этой командой в подписи\n\n"
+            f"<b>Отчёты:</b>\n{presets}\n"
+            "• <code>custom</code> — ваш промпт (/setprompt)\n"
+            "• <code>default</code> — стандартный анализ\n\n"
+            "Без списка — все готовые отчёты. Данные отправляются в Claude один раз."
+        )
+        return
+
+    # Оценка токенов и проверка бюджета до постановки в очередь
+    try:
+        models = resolve_model_tiers(settings)
+        loop = asyncio.get_event_loop()
+        estimate = await loop.run_in_executor(
+            None,
+            preflight_multi,
+            file_path,
+            specs,
+            user.claude_api_key if user else None,
+            models
+        )
+        used_today = await db.get_tokens_used_today(user_id)
+        check_user_budget(estimate.total_tokens, used_today, resolve_daily_budget(settings))
+
+    except TokenBudgetError as e:
+        await message.answer(f"⛔ <b>Превышен бюджет токенов</b>\n\n{e}")
+        return
+
+    except Exception as e:
+        logger.error(f"Error estimating multi-analyze task: {e}", exc_info=True)
+        await message.answer(
+            f"❌ <b>Не удалось подготовить анализ</b>\n\n"
+            f"📄 Файл: <code>{filename}</code>\n"
+            f"Ошибка: {str(e)}"
+        )
+        return
+
+    task_id = await task_queue.add_task(
+        task_type=TaskType.MULTI_ANALYZE,
+        user_id=user_id,
+        data={
+            'file_path': file_path,
+            'filename': filename,
+            'prompts': keys,
+            'output': output,
+        }
+    )
+
+    titles = "\n".join(f"• {spec.title}" for spec in specs)
+    await message.answer(
+        f"✅ <b>Задача создана: {len(specs)} отчётов</b>\n\n"
+        f"🆔 Задача: #{task_id}\n"
+        f"📄 Файл: <code>{filename}</code>\n"
+        f"{titles}\n"
+        f"📎 Результат: {MULTI_OUTPUT_MODES[output]}\n"
+        f"{estimate.describe_html()}"
+    )
+    logger.info(f"Multi-analyze task #{task_id} created for user {user_id}: {keys}")
@@ -0,0 +1,105 @@
+# bot/handlers/models.py
+"""Обработчик команды /setmodel: модели Claude для заметок по частям и итогового отчёта"""
+
+import re
+import logging
+
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.types import Message
+
+from core.config import CLAUDE_REPORT_MODEL, CLAUDE_MAP_MODEL
+from core.db_manager import get_db_manager
+from services.analyzer import resolve_model_tiers
+
+logger = logging.getLogger(__name__)
+
+# Создаем router для этого модуля
+router = Router()
+
+# Короткие имена моделей
+MODEL_ALIASES = {
+    'haiku': "claude-haiku-4-5-20251001",
+    'sonnet': "claude-sonnet-4-5-20250929",
+    'opus': "claude-opus-4-1-20250805",
+}
+
+# Уровень в команде -> поле UserSettings
+TIER_FIELDS = {
+    'report': 'report_model',
+    'map': 'map_model',
+}
+
+MODEL_ID_PATTERN = re.compile(r'^claude-[a-z0-9.\-]+$')
+
+
+def parse_model(value: str) -> str:
+    """
+    Идентификатор модели из аргумента команды (короткое имя или полный ID)
+
+    Raises:
+        ValueError: Если это не модель Claude
+    """
+    value = value.strip().lower()
+    model = MODEL_ALIASES.get(value, value)
+    if not MODEL_ID_PATTERN.match(model):
+        raise ValueError(
+            f"Неизвестная модель: {value}. Укажите {', '.join(MODEL_ALIASES)} или полный ID (claude-...)"
+        )
+    return model
+
+
+@router.message(Command("setmodel"))
+async def cmd_setmodel(message: Message):
+    """
+    Обработчик команды /setmodel
+
+    Примеры:
+        /setmodel - показать текущие модели
+        /setmodel map haiku - модель заметок по частям
+        /setmodel report claude-sonnet-4-5-20250929 - модель итогового отчёта
+        /setmodel reset - вернуть модели по умолчанию
+    """
+    user_id = message.from_user.id
+    args = message.text.split()[1:]
+    db = get_db_manager()
+
+    if not args:
+        models = resolve_model_tiers(await db.get_user_settings(user_id))
+        await message.answer(
+            f"🤖 <b>Модели анализа</b>\n\n"
+            f"✍️ Итоговый отчёт: <code>{models.report}</code>\n"
+            f"🧩 Заметки по частям (большие чаты): <code>{models.map}</code>\n\n"
+            f"По умолчанию: отчёт <code>{CLAUDE_REPORT_MODEL}</code>, "
+            f"заметки <code>{CLAUDE_MAP_MODEL}</code>\n\n"
+            f"<b>Изменить:</b>\n"
+            f"<code>/setmodel report sonnet</code>\n"
+            f"<code>/setmodel map haiku</code>\n"
+            f"<code>/setmodel reset</code> — вернуть по умолчанию"
+        )
+        return
+
+    if args[0].lower() == 'reset':
+        await db.update_user_settings(user_id=user_id, report_model=None, map_model=None)
+        logger.info(f"User {user_id} reset Claude models")
+        await message.answer("🔄 Модели сброшены на значения по умолчанию.")
+        return
+
+    if len(args) != 2 or args[0].lower() not in TIER_FIELDS:
+        await message.answer(
+            "❌ Формат: <code>/setmodel report|map МОДЕЛЬ</code> или <code>/setmodel reset</code>"
+        )
+        return
+
+    try:
+        model = parse_model(args[1])
+    except ValueError as e:
+        await message.answer(f"❌ {e}")
+        return
+
+    tier = args[0].lower()
+    await db.update_user_settings(user_id=user_id, **{TIER_FIELDS[tier]: model})
+    logger.info(f"User {user_id} set {tier} model: {model}")
+
+    what = "итогового отчёта" if tier == 'report' else "заметок по частям"
+    await message.answer(f"✅ Модель {what}: <code>{model}</code>")
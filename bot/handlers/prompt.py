@@ -9,6 +9,7 @@ import logging
 
 from bot.states.command_states import PromptStates
 from core.db_manager import get_db_manager
+from services.prompt_template import PROMPT_VARIABLES, DATA_PLACEHOLDER, find_variables, unknown_variables
 
 logger = logging.getLogger(__name__)
 
@@ -18,20 +19,21 @@ router = Router()
 # Дефолтный промпт для справки
 DEFAULT_PROMPT = """Проанализируй следующие данные из CSV файла, содержащие информацию о взаимодействиях с клиентами и работе менеджеров службы поддержки.
 
-Менеджеры в CSV файлах имеют наименование, которое содержит в себе 'Fulfillment-Box Support', 'Support', 'Fulfillment-Box' и подобное.
+Роли отправителей уже определены: S — менеджеры поддержки, C — клиенты (в формате CSV — колонка Role). Правила ролей — /roles.
 
 Данные CSV файла:
 {csv_content}
 
+Статистика по менеджерам и времени ответа (рассчитана локально):
+{stats}
+
 На основе этих данных предоставь анализ по следующим пунктам:
 
 1. **Самые частые запросы клиентов** — повторяющиеся вопросы и темы обращений.
 
 2. **Причины конфликтов и недовольства клиентов** — выяви основные проблемные области.
 
-3. **Количество вопросов по каждому менеджеру** — статистика обработанных обращений.
-
-4. **Среднее время ответа менеджеров** — отдельно для будней и выходных.
+Количество вопросов по каждому менеджеру и время ответа (будни/выходные) добавляются в отчёт автоматически.
 
 Формат вывода:
 - Структурированный текст без таблиц
@@ -43,6 +45,13 @@ DEFAULT_PROMPT = """Проанализируй следующие данные 
 Предоставь анализ на русском языке."""
 
 
+def _variables_help() -> str:
+    """Список переменных промпта для справки"""
+    return "\n".join(
+        f"• <code>{{{name}}}</code> — {variable.description}" for name, variable in PROMPT_VARIABLES.items()
+    )
+
+
 @router.message(Command("setprompt"))
 async def cmd_setprompt(message: Message, state: FSMContext):
     """
@@ -94,6 +103,8 @@ async def callback_prompt_set(callback, state: FSMContext):
         "• Используйте <code>{csv_content}</code> где нужно вставить данные CSV\n"
         "• Промпт должен быть на русском или английском\n"
         "• Рекомендуемая длина: 500-2000 символов\n\n"
+        "<b>Переменные</b> (считаются локально, только те, что есть в промпте):\n"
+        f"{_variables_help()}\n\n"
         "<b>Пример:</b>\n"
         "<code>Проанализируй данные:\n{csv_content}\n\nВыведи топ-5 проблем клиентов.</code>\n\n"
         "Или используйте /cancel для отмены."
@@ -137,9 +148,17 @@ async def process_prompt_text(message: Message, state: FSMContext):
 
     # Предупреждение если нет {csv_content}
     warning = ""
-    if "{csv_content}" not in prompt_text:
-        warning = "\n\n⚠️ <b>Предупреждение:</b> Промпт не содержит <code>{csv_content}</code>. " \
-                  "Данные CSV не будут вставлены в промпт!"
+    if DATA_PLACEHOLDER not in prompt_text:
+        if any(name in PROMPT_VARIABLES for name, _ in find_variables(prompt_text)):
+            warning = "\n\nℹ️ Промпт не содержит <code>{csv_content}</code>: сообщения чата не отправляются, " \
+                      "Claude получит только значения переменных."
+        else:
+            warning = "\n\n⚠️ <b>Предупреждение:</b> Промпт не содержит <code>{csv_content}</code>. " \
+                      "Данные CSV не будут вставлены в промпт!"
+    unknown = unknown_variables(prompt_text)
+    if unknown:
+        warning += "\n\n⚠️ Неизвестные переменные (останутся как есть): " + \
+                   ", ".join(f"<code>{{{name}}}</code>" for name in unknown)
 
     # Сохранить в БД
     try:
@@ -245,6 +264,8 @@ async def callback_prompt_help(callback, state: FSMContext):
         "2. Выберите 'Установить новый'\n"
         "3. Отправьте текст промпта\n"
         "4. В промпте используйте <code>{csv_content}</code> для вставки данных\n\n"
+        "<b>Переменные промпта:</b>\n"
+        f"{_variables_help()}\n\n"
         "<b>Примеры задач:</b>\n"
         "• Анализ времени ответа менеджеров\n"
         "• Выявление частых проблем клиентов\n"
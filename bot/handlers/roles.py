@@ -0,0 +1,68 @@
+# bot/handlers/roles.py
+"""Обработчик команды /roles: правила ролей отправителей (менеджеры / клиенты) для экспорта"""
+
+import json
+import html
+import logging
+
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.types import Message
+
+from core.db_manager import get_db_manager
+from services.stats import parse_role_rules
+from services.telegram import user_role_rules
+
+logger = logging.getLogger(__name__)
+
+# Создаем router для этого модуля
+router = Router()
+
+ROLES_EXAMPLE = '{"support_patterns": ["Support"], "support_ids": [123456789], "client_ids": [987654321]}'
+
+
+@router.message(Command("roles"))
+async def cmd_roles(message: Message):
+    """
+    Обработчик команды /roles
+
+    Примеры:
+        /roles - показать текущие правила
+        /roles {"support_patterns": ["Support"], "support_ids": [123]} - задать свои правила
+        /roles reset - вернуть правила по умолчанию
+    """
+    user_id = message.from_user.id
+    text = message.text.split(maxsplit=1)
+    argument = text[1].strip() if len(text) > 1 else ""
+    db = get_db_manager()
+
+    if not argument:
+        settings = await db.get_user_settings(user_id)
+        rules = user_role_rules(settings)
+        source = "ваши" if settings and settings.role_rules else "по умолчанию"
+        await message.answer(
+            f"👥 <b>Правила ролей ({source})</b>\n\n"
+            f"<code>{html.escape(json.dumps(rules.to_dict(), ensure_ascii=False, indent=1))}</code>\n\n"
+            f"Роль записывается в колонку Role при экспорте: правила по ID отправителя "
+            f"сильнее правил по имени (подстроки support_patterns и выражения support_regex, без учёта регистра).\n\n"
+            f"<b>Изменить</b> (отсутствующие ключи — по умолчанию):\n"
+            f"<code>/roles {html.escape(ROLES_EXAMPLE)}</code>\n"
+            f"<code>/roles reset</code> — вернуть по умолчанию"
+        )
+        return
+
+    if argument.lower() == 'reset':
+        await db.update_user_settings(user_id=user_id, role_rules=None)
+        logger.info(f"User {user_id} reset role rules")
+        await message.answer("🔄 Правила ролей сброшены на значения по умолчанию.")
+        return
+
+    try:
+        rules = parse_role_rules(argument)
+    except ValueError as e:
+        await message.answer(f"❌ {html.escape(str(e))}")
+        return
+
+    await db.update_user_settings(user_id=user_id, role_rules=json.dumps(rules.to_dict(), ensure_ascii=False))
+    logger.info(f"User {user_id} set role rules")
+    await message.answer("✅ Правила ролей сохранены. Они применяются к следующим экспортам.")
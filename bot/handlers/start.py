@@ -58,7 +58,8 @@ async def cmd_start(message: Message):
         "<b>Экспорт:</b>\n"
         "/export @channel - Экспорт чата в CSV\n\n"
         "<b>Анализ:</b>\n"
-        "/analyze файл.csv - Анализ через Claude API\n\n"
+        "/analyze файл.csv - Анализ через Claude API\n"
+        "/quickstats файл.csv - Быстрая статистика без Claude\n\n"
         "<b>Комбо:</b>\n"
         "/exportanalyze @channel - Экспорт + анализ\n\n"
         "<b>Прочее:</b>\n"
@@ -158,7 +159,7 @@ async def cmd_help(message: Message):
 <code>/analyze имя_файла.csv</code>
 
 <b>Что делает:</b>
-• Анализирует сообщения через Claude Sonnet 4
+• Анализирует сообщения через Claude (модели — /setmodel)
 • Выявляет частые запросы клиентов
 • Находит причины конфликтов
 • Считает статистику по менеджерам
@@ -188,6 +189,9 @@ async def cmd_help(message: Message):
 2. Анализирует через Claude API (~1-3 мин)
 3. Отправляет оба файла (CSV + DOCX)
 
+<b>🔁 Повторный анализ того же чата:</b>
+В Claude отправляются только новые сообщения и сводка прошлого отчёта, статистика объединяется. Полный анализ заново: <code>/resetanalysis CHAT</code>
+
 ━━━━━━━━━━━━━━━━━━━━━━
 
 <b>📋 Как указать чат:</b>
@@ -228,7 +232,13 @@ async def cmd_help(message: Message):
 /export - Экспорт чата (с настройкой)
 /analyze - Анализ через Claude
 /exportanalyze - Экспорт + анализ (с настройкой)
+/multianalyze - Несколько отчётов по одному CSV
+/quickstats - Быстрая статистика без Claude (секунды, без токенов)
 /setprompt - Настроить промпт для Claude
+/resetanalysis - Сбросить историю анализа чатов
+/setmodel - Модели Claude (отчёт и заметки по частям)
+/roles - Правила ролей: кто менеджер, кто клиент
+/watch - Ключевые слова: счётчики при экспорте
 /cancel - Отменить текущее действие
 /help - Эта справка
 
@@ -0,0 +1,82 @@
+# bot/handlers/watchlist.py
+"""Обработчик команды /watch: ключевые слова, которые считаются при экспорте чатов"""
+
+import html
+import logging
+
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.types import Message
+
+from core.db_manager import get_db_manager
+from services.telegram import user_watchlist
+from services.watchlist import parse_watchlist
+
+logger = logging.getLogger(__name__)
+
+# Создаем router для этого модуля
+router = Router()
+
+SHOW_KEYWORDS = 50  # Слов в ответе /watch
+
+
+@router.message(Command("watch"))
+async def cmd_watch(message: Message):
+    """
+    Обработчик команды /watch
+
+    Примеры:
+        /watch - показать ключевые слова
+        /watch возврат, претензия, 12345 - задать список (через запятую или по строке на слово)
+        /watch notify off - не присылать уведомления о совпадениях
+        /watch reset - вернуть список по умолчанию
+    """
+    user_id = message.from_user.id
+    text = message.text.split(maxsplit=1)
+    argument = text[1].strip() if len(text) > 1 else ""
+    db = get_db_manager()
+
+    if not argument:
+        settings = await db.get_user_settings(user_id)
+        watchlist = user_watchlist(settings)
+        source = "ваши" if settings and settings.watchlist else "по умолчанию"
+        notify = not (settings and settings.watchlist_notify is False)
+        keywords = ", ".join(watchlist.keywords[:SHOW_KEYWORDS]) or "не заданы"
+        if len(watchlist) > SHOW_KEYWORDS:
+            keywords += f" … (всего {len(watchlist)})"
+        await message.answer(
+            f"🔎 <b>Ключевые слова ({source})</b>\n\n"
+            f"{html.escape(keywords)}\n\n"
+            f"При экспорте каждое сообщение проверяется по списку (без учёта регистра, с начала слова): "
+            f"счётчики и ссылки на сообщения записываются в манифест рядом с CSV.\n"
+            f"Уведомления о совпадениях: {'включены' if notify else 'выключены'}\n\n"
+            f"<b>Изменить:</b>\n"
+            f"<code>/watch возврат, претензия, 12345</code>\n"
+            f"<code>/watch notify on|off</code>\n"
+            f"<code>/watch reset</code> — вернуть по умолчанию"
+        )
+        return
+
+    lowered = argument.lower()
+    if lowered == 'reset':
+        await db.update_user_settings(user_id=user_id, watchlist=None)
+        logger.info(f"User {user_id} reset watchlist")
+        await message.answer("🔄 Ключевые слова сброшены на значения по умолчанию.")
+        return
+
+    if lowered in ('notify on', 'notify off'):
+        await db.update_user_settings(user_id=user_id, watchlist_notify=lowered == 'notify on')
+        await message.answer(f"✅ Уведомления о совпадениях {'включены' if lowered == 'notify on' else 'выключены'}.")
+        return
+
+    try:
+        watchlist = parse_watchlist(argument)
+    except ValueError as e:
+        await message.answer(f"❌ {html.escape(str(e))}")
+        return
+
+    await db.update_user_settings(user_id=user_id, watchlist=watchlist.to_text())
+    logger.info(f"User {user_id} set watchlist: {len(watchlist)} keyword(s)")
+    await message.answer(
+        f"✅ Ключевых слов: {len(watchlist)}. Они проверяются при следующих экспортах."
+    )
@@ -14,10 +14,11 @@ from core.config import BOT_TOKEN, reload_config
 from core.first_run_setup import check_bot_token_configured, run_first_time_setup
 
 # Импорт обработчиков
-from bot.handlers import start, export, analyze, setup, prompt, debug
+from bot.handlers import start, export, analyze, setup, prompt, models, roles, watchlist, debug
 
 # Импорт инициализации БД
 from core.database import init_database, close_database
+from services.docx_render import shutdown_render_pool
 
 # Настройка логирования
 logging.basicConfig(
@@ -100,6 +101,9 @@ async def main():
     dp.include_router(export.router)
     dp.include_router(analyze.router)
     dp.include_router(prompt.router)
+    dp.include_router(models.router)
+    dp.include_router(roles.router)
+    dp.include_router(watchlist.router)
     dp.include_router(debug.router)
 
     logger.info("✅ Обработчики зарегистрированы")
@@ -139,6 +143,7 @@ async def main():
     finally:
         logger.info("Закрытие соединений...")
         await worker.stop()
+        shutdown_render_pool()
         await bot.session.close()
         await close_database()
         logger.info("✅ Бот остановлен")
@@ -167,6 +167,7 @@ API_ID: int = _get_int("API_ID", 0)
 API_HASH: str = _get_str("API_HASH", "")
 PHONE: str = _get_str("PHONE", "")
 CLAUDE_API_KEY: str = _get_str("CLAUDE_API_KEY", "")
+CLAUDE_BASE_URL: str = _get_str("CLAUDE_BASE_URL", "")  # Другой адрес API (например, tools/fake_anthropic.py)
 
 # Опциональные параметры
 EXCLUDE_USER_ID: int = _get_int("EXCLUDE_USER_ID", 0)
@@ -176,6 +177,35 @@ EXCLUDE_USERNAME: str = _get_str("EXCLUDE_USERNAME", "")
 BOT_TOKEN: str = _get_str("BOT_TOKEN", "")
 OWNER_ID: int = _get_int("OWNER_ID", 0)
 
+# Параметры анализа (Claude API)
+ANALYZE_WORKERS: int = _get_int("ANALYZE_WORKERS", 3)  # Параллельных анализов в папке
+CLAUDE_RPM_LIMIT: int = _get_int("CLAUDE_RPM_LIMIT", 50)  # Запросов в минуту (лимит аккаунта)
+CLAUDE_TPM_LIMIT: int = _get_int("CLAUDE_TPM_LIMIT", 30000)  # Входных токенов в минуту
+MAX_REQUEST_TOKENS: int = _get_int("MAX_REQUEST_TOKENS", 150000)  # Лимит входных токенов на запрос
+MAP_CHUNK_TOKENS: int = _get_int("MAP_CHUNK_TOKENS", 40000)  # Размер части при анализе по частям
+MAP_CACHE_MB: int = _get_int("MAP_CACHE_MB", 64)  # Кэш заметок по частям, МБ (0 — без кэша)
+INGEST_MEMORY_MB: int = _get_int("INGEST_MEMORY_MB", 512)  # Память на чтение и анализ файла, МБ (services/ingest.py)
+USER_DAILY_TOKEN_BUDGET: int = _get_int("USER_DAILY_TOKEN_BUDGET", 0)  # Дневной бюджет пользователя (0 — без лимита)
+CLAUDE_REPORT_MODEL: str = _get_str("CLAUDE_REPORT_MODEL", "claude-sonnet-4-5-20250929")  # Итоговый отчёт
+CLAUDE_MAP_MODEL: str = _get_str("CLAUDE_MAP_MODEL", "claude-haiku-4-5-20251001")  # Заметки по частям, извлечение
+OVERSIZE_MODE: str = _get_str("OVERSIZE_MODE", "chunked")  # Чат больше лимита: chunked | sample
+SAMPLING_STRATEGY: str = _get_str("SAMPLING_STRATEGY", "day")  # Стратегия выборки (services/sampling.py)
+DOCX_RENDER_WORKERS: int = _get_int("DOCX_RENDER_WORKERS", 2)  # Процессов рендеринга DOCX
+RELEVANCE_FILTER: int = _get_int("RELEVANCE_FILTER", 1)  # Отбрасывать «спасибо», «ок» и т.п. перед Claude (0 — нет)
+RELEVANCE_LEXICON: str = _get_str("RELEVANCE_LEXICON", "")  # JSON словарь значимости (services/relevance.py)
+RELEVANCE_CONTEXT: int = _get_int("RELEVANCE_CONTEXT", 1)  # Соседних сообщений вокруг значимого
+NEAR_DUP_COLLAPSE: int = _get_int("NEAR_DUP_COLLAPSE", 1)  # Схлопывать похожие сообщения перед Claude (0 — нет)
+NEAR_DUP_SIMILARITY: int = _get_int("NEAR_DUP_SIMILARITY", 70)  # Порог сходства похожих сообщений, %
+NEAR_DUP_TOP: int = _get_int("NEAR_DUP_TOP", 15)  # Строк в разделе частых сообщений клиентов
+TOPIC_COUNT: int = _get_int("TOPIC_COUNT", 12)  # Тем обращений клиентов (services/topics.py, 0 — не выделять)
+DIALOGUE_GAP_MINUTES: int = _get_int("DIALOGUE_GAP_MINUTES", 30)  # Пауза, после которой начинается новый диалог
+ROLE_RULES: str = _get_str("ROLE_RULES", "")  # JSON правила ролей отправителей (services/stats.py)
+WATCHLIST: str = _get_str("WATCHLIST", "")  # Файл ключевых слов для экспорта, по одному на строку (services/watchlist.py)
+WATCHLIST_MAX_REFS: int = _get_int("WATCHLIST_MAX_REFS", 50)  # Ссылок на сообщения на слово в манифесте экспорта
+SECTION_PARALLEL: int = _get_int("SECTION_PARALLEL", 1)  # Стандартный отчёт — разделы параллельными запросами
+CONFLICT_CONTEXT: int = _get_int("CONFLICT_CONTEXT", 3)  # Соседних сообщений вокруг жалобы (раздел конфликтов)
+DOCX_TEMPLATE: str = _get_str("DOCX_TEMPLATE", "")  # Шаблон отчёта со стилями (пусто — встроенный)
+
 # Пути (используем кросс-платформенные)
 EXPORT_FOLDER: str = str(get_input_folder())
 OUTPUT_FOLDER: str = str(get_output_folder())
@@ -229,9 +259,16 @@ def validate_config(mode: str = "legacy") -> Tuple[bool, str]:
 
 def reload_config():
     """Перезагрузка конфигурации из .env файла"""
-    global API_ID, API_HASH, PHONE, CLAUDE_API_KEY
+    global API_ID, API_HASH, PHONE, CLAUDE_API_KEY, CLAUDE_BASE_URL
     global EXCLUDE_USER_ID, EXCLUDE_USERNAME
     global BOT_TOKEN, OWNER_ID
+    global ANALYZE_WORKERS, CLAUDE_RPM_LIMIT, CLAUDE_TPM_LIMIT
+    global MAX_REQUEST_TOKENS, MAP_CHUNK_TOKENS, MAP_CACHE_MB, INGEST_MEMORY_MB, USER_DAILY_TOKEN_BUDGET
+    global CLAUDE_REPORT_MODEL, CLAUDE_MAP_MODEL, OVERSIZE_MODE, SAMPLING_STRATEGY
+    global DOCX_RENDER_WORKERS, DOCX_TEMPLATE
+    global RELEVANCE_FILTER, RELEVANCE_LEXICON, RELEVANCE_CONTEXT
+    global NEAR_DUP_COLLAPSE, NEAR_DUP_SIMILARITY, NEAR_DUP_TOP, TOPIC_COUNT, DIALOGUE_GAP_MINUTES
+    global SECTION_PARALLEL, CONFLICT_CONTEXT, ROLE_RULES, WATCHLIST, WATCHLIST_MAX_REFS
 
     load_dotenv(get_env_path(), override=True)
 
@@ -239,10 +276,38 @@ def reload_config():
     API_HASH = _get_str("API_HASH", "")
     PHONE = _get_str("PHONE", "")
     CLAUDE_API_KEY = _get_str("CLAUDE_API_KEY", "")
+    CLAUDE_BASE_URL = _get_str("CLAUDE_BASE_URL", "")
     EXCLUDE_USER_ID = _get_int("EXCLUDE_USER_ID", 0)
     EXCLUDE_USERNAME = _get_str("EXCLUDE_USERNAME", "")
     BOT_TOKEN = _get_str("BOT_TOKEN", "")
     OWNER_ID = _get_int("OWNER_ID", 0)
+    ANALYZE_WORKERS = _get_int("ANALYZE_WORKERS", 3)
+    CLAUDE_RPM_LIMIT = _get_int("CLAUDE_RPM_LIMIT", 50)
+    CLAUDE_TPM_LIMIT = _get_int("CLAUDE_TPM_LIMIT", 30000)
+    MAX_REQUEST_TOKENS = _get_int("MAX_REQUEST_TOKENS", 150000)
+    MAP_CHUNK_TOKENS = _get_int("MAP_CHUNK_TOKENS", 40000)
+    MAP_CACHE_MB = _get_int("MAP_CACHE_MB", 64)
+    INGEST_MEMORY_MB = _get_int("INGEST_MEMORY_MB", 512)
+    USER_DAILY_TOKEN_BUDGET = _get_int("USER_DAILY_TOKEN_BUDGET", 0)
+    CLAUDE_REPORT_MODEL = _get_str("CLAUDE_REPORT_MODEL", "claude-sonnet-4-5-20250929")
+    CLAUDE_MAP_MODEL = _get_str("CLAUDE_MAP_MODEL", "claude-haiku-4-5-20251001")
+    OVERSIZE_MODE = _get_str("OVERSIZE_MODE", "chunked")
+    SAMPLING_STRATEGY = _get_str("SAMPLING_STRATEGY", "day")
+    DOCX_RENDER_WORKERS = _get_int("DOCX_RENDER_WORKERS", 2)
+    RELEVANCE_FILTER = _get_int("RELEVANCE_FILTER", 1)
+    RELEVANCE_LEXICON = _get_str("RELEVANCE_LEXICON", "")
+    RELEVANCE_CONTEXT = _get_int("RELEVANCE_CONTEXT", 1)
+    NEAR_DUP_COLLAPSE = _get_int("NEAR_DUP_COLLAPSE", 1)
+    NEAR_DUP_SIMILARITY = _get_int("NEAR_DUP_SIMILARITY", 70)
+    NEAR_DUP_TOP = _get_int("NEAR_DUP_TOP", 15)
+    TOPIC_COUNT = _get_int("TOPIC_COUNT", 12)
+    DIALOGUE_GAP_MINUTES = _get_int("DIALOGUE_GAP_MINUTES", 30)
+    ROLE_RULES = _get_str("ROLE_RULES", "")
+    WATCHLIST = _get_str("WATCHLIST", "")
+    WATCHLIST_MAX_REFS = _get_int("WATCHLIST_MAX_REFS", 50)
+    SECTION_PARALLEL = _get_int("SECTION_PARALLEL", 1)
+    CONFLICT_CONTEXT = _get_int("CONFLICT_CONTEXT", 3)
+    DOCX_TEMPLATE = _get_str("DOCX_TEMPLATE", "")
 
 
 def save_config(
@@ -1,7 +1,9 @@
 # core/database.py
 """Модели базы данных для multi-user системы"""
 
-from sqlalchemy import Column, Integer, BigInteger, String, Text, Boolean, DateTime, ForeignKey
+from sqlalchemy import (
+    Column, Integer, BigInteger, String, Text, Boolean, DateTime, ForeignKey, UniqueConstraint, inspect
+)
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime
@@ -80,6 +82,20 @@ class UserSettings(Base):
     # Кастомный промпт для анализа через Claude
     custom_prompt = Column(Text, nullable=True)
 
+    # Дневной бюджет токенов Claude (None — глобальный USER_DAILY_TOKEN_BUDGET, 0 — без лимита)
+    daily_token_budget = Column(Integer, nullable=True)
+
+    # Модели Claude (None — CLAUDE_REPORT_MODEL / CLAUDE_MAP_MODEL из конфига)
+    report_model = Column(String(100), nullable=True)
+    map_model = Column(String(100), nullable=True)
+
+    # Правила ролей отправителей, JSON (None — ROLE_RULES из конфига)
+    role_rules = Column(Text, nullable=True)
+
+    # Ключевые слова для экспорта, по одному на строку (None — WATCHLIST из конфига)
+    watchlist = Column(Text, nullable=True)
+    watchlist_notify = Column(Boolean, nullable=True)  # Уведомлять о совпадениях (None — да)
+
     # Связь с пользователем
     user = relationship("User", back_populates="settings")
 
@@ -87,6 +103,74 @@ class UserSettings(Base):
         return f"<UserSettings(user_id={self.user_id}, limit={self.default_export_limit})>"
 
 
+class TokenUsage(Base):
+    """
+    Учёт израсходованных токенов Claude API
+
+    Одна запись на модель в рамках одной задачи анализа
+    """
+    __tablename__ = "token_usage"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(BigInteger, ForeignKey("users.user_id"), index=True)
+    model = Column(String(100), nullable=False)
+    input_tokens = Column(Integer, default=0)
+    output_tokens = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<TokenUsage(user_id={self.user_id}, model={self.model}, in={self.input_tokens}, out={self.output_tokens})>"
+
+
+class ChatAnalysisState(Base):
+    """
+    Состояние анализа чата для инкрементального режима
+
+    Одна запись на пару (пользователь, чат): до какого сообщения чат уже
+    проанализирован, сводка предыдущего отчёта и накопленная статистика
+    """
+    __tablename__ = "chat_analysis_state"
+    __table_args__ = (UniqueConstraint("user_id", "chat_key", name="uq_chat_analysis_state"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(BigInteger, ForeignKey("users.user_id"), index=True)
+    chat_key = Column(String(255), nullable=False)  # chat_id / @username из задачи экспорта
+
+    last_message_at = Column(DateTime, nullable=True)  # Время последнего проанализированного сообщения
+    messages_analyzed = Column(Integer, default=0)
+    prompt_hash = Column(String(64), nullable=True)  # Сводка валидна только для того же промпта
+    summary = Column(Text, nullable=True)  # Сжатая сводка предыдущего отчёта
+    stats_json = Column(Text, nullable=True)  # ChatStats.to_json()
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ChatAnalysisState(user_id={self.user_id}, chat={self.chat_key}, last={self.last_message_at})>"
+
+
+def _add_missing_columns(conn):
+    """
+    Простая миграция: добавить в существующие таблицы новые nullable колонки
+
+    create_all() создаёт только отсутствующие таблицы, но не колонки,
+    поэтому базы, созданные предыдущими версиями, дополняются здесь.
+    """
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+
+        existing_columns = {col["name"] for col in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}')
+            logger.info(f"🔧 Миграция БД: добавлена колонка {table.name}.{column.name}")
+
+
 # Глобальные переменные для engine и session maker
 _engine = None
 _async_session_maker = None
@@ -119,6 +203,7 @@ async def init_database():
     # Создать таблицы
     async with _engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
 
     logger.info("✅ База данных инициализирована")
 
@@ -2,12 +2,12 @@
 """Менеджер для работы с базой данных"""
 
 from typing import Optional, Dict, Any
-from sqlalchemy import select, update, delete
+from sqlalchemy import select, update, delete, func
 from sqlalchemy.ext.asyncio import AsyncSession
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
 
-from core.database import User, UserSettings, get_session_maker
+from core.database import User, UserSettings, TokenUsage, ChatAnalysisState, get_session_maker
 from cryptography.fernet import Fernet
 import os
 
@@ -236,6 +236,104 @@ class DatabaseManager:
 
             return result.rowcount > 0
 
+    async def add_token_usage(self, user_id: int, model: str, input_tokens: int, output_tokens: int):
+        """
+        Записать израсходованные токены
+
+        Args:
+            user_id: Telegram User ID
+            model: Модель Claude
+            input_tokens: Входные токены
+            output_tokens: Выходные токены
+        """
+        async with self.session_maker() as session:
+            session.add(TokenUsage(
+                user_id=user_id,
+                model=model,
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                created_at=datetime.utcnow()
+            ))
+            await session.commit()
+
+    async def get_tokens_used_today(self, user_id: int) -> int:
+        """
+        Получить количество токенов, израсходованных за последние сутки
+
+        Args:
+            user_id: Telegram User ID
+
+        Returns:
+            Сумма входных и выходных токенов
+        """
+        since = datetime.utcnow() - timedelta(days=1)
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(func.coalesce(func.sum(TokenUsage.input_tokens + TokenUsage.output_tokens), 0))
+                .where(TokenUsage.user_id == user_id, TokenUsage.created_at >= since)
+            )
+            return int(result.scalar_one())
+
+    async def get_chat_state(self, user_id: int, chat_key: str) -> Optional[ChatAnalysisState]:
+        """
+        Получить состояние инкрементального анализа чата
+
+        Args:
+            user_id: Telegram User ID
+            chat_key: Идентификатор чата из задачи
+
+        Returns:
+            ChatAnalysisState или None
+        """
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(ChatAnalysisState).where(
+                    ChatAnalysisState.user_id == user_id,
+                    ChatAnalysisState.chat_key == chat_key
+                )
+            )
+            return result.scalar_one_or_none()
+
+    async def save_chat_state(self, user_id: int, chat_key: str, **kwargs):
+        """
+        Создать или обновить состояние инкрементального анализа чата
+
+        Args:
+            user_id: Telegram User ID
+            chat_key: Идентификатор чата из задачи
+            **kwargs: Поля ChatAnalysisState
+        """
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(ChatAnalysisState).where(
+                    ChatAnalysisState.user_id == user_id,
+                    ChatAnalysisState.chat_key == chat_key
+                )
+            )
+            state = result.scalar_one_or_none()
+            if state is None:
+                state = ChatAnalysisState(user_id=user_id, chat_key=chat_key)
+                session.add(state)
+            for key, value in kwargs.items():
+                setattr(state, key, value)
+            state.updated_at = datetime.utcnow()
+            await session.commit()
+
+    async def delete_chat_state(self, user_id: int, chat_key: Optional[str] = None) -> int:
+        """
+        Сбросить состояние инкрементального анализа (одного чата или всех)
+
+        Returns:
+            Количество удалённых записей
+        """
+        async with self.session_maker() as session:
+            query = delete(ChatAnalysisState).where(ChatAnalysisState.user_id == user_id)
+            if chat_key is not None:
+                query = query.where(ChatAnalysisState.chat_key == chat_key)
+            result = await session.execute(query)
+            await session.commit()
+            return result.rowcount
+
     async def delete_user(self, user_id: int) -> bool:
         """
         Удалить пользователя и все его данные
@@ -247,6 +345,10 @@ class DatabaseManager:
             True если удален
         """
         async with self.session_maker() as session:
+            # SQLite не проверяет внешние ключи, а массовый delete не вызывает каскад ORM —
+            # зависимые записи удаляются явно, в той же транзакции
+            for model in (ChatAnalysisState, TokenUsage, UserSettings):
+                await session.execute(delete(model).where(model.user_id == user_id))
             result = await session.execute(
                 delete(User).where(User.user_id == user_id)
             )
@@ -15,6 +15,7 @@ class TaskType(Enum):
     EXPORT = "export"
     ANALYZE = "analyze"
     EXPORT_ANALYZE = "export_analyze"
+    MULTI_ANALYZE = "multi_analyze"
 
 
 class TaskStatus(Enum):
@@ -310,4 +310,7 @@ def main():
 
 
 if __name__ == "__main__":
+    # Пул рендеринга DOCX запускает процессы через spawn — нужно для сборки PyInstaller
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
@@ -2,24 +2,66 @@
 """Модуль для анализа CSV файлов с помощью Claude API (Anthropic)"""
 
 import os
-import time
+import threading
 import pandas as pd
 import logging
 from pathlib import Path
-from datetime import datetime
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Optional, Callable, Union
 
 import anthropic
-from docx import Document
-from docx.shared import Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
 
 from core.config import (
     CLAUDE_API_KEY,
+    CLAUDE_BASE_URL,
+    ANALYZE_WORKERS,
+    MAX_REQUEST_TOKENS,
+    MAP_CHUNK_TOKENS,
+    MAP_CACHE_MB,
+    CLAUDE_REPORT_MODEL,
+    CLAUDE_MAP_MODEL,
+    OVERSIZE_MODE,
+    SAMPLING_STRATEGY,
+    RELEVANCE_FILTER,
+    NEAR_DUP_COLLAPSE,
+    SECTION_PARALLEL,
     get_input_folder,
     get_output_folder,
     get_logs_dir
 )
+from services.rate_limiter import get_rate_limiter, parse_retry_after
+from services.tokens import (
+    estimate_tokens,
+    count_tokens,
+    choose_strategy,
+    check_request_budget,
+    PreflightEstimate,
+    UsageTracker,
+    STRATEGY_SINGLE,
+    STRATEGY_CHUNKED,
+    STRATEGY_SAMPLED,
+    TIER_MAP,
+    TIER_REPORT,
+)
+from services.stats import (
+    compute_chat_stats,
+    format_stats_text,
+    parse_dates,
+    sender_roles,
+    ROLE_SUPPORT,
+    DAYS_RU,
+    EXPORT_DATE_FORMAT,
+)
+from services.streaming import ResponseStream
+from services.ingest import ChatSource, read_chat_for_analysis
+from services.sampling import sample_messages, SampleReport
+from services.relevance import noise_mask
+from services.dedup import collapse_near_duplicates, format_clusters_text
+from services.sessions import dialogue_ids, period_chunks, summarize_dialogues, format_dialogues_text
+from services.map_cache import get_map_cache, map_cache_key
+from services.prompt_template import PromptContext, render_prompt, DATA_PLACEHOLDER
+from services.docx_render import render_in_pool
 
 # Настройка логирования
 logging.basicConfig(
@@ -29,25 +71,70 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Константы Claude API
-CLAUDE_MODEL = "claude-sonnet-4-5-20250929"  # Актуальная модель Claude Sonnet 4.5
+CLAUDE_MODEL = CLAUDE_REPORT_MODEL  # Модель итогового отчёта по умолчанию (Claude Sonnet 4.5)
 MAX_TOKENS = 8192  # Максимум токенов в ответе
 MAX_RETRIES = 3  # Количество попыток при ошибке API
-MAX_CSV_ROWS = 3000  # Лимит строк CSV для контекста
-API_DELAY_SECONDS = 5  # Задержка между запросами к API (секунды)
+MAP_MAX_TOKENS = 2048  # Максимум токенов в ответе map-этапа (заметки по части)
+STREAM_RESPONSES = True  # Потоковые ответы: прогресс сразу и без HTTP-таймаутов на длинных ответах
+RATE_LIMIT_FALLBACK_SECONDS = 10  # Пауза при 429 без заголовка retry-after
+CHARS_PER_TOKEN = 3  # Грубая оценка: символов на токен (кириллица)
+COMPACT_CSV = True  # Сжимать данные чата перед отправкой (легенда, заголовки дней)
+COMPACT_MAX_MESSAGE_CHARS = 1000  # Обрезка очень длинных сообщений (None — без обрезки)
+COMPACT_MERGE_SEPARATOR = " | "  # Разделитель склеенных подряд сообщений одного отправителя
+# Буква или цифра (латиница, кириллица). Явный класс вместо \w: pandas со строками
+# на pyarrow использует RE2, где \w — только ASCII
+WORD_CHAR_PATTERN = "[0-9A-Za-z\u00C0-\u024F\u0400-\u04FF]"
+
+
+@dataclass(frozen=True)
+class ModelTiers:
+    """
+    Модели по уровням задач: дешёвая быстрая — для заметок по частям (map),
+    сильная — для итогового отчёта (одиночный запрос и reduce).
+    """
+    report: str = CLAUDE_REPORT_MODEL
+    map: str = CLAUDE_MAP_MODEL
+
+    def for_tier(self, tier: str) -> str:
+        return self.map if tier == TIER_MAP else self.report
+
+
+def resolve_model_tiers(settings=None) -> ModelTiers:
+    """
+    Модели с учётом переопределений пользователя (UserSettings.report_model / map_model).
+
+    Args:
+        settings: Настройки пользователя бота (None — настройки развёртывания)
+
+    Returns:
+        ModelTiers
+    """
+    return ModelTiers(
+        report=getattr(settings, 'report_model', None) or CLAUDE_REPORT_MODEL,
+        map=getattr(settings, 'map_model', None) or CLAUDE_MAP_MODEL,
+    )
+
 
 def get_client(api_key: Optional[str] = None) -> anthropic.Anthropic:
     """
     Получение или создание клиента Claude API
 
+    При заданном CLAUDE_BASE_URL запросы идут на этот адрес (например,
+    на локальный tools/fake_anthropic.py для нагрузочных тестов).
+
     Args:
         api_key: Claude API ключ (если None, использует глобальный из конфига)
 
     Returns:
         Клиент Claude API
     """
+    # Повторы выполняет create_message с учётом rate limiter, поэтому
+    # встроенные повторы SDK отключены (иначе паузы удваиваются)
+    base_url = CLAUDE_BASE_URL or None
+
     # Если передан api_key, создаем новый клиент для этого ключа
     if api_key and api_key.strip():
-        return anthropic.Anthropic(api_key=api_key)
+        return anthropic.Anthropic(api_key=api_key, max_retries=0, base_url=base_url)
 
     # Иначе используем глобальный ключ из конфига
     if not CLAUDE_API_KEY or CLAUDE_API_KEY.strip() == "":
@@ -56,10 +143,427 @@ def get_client(api_key: Optional[str] = None) -> anthropic.Anthropic:
         )
 
     logger.info("✅ Using global Claude API key from config")
-    return anthropic.Anthropic(api_key=CLAUDE_API_KEY)
+    return anthropic.Anthropic(api_key=CLAUDE_API_KEY, max_retries=0, base_url=base_url)
+
+
+def create_message(
+        client: anthropic.Anthropic,
+        prompt: Union[str, list],
+        on_wait: Optional[Callable[[float], None]] = None,
+        usage: Optional[UsageTracker] = None,
+        max_tokens: int = MAX_TOKENS,
+        stream: Optional[ResponseStream] = None,
+        model: str = CLAUDE_MODEL,
+        tier: str = TIER_REPORT
+):
+    """
+    Отправка запроса в Claude API через общий rate limiter.
+
+    Перед запросом резервирует квоту RPM/TPM, после ответа синхронизирует
+    лимитер по заголовкам anthropic-ratelimit-*. При 429 ждёт retry-after.
+    При STREAM_RESPONSES ответ читается потоком: соединение не простаивает
+    минутами, а фрагменты текста сразу передаются в stream.
+
+    Args:
+        client: Клиент Claude API
+        prompt: Текст запроса или список блоков content (например, с cache_control)
+        on_wait: Колбэк ожидания квоты (получает секунды ожидания)
+        usage: Учёт израсходованных токенов (опционально)
+        max_tokens: Максимум токенов в ответе
+        stream: Приёмник фрагментов ответа (опционально)
+        model: Модель Claude
+        tier: Уровень задачи для учёта токенов (TIER_MAP / TIER_REPORT)
+
+    Returns:
+        Ответ Messages API
+    """
+    limiter = get_rate_limiter(client.api_key)
+    estimated_tokens = estimate_tokens(
+        prompt if isinstance(prompt, str) else "".join(block.get("text", "") for block in prompt)
+    )
+    messages = [{"role": "user", "content": prompt}]
 
+    for attempt in range(MAX_RETRIES):
+        limiter.acquire(estimated_tokens, on_wait=on_wait)
+        if stream is not None:
+            stream.begin()
 
-def analyze_csv_with_claude(file_path: str, claude_api_key: Optional[str] = None, custom_prompt: Optional[str] = None) -> str:
+        try:
+            if STREAM_RESPONSES:
+                with client.messages.stream(
+                    model=model,
+                    max_tokens=max_tokens,
+                    messages=messages
+                ) as response:
+                    limiter.update_from_headers(response.response.headers)
+                    for text in response.text_stream:
+                        if stream is not None:
+                            stream.feed(text)
+                    message = response.get_final_message()
+            else:
+                raw = client.messages.with_raw_response.create(
+                    model=model,
+                    max_tokens=max_tokens,
+                    messages=messages
+                )
+                limiter.update_from_headers(raw.headers)
+                message = raw.parse()
+                if stream is not None:
+                    stream.feed(message_text(message))
+
+            if usage is not None:
+                usage.add_message(model, message, tier=tier)
+            if stream is not None:
+                stream.end(message)
+            return message
+
+        except anthropic.RateLimitError as e:
+            limiter.update_from_headers(e.response.headers)
+            if parse_retry_after(e.response.headers) is None:
+                limiter.pause(RATE_LIMIT_FALLBACK_SECONDS)
+            logger.warning(f"Rate limit. Попытка {attempt + 1}/{MAX_RETRIES}")
+            if attempt == MAX_RETRIES - 1:
+                raise
+
+        except anthropic.APIStatusError as e:
+            limiter.update_from_headers(e.response.headers)
+            logger.warning(f"API ошибка: {e}. Попытка {attempt + 1}/{MAX_RETRIES}")
+            if attempt == MAX_RETRIES - 1 or e.status_code < 500:
+                raise
+            limiter.pause(parse_retry_after(e.response.headers) or 2 ** attempt)
+
+        except anthropic.APIError as e:
+            logger.warning(f"API ошибка: {e}. Попытка {attempt + 1}/{MAX_RETRIES}")
+            if attempt == MAX_RETRIES - 1:
+                raise
+            limiter.pause(2 ** attempt)
+
+
+@dataclass
+class AnalysisPlan:
+    """План анализа: стратегия, готовые запросы и оценка токенов"""
+    estimate: PreflightEstimate
+    stats_text: str
+    prompt: Optional[str] = None  # Для STRATEGY_SINGLE / STRATEGY_COMPACT
+    chunks: Optional[list] = None  # Тексты частей для STRATEGY_CHUNKED
+    context: str = ""  # Вступление итогового запроса (например, сводка предыдущего отчёта)
+    data: Optional[str] = None  # Блок данных чата из prompt (для общего кэшируемого префикса)
+    sample_report: Optional[SampleReport] = None  # Для STRATEGY_SAMPLED
+    clusters_text: str = ""  # Частые повторяющиеся сообщения клиентов (services/dedup.py)
+    dialogues_text: str = ""  # Диалоги и время первого ответа (services/sessions.py)
+    task: Optional[str] = None  # Промпт пользователя с подставленными переменными (services/prompt_template.py)
+
+    @property
+    def appendix(self) -> str:
+        """Локальные разделы, добавляемые к тексту Claude: статистика, диалоги, частые сообщения, выборка"""
+        sections = [self.stats_text, self.dialogues_text, self.clusters_text]
+        if self.sample_report is not None:
+            sections.append(self.sample_report.to_text())
+        return "\n\n".join(section for section in sections if section)
+
+
+def plan_analysis(
+        df: pd.DataFrame,
+        custom_prompt: Optional[str] = None,
+        client: Optional[anthropic.Anthropic] = None,
+        request_budget: Optional[int] = None,
+        stats_text: Optional[str] = None,
+        context: str = "",
+        oversize_mode: Optional[str] = None,
+        sampling_strategy: Optional[str] = None,
+        models: Optional[ModelTiers] = None,
+        include_data: Optional[bool] = None,
+        prompt_context: Optional[PromptContext] = None,
+        dialogues_text: Optional[str] = None
+) -> AnalysisPlan:
+    """
+    Предварительная оценка токенов и выбор стратегии анализа.
+
+    Сначала размер оценивается локально (векторно, без сериализации),
+    затем итоговый запрос проверяется через count-tokens endpoint (если доступен клиент).
+
+    Args:
+        df: Данные чата (Date/From/Text)
+        custom_prompt: Кастомный промпт пользователя
+        client: Клиент Claude API для точного подсчёта (None — только локальная оценка)
+        request_budget: Лимит входных токенов на запрос (по умолчанию MAX_REQUEST_TOKENS)
+        stats_text: Готовая статистика (по умолчанию считается по df)
+        context: Вступление итогового запроса (инкрементальный анализ)
+        oversize_mode: Что делать, если данные не помещаются: 'chunked' | 'sample' (по умолчанию OVERSIZE_MODE)
+        sampling_strategy: Стратегия выборки для 'sample' (по умолчанию SAMPLING_STRATEGY)
+        models: Модели по уровням (токены считаются для модели итогового отчёта)
+        include_data: Отправлять данные чата (по умолчанию — если в промпте пользователя есть {csv_content})
+        prompt_context: Общий для нескольких промптов PromptContext этого чата (переменные считаются один раз)
+        dialogues_text: Готовая сводка диалогов (по умолчанию считается по df)
+
+    Returns:
+        AnalysisPlan
+
+    Raises:
+        TokenBudgetError: Если сам промпт (без данных) не помещается в лимит
+    """
+    budget = request_budget or MAX_REQUEST_TOKENS
+    models = models or ModelTiers()
+
+    # Числовые разделы отчёта считаются локально по всему файлу
+    if stats_text is None:
+        stats_text = format_stats_text(compute_chat_stats(df))
+
+    if custom_prompt:
+        # Переменные считаются только если упомянуты в шаблоне
+        custom_prompt = render_prompt(custom_prompt, prompt_context or PromptContext(
+            df, stats_text=stats_text, dialogues_text=dialogues_text
+        ))
+    if include_data is None:
+        include_data = not custom_prompt or DATA_PLACEHOLDER in custom_prompt
+
+    overhead = estimate_tokens(context + _build_prompt("", stats_text, custom_prompt))
+    check_request_budget(overhead, budget, what="Промпт без данных")
+
+    compacted, report = compact_messages(df, max_message_chars=COMPACT_MAX_MESSAGE_CHARS)
+    logger.info(f"📉 {report.describe()}")
+    # Частота повторов — по всем сообщениям, даже если в запрос попадёт только выборка
+    clusters_text = format_clusters_text(report.clusters)
+    if dialogues_text is None:
+        dialogues_text = format_dialogues_text(summarize_dialogues(df))
+
+    if not include_data:
+        # В промпте нет {csv_content}: данные чата не отправляются, только подставленные переменные
+        prompt = context + _build_prompt("", stats_text, custom_prompt)
+        request_tokens, exact = count_tokens(client, prompt, models.report)
+        estimate = PreflightEstimate(
+            strategy=STRATEGY_SINGLE,
+            raw_tokens=overhead + report.tokens_before,
+            compact_tokens=request_tokens,
+            request_tokens=request_tokens,
+            total_tokens=request_tokens + MAX_TOKENS,
+            exact=exact,
+        )
+        return AnalysisPlan(
+            estimate=estimate, stats_text=stats_text, prompt=prompt, context=context, data="",
+            clusters_text=clusters_text, dialogues_text=dialogues_text, task=custom_prompt
+        )
+
+    raw_tokens = overhead + report.tokens_before
+    compact_tokens = overhead + report.tokens_after
+    strategy = choose_strategy(raw_tokens, compact_tokens, budget, prefer_compact=COMPACT_CSV)
+
+    if strategy != STRATEGY_CHUNKED:
+        if strategy == STRATEGY_SINGLE:
+            csv_content = df.to_csv(index=False, sep=';', date_format=EXPORT_DATE_FORMAT)
+        else:
+            csv_content = render_compact(compacted)
+        prompt = context + _build_prompt(csv_content, stats_text, custom_prompt)
+        request_tokens, exact = count_tokens(client, prompt, models.report)
+
+        if request_tokens <= budget:
+            estimate = PreflightEstimate(
+                strategy=strategy,
+                raw_tokens=raw_tokens,
+                compact_tokens=compact_tokens,
+                request_tokens=request_tokens,
+                total_tokens=request_tokens + MAX_TOKENS,
+                exact=exact,
+            )
+            return AnalysisPlan(
+                estimate=estimate, stats_text=stats_text, prompt=prompt, context=context,
+                data=csv_content, clusters_text=clusters_text, dialogues_text=dialogues_text, task=custom_prompt
+            )
+
+        # Локальная оценка оказалась занижена — переходим к анализу по частям
+        logger.warning(f"⚠️ Запрос ~{request_tokens:,} токенов превышает лимит {budget:,}")
+        strategy = STRATEGY_CHUNKED
+
+    if (oversize_mode or OVERSIZE_MODE) == "sample":
+        plan = _plan_sampled(
+            df, custom_prompt, client, budget, overhead, stats_text, context,
+            raw_tokens, compact_tokens, sampling_strategy or SAMPLING_STRATEGY, models.report
+        )
+        if plan is not None:
+            plan.clusters_text = clusters_text
+            plan.dialogues_text = dialogues_text
+            plan.task = custom_prompt
+            return plan
+
+    chunk_budget = min(MAP_CHUNK_TOKENS, budget) - overhead
+    # Повторы и псевдонимы — свои в каждой части: текст части не зависит от периода анализа
+    chunks = [
+        render_compact(part)
+        for part in compact_chunks(df, chunk_budget, max_message_chars=COMPACT_MAX_MESSAGE_CHARS)
+    ]
+    estimate = chunked_estimate(chunks, custom_prompt, overhead, raw_tokens, compact_tokens, models)
+    return AnalysisPlan(
+        estimate=estimate, stats_text=stats_text, chunks=chunks, context=context,
+        clusters_text=clusters_text, dialogues_text=dialogues_text, task=custom_prompt
+    )
+
+
+def chunked_estimate(
+        chunks: list,
+        custom_prompt: Optional[str],
+        overhead: int,
+        raw_tokens: int,
+        compact_tokens: int,
+        models: ModelTiers
+) -> PreflightEstimate:
+    """
+    Оценка map-reduce по готовым текстам частей.
+
+    Части с заметками в кэше (services/map_cache.py) запросов не требуют.
+
+    Args:
+        chunks: Тексты частей
+        custom_prompt: Задача (промпт с подставленными переменными)
+        overhead: Токены итогового промпта без данных
+        raw_tokens: Оценка исходных данных (для отчёта о сжатии)
+        compact_tokens: Оценка сжатых данных
+        models: Модели по уровням
+    """
+    map_tokens = [estimate_tokens(_build_map_prompt(chunk, custom_prompt, 1, len(chunks))) for chunk in chunks]
+    reduce_tokens = overhead + len(chunks) * MAP_MAX_TOKENS
+
+    cache = get_map_cache(MAP_CACHE_MB)
+    if cache is not None:
+        task = _map_task(custom_prompt)
+        cached = [cache.contains(map_cache_key(chunk, task, models.map, MAP_MAX_TOKENS)) for chunk in chunks]
+        if any(cached):
+            logger.info(f"♻️ Заметки в кэше: {sum(cached)} из {len(chunks)} частей")
+        map_tokens = [tokens for tokens, hit in zip(map_tokens, cached) if not hit]
+
+    return PreflightEstimate(
+        strategy=STRATEGY_CHUNKED,
+        raw_tokens=raw_tokens,
+        compact_tokens=compact_tokens,
+        request_tokens=max(map_tokens + [reduce_tokens]),
+        total_tokens=sum(map_tokens) + len(map_tokens) * MAP_MAX_TOKENS + reduce_tokens + MAX_TOKENS,
+        requests=len(map_tokens) + 1,
+    )
+
+
+def _plan_sampled(
+        df: pd.DataFrame,
+        custom_prompt: Optional[str],
+        client: Optional[anthropic.Anthropic],
+        budget: int,
+        overhead: int,
+        stats_text: str,
+        context: str,
+        raw_tokens: int,
+        compact_tokens: int,
+        strategy: str,
+        model: str = CLAUDE_MODEL
+) -> Optional[AnalysisPlan]:
+    """
+    План одного запроса по выборке сообщений.
+
+    Если после точного подсчёта запрос всё же превышает лимит, выборка
+    повторяется с уменьшенным бюджетом; None — выборка не помогла (будет map-reduce).
+    """
+    data_budget = budget - overhead
+    for _ in range(3):
+        sampled, sample_report = sample_messages(
+            df, data_budget, strategy=strategy, max_message_chars=COMPACT_MAX_MESSAGE_CHARS
+        )
+        compacted, _ = compact_messages(sampled, max_message_chars=COMPACT_MAX_MESSAGE_CHARS)
+        csv_content = f"(Это {sample_report.describe()}.)\n{render_compact(compacted)}"
+        prompt = context + _build_prompt(csv_content, stats_text, custom_prompt)
+        request_tokens, exact = count_tokens(client, prompt, model)
+
+        if request_tokens <= budget:
+            estimate = PreflightEstimate(
+                strategy=STRATEGY_SAMPLED,
+                raw_tokens=raw_tokens,
+                compact_tokens=compact_tokens,
+                request_tokens=request_tokens,
+                total_tokens=request_tokens + MAX_TOKENS,
+                exact=exact,
+            )
+            return AnalysisPlan(
+                estimate=estimate, stats_text=stats_text, prompt=prompt,
+                context=context, sample_report=sample_report, data=csv_content
+            )
+        data_budget = int(data_budget * budget / request_tokens * 0.95)
+
+    logger.warning("⚠️ Выборка не поместилась в лимит — анализ по частям")
+    return None
+
+
+def preflight_analysis(
+        file_path: str,
+        claude_api_key: Optional[str] = None,
+        custom_prompt: Optional[str] = None,
+        models: Optional[ModelTiers] = None
+) -> PreflightEstimate:
+    """
+    Оценка токенов и стратегии для файла без запуска анализа.
+
+    Args:
+        file_path: Путь к CSV файлу
+        claude_api_key: Claude API ключ (если есть — точный подсчёт через count-tokens)
+        custom_prompt: Кастомный промпт пользователя
+        models: Модели по уровням (по умолчанию из конфига)
+
+    Returns:
+        PreflightEstimate
+    """
+    client = get_client(api_key=claude_api_key) if claude_api_key else None
+    chat = read_chat_for_analysis(file_path)
+    check_required_columns(chat.frame)
+    return _plan_report(chat, custom_prompt, client, models).estimate
+
+
+def chat_report_texts(chat: ChatSource) -> tuple:
+    """
+    Статистика и сводка диалогов файла, прочитанного блоками.
+
+    Returns:
+        (stats_text, dialogues_text) или (None, None) — файл прочитан целиком, считать по df
+    """
+    if chat.stats is None:
+        return None, None
+    stats_text = format_stats_text(chat.stats)
+    if chat.sampled:
+        stats_text += f"\n\n_{chat.describe()}_"
+    return stats_text, format_dialogues_text(chat.dialogues)
+
+
+def _plan_report(
+        chat: ChatSource,
+        custom_prompt: Optional[str],
+        client: Optional[anthropic.Anthropic],
+        models: Optional[ModelTiers]
+):
+    """
+    План полного отчёта: стандартный отчёт — по разделам параллельно (SECTION_PARALLEL),
+    отчёт по промпту пользователя — одним планом.
+
+    Для большого файла (выборка текстов) статистика и диалоги — посчитанные
+    по блокам при чтении, по всем сообщениям, а не по выборке.
+
+    Returns:
+        AnalysisPlan или SectionedPlan (оба с .estimate и .appendix)
+    """
+    stats_text, dialogues_text = chat_report_texts(chat)
+    if SECTION_PARALLEL and not custom_prompt:
+        # services/sections.py сам импортирует analyzer — импорт здесь, а не на уровне модуля
+        from services.sections import plan_sections
+        return plan_sections(
+            chat.frame, client=client, models=models, stats_text=stats_text, dialogues_text=dialogues_text
+        )
+    return plan_analysis(
+        chat.frame, custom_prompt, client=client, models=models, stats_text=stats_text, dialogues_text=dialogues_text
+    )
+
+
+def analyze_csv_with_claude(
+        file_path: str,
+        claude_api_key: Optional[str] = None,
+        custom_prompt: Optional[str] = None,
+        on_wait: Optional[Callable[[float], None]] = None,
+        usage: Optional[UsageTracker] = None,
+        stream: Optional[ResponseStream] = None,
+        models: Optional[ModelTiers] = None
+) -> str:
     """
     Читает CSV и отправляет данные в Claude API для анализа.
 
@@ -67,6 +571,10 @@ def analyze_csv_with_claude(file_path: str, claude_api_key: Optional[str] = None
         file_path: Путь к CSV файлу
         claude_api_key: Claude API ключ (опционально, если None - использует глобальный)
         custom_prompt: Кастомный промпт пользователя (опционально, если None - использует дефолтный)
+        on_wait: Колбэк ожидания квоты rate limiter (опционально)
+        usage: Учёт израсходованных токенов (опционально)
+        stream: Приёмник потокового текста итогового отчёта и прогресса (опционально)
+        models: Модели по уровням (по умолчанию из конфига)
 
     Returns:
         Текст анализа от Claude
@@ -80,72 +588,39 @@ def analyze_csv_with_claude(file_path: str, claude_api_key: Optional[str] = None
         client = get_client(api_key=claude_api_key)
         logger.info(f"📖 Reading file: {file_path}")
 
-        # Чтение CSV с поддержкой разных форматов
-        df = _read_csv_flexible(file_path)
+        # Чтение CSV с поддержкой разных форматов (большой файл — блоками, в пределах памяти)
+        chat = read_chat_for_analysis(file_path)
+        df = chat.frame
         logger.info(f"✅ Файл прочитан. Строк: {len(df)}, Столбцов: {len(df.columns)}")
 
         # Проверка обязательных колонок
-        required_columns = ['Date', 'From', 'Text']
-        missing = [col for col in required_columns if col not in df.columns]
-        if missing:
-            return f"Ошибка: Отсутствуют обязательные колонки: {missing}"
-
-        # Ограничение размера для API
-        if len(df) > MAX_CSV_ROWS:
-            logger.warning(
-                f"Файл содержит {len(df)} строк. "
-                f"Ограничиваем до {MAX_CSV_ROWS} для анализа."
-            )
-            df = df.head(MAX_CSV_ROWS)
-
-        # Формирование контента (используем to_csv для эффективности)
-        csv_content = df.to_csv(index=False, sep=';')
+        try:
+            check_required_columns(df)
+        except ValueError as e:
+            return f"Ошибка: {e}"
 
-        # Промпт для анализа (используем кастомный если есть, иначе дефолтный)
         if custom_prompt:
             logger.info("🎯 Используется кастомный промпт пользователя")
-            # В кастомном промпте {csv_content} будет заменен на данные
-            prompt = custom_prompt.replace("{csv_content}", csv_content)
         else:
             logger.info("📝 Используется дефолтный промпт анализа")
-            prompt = _build_analysis_prompt(csv_content)
-
-        logger.info("🤖 Отправка запроса в Claude API...")
-
-        # Отправка с повторами при ошибке
-        for attempt in range(MAX_RETRIES):
-            try:
-                message = client.messages.create(
-                    model=CLAUDE_MODEL,
-                    max_tokens=MAX_TOKENS,
-                    messages=[
-                        {"role": "user", "content": prompt}
-                    ]
-                )
 
-                logger.info("✅ Ответ получен от Claude API")
+        # Оценка токенов и выбор стратегии до отправки
+        plan = _plan_report(chat, custom_prompt, client, models)
+        logger.info(f"📏 {plan.estimate.describe()}")
 
-                # Извлекаем текст из ответа
-                if message.content and len(message.content) > 0:
-                    return message.content[0].text
-                else:
-                    return "Ошибка: Пустой ответ от Claude API"
-
-            except anthropic.RateLimitError as e:
-                wait_time = 2 ** (attempt + 1)
-                logger.warning(
-                    f"Rate limit. Попытка {attempt + 1}/{MAX_RETRIES}. "
-                    f"Ожидание {wait_time} сек..."
-                )
-                time.sleep(wait_time)
+        if isinstance(plan, AnalysisPlan):
+            analysis_text = run_analysis_plan(
+                client, plan, custom_prompt, on_wait=on_wait, usage=usage, stream=stream, models=models
+            )
+        else:
+            from services.sections import run_sections
+            analysis_text = run_sections(client, plan, on_wait=on_wait, usage=usage, stream=stream, models=models)
 
-            except anthropic.APIError as e:
-                logger.warning(f"API ошибка: {e}. Попытка {attempt + 1}/{MAX_RETRIES}")
-                if attempt == MAX_RETRIES - 1:
-                    raise
-                time.sleep(2 ** attempt)
+        if not analysis_text:
+            return "Ошибка: Пустой ответ от Claude API"
 
-        return "Ошибка: Превышено количество попыток обращения к API"
+        # Качественные разделы — от Claude, числовые — из локального расчёта
+        return f"{analysis_text}\n\n{plan.appendix}"
 
     except Exception as e:
         error_msg = f"Ошибка при анализе файла {file_path}: {e}"
@@ -153,49 +628,460 @@ def analyze_csv_with_claude(file_path: str, claude_api_key: Optional[str] = None
         return error_msg
 
 
-def _read_csv_flexible(file_path: str) -> pd.DataFrame:
-    """Чтение CSV с автоопределением формата"""
-    encodings = ['utf-8-sig', 'utf-8', 'cp1251', 'latin-1']
-    separators = [';', ',', '\t']
+def run_analysis_plan(
+        client: anthropic.Anthropic,
+        plan: AnalysisPlan,
+        custom_prompt: Optional[str] = None,
+        on_wait: Optional[Callable[[float], None]] = None,
+        usage: Optional[UsageTracker] = None,
+        stream: Optional[ResponseStream] = None,
+        models: Optional[ModelTiers] = None
+) -> str:
+    """
+    Выполнить план анализа (один запрос или map-reduce).
 
-    for encoding in encodings:
-        for sep in separators:
-            try:
-                df = pd.read_csv(file_path, sep=sep, encoding=encoding)
-                # Проверяем, что получили больше одной колонки
-                if len(df.columns) > 1:
-                    return df
-            except Exception:
-                continue
+    Returns:
+        Текст анализа от Claude (без локальной статистики)
+    """
+    models = models or ModelTiers()
+    if plan.task is not None:
+        # В плане — промпт с уже подставленными переменными
+        custom_prompt = plan.task
+    if plan.estimate.strategy == STRATEGY_CHUNKED:
+        text = _run_chunked(
+            client, plan, custom_prompt, on_wait=on_wait, usage=usage, stream=stream, models=models
+        )
+    else:
+        logger.info(f"🤖 Отправка запроса в Claude API ({models.report})...")
+        if stream is not None:
+            stream.set_stage("✍️ Claude пишет отчёт")
+        message = create_message(
+            client, plan.prompt, on_wait=on_wait, usage=usage, stream=stream, model=models.report
+        )
+        logger.info("✅ Ответ получен от Claude API")
+        text = message_text(message)
+
+    if usage is not None:
+        logger.info(f"💰 Токены по уровням моделей: {usage.describe_tiers()}")
+    return text
+
+
+def _run_chunked(
+        client: anthropic.Anthropic,
+        plan: AnalysisPlan,
+        custom_prompt: Optional[str],
+        on_wait: Optional[Callable[[float], None]] = None,
+        usage: Optional[UsageTracker] = None,
+        stream: Optional[ResponseStream] = None,
+        models: Optional[ModelTiers] = None
+) -> str:
+    """
+    Анализ по частям: map (заметки по каждой части, параллельно) + reduce (итоговый отчёт).
+
+    Заметки по частям пишет дешёвая модель (models.map), итоговый отчёт — сильная (models.report).
+    Заметки кэшируются по содержимому части (services/map_cache.py): при повторном
+    анализе пересекающегося периода запросы идут только по новым частям.
+    В stream передаётся только текст итогового отчёта; по map-этапу —
+    смена этапа после каждой обработанной части.
+
+    Returns:
+        Текст итогового отчёта
+    """
+    models = models or ModelTiers()
+    total = len(plan.chunks)
+    logger.info(f"🧩 Анализ по частям: {total} частей (map: {models.map}, отчёт: {models.report})")
+    done = [0]
+    done_lock = threading.Lock()
+
+    if stream is not None:
+        stream.set_stage(f"🧩 Обработка частей: 0/{total}")
+
+    cache = get_map_cache(MAP_CACHE_MB)
+    task = _map_task(custom_prompt)
+
+    def map_chunk(index: int) -> str:
+        key = map_cache_key(plan.chunks[index], task, models.map, MAP_MAX_TOKENS)
+        note = cache.get(key) if cache is not None else None
+        if note is not None:
+            logger.info(f"♻️ Часть {index + 1}/{total}: заметки из кэша")
+        else:
+            prompt = _build_map_prompt(plan.chunks[index], custom_prompt, index + 1, total)
+            message = create_message(
+                client, prompt, on_wait=on_wait, usage=usage, max_tokens=MAP_MAX_TOKENS,
+                model=models.map, tier=TIER_MAP
+            )
+            logger.info(f"✅ Часть {index + 1}/{total} обработана")
+            note = message_text(message)
+            if cache is not None and note:
+                cache.put(key, note)
+        if stream is not None:
+            with done_lock:
+                done[0] += 1
+                stage = f"🧩 Обработка частей: {done[0]}/{total}"
+            stream.set_stage(stage)
+        return note
+
+    with ThreadPoolExecutor(max_workers=max(1, ANALYZE_WORKERS), thread_name_prefix="map") as executor:
+        notes = list(executor.map(map_chunk, range(total)))
+
+    notes_text = "\n\n".join(
+        f"### Часть {i + 1}\n{note}" for i, note in enumerate(notes) if note
+    )
+    reduce_prompt = plan.context + _build_reduce_prompt(notes_text, plan.stats_text, custom_prompt)
+    check_request_budget(estimate_tokens(reduce_prompt), MAX_REQUEST_TOKENS, what="Итоговый запрос")
+
+    logger.info("🤖 Формирование итогового отчёта...")
+    if stream is not None:
+        stream.set_stage("✍️ Claude пишет итоговый отчёт")
+    message = create_message(
+        client, reduce_prompt, on_wait=on_wait, usage=usage, stream=stream, model=models.report
+    )
+    return message_text(message)
+
+
+def message_text(message) -> str:
+    """Текст из ответа Messages API (пустая строка, если ответ пустой)"""
+    if message.content and len(message.content) > 0:
+        return message.content[0].text
+    return ""
+
+
+def check_required_columns(df: pd.DataFrame):
+    """Проверка обязательных колонок Date/From/Text"""
+    required_columns = ['Date', 'From', 'Text']
+    missing = [col for col in required_columns if col not in df.columns]
+    if missing:
+        raise ValueError(f"Отсутствуют обязательные колонки: {missing}")
+
+
+def _split_by_dialogues(compacted: pd.DataFrame, max_tokens: int) -> list:
+    """
+    Разбиение сообщений (по времени, Date/Text) на части не больше max_tokens.
+
+    Части набираются целыми диалогами (services/sessions.py): диалог не
+    разрывается между частями, время ответа и конфликты видны целиком.
+    Диалог, который сам не помещается в лимит, делится по строкам.
+    Границы выровнены по календарным периодам — пересекающиеся периоды
+    анализа дают одинаковые части (кэш заметок).
+
+    Returns:
+        Список DataFrame (в хронологическом порядке)
+    """
+    if compacted.empty:
+        return [compacted]
+
+    # Псевдоним отправителя — 2-3 символа (назначается уже в части)
+    row_tokens = ((compacted['Text'].str.len() + 12) // CHARS_PER_TOKEN + 1).to_numpy()
+    chunk_ids = period_chunks(compacted['Date'], dialogue_ids(compacted['Date']), row_tokens, max_tokens)
+    return [part for _, part in compacted.groupby(chunk_ids, sort=True)]
+
+
+@dataclass
+class CompactionReport:
+    """Итоги сжатия данных чата перед отправкой в Claude"""
+    rows_before: int
+    rows_after: int
+    dropped_empty: int
+    dropped_duplicates: int
+    merged: int
+    truncated: int
+    tokens_before: int
+    tokens_after: int
+    dropped_noise: int = 0
+    collapsed: int = 0  # Похожих сообщений, схлопнутых в пример с пометкой [×N]
+    clusters: Optional[pd.DataFrame] = field(default=None, repr=False)  # Кластеры повторов (Text/Role/Count)
+
+    @property
+    def savings(self) -> float:
+        """Доля сэкономленных токенов (0..1)"""
+        if not self.tokens_before:
+            return 0.0
+        return 1 - self.tokens_after / self.tokens_before
+
+    def describe(self) -> str:
+        return (
+            f"Сжатие данных: строк {self.rows_before} → {self.rows_after} "
+            f"(пустых/эмодзи: {self.dropped_empty}, шум: {self.dropped_noise}, дублей: {self.dropped_duplicates}, "
+            f"похожих: {self.collapsed}, "
+            f"склеено: {self.merged}, обрезано: {self.truncated}); "
+            f"токенов ~{self.tokens_before} → ~{self.tokens_after} (−{self.savings:.0%})"
+        )
+
+
+def compact_messages(
+        df: pd.DataFrame,
+        max_message_chars: Optional[int] = None,
+        drop_noise: bool = bool(RELEVANCE_FILTER),
+        collapse_near: bool = bool(NEAR_DUP_COLLAPSE)
+) -> tuple:
+    """
+    Сжатие сообщений чата (векторно, без циклов по строкам).
+
+    - удаляет пустые, эмодзи-only и точные дубли строк
+    - удаляет сообщения-шум: только благодарности/подтверждения (services/relevance.py)
+    - схлопывает похожие сообщения в первое с пометкой [×N] (services/dedup.py)
+    - склеивает подряд идущие сообщения одного отправителя в пределах дня
+    - опционально обрезает очень длинные сообщения
+    - назначает отправителям короткие псевдонимы (S1.. менеджеры, C1.. остальные)
+
+    Args:
+        df: Данные чата (Date/From/Text)
+        max_message_chars: Максимальная длина сообщения (None — без обрезки)
+        drop_noise: Удалять сообщения-шум (по умолчанию RELEVANCE_FILTER)
+        collapse_near: Схлопывать похожие сообщения (по умолчанию NEAR_DUP_COLLAPSE)
+
+    Returns:
+        (DataFrame с колонками Date/Alias/Text в хронологическом порядке, CompactionReport)
+    """
+    data, counts = _clean_messages(df, max_message_chars, drop_noise)
+
+    collapsed, clusters = 0, None
+    if collapse_near:
+        before_collapse = len(data)
+        data, clusters = collapse_near_duplicates(data)
+        collapsed = before_collapse - len(data)
+
+    merged_frame = _merge_runs(data)
+    merged_frame['Alias'] = _sender_aliases(merged_frame['From'], merged_frame['Role'])
+
+    report = CompactionReport(
+        rows_after=len(merged_frame),
+        collapsed=collapsed,
+        clusters=clusters,
+        merged=len(data) - len(merged_frame),
+        tokens_after=_estimate_compact_tokens(merged_frame),
+        **counts,
+    )
+    return merged_frame, report
+
+
+def compact_chunks(
+        df: pd.DataFrame,
+        max_tokens: int,
+        max_message_chars: Optional[int] = None,
+        drop_noise: bool = bool(RELEVANCE_FILTER),
+        collapse_near: bool = bool(NEAR_DUP_COLLAPSE)
+) -> list:
+    """
+    Сжатые части для map-этапа (как compact_messages, но по частям).
+
+    Сообщения сначала делятся на части (_split_by_dialogues), а похожие
+    схлопываются и подряд идущие склеиваются уже внутри каждой части: текст
+    части и пометки [×N] зависят только от её сообщений, поэтому у
+    пересекающихся периодов анализа общие части совпадают (кэш заметок).
+
+    Args:
+        df: Данные чата (Date/From/Text)
+        max_tokens: Лимит токенов части
+        max_message_chars: Максимальная длина сообщения (None — без обрезки)
+        drop_noise: Удалять сообщения-шум (по умолчанию RELEVANCE_FILTER)
+        collapse_near: Схлопывать похожие сообщения (по умолчанию NEAR_DUP_COLLAPSE)
+
+    Returns:
+        Список DataFrame (Date/From/Role/Text/Alias, псевдонимы — свои в каждой части)
+    """
+    data, _ = _clean_messages(df, max_message_chars, drop_noise)
+    chunks = []
+    for part in _split_by_dialogues(data, max_tokens):
+        if collapse_near:
+            part, _ = collapse_near_duplicates(part)
+        merged = _merge_runs(part)
+        chunks.append(merged.assign(Alias=_sender_aliases(merged['From'], merged['Role'])))
+    return chunks
+
+
+def _clean_messages(df: pd.DataFrame, max_message_chars: Optional[int], drop_noise: bool) -> tuple:
+    """
+    Отбор сообщений для сжатия: без пустых, шума и точных дублей, по времени, с обрезкой длинных.
+
+    Returns:
+        (DataFrame Date/From/Role/Text, счётчики для CompactionReport)
+    """
+    rows_before = len(df)
+    tokens_before = _estimate_frame_tokens(df)
+
+    data = pd.DataFrame({
+        'Date': parse_dates(df['Date']),
+        'From': df['From'].fillna('Unknown').astype(str),
+        'Role': sender_roles(df),
+        'Text': df['Text'].fillna('').astype(str).str.strip(),
+    })
+
+    # Пустые и эмодзи-only (нет ни одной буквы/цифры)
+    meaningful = data['Text'].str.contains(WORD_CHAR_PATTERN, regex=True)
+    dropped_empty = int((~meaningful).sum())
+    data = data[meaningful & data['Date'].notna()]
+
+    dropped_noise = 0
+    if drop_noise:
+        noise = noise_mask(data['Text'])
+        dropped_noise = int(noise.sum())
+        data = data[~noise]
+
+    before_dedup = len(data)
+    data = data.drop_duplicates(subset=['Date', 'From', 'Text'])
+    dropped_duplicates = before_dedup - len(data)
+
+    data = data.sort_values('Date', kind='mergesort')
+
+    # До схлопывания повторов: пометка [×N] не должна отрезаться
+    truncated = 0
+    if max_message_chars:
+        too_long = data['Text'].str.len() > max_message_chars
+        truncated = int(too_long.sum())
+        if truncated:
+            data.loc[too_long, 'Text'] = data.loc[too_long, 'Text'].str.slice(0, max_message_chars) + '…'
+
+    return data, dict(
+        rows_before=rows_before,
+        dropped_empty=dropped_empty,
+        dropped_noise=dropped_noise,
+        dropped_duplicates=dropped_duplicates,
+        truncated=truncated,
+        tokens_before=tokens_before,
+    )
+
+
+def _merge_runs(data: pd.DataFrame) -> pd.DataFrame:
+    """Склейка подряд идущих сообщений одного отправителя в пределах дня"""
+    day = data['Date'].dt.normalize()
+    new_block = (data['From'] != data['From'].shift()) | (day != day.shift())
+    block_id = new_block.cumsum()
+    return data.groupby(block_id, sort=False).agg(
+        Date=('Date', 'first'),
+        From=('From', 'first'),
+        Role=('Role', 'first'),
+        Text=('Text', COMPACT_MERGE_SEPARATOR.join),
+    ).reset_index(drop=True)
+
+
+def _sender_aliases(senders: pd.Series, roles: pd.Series) -> pd.Series:
+    """Короткие псевдонимы: S1, S2... для менеджеров и C1, C2... для остальных (по частоте)"""
+    counts = senders.value_counts()
+    # Роль отправителя — из колонки Role (у одного имени она одна, берётся первая)
+    roles = pd.Series(roles.to_numpy(), index=senders.to_numpy()).groupby(level=0, sort=False).first()
+    roles = roles.reindex(counts.index)
+
+    aliases = {}
+    support_idx = client_idx = 0
+    for name, role in roles.items():
+        if role == ROLE_SUPPORT:
+            support_idx += 1
+            aliases[name] = f"S{support_idx}"
+        else:
+            client_idx += 1
+            aliases[name] = f"C{client_idx}"
+    return senders.map(aliases)
+
+
+def render_compact(compacted: pd.DataFrame) -> str:
+    """
+    Рендер сжатых сообщений в текст для промпта.
+
+    Формат:
+        Отправители: S1=Имя менеджера; C1=Имя клиента; ...
+        # 06-01-2024 (Суббота)
+        10:05 S1: текст | продолжение
+    """
+    if compacted.empty:
+        return "Отправители: —\n(нет сообщений)"
+
+    legend = (
+        compacted.drop_duplicates('Alias')
+        .assign(order=lambda f: f['Alias'].str[0] + f['Alias'].str[1:].str.zfill(6))
+        .sort_values('order')
+    )
+    legend_line = "Отправители (S — менеджеры поддержки, C — клиенты и прочие): " + "; ".join(
+        legend['Alias'] + "=" + legend['From']
+    )
+
+    days = compacted['Date'].dt.normalize()
+    lines = compacted['Date'].dt.strftime('%H:%M') + ' ' + compacted['Alias'] + ': ' + compacted['Text']
+
+    # Заголовок дня перед первым сообщением каждого дня
+    new_day = days != days.shift()
+    headers = (
+        '# ' + days.dt.strftime('%d-%m-%Y')
+        + ' (' + days.dt.dayofweek.map(dict(enumerate(DAYS_RU))) + ')\n'
+    )
+    lines = headers.where(new_day, '') + lines
+
+    return legend_line + "\n" + "\n".join(lines.tolist())
+
+
+def _estimate_frame_tokens(df: pd.DataFrame) -> int:
+    """Оценка токенов для df.to_csv(sep=';') без фактической сериализации"""
+    chars = sum(df[col].astype(str).str.len().sum() for col in df.columns)
+    chars += len(df) * len(df.columns)  # разделители и переводы строк
+    return int(chars) // CHARS_PER_TOKEN + 1
+
+
+def _estimate_compact_tokens(compacted: pd.DataFrame) -> int:
+    """Оценка токенов для render_compact() без фактического рендера"""
+    # "HH:MM " + ": " + перевод строки = 9 символов на строку
+    chars = compacted['Text'].str.len().sum() + compacted['Alias'].str.len().sum() + 9 * len(compacted)
+    chars += compacted['Date'].dt.normalize().nunique() * 28  # заголовки дней
+    chars += compacted.drop_duplicates('From')['From'].str.len().sum() * 1.2  # легенда
+    return int(chars) // CHARS_PER_TOKEN + 1
+
+
+def _build_prompt(csv_content: str, stats_text: str, custom_prompt: Optional[str] = None) -> str:
+    """Промпт одиночного анализа: кастомный (с подстановкой) или дефолтный"""
+    if custom_prompt:
+        # В кастомном промпте {csv_content} и {stats} будут заменены на данные
+        return custom_prompt.replace("{csv_content}", csv_content).replace("{stats}", stats_text)
+    return build_analysis_prompt(csv_content, stats_text)
 
-    # Последняя попытка с автоопределением
-    return pd.read_csv(file_path, sep=None, encoding='utf-8-sig', engine='python')
 
+def _map_task(custom_prompt: Optional[str]) -> str:
+    """Итоговая задача в промпте map-этапа (входит в ключ кэша заметок)"""
+    return custom_prompt.replace("{csv_content}", "(данные ниже)").replace("{stats}", "") if custom_prompt else (
+        "1. Самые частые запросы клиентов — повторяющиеся вопросы и темы обращений.\n"
+        "2. Причины конфликтов и недовольства клиентов."
+    )
 
-def _build_analysis_prompt(csv_content: str) -> str:
+
+def _build_map_prompt(chunk_content: str, custom_prompt: Optional[str], index: int, total: int) -> str:
+    """Промпт map-этапа: краткие заметки по одной части чата"""
+    return f"""Это часть {index} из {total} переписки службы поддержки с клиентами. Итоговый отчёт будет составлен позже по заметкам со всех частей.
+
+Итоговая задача:
+{_map_task(custom_prompt)}
+
+Данные части (компактный формат: легенда отправителей, заголовки дней, время ЧЧ:ММ; S — менеджеры, C — клиенты; [×N] — похожее сообщение встречалось N раз):
+{chunk_content}
+
+Составь краткие структурированные заметки по этой части, нужные для итоговой задачи: темы запросов с примерным количеством упоминаний, конфликтные ситуации и их причины. Псевдонимы S1, C1... действуют только в этой части — отправителей называй по именам из легенды. Без вступлений, на русском языке."""
+
+
+def _build_reduce_prompt(notes_text: str, stats_text: str, custom_prompt: Optional[str]) -> str:
+    """Промпт reduce-этапа: итоговый отчёт по заметкам всех частей"""
+    notes_block = (
+        "Переписка слишком большая, поэтому вместо исходных данных ниже приведены "
+        f"заметки по её частям:\n\n{notes_text}"
+    )
+    return _build_prompt(notes_block, stats_text, custom_prompt)
+
+
+def build_analysis_prompt(csv_content: str, stats_text: str) -> str:
     """Построение промпта для анализа"""
     return f"""Проанализируй следующие данные из CSV файла, содержащие информацию о взаимодействиях с клиентами и работе менеджеров службы поддержки.
 
-Менеджеры в CSV файлах имеют наименование, которое содержит в себе 'Fulfillment-Box Support', 'Support', 'Fulfillment-Box' и подобное.
+Роли отправителей уже определены: S — менеджеры поддержки, C — клиенты и прочие (в формате CSV — колонка Role: support, client, system). Не определяй роли по именам.
 
-Данные CSV файла:
+Данные чата (компактный формат: легенда отправителей, заголовки дней, время ЧЧ:ММ; подряд идущие сообщения одного отправителя склеены через " | "; пометка [×N] — похожее сообщение встречалось N раз, приведён первый пример):
 {csv_content}
 
-На основе этих данных предоставь анализ по следующим пунктам:
+Статистика по менеджерам и времени ответа уже рассчитана точно по всему файлу и будет добавлена в отчёт автоматически:
+{stats_text}
+
+На основе данных предоставь анализ только по следующим пунктам:
 
 1. **Самые частые запросы клиентов** — повторяющиеся вопросы и темы обращений, что позволит доработать Ysell и другие процессы.
 
 2. **Причины конфликтов и недовольства клиентов** — выяви основные проблемные области.
 
-3. **Количество вопросов по каждому менеджеру** — статистика обработанных обращений.
-
-4. **Среднее время ответа менеджеров** — отдельно для будней и выходных.
-
-Требования к анализу времени ответа:
-- Раздели сообщения по календарным дням с указанием дня недели
-- Для каждого клиентского сообщения найди первое последующее сообщение менеджера в течение того же дня
-- Исключи случаи, когда первое последующее сообщение — это системная/сервисная отправка не от support-аккаунта
-- Рассчитай среднее и медиану времени ответа отдельно для будней и выходных
+Не пересчитывай количество вопросов по менеджерам и время ответа — используй приведённые цифры, если на них нужно сослаться.
 
 Формат вывода:
 - Структурированный текст без таблиц (для удобного просмотра в DOCX)
@@ -207,89 +1093,25 @@ def _build_analysis_prompt(csv_content: str) -> str:
 Предоставь анализ на русском языке."""
 
 
-def save_to_docx(text_content: str, output_file_path: str, source_filename: str):
-    """
-    Сохраняет текстовый контент в DOCX файл с форматированием.
-
-    Args:
-        text_content: Текст для сохранения
-        output_file_path: Путь к выходному файлу
-        source_filename: Имя исходного файла для заголовка
-    """
-    try:
-        logger.info(f"💾 Сохранение результатов в {output_file_path}")
-
-        doc = Document()
-
-        # Заголовок
-        title = doc.add_heading(f'Анализ файла: {source_filename}', 0)
-        title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-        # Дата создания
-        doc.add_paragraph(
-            f"Дата создания отчёта: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}"
-        )
-        doc.add_paragraph(f"Модель анализа: {CLAUDE_MODEL}")
-        doc.add_paragraph()
-
-        # Обработка текста
-        for line in text_content.split('\n'):
-            line = line.strip()
-            if not line:
-                continue
-
-            # Определение типа строки
-            if line.startswith('**') and line.endswith('**'):
-                # Жирный текст как заголовок
-                doc.add_heading(line.strip('*').strip(), level=2)
-            elif line[0].isdigit() and '.' in line[:3] and '**' in line:
-                # Нумерованный заголовок с жирным текстом
-                doc.add_heading(line.replace('**', '').strip(), level=2)
-            elif line.startswith('###'):
-                doc.add_heading(line.replace('#', '').strip(), level=3)
-            elif line.startswith('##'):
-                doc.add_heading(line.replace('#', '').strip(), level=2)
-            elif line.startswith('#'):
-                doc.add_heading(line.replace('#', '').strip(), level=1)
-            else:
-                paragraph = doc.add_paragraph()
-
-                # Обработка жирного текста внутри строки
-                if '**' in line:
-                    parts = line.split('**')
-                    for i, part in enumerate(parts):
-                        if part:
-                            run = paragraph.add_run(part)
-                            if i % 2 == 1:  # Нечётные части — жирные
-                                run.bold = True
-                else:
-                    paragraph.add_run(line)
-
-                # Отступ для списков
-                if line.startswith('-') or line.startswith('•') or line.startswith('*'):
-                    paragraph.paragraph_format.left_indent = Pt(20)
-
-        doc.save(output_file_path)
-        logger.info(f"✅ Файл сохранён: {output_file_path}")
-
-    except Exception as e:
-        logger.error(f"❌ Ошибка при сохранении DOCX: {e}")
-        raise
-
-
 def analyze_csv_folder(
         input_folder: Optional[str] = None,
         output_folder: Optional[str] = None,
-        progress_callback: Optional[callable] = None
+        progress_callback: Optional[callable] = None,
+        max_workers: Optional[int] = None
 ) -> dict:
     """
     Анализирует все CSV файлы в папке и создаёт DOCX отчёты.
 
+    Файлы обрабатываются параллельно (max_workers потоков), темп запросов
+    определяется общим rate limiter (RPM/TPM аккаунта), а не фиксированной паузой.
+
     Args:
         input_folder: Путь к папке с CSV (по умолчанию из конфига)
         output_folder: Путь к папке для DOCX (по умолчанию из конфига)
         progress_callback: Функция обратного вызова для обновления прогресса
                           Сигнатура: callback(current: int, total: int, filename: str, status: str)
+                          status: "analyzing" | "waiting" | "done" | "error"
+        max_workers: Количество параллельных анализов (по умолчанию ANALYZE_WORKERS)
 
     Returns:
         Словарь с результатами: {'success': int, 'errors': int, 'details': list}
@@ -299,6 +1121,9 @@ def analyze_csv_folder(
         input_folder = str(get_input_folder())
     if output_folder is None:
         output_folder = str(get_output_folder())
+    if max_workers is None:
+        max_workers = ANALYZE_WORKERS
+    max_workers = max(1, max_workers)
 
     logger.info("\n" + "=" * 50)
     logger.info("🔍 НАЧАЛО АНАЛИЗА CSV ФАЙЛОВ (Claude API)")
@@ -312,7 +1137,8 @@ def analyze_csv_folder(
 
     logger.info(f"📁 Входная папка: {input_folder}")
     logger.info(f"📁 Выходная папка: {output_folder}")
-    logger.info(f"🤖 Модель: {CLAUDE_MODEL}\n")
+    logger.info(f"🤖 Модели: отчёт {CLAUDE_REPORT_MODEL}, заметки по частям {CLAUDE_MAP_MODEL}")
+    logger.info(f"⚙️ Параллельных анализов: {max_workers}\n")
 
     # Проверка входной папки
     input_path = Path(input_folder)
@@ -338,65 +1164,68 @@ def analyze_csv_folder(
 
     logger.info(f"📊 Найдено файлов для анализа: {len(csv_files)}\n")
 
-    # Обработка файлов
-    success_count = 0
-    error_count = 0
-    error_details = []
-
-    for idx, csv_file in enumerate(csv_files, 1):
+    total = len(csv_files)
+    started = 0
+    progress_lock = threading.Lock()
+
+    def report(filename: str, status: str, next_index: bool = False):
+        """Потокобезопасный вызов progress_callback"""
+        nonlocal started
+        with progress_lock:
+            if next_index:
+                started += 1
+            if progress_callback:
+                progress_callback(started, total, filename, status)
+
+    def process(csv_file: Path):
+        """Анализ одного файла (выполняется в потоке пула)"""
         filename = csv_file.name
+        logger.info(f"📄 Обработка: {filename}")
+        report(filename, "analyzing", next_index=True)
 
-        logger.info(f"\n{'=' * 50}")
-        logger.info(f"📄 [{idx}/{len(csv_files)}] Обработка: {filename}")
-        logger.info("=" * 50)
+        analysis_result = analyze_csv_with_claude(
+            str(csv_file),
+            on_wait=lambda seconds: report(filename, "waiting")
+        )
 
-        # Колбэк прогресса: начало обработки файла
-        if progress_callback:
-            progress_callback(idx, len(csv_files), filename, "analyzing")
+        # Проверка на ошибку
+        if analysis_result.startswith("Ошибка"):
+            raise RuntimeError(analysis_result)
 
-        try:
-            # Анализ файла
-            analysis_result = analyze_csv_with_claude(str(csv_file))
+        # Формирование выходного файла
+        output_filename = csv_file.stem + "_analysis.docx"
+        output_file_path = output_path / output_filename
 
-            # Проверка на ошибку
-            if analysis_result.startswith("Ошибка"):
-                logger.warning(f"⚠️ Ошибка анализа {filename}")
-                error_count += 1
-                error_details.append(f"{filename}: {analysis_result}")
-                continue
+        # Сохранение результата: рендеринг в пуле процессов, параллельно с анализом других файлов
+        render_in_pool(analysis_result, str(output_file_path), filename, CLAUDE_REPORT_MODEL)
+
+        # Удаление исходного файла после успешного сохранения
+        try:
+            csv_file.unlink()
+            logger.info(f"🗑️ Исходный файл {filename} удалён")
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось удалить {filename}: {e}")
 
-            # Формирование выходного файла
-            output_filename = csv_file.stem + "_analysis.docx"
-            output_file_path = output_path / output_filename
+    # Обработка файлов
+    success_count = 0
+    error_count = 0
+    error_details = []
 
-            # Сохранение результата
-            save_to_docx(analysis_result, str(output_file_path), filename)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analyze") as executor:
+        futures = {executor.submit(process, csv_file): csv_file for csv_file in csv_files}
 
-            # Удаление исходного файла после успешного сохранения
+        for future in as_completed(futures):
+            filename = futures[future].name
             try:
-                csv_file.unlink()
-                logger.info(f"🗑️ Исходный файл {filename} удалён")
+                future.result()
+                success_count += 1
+                logger.info(f"✅ Файл {filename} успешно обработан!")
+                report(filename, "done")
             except Exception as e:
-                logger.warning(f"⚠️ Не удалось удалить {filename}: {e}")
-
-            success_count += 1
-            logger.info(f"✅ Файл {filename} успешно обработан!")
-
-            # Задержка перед следующим файлом (для rate limit)
-            if idx < len(csv_files):
-                logger.info(f"⏳ Пауза {API_DELAY_SECONDS} сек. перед следующим файлом...")
-
-                # Колбэк прогресса: ожидание
-                if progress_callback:
-                    progress_callback(idx, len(csv_files), filename, "waiting")
-
-                time.sleep(API_DELAY_SECONDS)
-
-        except Exception as e:
-            error_msg = f"❌ Ошибка при обработке {filename}: {e}"
-            logger.error(error_msg)
-            error_count += 1
-            error_details.append(f"{filename}: {str(e)}")
+                logger.error(f"❌ Ошибка при обработке {filename}: {e}")
+                error_count += 1
+                error_details.append(f"{filename}: {str(e)}")
+                report(filename, "error")
 
     # Итоговая статистика
     logger.info("\n" + "=" * 50)
@@ -420,4 +1249,4 @@ def analyze_csv_folder(
         'success': success_count,
         'errors': error_count,
         'details': error_details
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,392 @@
+# services/cross_chat.py
+"""Сводный анализ нескольких чатов: один набор данных с колонкой Chat, общая статистика и один map-reduce"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Callable, List, Tuple
+
+import anthropic
+import numpy as np
+import pandas as pd
+
+from core.config import (
+    ANALYZE_WORKERS,
+    MAX_REQUEST_TOKENS,
+    MAP_CHUNK_TOKENS,
+    CLAUDE_API_KEY,
+    CLAUDE_REPORT_MODEL,
+    get_input_folder,
+    get_output_folder,
+)
+from services.analyzer import (
+    AnalysisPlan,
+    ModelTiers,
+    COMPACT_MAX_MESSAGE_CHARS,
+    MAX_TOKENS,
+    get_client,
+    compact_messages,
+    compact_chunks,
+    render_compact,
+    run_analysis_plan,
+    chunked_estimate,
+    _build_prompt,
+    check_required_columns,
+)
+from services.dedup import format_clusters_text
+from services.docx_render import render_in_pool
+from services.ingest import read_chat_csv
+from services.stats import (
+    CHAT_COLUMN,
+    ROLE_CLIENT,
+    ROLE_SUPPORT,
+    ChatStats,
+    compute_chat_stats,
+    format_stats_text,
+    sender_roles,
+    _fmt_minutes,
+)
+from services.streaming import ResponseStream
+from services.tokens import (
+    estimate_tokens,
+    count_tokens,
+    check_request_budget,
+    PreflightEstimate,
+    UsageTracker,
+    STRATEGY_COMPACT,
+)
+
+logger = logging.getLogger(__name__)
+
+REPORT_FILENAME = "cross_chat_analysis.docx"
+
+CROSS_CHAT_PROMPT = """Проанализируй переписку службы поддержки с клиентами сразу в нескольких чатах и сравни чаты между собой.
+
+Данные (перед сообщениями каждого чата — заголовок «## Чат: имя»; далее компактный формат: легенда отправителей, заголовки дней, время ЧЧ:ММ; S — менеджеры поддержки, C — клиенты и прочие; подряд идущие сообщения одного отправителя склеены через " | "; [×N] — похожее сообщение встречалось N раз):
+{csv_content}
+
+Статистика по каждому чату и по всем чатам вместе уже рассчитана точно и будет добавлена в отчёт автоматически:
+{stats}
+
+На основе данных предоставь сравнительный анализ только по следующим пунктам:
+
+1. **Общие запросы клиентов** — темы и вопросы, которые повторяются в нескольких чатах (укажи, в каких).
+
+2. **Особенности чатов** — запросы и проблемы, характерные только для отдельных чатов.
+
+3. **Причины конфликтов и недовольства клиентов** — основные проблемные области и чаты, где их больше всего.
+
+Не пересчитывай количество сообщений и время ответа — используй приведённые цифры, если на них нужно сослаться.
+
+Формат вывода:
+- Структурированный текст без таблиц (для удобного просмотра в DOCX)
+- Без упоминания номеров строк и сообщений
+- Не включай методику обработки в отчёт
+- Не добавляй рекомендации и советы в конце
+- Это только аналитический отчёт
+
+Предоставь анализ на русском языке."""
+
+
+def chat_name(path) -> str:
+    """Имя чата в сводном отчёте — имя файла без расширения"""
+    return Path(path).stem
+
+
+def load_chats(paths: List[str], max_workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    Чтение нескольких CSV в один DataFrame с колонкой Chat.
+
+    Файлы читаются параллельно (разбор CSV в pyarrow отпускает GIL);
+    From, Role и Chat в объединении — категориальные.
+
+    Args:
+        paths: Пути к CSV файлам
+        max_workers: Потоков чтения (по умолчанию ANALYZE_WORKERS)
+
+    Returns:
+        DataFrame: Date, From, Text, Role, Chat
+
+    Raises:
+        ValueError: Нет файлов или в файле нет колонок Date/From/Text
+    """
+    if not paths:
+        raise ValueError("Нет CSV файлов для сводного анализа")
+
+    def read(path) -> pd.DataFrame:
+        df = read_chat_csv(str(path))
+        try:
+            check_required_columns(df)
+        except ValueError as e:
+            raise ValueError(f"{Path(path).name}: {e}")
+        return df
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers or ANALYZE_WORKERS), thread_name_prefix="load") as executor:
+        frames = list(executor.map(read, paths))
+
+    names = [chat_name(path) for path in paths]
+    union = pd.concat(frames, ignore_index=True)
+    union['From'] = union['From'].astype('category')
+    union['Role'] = union['Role'].astype('category')
+    union[CHAT_COLUMN] = pd.Categorical(
+        np.repeat(names, [len(frame) for frame in frames]), categories=list(dict.fromkeys(names))
+    )
+    logger.info(f"📚 Сводный набор: {len(paths)} чатов, {len(union)} сообщений")
+    return union
+
+
+def compute_cross_chat_stats(df: pd.DataFrame) -> Tuple[ChatStats, pd.DataFrame]:
+    """
+    Статистика по всем чатам вместе и сравнительная таблица по чатам — за один проход.
+
+    Ответы менеджеров ищутся одним векторным поиском по всем чатам
+    (services/stats.py, ключи «чат, время»), таблица по чатам — группировкой
+    уже найденных ответов.
+
+    Args:
+        df: Результат load_chats()
+
+    Returns:
+        (ChatStats по всем чатам, DataFrame по чатам: messages, clients, managers,
+         questions, answered, median, mean — время в минутах)
+    """
+    overall = compute_chat_stats(df)
+
+    senders = pd.DataFrame({
+        CHAT_COLUMN: df[CHAT_COLUMN],
+        'From': df['From'],
+        'Role': sender_roles(df).to_numpy(),
+    })
+    people = senders.groupby([CHAT_COLUMN, 'Role'], observed=True)['From'].nunique().unstack('Role')
+    table = overall.chat_summary().reindex(df[CHAT_COLUMN].cat.categories)
+    table.insert(0, 'messages', senders.groupby(CHAT_COLUMN, observed=False).size())
+    for role, column in ((ROLE_CLIENT, 'clients'), (ROLE_SUPPORT, 'managers')):
+        values = people[role] if role in people.columns else pd.Series(dtype=float)
+        table[column] = values.reindex(table.index).fillna(0).astype(int)
+    table[['questions', 'answered']] = table[['questions', 'answered']].fillna(0).astype(int)
+    return overall, table.sort_values(['questions', 'messages'], ascending=False, kind='mergesort')
+
+
+def format_cross_chat_text(table: pd.DataFrame) -> str:
+    """
+    Раздел отчёта «Сравнение чатов» (Markdown-подобный формат для DOCX и промпта).
+
+    Args:
+        table: Таблица из compute_cross_chat_stats()
+    """
+    lines = ["## Сравнение чатов", ""]
+    for chat, row in table.iterrows():
+        unanswered = row['questions'] - row['answered']
+        share = f" ({unanswered / row['questions']:.0%})" if row['questions'] else ""
+        lines.append(
+            f"- **{chat}**: сообщений — {int(row['messages'])}, вопросов клиентов — {int(row['questions'])}, "
+            f"без ответа в тот же день — {int(unanswered)}{share}; первый ответ: медиана — "
+            f"{_fmt_minutes(row['median'])}, среднее — {_fmt_minutes(row['mean'])}; "
+            f"менеджеров — {int(row['managers'])}, клиентов — {int(row['clients'])}"
+        )
+    return "\n".join(lines)
+
+
+def _chat_blocks(df: pd.DataFrame, block_budget: int) -> Tuple[list, int, int, list]:
+    """
+    Сжатые данные каждого чата с заголовком «## Чат: имя».
+
+    Чат больше block_budget делится на части по диалогам (как при анализе одного чата).
+
+    Returns:
+        (тексты блоков, токены до сжатия, токены после сжатия, кластеры повторов по чатам)
+    """
+    blocks, clusters = [], []
+    tokens_before = tokens_after = 0
+    for chat, chat_df in df.groupby(CHAT_COLUMN, observed=True, sort=True):
+        _, report = compact_messages(chat_df, max_message_chars=COMPACT_MAX_MESSAGE_CHARS)
+        tokens_before += report.tokens_before
+        tokens_after += report.tokens_after
+        if report.clusters is not None:
+            clusters.append(report.clusters)
+        # Повторы схлопываются внутри блока: текст блока не зависит от периода анализа
+        for part in compact_chunks(chat_df, block_budget, max_message_chars=COMPACT_MAX_MESSAGE_CHARS):
+            blocks.append(f"## Чат: {chat}\n{render_compact(part)}")
+    return blocks, tokens_before, tokens_after, clusters
+
+
+def _pack_blocks(blocks: list, max_tokens: int) -> list:
+    """Части map-этапа: подряд идущие блоки чатов, пока часть не больше max_tokens"""
+    chunks, current, current_tokens = [], [], 0
+    for block in blocks:
+        tokens = estimate_tokens(block)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(block)
+        current_tokens += tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def plan_cross_chat(
+        df: pd.DataFrame,
+        client: Optional[anthropic.Anthropic] = None,
+        request_budget: Optional[int] = None,
+        models: Optional[ModelTiers] = None
+) -> AnalysisPlan:
+    """
+    План сводного анализа: один запрос, если сжатые данные всех чатов помещаются в лимит,
+    иначе — один map-reduce по всем чатам (мелкие чаты делят части, заметки кэшируются).
+
+    Args:
+        df: Результат load_chats()
+        client: Клиент Claude API для точного подсчёта (None — только локальная оценка)
+        request_budget: Лимит входных токенов на запрос (по умолчанию MAX_REQUEST_TOKENS)
+        models: Модели по уровням
+
+    Returns:
+        AnalysisPlan (task — сравнительный промпт CROSS_CHAT_PROMPT)
+    """
+    budget = request_budget or MAX_REQUEST_TOKENS
+    models = models or ModelTiers()
+
+    overall, table = compute_cross_chat_stats(df)
+    stats_text = f"{format_cross_chat_text(table)}\n\n{format_stats_text(overall)}"
+
+    overhead = estimate_tokens(_build_prompt("", stats_text, CROSS_CHAT_PROMPT))
+    check_request_budget(overhead, budget, what="Промпт без данных")
+
+    chunk_budget = min(MAP_CHUNK_TOKENS, budget) - overhead
+    blocks, tokens_before, tokens_after, clusters = _chat_blocks(df, chunk_budget)
+    clusters_text = format_clusters_text(
+        pd.concat(clusters, ignore_index=True).sort_values('Count', ascending=False, kind='mergesort')
+        if clusters else None
+    )
+    raw_tokens = overhead + tokens_before
+    compact_tokens = overhead + tokens_after
+
+    if compact_tokens <= budget:
+        data = "\n\n".join(blocks)
+        prompt = _build_prompt(data, stats_text, CROSS_CHAT_PROMPT)
+        request_tokens, exact = count_tokens(client, prompt, models.report)
+        if request_tokens <= budget:
+            estimate = PreflightEstimate(
+                strategy=STRATEGY_COMPACT,
+                raw_tokens=raw_tokens,
+                compact_tokens=compact_tokens,
+                request_tokens=request_tokens,
+                total_tokens=request_tokens + MAX_TOKENS,
+                exact=exact,
+            )
+            return AnalysisPlan(
+                estimate=estimate, stats_text=stats_text, prompt=prompt, data=data,
+                clusters_text=clusters_text, task=CROSS_CHAT_PROMPT
+            )
+        logger.warning(f"⚠️ Запрос ~{request_tokens:,} токенов превышает лимит {budget:,}")
+
+    chunks = _pack_blocks(blocks, chunk_budget)
+    estimate = chunked_estimate(chunks, CROSS_CHAT_PROMPT, overhead, raw_tokens, compact_tokens, models)
+    return AnalysisPlan(
+        estimate=estimate, stats_text=stats_text, chunks=chunks,
+        clusters_text=clusters_text, task=CROSS_CHAT_PROMPT
+    )
+
+
+def analyze_chats_aggregate(
+        paths: List[str],
+        claude_api_key: Optional[str] = None,
+        on_wait: Optional[Callable[[float], None]] = None,
+        usage: Optional[UsageTracker] = None,
+        stream: Optional[ResponseStream] = None,
+        models: Optional[ModelTiers] = None
+) -> str:
+    """
+    Сводный сравнительный отчёт по нескольким CSV одним анализом.
+
+    Args:
+        paths: Пути к CSV файлам чатов
+        claude_api_key: Claude API ключ (по умолчанию глобальный)
+        on_wait: Колбэк ожидания квоты rate limiter
+        usage: Учёт израсходованных токенов
+        stream: Приёмник потокового текста итогового отчёта
+        models: Модели по уровням
+
+    Returns:
+        Текст отчёта: анализ Claude + сравнение чатов и общая статистика
+
+    Raises:
+        ValueError: Нет файлов или некорректный CSV
+        RuntimeError: Пустой ответ Claude API
+    """
+    client = get_client(api_key=claude_api_key)
+    df = load_chats(paths)
+    plan = plan_cross_chat(df, client, models=models)
+    logger.info(f"📏 Сводный анализ: {plan.estimate.describe()}")
+
+    analysis_text = run_analysis_plan(client, plan, on_wait=on_wait, usage=usage, stream=stream, models=models)
+    if not analysis_text:
+        raise RuntimeError("Пустой ответ от Claude API")
+    return f"{analysis_text}\n\n{plan.appendix}"
+
+
+def analyze_csv_folder_aggregate(
+        input_folder: Optional[str] = None,
+        output_folder: Optional[str] = None,
+        progress_callback: Optional[callable] = None
+) -> dict:
+    """
+    Сводный анализ всех CSV файлов папки: один DOCX отчёт вместо отчёта на каждый файл.
+
+    Args:
+        input_folder: Путь к папке с CSV (по умолчанию из конфига)
+        output_folder: Путь к папке для DOCX (по умолчанию из конфига)
+        progress_callback: callback(current, total, filename, status), как у analyze_csv_folder;
+                          status: "analyzing" | "waiting" | "done" | "error"
+
+    Returns:
+        Словарь с результатами: {'success': int, 'errors': int, 'details': list, 'report': str}
+    """
+    input_path = Path(input_folder or get_input_folder())
+    output_path = Path(output_folder or get_output_folder())
+
+    if not CLAUDE_API_KEY or CLAUDE_API_KEY.strip() == "":
+        error_msg = "❌ CLAUDE_API_KEY не настроен. Откройте настройки и введите ключ API."
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+    if not input_path.exists():
+        raise FileNotFoundError(f"❌ Входная папка не найдена: {input_path}")
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    csv_files = sorted(
+        {f.resolve() for f in list(input_path.glob("*.csv")) + list(input_path.glob("*.CSV"))},
+        key=lambda f: f.name
+    )
+    if not csv_files:
+        logger.warning(f"⚠️ В папке {input_path} не найдено CSV файлов")
+        return {'success': 0, 'errors': 0, 'details': [], 'report': None}
+
+    label = f"{len(csv_files)} чатов"
+
+    def report(status: str):
+        if progress_callback:
+            progress_callback(1, 1, label, status)
+
+    logger.info(f"🔍 Сводный анализ: {len(csv_files)} CSV файлов из {input_path}")
+    report("analyzing")
+    try:
+        analysis_result = analyze_chats_aggregate(
+            [str(f) for f in csv_files], on_wait=lambda seconds: report("waiting")
+        )
+        output_file_path = output_path / REPORT_FILENAME
+        render_in_pool(analysis_result, str(output_file_path), label, CLAUDE_REPORT_MODEL)
+    except Exception as e:
+        logger.error(f"❌ Ошибка сводного анализа: {e}")
+        report("error")
+        return {'success': 0, 'errors': 1, 'details': [str(e)], 'report': None}
+
+    for csv_file in csv_files:
+        try:
+            csv_file.unlink()
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось удалить {csv_file.name}: {e}")
+
+    logger.info(f"✅ Сводный отчёт: {output_file_path}")
+    report("done")
+    return {'success': len(csv_files), 'errors': 0, 'details': [], 'report': str(output_file_path)}
@@ -0,0 +1,235 @@
+# services/dedup.py
+"""Схлопывание похожих сообщений (MinHash + LSH): один представитель кластера и точная частота"""
+
+import logging
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from core.config import NEAR_DUP_SIMILARITY, NEAR_DUP_TOP
+from services.stats import sender_roles, ROLE_CLIENT
+
+logger = logging.getLogger(__name__)
+
+NUM_PERMUTATIONS = 32  # Длина MinHash сигнатуры
+LSH_BANDS = 8  # Полос LSH (по NUM_PERMUTATIONS // LSH_BANDS значений): порог кандидатов ~0.6
+MIN_NORMALIZED_CHARS = 10  # Короче — не схлопываются («да», «нет» в разных диалогах значат разное)
+REPRESENTATIVE_MAX_CHARS = 150  # Обрезка примера в разделе отчёта
+MINHASH_SEED = 20240601  # Фиксированные перестановки: одинаковые кластеры при каждом запуске
+MINHASH_BATCH_CHARS = 250_000  # Символов в пачке расчёта сигнатур (~10 МБ промежуточных массивов)
+
+_rng = np.random.default_rng(MINHASH_SEED)
+# Перестановки h·a + b по модулю 2^32 (a нечётное — биекция); 32 бита вдвое экономнее по памяти
+_MULTIPLIERS = _rng.integers(1, 2 ** 32, size=NUM_PERMUTATIONS, dtype=np.uint32) | np.uint32(1)
+_OFFSETS = _rng.integers(0, 2 ** 32, size=NUM_PERMUTATIONS, dtype=np.uint32)
+
+
+def normalize_texts(texts: pd.Series) -> pd.Series:
+    """Нормализация для сравнения: регистр, ё→е, числа → 0, знаки препинания → пробел"""
+    return (
+        texts.fillna('').astype(str).str.lower()
+        .str.replace('ё', 'е', regex=False)
+        .str.replace('[0-9]+', '0', regex=True)
+        .str.replace('[^0-9a-zа-я]+', ' ', regex=True)
+        .str.strip()
+    )
+
+
+def mix64(values: np.ndarray) -> np.ndarray:
+    """Перемешивание 64-битных значений (финализатор splitmix64), векторно"""
+    x = values.astype(np.uint64, copy=True)
+    x ^= x >> np.uint64(30)
+    x *= np.uint64(0xBF58476D1CE4E5B9)
+    x ^= x >> np.uint64(27)
+    x *= np.uint64(0x94D049BB133111EB)
+    x ^= x >> np.uint64(31)
+    return x
+
+
+def minhash_signatures(texts: list) -> np.ndarray:
+    """
+    MinHash сигнатуры по символьным триграммам (векторно, без циклов по строкам).
+
+    Тексты склеиваются в один массив кодов символов; триграмма — три кода
+    в одном uint64, на границах текстов триграммы отбрасываются. Промежуточные
+    массивы — ~40 байт на символ, поэтому тексты обрабатываются пачками по
+    MINHASH_BATCH_CHARS символов.
+
+    Args:
+        texts: Непустые нормализованные тексты
+
+    Returns:
+        Массив (len(texts), NUM_PERMUTATIONS) uint32
+    """
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    batch_ids = (np.cumsum(lengths + 2) - 1) // MINHASH_BATCH_CHARS
+    bounds = np.r_[0, np.flatnonzero(np.diff(batch_ids)) + 1, len(texts)]
+    signatures = np.empty((len(texts), NUM_PERMUTATIONS), dtype=np.uint32)
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if end > start:
+            signatures[start:end] = _batch_signatures(texts[start:end])
+    return signatures
+
+
+def _batch_signatures(texts: list) -> np.ndarray:
+    """MinHash сигнатуры пачки текстов (см. minhash_signatures)"""
+    padded = [f" {text} " for text in texts]
+    lengths = np.fromiter(map(len, padded), dtype=np.int64, count=len(padded))
+    codes = np.frombuffer("".join(padded).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+
+    # Коды символов Unicode < 2^21: три кода помещаются в uint64 без коллизий
+    trigrams = (codes[:-2] << np.uint64(42)) | (codes[1:-1] << np.uint64(21)) | codes[2:]
+    ends = np.cumsum(lengths)
+    valid = np.ones(len(trigrams), dtype=bool)
+    crossing = np.concatenate([ends - 2, ends - 1])
+    valid[crossing[crossing < len(trigrams)]] = False
+    hashes = (mix64(trigrams[valid]) >> np.uint64(32)).astype(np.uint32)
+
+    starts = np.r_[0, np.cumsum(lengths - 2)[:-1]]
+    signatures = np.empty((len(texts), NUM_PERMUTATIONS), dtype=np.uint32)
+    permuted = np.empty_like(hashes)
+    for k in range(NUM_PERMUTATIONS):
+        np.multiply(hashes, _MULTIPLIERS[k], out=permuted)
+        np.add(permuted, _OFFSETS[k], out=permuted)
+        signatures[:, k] = np.minimum.reduceat(permuted, starts)
+    return signatures
+
+
+def _connected_components(size: int, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Компоненты связности: метка — наименьший номер вершины компоненты"""
+    labels = np.arange(size)
+    while True:
+        low = np.minimum(labels[left], labels[right])
+        updated = labels.copy()
+        np.minimum.at(updated, left, low)
+        np.minimum.at(updated, right, low)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def _cluster_signatures(signatures: np.ndarray, threshold: float) -> np.ndarray:
+    """
+    Кластеры по LSH: тексты с совпавшей полосой сигнатуры — кандидаты.
+
+    Кандидат сравнивается только с первым текстом своей корзины (а не со всеми
+    парами), поэтому этап линеен по числу текстов: O(n · LSH_BANDS).
+    """
+    size = len(signatures)
+    rows = NUM_PERMUTATIONS // LSH_BANDS
+    left, right = [], []
+    for band in range(LSH_BANDS):
+        key = np.zeros(size, dtype=np.uint64)
+        for column in range(band * rows, (band + 1) * rows):
+            key = mix64(key ^ signatures[:, column].astype(np.uint64))
+
+        order = np.argsort(key, kind='stable')
+        sorted_key = key[order]
+        new_bucket = np.r_[True, sorted_key[1:] != sorted_key[:-1]]
+        leaders = order[np.flatnonzero(new_bucket)][np.cumsum(new_bucket) - 1]
+
+        members, leaders = order[~new_bucket], leaders[~new_bucket]
+        similarity = (signatures[members] == signatures[leaders]).mean(axis=1)
+        similar = similarity >= threshold
+        left.append(members[similar])
+        right.append(leaders[similar])
+
+    return _connected_components(size, np.concatenate(left), np.concatenate(right))
+
+
+def cluster_near_duplicates(texts: pd.Series, threshold: Optional[float] = None) -> np.ndarray:
+    """
+    Кластеры похожих сообщений.
+
+    Одинаковые после нормализации тексты объединяются сразу (pd.factorize),
+    MinHash + LSH считаются только по уникальным текстам.
+
+    Args:
+        texts: Тексты в хронологическом порядке
+        threshold: Порог сходства (оценка Жаккара по триграммам, по умолчанию NEAR_DUP_SIMILARITY)
+
+    Returns:
+        Для каждой строки — позиция первой строки её кластера (представителя)
+    """
+    threshold = NEAR_DUP_SIMILARITY / 100 if threshold is None else threshold
+    normalized = normalize_texts(texts)
+    labels = np.arange(len(normalized))
+
+    eligible = np.flatnonzero((normalized.str.len() >= MIN_NORMALIZED_CHARS).to_numpy(dtype=bool))
+    if len(eligible) < 2:
+        return labels
+
+    codes, uniques = pd.factorize(normalized.iloc[eligible])
+    unique_labels = _cluster_signatures(minhash_signatures(list(uniques)), threshold)
+
+    # pd.factorize нумерует в порядке появления: наименьшая метка — самая ранняя строка
+    _, first_seen = np.unique(codes, return_index=True)
+    labels[eligible] = eligible[first_seen[unique_labels[codes]]]
+    return labels
+
+
+def collapse_near_duplicates(data: pd.DataFrame, threshold: Optional[float] = None) -> tuple:
+    """
+    Схлопывание похожих сообщений: остаётся первое, к нему дописывается « [×N]».
+
+    Сообщения менеджеров и клиентов кластеризуются раздельно.
+
+    Args:
+        data: Сообщения в хронологическом порядке (From/Text, Role — если есть)
+        threshold: Порог сходства (по умолчанию NEAR_DUP_SIMILARITY)
+
+    Returns:
+        (DataFrame без повторов, DataFrame кластеров Text/Role/Count по убыванию Count)
+    """
+    roles = sender_roles(data).to_numpy()
+    labels = np.arange(len(data))
+    for role in np.unique(roles):
+        positions = np.flatnonzero(roles == role)
+        labels[positions] = positions[cluster_near_duplicates(data['Text'].iloc[positions], threshold)]
+
+    counts = np.bincount(labels, minlength=len(data))
+    keep = labels == np.arange(len(data))
+    sizes = counts[keep]
+    repeated = sizes > 1
+
+    collapsed = data[keep].copy()
+    if repeated.any():
+        annotated = collapsed['Text'].iloc[repeated] + " [×" + pd.Series(sizes[repeated]).astype(str).to_numpy() + "]"
+        collapsed.iloc[np.flatnonzero(repeated), collapsed.columns.get_loc('Text')] = annotated.to_numpy()
+
+    clusters = pd.DataFrame({
+        'Text': data['Text'].to_numpy()[keep][repeated],
+        'Role': roles[keep][repeated],
+        'Count': sizes[repeated],
+    }).sort_values('Count', ascending=False, kind='mergesort').reset_index(drop=True)
+    return collapsed, clusters
+
+
+def format_clusters_text(clusters: Optional[pd.DataFrame], top: Optional[int] = None) -> str:
+    """
+    Раздел отчёта: самые частые повторяющиеся сообщения клиентов (точный подсчёт).
+
+    Args:
+        clusters: Результат collapse_near_duplicates()
+        top: Сколько кластеров показать (по умолчанию NEAR_DUP_TOP)
+
+    Returns:
+        Markdown раздел или пустая строка (повторов нет)
+    """
+    top = NEAR_DUP_TOP if top is None else top
+    if clusters is None or clusters.empty or top <= 0:
+        return ""
+    frequent = clusters[clusters['Role'] == ROLE_CLIENT].head(top)
+    if frequent.empty:
+        return ""
+
+    lines = [
+        "## Самые частые повторяющиеся сообщения клиентов", "",
+        "Похожие формулировки объединены, приведён первый пример.", "",
+    ]
+    for text, count in zip(frequent['Text'], frequent['Count']):
+        example = text if len(text) <= REPRESENTATIVE_MAX_CHARS else text[:REPRESENTATIVE_MAX_CHARS] + '…'
+        lines.append(f"- «{example}» — сообщений: {int(count)}")
+    return "\n".join(lines)
@@ -0,0 +1,395 @@
+# services/docx_render.py
+"""Рендеринг отчётов в DOCX: Markdown (заголовки, вложенные списки, таблицы, bold/italic), шаблон, пул процессов"""
+
+import io
+import re
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+from typing import Optional
+
+from docx import Document
+from docx.shared import Pt
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+
+from core.config import CLAUDE_REPORT_MODEL, DOCX_RENDER_WORKERS, DOCX_TEMPLATE
+
+logger = logging.getLogger(__name__)
+
+BASE_FONT = "Calibri"
+BASE_FONT_SIZE = 11
+CODE_FONT = "Consolas"
+MAX_LIST_LEVEL = 3  # Стили List Bullet / List Bullet 2 / List Bullet 3
+LIST_INDENT_PT = 20  # Отступ уровня списка, если в шаблоне нет стиля списка
+
+_HEADING_RE = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+_BOLD_LINE_RE = re.compile(r'^\*\*([^*]+)\*\*:?$')
+_LIST_RE = re.compile(r'^(\s*)([-*+•]|\d{1,3}[.)])\s+(.*)$')
+_RULE_RE = re.compile(r'^(-{3,}|\*{3,}|_{3,})$')
+_TABLE_SEPARATOR_RE = re.compile(r'^\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?$')
+_QUOTE_RE = re.compile(r'^>\s?(.*)$')
+# Встроенная разметка: ***bold italic***, **bold**, __bold__, *italic*, _italic_, `code`, [текст](ссылка)
+_INLINE_RE = re.compile(
+    r'\*\*\*(?P<bi>.+?)\*\*\*'
+    r'|\*\*(?P<b>.+?)\*\*'
+    r'|__(?P<b2>.+?)__'
+    r'|(?<![\w*])\*(?P<i>[^\s*](?:.*?[^\s*])?)\*(?![\w*])'
+    r'|(?<![\w])_(?P<i2>[^\s_](?:.*?[^\s_])?)_(?![\w])'
+    r'|`(?P<code>[^`]+)`'
+    r'|\[(?P<link>[^\]]+)\]\([^)]*\)'
+)
+
+_template_bytes: Optional[bytes] = None
+_template_lock = threading.Lock()
+
+
+def _build_template() -> bytes:
+    """Документ-шаблон: файл DOCX_TEMPLATE или стандартный документ с базовыми стилями"""
+    if DOCX_TEMPLATE:
+        with open(DOCX_TEMPLATE, 'rb') as f:
+            logger.info(f"📄 Шаблон DOCX: {DOCX_TEMPLATE}")
+            return f.read()
+
+    doc = Document()
+    normal = doc.styles['Normal']
+    normal.font.name = BASE_FONT
+    normal.font.size = Pt(BASE_FONT_SIZE)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def new_document() -> Document:
+    """
+    Новый документ из шаблона.
+
+    Шаблон загружается (или строится) один раз на процесс и хранится в памяти
+    как байты DOCX; каждый отчёт — его копия, без повторной настройки стилей.
+    """
+    global _template_bytes
+    if _template_bytes is None:
+        with _template_lock:
+            if _template_bytes is None:
+                _template_bytes = _build_template()
+    return Document(io.BytesIO(_template_bytes))
+
+
+def _has_style(doc, name: str) -> bool:
+    try:
+        doc.styles[name]
+        return True
+    except KeyError:
+        return False
+
+
+def add_inline(paragraph, text: str, bold: bool = False):
+    """Добавить текст со встроенной разметкой Markdown в абзац"""
+    position = 0
+    for match in _INLINE_RE.finditer(text):
+        if match.start() > position:
+            paragraph.add_run(text[position:match.start()]).bold = bold or None
+        kind = match.lastgroup
+        run = paragraph.add_run(match.group(kind))
+        if kind in ('bi', 'b', 'b2') or bold:
+            run.bold = True
+        if kind in ('bi', 'i', 'i2'):
+            run.italic = True
+        if kind == 'code':
+            run.font.name = CODE_FONT
+        position = match.end()
+    if position < len(text):
+        paragraph.add_run(text[position:]).bold = bold or None
+
+
+def plain_text(text: str) -> str:
+    """Текст без встроенной разметки (для заголовков)"""
+    return _INLINE_RE.sub(lambda m: m.group(m.lastgroup), text).strip()
+
+
+def _split_row(row: str) -> list:
+    """Ячейки строки таблицы Markdown (| a | b |)"""
+    row = row.strip()
+    if row.startswith('|'):
+        row = row[1:]
+    if row.endswith('|') and not row.endswith('\\|'):
+        row = row[:-1]
+    cells = re.split(r'(?<!\\)\|', row)
+    return [cell.strip().replace('\\|', '|') for cell in cells]
+
+
+class MarkdownRenderer:
+    """
+    Построчный конвертер Markdown в DOCX.
+
+    Строки подаются по одной (в том числе по мере потокового ответа): таблица
+    распознаётся по строке-разделителю после заголовка и дополняется строками,
+    вложенность списков определяется по отступам.
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.reset()
+
+    def reset(self):
+        """Сбросить состояние (таблица, список, блок кода)"""
+        self._pending_row: Optional[str] = None  # Возможный заголовок таблицы
+        self._table = None
+        self._columns = 0
+        self._in_code = False
+        self._list_indents: list = []
+
+    def feed_line(self, line: str):
+        """Обработать одну строку"""
+        line = line.rstrip('\r').expandtabs(4)
+        stripped = line.strip()
+
+        if self._in_code:
+            if stripped.startswith('```'):
+                self._in_code = False
+            else:
+                self._add_code(line)
+            return
+
+        if self._table is not None:
+            if stripped.startswith('|'):
+                self._add_table_row(_split_row(stripped))
+                return
+            self._table = None
+
+        if self._pending_row is not None:
+            header, self._pending_row = self._pending_row, None
+            if _TABLE_SEPARATOR_RE.match(stripped):
+                self._start_table(_split_row(header))
+                return
+            self._add_paragraph(header)
+
+        if stripped.startswith('|') and stripped.count('|') >= 2:
+            self._pending_row = stripped
+            return
+
+        if not stripped:
+            return
+
+        if stripped.startswith('```'):
+            self._in_code = True
+            return
+
+        list_match = _LIST_RE.match(line)
+        if list_match is None:
+            self._list_indents = []
+
+        if _RULE_RE.match(stripped):
+            return
+
+        heading = _HEADING_RE.match(stripped)
+        if heading:
+            self.doc.add_heading(plain_text(heading.group(2)), level=len(heading.group(1)))
+            return
+
+        bold_line = _BOLD_LINE_RE.match(stripped)
+        if bold_line:
+            # Строка целиком жирным — заголовок раздела (так Claude оформляет разделы)
+            self.doc.add_heading(bold_line.group(1).strip(), level=2)
+            return
+
+        if list_match:
+            self._add_list_item(*list_match.groups())
+            return
+
+        quote = _QUOTE_RE.match(stripped)
+        if quote:
+            paragraph = self.doc.add_paragraph(style='Quote' if _has_style(self.doc, 'Quote') else None)
+            add_inline(paragraph, quote.group(1))
+            return
+
+        self._add_paragraph(stripped)
+
+    def close(self):
+        """Завершить документ: незакрытый заголовок таблицы — обычный абзац"""
+        if self._pending_row is not None:
+            self._add_paragraph(self._pending_row)
+        self.reset()
+
+    def _add_paragraph(self, text: str):
+        add_inline(self.doc.add_paragraph(), text)
+
+    def _add_code(self, line: str):
+        paragraph = self.doc.add_paragraph()
+        run = paragraph.add_run(line)
+        run.font.name = CODE_FONT
+        paragraph.paragraph_format.space_after = Pt(0)
+
+    def _add_list_item(self, indent: str, marker: str, text: str):
+        # Уровень — по стеку отступов: глубже предыдущего — вложенный, меньше — возврат
+        width = len(indent)
+        while self._list_indents and width < self._list_indents[-1]:
+            self._list_indents.pop()
+        if not self._list_indents or width > self._list_indents[-1]:
+            self._list_indents.append(width)
+        level = min(len(self._list_indents), MAX_LIST_LEVEL)
+
+        ordered = marker[0].isdigit()
+        bold_item = _BOLD_LINE_RE.match(text.strip())
+        if ordered and level == 1 and bold_item:
+            # "1. **Раздел**" — нумерованный заголовок раздела
+            self.doc.add_heading(f"{marker} {bold_item.group(1).strip()}", level=2)
+            return
+
+        # Нумерованные пункты сохраняют номера из текста (нумерация Word продолжалась бы между списками)
+        style = ('List' if ordered else 'List Bullet') + (f' {level}' if level > 1 else '')
+        if _has_style(self.doc, style):
+            paragraph = self.doc.add_paragraph(style=style)
+        else:
+            paragraph = self.doc.add_paragraph()
+            paragraph.paragraph_format.left_indent = Pt(LIST_INDENT_PT * level)
+            if not ordered:
+                paragraph.add_run("• ")
+        if ordered:
+            paragraph.add_run(f"{marker} ")
+        add_inline(paragraph, text)
+
+    def _start_table(self, header: list):
+        self._columns = len(header)
+        self._table = self.doc.add_table(rows=1, cols=self._columns)
+        if _has_style(self.doc, 'Table Grid'):
+            self._table.style = 'Table Grid'
+        for cell, text in zip(self._table.rows[0].cells, header):
+            add_inline(cell.paragraphs[0], text, bold=True)
+
+    def _add_table_row(self, cells: list):
+        row = self._table.add_row()
+        for cell, text in zip(row.cells, cells[:self._columns]):
+            add_inline(cell.paragraphs[0], text)
+
+
+def markdown_to_docx(doc, text: str):
+    """Добавить Markdown текст в документ целиком"""
+    renderer = MarkdownRenderer(doc)
+    for line in text.split('\n'):
+        renderer.feed_line(line)
+    renderer.close()
+
+
+def render_docx(
+        text_content: str,
+        output_file_path: str,
+        source_filename: str,
+        model: Optional[str] = None
+) -> str:
+    """
+    Построить и сохранить DOCX отчёт (выполняется в процессе пула рендеринга).
+
+    Args:
+        text_content: Текст отчёта (Markdown)
+        output_file_path: Путь к выходному файлу
+        source_filename: Имя исходного файла для заголовка
+        model: Модель анализа для шапки отчёта
+
+    Returns:
+        Путь к сохранённому файлу
+    """
+    doc = new_document()
+
+    # Заголовок
+    title = doc.add_heading(f'Анализ файла: {source_filename}', 0)
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+    # Дата создания
+    doc.add_paragraph(f"Дата создания отчёта: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}")
+    doc.add_paragraph(f"Модель анализа: {model or CLAUDE_REPORT_MODEL}")
+    doc.add_paragraph()
+
+    markdown_to_docx(doc, text_content)
+
+    logger.info(f"💾 Сохранение результатов в {output_file_path}")
+    doc.save(output_file_path)
+    logger.info(f"✅ Файл сохранён: {output_file_path}")
+    return output_file_path
+
+
+_render_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _init_render_process():
+    """Инициализация процесса пула: шаблон загружается один раз на процесс"""
+    new_document()
+
+
+def get_render_pool() -> ProcessPoolExecutor:
+    """
+    Общий ограниченный пул процессов рендеринга DOCX (DOCX_RENDER_WORKERS процессов).
+
+    Процессы запускаются через spawn: бот и GUI многопоточны, fork копировал бы
+    захваченные блокировки. Пул создаётся при первом рендеринге и живёт до
+    shutdown_render_pool().
+    """
+    global _render_pool
+    with _pool_lock:
+        if _render_pool is None:
+            _render_pool = ProcessPoolExecutor(
+                max_workers=max(1, DOCX_RENDER_WORKERS),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_render_process,
+            )
+            logger.info(f"🖨️ Пул рендеринга DOCX: {max(1, DOCX_RENDER_WORKERS)} процессов")
+        return _render_pool
+
+
+def shutdown_render_pool():
+    """Остановить пул рендеринга"""
+    global _render_pool
+    with _pool_lock:
+        if _render_pool is not None:
+            _render_pool.shutdown(wait=True)
+            _render_pool = None
+
+
+def _discard_broken_pool(pool: ProcessPoolExecutor):
+    """Сломанный пул (процесс упал) пересоздаётся при следующем рендеринге"""
+    global _render_pool
+    with _pool_lock:
+        if _render_pool is pool:
+            _render_pool = None
+    pool.shutdown(wait=False)
+
+
+def render_in_pool(
+        text_content: str,
+        output_file_path: str,
+        source_filename: str,
+        model: Optional[str] = None
+) -> str:
+    """Рендеринг в пуле процессов с ожиданием результата; при сбое пула — в текущем процессе"""
+    pool = get_render_pool()
+    try:
+        return pool.submit(render_docx, text_content, output_file_path, source_filename, model).result()
+    except BrokenProcessPool as e:
+        logger.warning(f"⚠️ Пул рендеринга недоступен ({e}) — рендеринг в текущем процессе")
+        _discard_broken_pool(pool)
+        return render_docx(text_content, output_file_path, source_filename, model)
+
+
+async def render_docx_async(
+        text_content: str,
+        output_file_path: str,
+        source_filename: str,
+        model: Optional[str] = None
+) -> str:
+    """Рендеринг из event loop: в пуле процессов, не занимая GIL бота"""
+    loop = asyncio.get_running_loop()
+    pool = get_render_pool()
+    try:
+        return await loop.run_in_executor(
+            pool, render_docx, text_content, output_file_path, source_filename, model
+        )
+    except BrokenProcessPool as e:
+        logger.warning(f"⚠️ Пул рендеринга недоступен ({e}) — рендеринг в потоке")
+        _discard_broken_pool(pool)
+        return await loop.run_in_executor(
+            None, render_docx, text_content, output_file_path, source_filename, model
+        )
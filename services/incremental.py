@@ -0,0 +1,297 @@
+# services/incremental.py
+"""Инкрементальный анализ: в Claude отправляются только новые сообщения и сводка прошлого отчёта"""
+
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Optional, Callable
+
+import pandas as pd
+
+from services.analyzer import (
+    ModelTiers,
+    get_client,
+    plan_analysis,
+    run_analysis_plan,
+    chat_report_texts,
+    check_required_columns,
+)
+from services.ingest import read_chat_for_analysis
+from services.stats import ChatStats, compute_chat_stats, format_stats_text, parse_dates
+from services.streaming import ResponseStream
+from services.tokens import PreflightEstimate, UsageTracker, STRATEGY_COMPACT
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_MAX_CHARS = 6000  # Предел сводки предыдущего отчёта в запросе
+SUMMARY_LINE_CHARS = 300  # Длинные абзацы сводки обрезаются до этой длины
+
+
+@dataclass
+class IncrementalState:
+    """Что уже проанализировано по чату (хранится в ChatAnalysisState)"""
+    last_message_at: Optional[pd.Timestamp] = None
+    messages_analyzed: int = 0
+    prompt_hash: Optional[str] = None
+    summary: str = ""
+    stats: Optional[ChatStats] = None
+
+    def matches(self, custom_prompt: Optional[str]) -> bool:
+        """Состояние применимо к анализу с этим промптом"""
+        return self.stats is not None and self.prompt_hash == prompt_hash(custom_prompt)
+
+    @classmethod
+    def from_record(cls, record) -> Optional['IncrementalState']:
+        """Из записи БД (ChatAnalysisState или None)"""
+        if record is None or record.last_message_at is None:
+            return None
+        return cls(
+            last_message_at=pd.Timestamp(record.last_message_at),
+            messages_analyzed=record.messages_analyzed or 0,
+            prompt_hash=record.prompt_hash,
+            summary=record.summary or "",
+            stats=ChatStats.from_json(record.stats_json) if record.stats_json else None,
+        )
+
+    def to_record(self) -> dict:
+        """Поля для DatabaseManager.save_chat_state()"""
+        return {
+            'last_message_at': self.last_message_at.to_pydatetime() if self.last_message_at is not None else None,
+            'messages_analyzed': self.messages_analyzed,
+            'prompt_hash': self.prompt_hash,
+            'summary': self.summary,
+            'stats_json': self.stats.to_json() if self.stats is not None else None,
+        }
+
+
+@dataclass
+class IncrementalPart:
+    """Данные, которые нужно проанализировать с учётом сохранённого состояния"""
+    new_messages: pd.DataFrame
+    stats: ChatStats  # Статистика за весь период (старая + новая)
+    previous: Optional[IncrementalState]  # None — полный анализ
+    new_stats: Optional[ChatStats] = None  # Статистика только новых сообщений (None — их нет)
+
+    @property
+    def is_incremental(self) -> bool:
+        return self.previous is not None
+
+
+def prompt_hash(custom_prompt: Optional[str]) -> str:
+    """Отпечаток промпта: при смене промпта сводка прошлого отчёта неприменима"""
+    return hashlib.sha256((custom_prompt or "").encode('utf-8')).hexdigest()
+
+
+def select_new_messages(
+        df: pd.DataFrame,
+        previous: Optional[IncrementalState],
+        custom_prompt: Optional[str] = None,
+        new_stats: Optional[ChatStats] = None
+) -> IncrementalPart:
+    """
+    Отобрать сообщения после последнего проанализированного и объединить статистику.
+
+    В экспорте нет ID сообщений, поэтому граница — время последнего сообщения
+    (строго позже него). Статистика новых сообщений считается отдельно и
+    объединяется с сохранённой через ChatStats.merge().
+
+    Args:
+        df: Данные чата (Date/From/Text)
+        previous: Сохранённое состояние (None — первый анализ)
+        custom_prompt: Текущий промпт пользователя
+        new_stats: Готовая статистика новых сообщений (файл прочитан блоками, в df — выборка)
+
+    Returns:
+        IncrementalPart
+    """
+    if previous is not None and not previous.matches(custom_prompt):
+        logger.info("🔄 Промпт изменился — выполняется полный анализ")
+        previous = None
+
+    if previous is None:
+        stats = new_stats or compute_chat_stats(df)
+        return IncrementalPart(new_messages=df, stats=stats, previous=None, new_stats=stats)
+
+    dates = parse_dates(df['Date'])
+    new_messages = df[dates > previous.last_message_at]
+    if new_stats is None and len(new_messages):
+        new_stats = compute_chat_stats(new_messages)
+    if new_stats is not None and not new_stats.total_messages:
+        new_stats = None
+    logger.info(
+        f"➕ Инкрементальный анализ: {new_stats.total_messages if new_stats else 0} новых сообщений "
+        f"(после {previous.last_message_at:%d.%m.%Y %H:%M})"
+    )
+    stats = previous.stats.merge(new_stats) if new_stats is not None else previous.stats
+    return IncrementalPart(new_messages=new_messages, stats=stats, previous=previous, new_stats=new_stats)
+
+
+def read_new_messages(
+        file_path: str,
+        previous: Optional[IncrementalState],
+        custom_prompt: Optional[str] = None
+) -> tuple:
+    """
+    Прочитать файл и отобрать новые сообщения (select_new_messages).
+
+    Большой файл читается блоками (read_chat_for_analysis): отбор по времени
+    выполняется в каждом блоке, статистика новых сообщений — по всем, тексты — выборка.
+
+    Returns:
+        (IncrementalPart, текст статистики за весь период, сводка диалогов новых сообщений или None)
+
+    Raises:
+        ValueError: Если в файле нет обязательных колонок
+    """
+    since = previous.last_message_at if previous is not None and previous.matches(custom_prompt) else None
+    chat = read_chat_for_analysis(file_path, since=since)
+    check_required_columns(chat.frame)
+    part = select_new_messages(chat.frame, previous, custom_prompt, new_stats=chat.stats)
+
+    stats_text = format_stats_text(part.stats)
+    if chat.sampled:
+        stats_text += f"\n\n_{chat.describe()}_"
+    return part, stats_text, chat_report_texts(chat)[1]
+
+
+def summarize_report(text: str, max_chars: int = SUMMARY_MAX_CHARS) -> str:
+    """
+    Сжатая структурированная сводка отчёта: заголовки и пункты списков
+    сохраняются, длинные абзацы обрезаются, общий объём ограничен.
+    """
+    lines = []
+    used = 0
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if len(line) > SUMMARY_LINE_CHARS:
+            line = line[:SUMMARY_LINE_CHARS].rstrip() + "…"
+        if used + len(line) > max_chars:
+            break
+        lines.append(line)
+        used += len(line) + 1
+    return "\n".join(lines)
+
+
+def build_context(part: IncrementalPart) -> str:
+    """Вступление запроса: что уже было проанализировано и что от Claude нужно сейчас"""
+    if not part.is_incremental:
+        return ""
+    previous = part.previous
+    first = previous.stats.first_date
+    period = f"{first:%d.%m.%Y} — {previous.last_message_at:%d.%m.%Y}" if first is not None else "прошлый период"
+    return f"""Это обновление ранее составленного отчёта. Чат уже был проанализирован за период {period} ({previous.messages_analyzed} сообщений).
+
+Сводка предыдущего отчёта:
+{previous.summary}
+
+Ниже приведены ТОЛЬКО новые сообщения. Составь обновлённый отчёт за весь период: объедини выводы предыдущего отчёта с новыми данными, отметь новые темы и изменения по сравнению с прошлым периодом.
+
+"""
+
+
+def next_state(part: IncrementalPart, analysis_text: str, custom_prompt: Optional[str]) -> IncrementalState:
+    """Состояние после успешного анализа"""
+    previous = part.previous
+    # Граница и счётчик — по статистике: при чтении блоками в new_messages только выборка
+    last = part.new_stats.last_date if part.new_stats is not None else None
+    if last is None or pd.isna(last):
+        last = previous.last_message_at if previous else None
+    return IncrementalState(
+        last_message_at=last,
+        messages_analyzed=(previous.messages_analyzed if previous else 0) + (
+            part.new_stats.total_messages if part.new_stats is not None else 0
+        ),
+        prompt_hash=prompt_hash(custom_prompt),
+        summary=summarize_report(analysis_text),
+        stats=part.stats,
+    )
+
+
+def preflight_incremental(
+        file_path: str,
+        previous: Optional[IncrementalState],
+        claude_api_key: Optional[str] = None,
+        custom_prompt: Optional[str] = None,
+        models: Optional[ModelTiers] = None
+) -> PreflightEstimate:
+    """Оценка токенов с учётом того, что отправлены будут только новые сообщения"""
+    client = get_client(api_key=claude_api_key) if claude_api_key else None
+    part, stats_text, dialogues_text = read_new_messages(file_path, previous, custom_prompt)
+    if part.is_incremental and part.new_messages.empty:
+        # Claude не будет вызван
+        return PreflightEstimate(
+            strategy=STRATEGY_COMPACT, raw_tokens=0, compact_tokens=0,
+            request_tokens=0, total_tokens=0, requests=0
+        )
+    return plan_analysis(
+        part.new_messages,
+        custom_prompt,
+        client=client,
+        stats_text=stats_text,
+        context=build_context(part),
+        models=models,
+        dialogues_text=dialogues_text,
+    ).estimate
+
+
+def analyze_csv_incremental(
+        file_path: str,
+        previous: Optional[IncrementalState],
+        claude_api_key: Optional[str] = None,
+        custom_prompt: Optional[str] = None,
+        on_wait: Optional[Callable[[float], None]] = None,
+        usage: Optional[UsageTracker] = None,
+        stream: Optional[ResponseStream] = None,
+        models: Optional[ModelTiers] = None
+) -> tuple:
+    """
+    Анализ чата с учётом предыдущего отчёта.
+
+    Без сохранённого состояния (или при смене промпта) — обычный полный анализ.
+    Если новых сообщений нет, Claude не вызывается: возвращается сводка
+    прошлого отчёта и статистика.
+
+    Args:
+        file_path: Путь к CSV файлу
+        previous: Сохранённое состояние чата (или None)
+        claude_api_key: Claude API ключ
+        custom_prompt: Кастомный промпт пользователя
+        on_wait: Колбэк ожидания квоты rate limiter
+        usage: Учёт израсходованных токенов
+        stream: Приёмник потокового ответа
+        models: Модели по уровням (по умолчанию из конфига)
+
+    Returns:
+        (текст отчёта, новое IncrementalState)
+
+    Raises:
+        ValueError: Если в файле нет обязательных колонок или ответ пустой
+    """
+    client = get_client(api_key=claude_api_key)
+    part, stats_text, dialogues_text = read_new_messages(file_path, previous, custom_prompt)
+
+    if part.is_incremental and part.new_messages.empty:
+        logger.info("✅ Новых сообщений нет — Claude не вызывается")
+        text = f"## Новых сообщений нет\n\nСводка предыдущего отчёта:\n\n{part.previous.summary}\n\n{stats_text}"
+        return text, part.previous
+
+    plan = plan_analysis(
+        part.new_messages,
+        custom_prompt,
+        client=client,
+        stats_text=stats_text,
+        context=build_context(part),
+        models=models,
+        dialogues_text=dialogues_text,
+    )
+    logger.info(f"📏 {plan.estimate.describe()}")
+
+    analysis_text = run_analysis_plan(
+        client, plan, custom_prompt, on_wait=on_wait, usage=usage, stream=stream, models=models
+    )
+    if not analysis_text:
+        raise ValueError("Пустой ответ от Claude API")
+
+    return f"{analysis_text}\n\n{plan.appendix}", next_state(part, analysis_text, custom_prompt)
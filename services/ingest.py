@@ -0,0 +1,488 @@
+# services/ingest.py
+"""Быстрое чтение CSV чатов: определение кодировки и разделителя по первым КБ, один парсинг или блоки"""
+
+import codecs
+import logging
+import os
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from core.config import INGEST_MEMORY_MB
+from services.dedup import mix64
+from services.sessions import dialogues_from_messages
+from services.stats import (
+    EXPORT_DATE_FORMAT,
+    ChatStats,
+    parse_dates,
+    prepare_messages,
+    sender_roles,
+    stats_from_messages,
+)
+
+logger = logging.getLogger(__name__)
+
+# Колонки, которые нужны анализу (остальные не читаются)
+CHAT_COLUMNS = ['Date', 'From', 'Text']
+
+# Роль отправителя: пишется экспортом, для остальных файлов вычисляется при чтении
+ROLE_COLUMN = 'Role'
+
+# Сигнатура собственного экспорта (services/telegram.py): UTF-8 с BOM, ';', Date;From;Text[;Role]
+EXPORT_SIGNATURE = codecs.BOM_UTF8 + b'Date;From;Text'
+
+SNIFF_BYTES = 64 * 1024  # Сколько байт читать для определения формата
+SEPARATORS = [';', ',', '\t']
+CHUNK_BYTES = 4 * 1024 * 1024  # Блок потокового чтения (наибольший)
+READ_BLOCKS = 48  # Память чтения в блоках: pyarrow держит впереди ~40 прочитанных блоков, плюс разбор текущего — замер
+ROW_BYTES = 120  # Средний размер строки чата — размер блока в строках для pandas
+SAMPLE_SHARE = 2  # Выборка вместе с её анализом — не больше INGEST_MEMORY_MB / SAMPLE_SHARE
+ANALYSIS_FACTOR = 14  # Пик памяти анализа выборки (сжатие, повторы, разделы отчёта) в размерах её DataFrame — замер 10–12
+SAMPLE_MAX_ROWS = 200_000  # Строк в выборке не больше, сколько бы ни было памяти: время анализа растёт с числом строк
+ENCODINGS = ['utf-8', 'cp1251', 'latin-1']
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.compute as pa_compute
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+
+@dataclass
+class CsvFormat:
+    """Параметры CSV файла, определённые по его началу"""
+    encoding: str
+    sep: str
+    columns: list
+    is_export: bool = False  # Файл нашего экспорта — формат известен заранее
+
+    @property
+    def has_chat_columns(self) -> bool:
+        return all(column in self.columns for column in CHAT_COLUMNS)
+
+    @property
+    def read_columns(self) -> list:
+        """Читаемые колонки: Date/From/Text и Role, если она есть в файле"""
+        return CHAT_COLUMNS + [ROLE_COLUMN] if ROLE_COLUMN in self.columns else list(CHAT_COLUMNS)
+
+
+def sniff_format(file_path: str, sample_bytes: int = SNIFF_BYTES) -> CsvFormat:
+    """
+    Определить кодировку и разделитель по первым байтам файла.
+
+    Args:
+        file_path: Путь к CSV файлу
+        sample_bytes: Размер анализируемого начала файла
+
+    Returns:
+        CsvFormat
+    """
+    with open(file_path, 'rb') as f:
+        sample = f.read(sample_bytes)
+
+    if sample.startswith(EXPORT_SIGNATURE):
+        header = sample[len(codecs.BOM_UTF8):].split(b'\n', 1)[0].decode('utf-8').strip()
+        return CsvFormat(encoding='utf-8-sig', sep=';', columns=header.split(';'), is_export=True)
+
+    text, encoding = _decode_sample(sample)
+    lines = text.splitlines()
+    header = lines[0] if lines else ''
+    sep = _detect_separator(header, lines[1:20])
+    columns = [c.strip().strip('"') for c in header.split(sep)]
+    return CsvFormat(encoding=encoding, sep=sep, columns=columns)
+
+
+def _decode_sample(sample: bytes) -> tuple:
+    """Декодировать начало файла: BOM, затем utf-8, cp1251, latin-1"""
+    for bom, encoding in (
+            (codecs.BOM_UTF8, 'utf-8-sig'),
+            (codecs.BOM_UTF16_LE, 'utf-16'),
+            (codecs.BOM_UTF16_BE, 'utf-16'),
+    ):
+        if sample.startswith(bom):
+            return sample.decode(encoding, errors='replace'), encoding
+
+    for encoding in ENCODINGS:
+        # Инкрементальный декодер не падает на символе, обрезанном границей выборки
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            return decoder.decode(sample, final=False), encoding
+        except UnicodeDecodeError:
+            continue
+    return sample.decode('latin-1'), 'latin-1'
+
+
+def _detect_separator(header: str, rows: list) -> str:
+    """
+    Разделитель — тот, по которому заголовок делится на обязательные колонки,
+    иначе — дающий больше всего колонок и одинаковое их количество в строках выборки.
+    """
+    for sep in SEPARATORS:
+        if all(column in [c.strip().strip('"') for c in header.split(sep)] for column in CHAT_COLUMNS):
+            return sep
+
+    def score(sep: str) -> tuple:
+        count = header.count(sep)
+        consistent = sum(1 for row in rows if row.count(sep) >= count)
+        return count > 0, consistent, count
+
+    return max(SEPARATORS, key=score)
+
+
+def read_chat_csv(file_path: str, csv_format: Optional[CsvFormat] = None) -> pd.DataFrame:
+    """
+    Прочитать CSV чата одним проходом.
+
+    Читаются только колонки Date/From/Text и Role (если они есть), From и Role —
+    категориальные, Date — datetime. Если колонки Role в файле нет, она вычисляется
+    по правилам ролей (services/stats.py). При установленном pyarrow файл разбирается его CSV-парсером,
+    иначе — движком C pandas. Для файлов без нужных колонок читаются все
+    колонки — проверку и понятную ошибку выполняет вызывающий код.
+
+    Args:
+        file_path: Путь к CSV файлу
+        csv_format: Заранее известный формат (иначе определяется по началу файла)
+
+    Returns:
+        DataFrame
+    """
+    csv_format = csv_format or sniff_format(file_path)
+
+    if not csv_format.has_chat_columns:
+        df = pd.read_csv(file_path, sep=csv_format.sep, encoding=csv_format.encoding)
+    elif PYARROW_AVAILABLE and csv_format.encoding != 'utf-16':
+        df = _read_chat_arrow(file_path, csv_format)
+    else:
+        df = pd.read_csv(
+            file_path,
+            sep=csv_format.sep,
+            encoding=csv_format.encoding,
+            usecols=csv_format.read_columns,
+            dtype={'Date': str, 'From': 'category', 'Text': str, ROLE_COLUMN: 'category'},
+        )
+        df['Date'] = parse_dates(df['Date'])
+
+    if csv_format.has_chat_columns:
+        df = _normalize_chat_frame(df)
+
+    logger.info(
+        f"📥 CSV прочитан: {len(df)} строк, кодировка {csv_format.encoding}, "
+        f"разделитель {csv_format.sep!r}{', формат экспорта' if csv_format.is_export else ''}"
+    )
+    return df
+
+
+def _arrow_options(csv_format: CsvFormat, block_size: Optional[int] = None) -> dict:
+    """Параметры парсера pyarrow: только нужные колонки, From и Role — словари, Date — строка"""
+    # Arrow сам пропускает UTF-8 BOM; остальные кодировки перекодируются при чтении
+    encoding = 'utf8' if csv_format.encoding in ('utf-8', 'utf-8-sig') else csv_format.encoding
+    read_options = pa_csv.ReadOptions(encoding=encoding)
+    if block_size:
+        read_options.block_size = block_size
+    return dict(
+        read_options=read_options,
+        parse_options=pa_csv.ParseOptions(
+            delimiter=csv_format.sep,
+            # Наш экспорт не содержит переносов внутри сообщений — быстрый режим
+            newlines_in_values=not csv_format.is_export,
+        ),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=csv_format.read_columns,
+            strings_can_be_null=True,  # Пустые значения — пропуски, как у pandas
+            column_types={
+                'Date': pa.string(),
+                'From': pa.dictionary(pa.int32(), pa.string()),
+                'Text': pa.string(),
+                ROLE_COLUMN: pa.dictionary(pa.int32(), pa.string()),
+            },
+        ),
+    )
+
+
+def _read_chat_arrow(file_path: str, csv_format: CsvFormat) -> pd.DataFrame:
+    """Разбор CSV парсером pyarrow за один вызов"""
+    return _arrow_to_frame(pa_csv.read_csv(file_path, **_arrow_options(csv_format)), csv_format)
+
+
+def _arrow_to_frame(table, csv_format: CsvFormat) -> pd.DataFrame:
+    """Таблица pyarrow → DataFrame: Date разбирается strptime, при несовпадении формата — pandas"""
+    dates = pa_compute.strptime(table['Date'], format=EXPORT_DATE_FORMAT, unit='s', error_is_null=True)
+    unparsed = dates.null_count - table['Date'].null_count
+    if csv_format.is_export or unparsed <= len(table) // 2:
+        table = table.set_column(table.schema.get_field_index('Date'), 'Date', dates)
+        return table.to_pandas()
+
+    # Формат дат не совпал с экспортом — разбор pandas с dayfirst
+    df = table.to_pandas()
+    df['Date'] = parse_dates(df['Date'])
+    return df
+
+
+def iter_chat_csv(
+        file_path: str,
+        csv_format: Optional[CsvFormat] = None,
+        chunk_bytes: int = CHUNK_BYTES
+) -> Iterator[pd.DataFrame]:
+    """
+    Прочитать CSV чата блоками: в памяти одновременно только текущий блок.
+
+    Блоки — те же DataFrame, что и у read_chat_csv() (типы колонок, Role),
+    но категории From у каждого блока свои. Метки строк — сквозные номера
+    строк файла, как у RangeIndex при чтении целиком (строка 0 — вторая строка CSV).
+
+    Args:
+        file_path: Путь к CSV файлу
+        csv_format: Заранее известный формат (иначе определяется по началу файла)
+        chunk_bytes: Размер блока в байтах (для pandas — пересчитывается в строки)
+
+    Yields:
+        DataFrame очередного блока
+
+    Raises:
+        ValueError: В файле нет колонок Date/From/Text
+    """
+    csv_format = csv_format or sniff_format(file_path)
+    if not csv_format.has_chat_columns:
+        missing = [column for column in CHAT_COLUMNS if column not in csv_format.columns]
+        raise ValueError(f"Отсутствуют обязательные колонки: {missing}")
+
+    if PYARROW_AVAILABLE and csv_format.encoding != 'utf-16':
+        offset = 0
+        # Файловый объект Python: по пути pyarrow сначала загружает в память весь файл
+        with open(file_path, 'rb') as f, \
+                pa_csv.open_csv(f, **_arrow_options(csv_format, block_size=chunk_bytes)) as reader:
+            for batch in reader:
+                df = _arrow_to_frame(pa.Table.from_batches([batch]), csv_format)
+                df.index = pd.RangeIndex(offset, offset + len(df))
+                offset += len(df)
+                yield _normalize_chat_frame(df)
+        return
+
+    chunks = pd.read_csv(
+        file_path,
+        sep=csv_format.sep,
+        encoding=csv_format.encoding,
+        usecols=csv_format.read_columns,
+        dtype={'Date': str, 'From': 'category', 'Text': str, ROLE_COLUMN: 'category'},
+        chunksize=max(1, chunk_bytes // ROW_BYTES),
+    )
+    with chunks:
+        # Метки строк pandas продолжает между блоками сам
+        for df in chunks:
+            df['Date'] = parse_dates(df['Date'])
+            yield _normalize_chat_frame(df)
+
+
+@dataclass
+class ChatSource:
+    """
+    Чат, прочитанный для анализа.
+
+    Небольшой файл читается целиком (stats — None, статистику считает анализ).
+    Большой — блоками: stats и dialogues посчитаны по всем сообщениям файла,
+    а frame — тексты только выборки целых дней в пределах памяти.
+    """
+    frame: pd.DataFrame
+    stats: Optional[ChatStats] = None
+    dialogues: Optional[pd.DataFrame] = None  # Результат summarize_dialogues() по всем сообщениям
+    rows: int = 0
+    days_total: int = 0
+    days_sampled: int = 0
+
+    @property
+    def sampled(self) -> bool:
+        return self.stats is not None and self.days_sampled < self.days_total
+
+    def describe(self) -> str:
+        if not self.sampled:
+            return ""
+        return (
+            f"Тексты сообщений — выборка {self.days_sampled:,} из {self.days_total:,} дней "
+            f"({len(self.frame):,} из {self.rows:,} сообщений); статистика — по всем сообщениям файла"
+        )
+
+
+class StatsAccumulator:
+    """
+    Статистика и диалоги по блокам файла — без DataFrame всех сообщений.
+
+    Ответ менеджера засчитывается в тот же день, а диалог не переходит через
+    полночь, поэтому блоки считаются целыми днями: сообщения последнего дня блока
+    (в порядке файла) переносятся в следующий блок. Для файла, упорядоченного
+    по времени (экспорт — от новых к старым), результат совпадает с расчётом
+    по всему файлу; в памяти — только сырые ответы и по строке на диалог.
+    """
+
+    def __init__(self):
+        self._stats: List[ChatStats] = []
+        self._dialogues: List[pd.DataFrame] = []
+        self._carry: Optional[pd.DataFrame] = None
+
+    def feed(self, chunk: pd.DataFrame):
+        """Учесть блок (нужны колонки Date/From/Role)"""
+        frame = chunk[['Date', 'From', ROLE_COLUMN]]
+        if self._carry is not None:
+            frame = _concat_chunks([self._carry, frame])
+        dated = frame['Date'].dropna()
+        if dated.empty:
+            self._carry = frame
+            return
+        days = frame['Date'].dt.normalize()
+        boundary = (days == dated.iloc[-1].normalize()).to_numpy()
+        self._add(frame[~boundary])
+        self._carry = frame[boundary]
+
+    def finish(self) -> tuple:
+        """
+        Returns:
+            (ChatStats, сводка диалогов) по всем учтённым сообщениям
+        """
+        if self._carry is not None:
+            self._add(self._carry)
+            self._carry = None
+        if not self._stats:
+            empty = prepare_messages(pd.DataFrame({'Date': pd.Series(dtype='datetime64[s]'), 'From': [], ROLE_COLUMN: []}))
+            return stats_from_messages(empty), dialogues_from_messages(empty)
+        return ChatStats.combine(self._stats), pd.concat(self._dialogues, ignore_index=True)
+
+    def _add(self, frame: pd.DataFrame):
+        messages = prepare_messages(frame)
+        if messages.empty:
+            return
+        self._stats.append(stats_from_messages(messages))
+        self._dialogues.append(dialogues_from_messages(messages))
+
+
+def read_chat_for_analysis(
+        file_path: str,
+        memory_bytes: Optional[int] = None,
+        chunk_bytes: Optional[int] = None,
+        since: Optional[pd.Timestamp] = None
+) -> ChatSource:
+    """
+    Прочитать чат для анализа в пределах памяти.
+
+    Память строки в анализе — её размер в DataFrame (memory_usage(deep=True)),
+    умноженный на ANALYSIS_FACTOR: сжатие, поиск повторов и разделы отчёта. Файл, который
+    с анализом помещается в memory_bytes / SAMPLE_SHARE (DataFrame — примерно размер
+    файла), читается целиком (read_chat_csv).
+    Больший — блоками (iter_chat_csv): статистика и диалоги накапливаются по блокам
+    (StatsAccumulator), а тексты сохраняются только у дней выборки (непустые).
+    Дни выбираются по хешу даты (равномерно и одинаково для частей дня в разных
+    блоках): после каждого блока остаются дни с наименьшими ключами, строки которых
+    помещаются в ту же память, а строк не больше SAMPLE_MAX_ROWS. Метки строк выборки — номера строк файла.
+    Остальная память — чтение: блок не больше её READ_BLOCKS-й доли.
+
+    Args:
+        file_path: Путь к CSV файлу
+        memory_bytes: Память на чтение и анализ, байт (по умолчанию INGEST_MEMORY_MB)
+        chunk_bytes: Размер блока потокового чтения (по умолчанию — по памяти, не больше CHUNK_BYTES)
+        since: Только сообщения позже этого времени (инкрементальный анализ)
+
+    Returns:
+        ChatSource
+    """
+    if memory_bytes is None:
+        memory_bytes = INGEST_MEMORY_MB * 1024 * 1024
+    csv_format = sniff_format(file_path)
+    size = os.path.getsize(file_path)
+    budget = memory_bytes // SAMPLE_SHARE
+    if chunk_bytes is None:
+        chunk_bytes = max(SNIFF_BYTES, min(CHUNK_BYTES, (memory_bytes - budget) // READ_BLOCKS))
+    if not csv_format.has_chat_columns or size * ANALYSIS_FACTOR <= budget:
+        df = read_chat_csv(file_path, csv_format)
+        if since is not None and csv_format.has_chat_columns:
+            df = df[df['Date'] > since]
+        return ChatSource(frame=df, rows=len(df))
+
+    logger.info(
+        f"📥 Большой CSV ({size / 1024 / 1024:,.0f} МБ): чтение блоками, выборка дней до "
+        f"{budget / 1024 / 1024:,.0f} МБ с анализом, "
+        f"блоки по {chunk_bytes / 1024 / 1024:,.1f} МБ"
+    )
+    accumulator = StatsAccumulator()
+    kept = []
+    # Байт и строк по ключам дней выборки
+    sizes = pd.DataFrame({'bytes': [], 'rows': []}, index=pd.Index([], dtype=np.uint64), dtype=float)
+    threshold = np.iinfo(np.uint64).max
+    days_seen = set()
+    rows = 0
+    for chunk in iter_chat_csv(file_path, csv_format, chunk_bytes=chunk_bytes):
+        if since is not None:
+            chunk = chunk[chunk['Date'] > since]
+        rows += len(chunk)
+        accumulator.feed(chunk)
+        days = chunk['Date'].dt.floor('D').to_numpy('datetime64[D]').astype(np.int64)
+        keys = mix64(days)
+        # Пустые тексты и строки без даты в выборку не попадают
+        dated = chunk['Date'].notna().to_numpy() & (chunk['Text'] != '').to_numpy(dtype=bool)
+        days_seen.update(np.unique(days[dated]).tolist())
+
+        # Дни с ключом за порогом уже не поместятся — их строки сразу отбрасываются
+        take = dated & (keys < threshold)
+        if not take.any():
+            continue
+        part = chunk.loc[take, ['Date', 'From', 'Text', ROLE_COLUMN]].assign(_Key=keys[take])
+        kept.append(part)
+        # Строке — её доля фактического размера блока (по длине текста) с запасом на анализ
+        weights = part['Text'].str.len().to_numpy(dtype=float) + 1
+        row_bytes = weights * (part.memory_usage(deep=True).sum() * ANALYSIS_FACTOR / weights.sum())
+        added = pd.DataFrame({'bytes': row_bytes, 'rows': 1.0}).groupby(part['_Key'].to_numpy()).sum()
+        sizes = sizes.add(added, fill_value=0).sort_index()
+
+        total = sizes.cumsum()
+        fits = (total['bytes'] <= budget) & (total['rows'] <= SAMPLE_MAX_ROWS)
+        if not fits.all():
+            threshold = fits.index[~fits.to_numpy()][0]
+            sizes = sizes[sizes.index < threshold]
+            # Копируются только блоки, где есть отброшенные дни
+            kept = [part if part['_Key'].max() < threshold else part[part['_Key'] < threshold] for part in kept]
+
+    stats, dialogues = accumulator.finish()
+    if kept:
+        frame = _concat_chunks(kept, ignore_index=False)[['Date', 'From', 'Text', ROLE_COLUMN]]
+    else:
+        frame = _normalize_chat_frame(pd.DataFrame({column: [] for column in csv_format.read_columns}))
+    source = ChatSource(
+        frame=frame,
+        stats=stats,
+        dialogues=dialogues,
+        rows=rows,
+        days_total=len(days_seen),
+        days_sampled=len(sizes),
+    )
+    logger.info(
+        f"📥 CSV прочитан блоками: {rows:,} строк, {stats.total_messages:,} сообщений в статистике, "
+        f"{len(dialogues):,} диалогов. {source.describe()}"
+    )
+    return source
+
+
+def _concat_chunks(parts: list, ignore_index: bool = True) -> pd.DataFrame:
+    """Склейка блоков: категории From и Role объединяются, а не превращаются в строки"""
+    frame = pd.concat(parts, ignore_index=ignore_index)
+    for column in ('From', ROLE_COLUMN):
+        if column in frame.columns:
+            frame[column] = union_categoricals([part[column] for part in parts])
+    return frame
+
+
+def _normalize_chat_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Типы колонок чата: From и Role — category без пропусков, Text — строка без пропусков"""
+    senders = df['From']
+    if not isinstance(senders.dtype, pd.CategoricalDtype):
+        senders = senders.astype('category')
+    if senders.isna().any():
+        if 'Unknown' not in senders.cat.categories:
+            senders = senders.cat.add_categories('Unknown')
+        senders = senders.fillna('Unknown')
+    df['From'] = senders
+
+    df['Text'] = df['Text'].fillna('')
+    df[ROLE_COLUMN] = sender_roles(df).astype('category')
+    return df
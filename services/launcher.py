@@ -32,6 +32,23 @@ def analyze_csvs():
     analyze_csv_folder(str(input_folder), str(output_folder))
 
 
+def analyze_csvs_aggregate():
+    """Сводный анализ всех CSV файлов одним отчётом"""
+    from services.cross_chat import analyze_csv_folder_aggregate
+
+    input_folder = get_input_folder()
+    output_folder = get_output_folder()
+
+    input_folder.mkdir(parents=True, exist_ok=True)
+    output_folder.mkdir(parents=True, exist_ok=True)
+
+    result = analyze_csv_folder_aggregate(str(input_folder), str(output_folder))
+    if result['report']:
+        print(f"✅ Сводный отчёт: {result['report']}")
+    for detail in result['details']:
+        print(f"❌ {detail}")
+
+
 def main_menu():
     """Консольное меню"""
     print("=== Ysell Analyzer - Консольный режим ===")
@@ -39,10 +56,11 @@ def main_menu():
     print("1. Экспорт из Telegram")
     print("2. Анализ CSV -> DOCX")
     print("3. Полный цикл (экспорт + анализ)")
+    print("4. Сводный отчёт по всем CSV (сравнение чатов)")
     print("0. Выход")
     print()
     
-    choice = input("Выберите действие (0-3): ").strip()
+    choice = input("Выберите действие (0-4): ").strip()
     
     if choice == "0":
         print("👋 До свидания!")
@@ -81,7 +99,12 @@ def main_menu():
         print("🔬 Запуск анализа...")
         analyze_csvs()
     
-    if choice not in ["0", "1", "2", "3"]:
+    if choice == "4":
+        print()
+        print("🔬 Запуск сводного анализа...")
+        analyze_csvs_aggregate()
+    
+    if choice not in ["0", "1", "2", "3", "4"]:
         print("❌ Неверный выбор")
 
 
@@ -0,0 +1,130 @@
+# services/map_cache.py
+"""Кэш заметок map-этапа: повторный анализ пересекающегося периода платит только за новые части"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional, Dict
+
+from core.config import get_data_dir
+
+logger = logging.getLogger(__name__)
+
+MAP_PROMPT_VERSION = 1  # Увеличить при изменении промпта map-этапа: старые заметки станут неприменимы
+CACHE_FILENAME = "map_cache.db"
+
+
+def map_cache_key(chunk: str, task: str, model: str, max_tokens: int) -> str:
+    """
+    Ключ заметок по части: содержимое части, задача, модель и версия промпта.
+
+    Номер части («часть i из N») в ключ не входит — он зависит от периода анализа,
+    а не от содержимого.
+    """
+    digest = hashlib.sha256()
+    for value in (str(MAP_PROMPT_VERSION), model, str(max_tokens), task, chunk):
+        digest.update(value.encode('utf-8'))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class MapCache:
+    """
+    Заметки по частям в SQLite с вытеснением давно не использованных (LRU).
+
+    Размер ограничен суммой байт ключей и заметок; потокобезопасен
+    (части обрабатываются параллельно).
+    """
+
+    def __init__(self, path: Path, max_bytes: int):
+        """
+        Args:
+            path: Файл базы SQLite
+            max_bytes: Предел размера кэша
+        """
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS map_notes ("
+                "key TEXT PRIMARY KEY, notes TEXT NOT NULL, size INTEGER NOT NULL, used_at INTEGER NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS map_notes_used ON map_notes (used_at)")
+
+    def _touch(self, key: str):
+        self._conn.execute(
+            "UPDATE map_notes SET used_at = (SELECT COALESCE(MAX(used_at), 0) + 1 FROM map_notes) WHERE key = ?",
+            (key,)
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        """Заметки по ключу (None — нет в кэше); отмечает использование"""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT notes FROM map_notes WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._touch(key)
+            return row[0]
+
+    def contains(self, key: str) -> bool:
+        """Есть ли заметки (для оценки стоимости; использование не отмечается)"""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM map_notes WHERE key = ?", (key,)).fetchone() is not None
+
+    def put(self, key: str, notes: str):
+        """Сохранить заметки и вытеснить самые давние, если кэш больше предела"""
+        size = len(key) + len(notes.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO map_notes (key, notes, size, used_at) VALUES (?, ?, ?, 0)",
+                (key, notes, size)
+            )
+            self._touch(key)
+            evicted = self._conn.execute(
+                "DELETE FROM map_notes WHERE key IN ("
+                "SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY used_at DESC) AS total FROM map_notes) "
+                "WHERE total > ?)",
+                (self.max_bytes,)
+            ).rowcount
+        if evicted:
+            logger.info(f"🗑 Кэш заметок: вытеснено {evicted}")
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM map_notes").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_caches: Dict[Path, MapCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_map_cache(max_mb: int, path: Optional[Path] = None) -> Optional[MapCache]:
+    """
+    Общий кэш заметок процесса.
+
+    Args:
+        max_mb: Предел размера, МБ (0 — кэш отключён)
+        path: Файл базы (по умолчанию data/map_cache.db)
+
+    Returns:
+        MapCache или None
+    """
+    if max_mb <= 0:
+        return None
+    path = Path(path) if path else get_data_dir() / CACHE_FILENAME
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = _caches[path] = MapCache(path, max_mb * 1024 * 1024)
+        cache.max_bytes = max_mb * 1024 * 1024
+        return cache
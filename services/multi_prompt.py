@@ -0,0 +1,303 @@
+# services/multi_prompt.py
+"""Несколько отчётов по одному чату за одну задачу: общий кэшируемый префикс данных, параллельные запросы"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Callable, List
+
+from services.analyzer import (
+    ModelTiers,
+    get_client,
+    plan_analysis,
+    chat_report_texts,
+    create_message,
+    message_text,
+    check_required_columns,
+    build_analysis_prompt,
+    MAX_TOKENS,
+)
+from services.ingest import read_chat_for_analysis
+from services.prompt_template import PromptContext, render_prompt
+from services.streaming import ResponseStream
+from services.tokens import (
+    estimate_tokens,
+    PreflightEstimate,
+    UsageTracker,
+    STRATEGY_CHUNKED,
+)
+
+logger = logging.getLogger(__name__)
+
+CACHE_WAIT_SECONDS = 120  # Сколько остальные запросы ждут начала ответа первого (записи кэша)
+DATA_REFERENCE = "(данные чата приведены выше)"
+STATS_REFERENCE = "(статистика приведена выше)"
+
+# Готовые задачи для отчётов (ключ — аргумент команды /multianalyze)
+PROMPT_PRESETS = {
+    'quality': (
+        "Качество поддержки",
+        """По данным переписки выше оцени качество работы службы поддержки:
+
+1. **Полнота и точность ответов** — решаются ли вопросы клиентов с первого ответа, типичные неполные или неверные ответы.
+2. **Тон общения** — вежливость, эмпатия, шаблонность ответов.
+3. **Повторные обращения** — вопросы, по которым клиентам приходилось писать несколько раз.
+
+Статистика по менеджерам и времени ответа добавляется в отчёт автоматически — не пересчитывай её.
+Формат: структурированный текст без таблиц, без номеров строк, без рекомендаций в конце. На русском языке."""
+    ),
+    'product': (
+        "Отзывы о продукте",
+        """По данным переписки выше собери обратную связь клиентов о продукте и сервисе:
+
+1. **Запрошенные функции и доработки** — что клиенты просят добавить или изменить.
+2. **Ошибки и неудобства** — на что клиенты жалуются в работе сервиса.
+3. **Положительные отзывы** — что клиентам нравится.
+
+Для каждого пункта укажи примерную частоту упоминаний.
+Формат: структурированный текст без таблиц, без номеров строк, без рекомендаций в конце. На русском языке."""
+    ),
+    'conflicts': (
+        "Разбор конфликтов",
+        """По данным переписки выше разбери конфликтные ситуации с клиентами:
+
+1. **Конфликты** — кратко суть каждого заметного конфликта и его дата.
+2. **Причины** — что привело к недовольству (сроки, ошибки, коммуникация).
+3. **Как завершились** — решена ли проблема, ушёл ли клиент недовольным.
+
+Формат: структурированный текст без таблиц, без номеров строк, без рекомендаций в конце. На русском языке."""
+    ),
+}
+
+
+@dataclass
+class PromptSpec:
+    """Один отчёт задачи: заголовок и промпт (None — стандартный промпт анализа)"""
+    title: str
+    prompt: Optional[str] = None
+
+
+@dataclass
+class MultiPromptResult:
+    """Результат задачи: тексты отчётов по порядку промптов и общие локальные разделы"""
+    reports: list  # [(title, text)]
+    appendix: str
+
+    def combined(self) -> str:
+        """Один документ: отчёты разделами первого уровня, затем статистика"""
+        sections = [f"# {title}\n\n{text}" for title, text in self.reports]
+        return "\n\n".join(sections + [self.appendix])
+
+    def separate(self) -> list:
+        """Отдельные документы: [(title, текст отчёта со статистикой)]"""
+        return [(title, f"{text}\n\n{self.appendix}") for title, text in self.reports]
+
+
+def resolve_prompt_specs(keys: List[str], custom_prompt: Optional[str] = None) -> List[PromptSpec]:
+    """
+    Промпты по ключам PROMPT_PRESETS; 'custom' — промпт пользователя (/setprompt), 'default' — стандартный.
+
+    Raises:
+        ValueError: Неизвестный ключ
+    """
+    specs = []
+    for key in keys:
+        if key in PROMPT_PRESETS:
+            title, prompt = PROMPT_PRESETS[key]
+            specs.append(PromptSpec(title, prompt))
+        elif key == 'custom':
+            specs.append(PromptSpec("Отчёт по вашему промпту", custom_prompt))
+        elif key == 'default':
+            specs.append(PromptSpec("Анализ обращений"))
+        else:
+            raise ValueError(
+                f"Неизвестный отчёт: {key}. Доступны: {', '.join(list(PROMPT_PRESETS) + ['custom', 'default'])}"
+            )
+    return specs
+
+
+def shared_prefix(plan) -> str:
+    """Общий для всех запросов блок: вступление, данные чата и статистика"""
+    return (
+        f"{plan.context}Данные чата (компактный формат: легенда отправителей, заголовки дней, "
+        f"время ЧЧ:ММ; подряд идущие сообщения одного отправителя склеены через \" | \"; "
+        f"пометка [×N] — похожее сообщение встречалось N раз, приведён первый пример):\n"
+        f"{plan.data}\n\n"
+        f"Статистика по менеджерам и времени ответа (рассчитана точно по всему файлу, "
+        f"добавляется в отчёт автоматически):\n{plan.stats_text}"
+    )
+
+
+def task_prompt(prompt: Optional[str], context: Optional[PromptContext] = None) -> str:
+    """
+    Задача одного отчёта без данных: {csv_content}/{stats} заменяются ссылками на префикс,
+    остальные переменные промпта — значениями (context общий для всех отчётов задачи).
+    """
+    if prompt:
+        task = prompt.replace("{csv_content}", DATA_REFERENCE).replace("{stats}", STATS_REFERENCE)
+        return render_prompt(task, context) if context is not None else task
+    return build_analysis_prompt(DATA_REFERENCE, STATS_REFERENCE)
+
+
+def build_content(prefix: str, prompt: Optional[str], context: Optional[PromptContext] = None) -> list:
+    """Блоки content запроса: префикс с cache_control (общий для всех отчётов) + задача"""
+    return [
+        {"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": task_prompt(prompt, context)},
+    ]
+
+
+def _plan(
+        df,
+        specs: List[PromptSpec],
+        client,
+        models: ModelTiers,
+        context: PromptContext,
+        stats_text: Optional[str] = None,
+        dialogues_text: Optional[str] = None
+):
+    """План общего запроса: данные должны поместиться в один запрос (при необходимости — выборка)"""
+    longest = max((spec.prompt or "" for spec in specs), key=len) or None
+    plan = plan_analysis(
+        df, longest, client=client, oversize_mode="sample", models=models,
+        include_data=True, prompt_context=context, stats_text=stats_text,
+        dialogues_text=dialogues_text
+    )
+    if plan.estimate.strategy == STRATEGY_CHUNKED:
+        raise ValueError(
+            "Чат слишком большой для нескольких отчётов за один запрос. "
+            "Запустите отчёты по отдельности (/analyze) — большие чаты анализируются по частям."
+        )
+    return plan
+
+
+def _estimate(plan, specs: List[PromptSpec], context: PromptContext) -> PreflightEstimate:
+    """Оценка: префикс записывается в кэш один раз, затем каждый отчёт — задача + ответ"""
+    prefix_tokens = estimate_tokens(shared_prefix(plan))
+    task_tokens = [estimate_tokens(task_prompt(spec.prompt, context)) for spec in specs]
+    return PreflightEstimate(
+        strategy=plan.estimate.strategy,
+        raw_tokens=plan.estimate.raw_tokens,
+        compact_tokens=plan.estimate.compact_tokens,
+        request_tokens=plan.estimate.request_tokens,
+        total_tokens=prefix_tokens + sum(task_tokens) + len(specs) * MAX_TOKENS,
+        requests=len(specs),
+        exact=False,
+    )
+
+
+def _read_chat(file_path: str) -> tuple:
+    """
+    Прочитать чат (большой — блоками, в пределах памяти) и подготовить общий PromptContext.
+
+    Returns:
+        (PromptContext, статистика и сводка диалогов по всему файлу — None, если считаются по данным)
+    """
+    chat = read_chat_for_analysis(file_path)
+    check_required_columns(chat.frame)
+    stats_text, dialogues_text = chat_report_texts(chat)
+    context = PromptContext(chat.frame, stats_text=stats_text, stats=chat.stats, dialogues_text=dialogues_text)
+    return context, stats_text, dialogues_text
+
+
+def preflight_multi(
+        file_path: str,
+        specs: List[PromptSpec],
+        claude_api_key: Optional[str] = None,
+        models: Optional[ModelTiers] = None
+) -> PreflightEstimate:
+    """Оценка токенов задачи с несколькими отчётами"""
+    client = get_client(api_key=claude_api_key) if claude_api_key else None
+    context, stats_text, dialogues_text = _read_chat(file_path)
+    plan = _plan(context.df, specs, client, models or ModelTiers(), context, stats_text, dialogues_text)
+    return _estimate(plan, specs, context)
+
+
+def analyze_csv_multi(
+        file_path: str,
+        specs: List[PromptSpec],
+        claude_api_key: Optional[str] = None,
+        on_wait: Optional[Callable[[float], None]] = None,
+        usage: Optional[UsageTracker] = None,
+        stream: Optional[ResponseStream] = None,
+        models: Optional[ModelTiers] = None
+) -> MultiPromptResult:
+    """
+    N отчётов по одному чату: данные отправляются общим префиксом с cache_control.
+
+    Первый запрос записывает префикс в кэш; как только начинает поступать его
+    ответ, остальные запросы отправляются параллельно и читают префикс из кэша.
+    Общее время — примерно один запрос, входные токены — заметно меньше N×.
+
+    Args:
+        file_path: Путь к CSV файлу
+        specs: Отчёты (заголовок + промпт)
+        claude_api_key: Claude API ключ
+        on_wait: Колбэк ожидания квоты rate limiter
+        usage: Учёт израсходованных токенов
+        stream: Приёмник прогресса (этапы; текст отчётов не транслируется)
+        models: Модели по уровням (отчёты пишет models.report)
+
+    Returns:
+        MultiPromptResult
+
+    Raises:
+        ValueError: Нет обязательных колонок, чат не помещается в один запрос или пустой ответ
+    """
+    if not specs:
+        raise ValueError("Не выбрано ни одного отчёта")
+    models = models or ModelTiers()
+    client = get_client(api_key=claude_api_key)
+    # Переменные промптов считаются один раз на все отчёты
+    prompt_context, stats_text, dialogues_text = _read_chat(file_path)
+    plan = _plan(prompt_context.df, specs, client, models, prompt_context, stats_text, dialogues_text)
+    prefix = shared_prefix(plan)
+    total = len(specs)
+    logger.info(f"📑 {total} отчётов по общему префиксу ~{estimate_tokens(prefix):,} токенов ({models.report})")
+
+    cache_ready = threading.Event()
+    done = [0]
+    done_lock = threading.Lock()
+
+    if stream is not None:
+        stream.set_stage(f"📑 Отчёты: 0/{total}")
+
+    def run(index: int) -> str:
+        spec = specs[index]
+        if index == 0:
+            # Первый фрагмент ответа — префикс уже в кэше
+            trigger = ResponseStream(on_text=lambda text: cache_ready.set())
+        else:
+            trigger = None
+            if not cache_ready.wait(CACHE_WAIT_SECONDS):
+                logger.warning("⚠️ Кэш префикса не подтверждён — запрос без ожидания")
+        try:
+            message = create_message(
+                client, build_content(prefix, spec.prompt, prompt_context), on_wait=on_wait, usage=usage,
+                stream=trigger, model=models.report
+            )
+        finally:
+            if index == 0:
+                cache_ready.set()
+        text = message_text(message)
+        if not text:
+            raise ValueError(f"Пустой ответ от Claude API: {spec.title}")
+
+        logger.info(f"✅ Отчёт «{spec.title}» готов")
+        if stream is not None:
+            with done_lock:
+                done[0] += 1
+                stage = f"📑 Отчёты: {done[0]}/{total}"
+            stream.set_stage(stage)
+        return text
+
+    with ThreadPoolExecutor(max_workers=total, thread_name_prefix="prompt") as executor:
+        texts = list(executor.map(run, range(total)))
+
+    if usage is not None:
+        logger.info(f"💰 Токены по уровням моделей: {usage.describe_tiers()}")
+    return MultiPromptResult(
+        reports=[(spec.title, text) for spec, text in zip(specs, texts)],
+        appendix=plan.appendix,
+    )
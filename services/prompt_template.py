@@ -0,0 +1,224 @@
+# services/prompt_template.py
+"""Переменные пользовательских промптов: {stats}, {top_senders:N}, {sample:N}... — считаются лениво и один раз на чат"""
+
+import re
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from services.dedup import format_clusters_text
+from services.sessions import summarize_dialogues, format_dialogues_text
+from services.topics import extract_topics, format_topics_text
+from services.stats import (
+    ChatStats,
+    prepare_messages,
+    compute_chat_stats,
+    format_stats_text,
+    ROLE_CLIENT,
+    ROLE_SUPPORT,
+    DAYS_RU,
+    _fmt_minutes,
+)
+
+logger = logging.getLogger(__name__)
+
+DATA_PLACEHOLDER = "{csv_content}"  # Данные чата: подставляются при планировании запроса (лимит, части, выборка)
+# {имя} или {имя:аргумент}; фигурные скобки с другим содержимым (например, JSON) не трогаются
+VARIABLE_RE = re.compile(r"\{([a-z_]+)(?::([0-9]+))?\}")
+
+ROLE_LABELS = {ROLE_SUPPORT: "менеджер", ROLE_CLIENT: "клиент"}
+
+
+class PromptContext:
+    """
+    Данные одного чата для подстановки переменных.
+
+    Каждая переменная (и общие промежуточные расчёты — роли, статистика,
+    сжатие) считается при первом обращении и запоминается, поэтому
+    несколько промптов по одному чату ничего не пересчитывают.
+    """
+
+    def __init__(
+            self,
+            df: pd.DataFrame,
+            stats_text: Optional[str] = None,
+            stats: Optional[ChatStats] = None,
+            dialogues_text: Optional[str] = None
+    ):
+        """
+        Args:
+            df: Данные чата (Date/From/Text)
+            stats_text: Готовая статистика (например, инкрементальная по всему чату)
+            stats: Готовая ChatStats (файл прочитан блоками, в df — выборка)
+            dialogues_text: Готовая сводка диалогов (файл прочитан блоками)
+        """
+        self.df = df
+        self._memo: Dict[tuple, object] = {}
+        if stats_text is not None:
+            self._memo[('stats', None)] = stats_text
+        if stats is not None:
+            self._memo[('_stats',)] = stats
+        if dialogues_text is not None:
+            self._memo[('dialogues', None)] = dialogues_text
+
+    def memo(self, key: tuple, compute: Callable[[], object]):
+        """Значение по ключу: посчитать при первом обращении"""
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
+    @property
+    def messages(self) -> pd.DataFrame:
+        return self.memo(('_messages',), lambda: prepare_messages(self.df))
+
+    @property
+    def stats(self):
+        return self.memo(('_stats',), lambda: compute_chat_stats(self.df))
+
+    @property
+    def compaction(self) -> tuple:
+        """(сжатые сообщения, CompactionReport) — с кластерами повторов"""
+        # services/analyzer.py импортирует этот модуль — импорт здесь, а не на уровне модуля
+        from services.analyzer import compact_messages, COMPACT_MAX_MESSAGE_CHARS
+        return self.memo(('_compaction',), lambda: compact_messages(
+            self.df, max_message_chars=COMPACT_MAX_MESSAGE_CHARS, collapse_near=True
+        ))
+
+    def value(self, name: str, arg: Optional[int] = None) -> str:
+        """Текст переменной name (с аргументом arg)"""
+        variable = PROMPT_VARIABLES[name]
+        arg = variable.default if arg is None else arg
+        return self.memo((name, arg), lambda: variable.compute(self, arg))
+
+
+@dataclass(frozen=True)
+class PromptVariable:
+    """Переменная промпта: описание для справки, расчёт и аргумент по умолчанию"""
+    description: str
+    compute: Callable[[PromptContext, Optional[int]], str]
+    default: Optional[int] = None
+
+
+def _stats(context: PromptContext, arg: Optional[int]) -> str:
+    return format_stats_text(context.stats)
+
+
+def _top_senders(context: PromptContext, limit: int) -> str:
+    messages = context.messages
+    counts = messages.groupby(['From', 'Role']).size().sort_values(ascending=False, kind='mergesort')
+    lines = [
+        f"- {sender} ({ROLE_LABELS.get(role, role)}): {count} сообщений"
+        for (sender, role), count in counts.head(limit).items()
+    ]
+    return "\n".join(lines) or "Сообщений нет."
+
+
+def _daily_volume(context: PromptContext, arg: Optional[int]) -> str:
+    messages = context.messages
+    if messages.empty:
+        return "Сообщений нет."
+    daily = messages.groupby('Day').agg(
+        total=('Role', 'size'),
+        clients=('Role', lambda roles: int((roles == ROLE_CLIENT).sum())),
+    )
+    return "\n".join(
+        f"- {day:%d-%m-%Y} ({DAYS_RU[day.dayofweek]}): сообщений {row.total}, от клиентов {row.clients}"
+        for day, row in daily.iterrows()
+    )
+
+
+def _response_times(context: PromptContext, arg: Optional[int]) -> str:
+    stats = context.stats
+    lines = [
+        f"- {day_type}: среднее {_fmt_minutes(row['mean'])}, медиана {_fmt_minutes(row['median'])} "
+        f"(вопросов: {int(row['questions'])})"
+        for day_type, row in stats.day_type_summary().iterrows()
+    ]
+    for manager, row in stats.manager_summary().iterrows():
+        if row['answered']:
+            lines.append(
+                f"- {manager}: медиана в будни {_fmt_minutes(row['median_weekday'])}, "
+                f"в выходные {_fmt_minutes(row['median_weekend'])} (ответов: {int(row['answered'])})"
+            )
+    return "\n".join(lines)
+
+
+def _dialogues(context: PromptContext, arg: Optional[int]) -> str:
+    return format_dialogues_text(summarize_dialogues(context.df)) or "Сообщений нет."
+
+
+def _dedup_clusters(context: PromptContext, limit: int) -> str:
+    _, report = context.compaction
+    return format_clusters_text(report.clusters, top=limit) or "Повторяющихся сообщений клиентов нет."
+
+
+def _topics(context: PromptContext, limit: Optional[int]) -> str:
+    topics = context.memo(('_topics',), lambda: extract_topics(context.df))
+    return format_topics_text(topics, top=limit) or "Темы обращений не выделены."
+
+
+def _sample(context: PromptContext, count: int) -> str:
+    from services.analyzer import render_compact
+    compacted, _ = context.compaction
+    if len(compacted) > count:
+        positions = np.unique(np.linspace(0, len(compacted) - 1, count).round().astype(np.int64))
+        compacted = compacted.iloc[positions]
+    return render_compact(compacted)
+
+
+# Имя -> переменная. {csv_content} сюда не входит: данные подставляются при планировании запроса
+PROMPT_VARIABLES: Dict[str, PromptVariable] = {
+    'stats': PromptVariable("статистика по менеджерам и времени ответа", _stats),
+    'top_senders': PromptVariable("самые активные отправители, {top_senders:N} — первые N", _top_senders, 10),
+    'daily_volume': PromptVariable("сообщений по дням", _daily_volume),
+    'response_times': PromptVariable("время ответа: будни/выходные и по менеджерам", _response_times),
+    'dialogues': PromptVariable("диалоги и время первого ответа", _dialogues),
+    'dedup_clusters': PromptVariable(
+        "частые повторяющиеся сообщения клиентов, {dedup_clusters:N} — первые N", _dedup_clusters, 15
+    ),
+    'topics': PromptVariable(
+        "темы обращений клиентов с точным числом сообщений (TF-IDF), {topics:N} — первые N", _topics
+    ),
+    'sample': PromptVariable("N сообщений равномерно по периоду (вместо всех данных): {sample:N}", _sample, 50),
+}
+
+
+def find_variables(template: Optional[str]) -> List[tuple]:
+    """Переменные шаблона [(имя, аргумент или None)], включая неизвестные"""
+    if not template:
+        return []
+    return [(name, int(arg) if arg else None) for name, arg in VARIABLE_RE.findall(template)]
+
+
+def unknown_variables(template: Optional[str]) -> List[str]:
+    """Имена в фигурных скобках, которые не являются переменными (для предупреждения в боте)"""
+    known = set(PROMPT_VARIABLES) | {DATA_PLACEHOLDER.strip("{}")}
+    return sorted({name for name, _ in find_variables(template) if name not in known})
+
+
+def render_prompt(template: str, context: PromptContext) -> str:
+    """
+    Подставить переменные в шаблон; считаются только упомянутые в нём.
+
+    {csv_content} и неизвестные имена остаются как есть.
+
+    Args:
+        template: Промпт пользователя
+        context: Данные чата (PromptContext)
+
+    Returns:
+        Промпт с подставленными значениями
+    """
+    def substitute(match: re.Match) -> str:
+        name, arg = match.group(1), match.group(2)
+        if name not in PROMPT_VARIABLES:
+            return match.group(0)
+        return context.value(name, int(arg) if arg else None)
+
+    names = sorted({name for name, _ in find_variables(template) if name in PROMPT_VARIABLES})
+    if names:
+        logger.info(f"🧮 Переменные промпта: {', '.join(names)}")
+    return VARIABLE_RE.sub(substitute, template)
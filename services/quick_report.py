@@ -0,0 +1,341 @@
+# services/quick_report.py
+"""Мгновенный отчёт без Claude: статистика и темы обращений считаются локально, DOCX с таблицами и графиками"""
+
+import io
+import asyncio
+import logging
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Callable
+
+import numpy as np
+import pandas as pd
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.shared import Inches
+
+from core.config import get_input_folder, get_output_folder
+from services.docx_render import new_document, get_render_pool, _discard_broken_pool, _has_style
+from services.ingest import CHAT_COLUMNS, read_chat_csv
+from services.stats import (
+    DAYS_RU,
+    ROLE_CLIENT,
+    ROLE_SUPPORT,
+    ROLE_SYSTEM,
+    compute_responses,
+    prepare_messages,
+    _fmt_minutes,
+)
+from services.topics import extract_topics
+
+logger = logging.getLogger(__name__)
+
+try:
+    # Графики строятся через Figure без pyplot: не нужен GUI backend, безопасно в потоках
+    from matplotlib.figure import Figure
+    MATPLOTLIB_AVAILABLE = True
+except ImportError:
+    MATPLOTLIB_AVAILABLE = False
+
+SENDER_ROWS = 30  # Отправителей в таблице
+BUSIEST_SLOTS = 10  # Самых загруженных часов недели
+UNANSWERED_ROWS = 50  # Последних сообщений клиентов без ответа
+TEXT_PREVIEW_CHARS = 200
+DAILY_TABLE_MAX_DAYS = 62  # Длиннее — таблица по неделям (если графики недоступны)
+
+# Интервалы времени первого ответа, минуты
+DELAY_EDGES = [5, 15, 30, 60, 120, 240]
+DELAY_LABELS = ['до 5 мин', '5–15 мин', '15–30 мин', '30–60 мин', '1–2 ч', '2–4 ч', 'больше 4 ч']
+
+ROLE_LABELS = {ROLE_SUPPORT: "менеджер", ROLE_CLIENT: "клиент", ROLE_SYSTEM: "служебный"}
+CHART_WIDTH = Inches(6.3)
+
+
+@dataclass
+class QuickReport:
+    """Статистика чата для мгновенного отчёта (все цифры — по всему файлу)"""
+    source: str
+    messages: int
+    first_date: Optional[pd.Timestamp]
+    last_date: Optional[pd.Timestamp]
+    by_day: pd.Series  # День -> сообщений (дни без сообщений — 0)
+    by_hour: np.ndarray  # 24 значения: сообщений по часу суток
+    busiest: pd.DataFrame  # Day, Hour, Messages
+    senders: pd.DataFrame  # From, Role, Messages, Share
+    senders_total: int
+    delays: np.ndarray  # Время первого ответа, минуты (только отвеченные вопросы)
+    delay_bins: pd.Series  # Интервал -> вопросов
+    questions: int
+    unanswered: pd.DataFrame  # Date, From, Text — последние сообщения клиентов без ответа
+    unanswered_total: int
+    topics: pd.DataFrame  # Topic, Count, Share, Examples — темы обращений клиентов (services/topics.py)
+
+    @property
+    def peak_hour(self) -> Optional[int]:
+        return int(np.argmax(self.by_hour)) if self.messages else None
+
+    def summary(self) -> str:
+        """Краткая сводка (подпись к файлу в боте, сообщение в GUI)"""
+        if not self.messages:
+            return "Сообщений нет"
+        lines = [
+            f"📨 Сообщений: {self.messages:,} ({self.first_date:%d.%m.%Y} — {self.last_date:%d.%m.%Y})",
+            f"👥 Отправителей: {self.senders_total}",
+            f"❓ Вопросов клиентов: {self.questions:,}, без ответа в тот же день: {self.unanswered_total:,}",
+        ]
+        if len(self.delays):
+            lines.append(
+                f"⏱ Первый ответ: медиана {_fmt_minutes(float(np.median(self.delays)))}, "
+                f"среднее {_fmt_minutes(float(self.delays.mean()))}"
+            )
+        lines.append(f"🔥 Пиковый час: {self.peak_hour:02d}:00–{self.peak_hour:02d}:59")
+        return "\n".join(lines)
+
+
+def compute_quick_report(df: pd.DataFrame, source: str = "") -> QuickReport:
+    """
+    Статистика чата векторно (pandas/NumPy, без циклов по строкам).
+
+    Args:
+        df: Данные чата (Date/From/Text, Role — если есть)
+        source: Имя файла для заголовка
+
+    Returns:
+        QuickReport
+    """
+    messages = prepare_messages(df, extra_columns=('Text',))
+    responses = compute_responses(messages)
+
+    dates = messages['Date']
+    hours = dates.dt.hour.to_numpy()
+    slots = np.bincount(dates.dt.dayofweek.to_numpy() * 24 + hours, minlength=7 * 24)
+    top = np.argsort(-slots, kind='stable')[:BUSIEST_SLOTS]
+    top = top[slots[top] > 0]
+    busiest = pd.DataFrame({
+        'Day': [DAYS_RU[slot // 24] for slot in top],
+        'Hour': [f"{slot % 24:02d}:00–{slot % 24:02d}:59" for slot in top],
+        'Messages': slots[top],
+    })
+
+    by_day = messages.groupby('Day').size()
+    if not by_day.empty:
+        by_day = by_day.reindex(pd.date_range(by_day.index.min(), by_day.index.max(), freq='D'), fill_value=0)
+
+    senders = (
+        messages.groupby(['From', 'Role'], sort=False).size()
+        .sort_values(ascending=False, kind='mergesort').rename('Messages').reset_index()
+    )
+    senders['Share'] = senders['Messages'] / max(len(messages), 1)
+
+    delays = responses['Delay'].dropna().to_numpy() / 60
+    delay_bins = pd.Series(
+        np.bincount(np.searchsorted(DELAY_EDGES, delays, side='right'), minlength=len(DELAY_LABELS)),
+        index=DELAY_LABELS,
+    )
+
+    unanswered = messages[messages['Role'] == ROLE_CLIENT][responses['Delay'].isna().to_numpy()]
+    latest = unanswered.iloc[::-1].head(UNANSWERED_ROWS)
+
+    return QuickReport(
+        source=source,
+        messages=len(messages),
+        first_date=dates.min() if len(messages) else None,
+        last_date=dates.max() if len(messages) else None,
+        by_day=by_day,
+        by_hour=np.bincount(hours, minlength=24),
+        busiest=busiest,
+        senders=senders.head(SENDER_ROWS),
+        senders_total=len(senders),
+        delays=delays,
+        delay_bins=delay_bins,
+        questions=len(responses),
+        unanswered=pd.DataFrame({
+            'Date': latest['Date'].to_numpy(),
+            'From': latest['From'].to_numpy(),
+            'Text': latest['Text'].astype(str).str.slice(0, TEXT_PREVIEW_CHARS).to_numpy(),
+        }),
+        unanswered_total=len(unanswered),
+        topics=extract_topics(df),
+    )
+
+
+def _chart(draw: Callable) -> Optional[bytes]:
+    """PNG графика (None — matplotlib не установлен)"""
+    if not MATPLOTLIB_AVAILABLE:
+        return None
+    figure = Figure(figsize=(7, 2.8), dpi=110)
+    axes = figure.subplots()
+    draw(axes)
+    axes.grid(axis='y', alpha=0.3)
+    figure.tight_layout()
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+
+def _add_chart(doc, png: Optional[bytes]) -> bool:
+    if png is None:
+        return False
+    doc.add_picture(io.BytesIO(png), width=CHART_WIDTH)
+    return True
+
+
+def _add_table(doc, header: list, rows: list):
+    table = doc.add_table(rows=1, cols=len(header))
+    if _has_style(doc, 'Table Grid'):
+        table.style = 'Table Grid'
+    for cell, text in zip(table.rows[0].cells, header):
+        cell.paragraphs[0].add_run(text).bold = True
+    for values in rows:
+        for cell, value in zip(table.add_row().cells, values):
+            cell.text = str(value)
+
+
+def render_quick_report(report: QuickReport, output_file_path: str) -> str:
+    """
+    Построить и сохранить DOCX мгновенного отчёта.
+
+    Графики — при установленном matplotlib; без него те же данные выводятся таблицами.
+
+    Returns:
+        Путь к сохранённому файлу
+    """
+    doc = new_document()
+    title = doc.add_heading(f'Статистика чата: {report.source}', 0)
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    doc.add_paragraph(f"Дата создания отчёта: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}")
+    doc.add_paragraph("Расчёт локальный, без Claude: все цифры точные по всему файлу.")
+    if not MATPLOTLIB_AVAILABLE:
+        doc.add_paragraph("Графики недоступны (не установлен matplotlib) — данные приведены таблицами.")
+
+    doc.add_heading("Общие показатели", 1)
+    for line in report.summary().splitlines():
+        doc.add_paragraph(line)
+    if not report.messages:
+        doc.save(output_file_path)
+        return output_file_path
+
+    doc.add_heading("Сообщения по дням", 1)
+    days = report.by_day
+    if not _add_chart(doc, _chart(lambda ax: ax.bar(days.index, days.to_numpy(), color='#1f6aa5'))):
+        if len(days) > DAILY_TABLE_MAX_DAYS:
+            weeks = days.resample('W-MON', label='left', closed='left').sum()
+            _add_table(doc, ["Неделя с", "Сообщений"], [(f"{day:%d.%m.%Y}", count) for day, count in weeks.items()])
+        else:
+            _add_table(doc, ["День", "Сообщений"], [
+                (f"{day:%d.%m.%Y} ({DAYS_RU[day.dayofweek]})", count) for day, count in days.items()
+            ])
+
+    doc.add_heading("Сообщения по часам суток", 1)
+    if not _add_chart(doc, _chart(lambda ax: ax.bar(range(24), report.by_hour, color='#28a745'))):
+        _add_table(doc, ["Час", "Сообщений"], [(f"{hour:02d}:00", count) for hour, count in enumerate(report.by_hour)])
+
+    doc.add_heading("Самое загруженное время", 1)
+    _add_table(doc, ["День недели", "Час", "Сообщений"], report.busiest.itertuples(index=False))
+
+    doc.add_heading("Сообщения по отправителям", 1)
+    if report.senders_total > len(report.senders):
+        doc.add_paragraph(f"Показаны {len(report.senders)} самых активных из {report.senders_total}.")
+    _add_table(doc, ["Отправитель", "Роль", "Сообщений", "Доля"], [
+        (row.From, ROLE_LABELS.get(row.Role, row.Role), row.Messages, f"{row.Share:.1%}")
+        for row in report.senders.itertuples(index=False)
+    ])
+
+    doc.add_heading("Время первого ответа менеджера", 1)
+    bins = report.delay_bins
+    if len(report.delays):
+        q50, q90 = np.percentile(report.delays, [50, 90])
+        doc.add_paragraph(
+            f"Отвечено в тот же день: {len(report.delays):,} из {report.questions:,} вопросов; "
+            f"медиана — {_fmt_minutes(q50)}, 90% ответов — быстрее {_fmt_minutes(q90)}."
+        )
+        _add_chart(doc, _chart(lambda ax: ax.bar(bins.index, bins.to_numpy(), color='#fd7e14')))
+    _add_table(doc, ["Время ответа", "Вопросов"], bins.items())
+
+    if not report.topics.empty:
+        doc.add_heading("Темы обращений клиентов", 1)
+        doc.add_paragraph("Выделены по словам и словосочетаниям всех сообщений клиентов; количества точные.")
+        _add_table(doc, ["Тема", "Сообщений", "Доля", "Пример"], [
+            (row.Topic, row.Count, f"{row.Share:.1%}", row.Examples[0] if row.Examples else "")
+            for row in report.topics.itertuples(index=False)
+        ])
+
+    doc.add_heading("Сообщения клиентов без ответа в тот же день", 1)
+    if report.unanswered.empty:
+        doc.add_paragraph("Таких сообщений нет.")
+    else:
+        doc.add_paragraph(f"Всего: {report.unanswered_total:,}. Показаны последние {len(report.unanswered)}.")
+        _add_table(doc, ["Дата", "Клиент", "Сообщение"], [
+            (f"{row.Date:%d.%m.%Y %H:%M}", row.From, row.Text) for row in report.unanswered.itertuples(index=False)
+        ])
+
+    doc.save(output_file_path)
+    return output_file_path
+
+
+def build_quick_report(file_path: str, output_file_path: str, source_filename: Optional[str] = None) -> str:
+    """
+    Прочитать CSV, посчитать статистику и сохранить DOCX (выполняется в процессе пула рендеринга).
+
+    Returns:
+        Краткая сводка (QuickReport.summary)
+
+    Raises:
+        ValueError: В файле нет колонок Date/From/Text
+    """
+    df = read_chat_csv(file_path)
+    missing = [column for column in CHAT_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError(f"Отсутствуют обязательные колонки: {missing}")
+
+    report = compute_quick_report(df, source_filename or Path(file_path).name)
+    render_quick_report(report, output_file_path)
+    logger.info(f"📊 Мгновенный отчёт: {output_file_path}")
+    return report.summary()
+
+
+def quick_report_path(output_folder: str, filename: str) -> str:
+    """Путь DOCX мгновенного отчёта: <имя CSV>_stats.docx"""
+    return str(Path(output_folder) / f"{Path(filename).stem}_stats.docx")
+
+
+async def build_quick_report_async(file_path: str, output_file_path: str, source_filename: str) -> str:
+    """build_quick_report из event loop: в пуле процессов, не занимая GIL бота"""
+    loop = asyncio.get_running_loop()
+    pool = get_render_pool()
+    try:
+        return await loop.run_in_executor(pool, build_quick_report, file_path, output_file_path, source_filename)
+    except BrokenProcessPool as e:
+        logger.warning(f"⚠️ Пул рендеринга недоступен ({e}) — расчёт в потоке")
+        _discard_broken_pool(pool)
+        return await loop.run_in_executor(None, build_quick_report, file_path, output_file_path, source_filename)
+
+
+def quick_report_folder(input_folder: Optional[str] = None, output_folder: Optional[str] = None) -> dict:
+    """
+    Мгновенные отчёты по всем CSV папки (параллельно в пуле процессов). CSV файлы не удаляются.
+
+    Returns:
+        Словарь с результатами: {'success': int, 'errors': int, 'details': list, 'reports': list}
+    """
+    input_path = Path(input_folder or get_input_folder())
+    output_path = Path(output_folder or get_output_folder())
+    output_path.mkdir(parents=True, exist_ok=True)
+    csv_files = sorted({f.resolve() for f in list(input_path.glob("*.csv")) + list(input_path.glob("*.CSV"))})
+
+    pool = get_render_pool()
+    futures = {
+        csv_file: pool.submit(build_quick_report, str(csv_file), quick_report_path(output_path, csv_file.name),
+                              csv_file.name)
+        for csv_file in csv_files
+    }
+    reports, details = [], []
+    for csv_file, future in futures.items():
+        try:
+            future.result()
+            reports.append(quick_report_path(output_path, csv_file.name))
+        except Exception as e:
+            logger.error(f"❌ Мгновенный отчёт {csv_file.name}: {e}")
+            details.append(f"{csv_file.name}: {e}")
+    return {'success': len(reports), 'errors': len(details), 'details': details, 'reports': reports}
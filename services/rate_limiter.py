@@ -0,0 +1,218 @@
+# services/rate_limiter.py
+"""Rate limiter для Claude API (requests-per-minute + tokens-per-minute)"""
+
+import time
+import threading
+import logging
+from datetime import datetime, timezone
+from typing import Optional, Callable, Dict, Mapping
+
+from core.config import CLAUDE_RPM_LIMIT, CLAUDE_TPM_LIMIT
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Классический token bucket.
+
+    Ёмкость = лимит за минуту, пополнение равномерное (capacity / 60 в секунду).
+    Не потокобезопасен сам по себе — синхронизацию обеспечивает RateLimiter.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(max(per_minute, 1))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        """Скорость пополнения (единиц в секунду)"""
+        return self.capacity / 60.0
+
+    def refill(self, now: float):
+        """Пополнить bucket на время, прошедшее с последнего обновления"""
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """Сколько секунд ждать, пока в bucket наберётся amount единиц"""
+        # Запрос больше ёмкости никогда не поместится целиком — ждём полный bucket
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def set_limit(self, per_minute: int):
+        """Обновить ёмкость (например, по заголовкам ответа API)"""
+        per_minute = float(max(per_minute, 1))
+        if per_minute != self.capacity:
+            self.tokens = min(self.tokens, per_minute)
+            self.capacity = per_minute
+
+    def clamp(self, remaining: float):
+        """Не позволять локальному счётчику превышать остаток, сообщённый сервером"""
+        self.tokens = min(self.tokens, max(remaining, 0.0))
+
+
+class RateLimiter:
+    """
+    Общий лимитер запросов к Claude API.
+
+    Один экземпляр разделяется всеми потоками, работающими с одним API ключом.
+    Перед каждым запросом вызывается acquire() с оценкой входных токенов,
+    после ответа — update_from_headers() с заголовками anthropic-ratelimit-*.
+    """
+
+    def __init__(self, requests_per_minute: int = CLAUDE_RPM_LIMIT, tokens_per_minute: int = CLAUDE_TPM_LIMIT):
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int = 0, on_wait: Optional[Callable[[float], None]] = None) -> float:
+        """
+        Дождаться разрешения на запрос.
+
+        Args:
+            tokens: Оценка входных токенов запроса
+            on_wait: Колбэк, вызываемый перед ожиданием (получает секунды ожидания)
+
+        Returns:
+            Суммарное время ожидания в секундах
+        """
+        waited = 0.0
+        notified = False
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._requests.refill(now)
+                self._tokens.refill(now)
+
+                delay = max(
+                    self._blocked_until - now,
+                    self._requests.wait_time(1),
+                    self._tokens.wait_time(tokens),
+                )
+
+                if delay <= 0:
+                    self._requests.tokens -= 1
+                    # Большие запросы могут увести bucket в минус — это честный "долг"
+                    self._tokens.tokens -= tokens
+                    return waited
+
+            if on_wait and not notified:
+                on_wait(delay)
+                notified = True
+
+            logger.debug(f"⏳ Rate limiter: ожидание {delay:.1f} сек")
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: float):
+        """Заблокировать все запросы на seconds секунд (retry-after / 429)"""
+        if seconds <= 0:
+            return
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        logger.warning(f"⏳ Rate limit API: пауза {seconds:.1f} сек")
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """
+        Синхронизировать лимитер с заголовками ответа API.
+
+        Используются anthropic-ratelimit-requests-* и
+        anthropic-ratelimit-input-tokens-* (или общие tokens-*), а также retry-after.
+        """
+        if not headers:
+            return
+
+        requests_limit = _header_int(headers, "anthropic-ratelimit-requests-limit")
+        requests_remaining = _header_int(headers, "anthropic-ratelimit-requests-remaining")
+        requests_reset = _header_reset(headers, "anthropic-ratelimit-requests-reset")
+
+        tokens_prefix = "anthropic-ratelimit-input-tokens"
+        if _header_int(headers, f"{tokens_prefix}-limit") is None:
+            tokens_prefix = "anthropic-ratelimit-tokens"
+        tokens_limit = _header_int(headers, f"{tokens_prefix}-limit")
+        tokens_remaining = _header_int(headers, f"{tokens_prefix}-remaining")
+        tokens_reset = _header_reset(headers, f"{tokens_prefix}-reset")
+
+        with self._lock:
+            now = time.monotonic()
+            self._requests.refill(now)
+            self._tokens.refill(now)
+
+            if requests_limit:
+                self._requests.set_limit(requests_limit)
+            if requests_remaining is not None:
+                self._requests.clamp(requests_remaining)
+                if requests_remaining == 0 and requests_reset:
+                    self._blocked_until = max(self._blocked_until, now + requests_reset)
+
+            if tokens_limit:
+                self._tokens.set_limit(tokens_limit)
+            if tokens_remaining is not None:
+                self._tokens.clamp(tokens_remaining)
+
+        retry_after = parse_retry_after(headers)
+        if retry_after:
+            self.pause(retry_after)
+        elif tokens_remaining == 0 and tokens_reset:
+            self.pause(tokens_reset)
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """Значение заголовка retry-after в секундах (или None)"""
+    if not headers:
+        return None
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        return None
+
+
+def _header_int(headers: Mapping[str, str], name: str) -> Optional[int]:
+    """Безопасное получение int из заголовка"""
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def _header_reset(headers: Mapping[str, str], name: str) -> Optional[float]:
+    """Секунды до момента сброса лимита (заголовок *-reset в формате RFC 3339)"""
+    value = headers.get(name)
+    if not value:
+        return None
+    try:
+        reset_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if reset_at.tzinfo is None:
+        reset_at = reset_at.replace(tzinfo=timezone.utc)
+    return max((reset_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+# Лимиты считаются на организацию, т.е. на API ключ — один лимитер на ключ
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(api_key: str) -> RateLimiter:
+    """Получить общий лимитер для API ключа"""
+    with _limiters_lock:
+        limiter = _limiters.get(api_key)
+        if limiter is None:
+            limiter = RateLimiter()
+            _limiters[api_key] = limiter
+        return limiter
@@ -0,0 +1,248 @@
+# services/relevance.py
+"""Локальная оценка значимости сообщений по словарю (векторно): шум отбрасывается, сигнал — в Claude"""
+
+import json
+import re
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from core.config import RELEVANCE_LEXICON, RELEVANCE_CONTEXT
+
+logger = logging.getLogger(__name__)
+
+# Граница слова: явный класс вместо \b — у pandas со строками на pyarrow RE2, где \b только ASCII
+WORD_START = "(?:^|[^0-9a-zа-яё])"
+LENGTH_BONUS = 0.5  # Добавка за длину (до LENGTH_BONUS_CHARS символов)
+LENGTH_BONUS_CHARS = 200
+NOISE_MAX_CHARS = 60  # Сообщения-шум короткие: длиннее не проверяются
+
+# Категория -> вес и признаки. terms — начала слов (регистр не важен), patterns — регулярные выражения
+DEFAULT_LEXICON: Dict[str, dict] = {
+    'question': {
+        'weight': 2.0,
+        'terms': [
+            'как', 'когда', 'где', 'почему', 'зачем', 'сколько', 'какой', 'какая', 'какие', 'каком',
+            'можно ли', 'подскажите', 'уточните', 'скажите', 'возможно ли', 'есть ли',
+        ],
+        'patterns': [r'\?'],
+    },
+    'complaint': {
+        'weight': 3.0,
+        'terms': [
+            'жалоб', 'претензи', 'проблем', 'ошибк', 'не приш', 'не пришл', 'не работает', 'не могу',
+            'не получ', 'задерж', 'опозд', 'потерял', 'потеря', 'брак', 'поврежд', 'возврат', 'верните',
+            'недостач', 'пересорт', 'штраф', 'сорвал', 'не отгруз', 'не доставл',
+        ],
+        'patterns': [],
+    },
+    'negative': {
+        'weight': 2.0,
+        'terms': [
+            'плохо', 'ужас', 'кошмар', 'безобраз', 'возмут', 'недовол', 'разочаров', 'сколько можно',
+            'опять', 'снова', 'до сих пор', 'безответ', 'игнор', 'хамств', 'отврат', 'срочно',
+        ],
+        'patterns': [r'!{2,}'],
+    },
+    'order': {
+        'weight': 1.5,
+        'terms': ['заказ', 'отгрузк', 'поставк', 'накладн', 'трек', 'артикул', 'счет', 'счёт', 'упд'],
+        'patterns': [r'[0-9]{6,}', r'№ ?[0-9]+'],
+    },
+    # Сообщения только из этих слов — шум (благодарности, подтверждения)
+    'noise': {
+        'weight': 0.0,
+        'terms': [
+            'спасибо', 'спс', 'благодарю', 'благодарим', 'большое', 'огромное', 'ок', 'окей', 'ok', 'okay',
+            'хорошо', 'понял', 'поняла', 'поняли', 'понятно', 'ясно', 'принято', 'принял', 'приняла',
+            'отлично', 'супер', 'ага', 'угу', 'thanks', 'thx', 'вам', 'тоже',
+        ],
+        'patterns': [],
+    },
+}
+
+
+@dataclass
+class Lexicon:
+    """Скомпилированный словарь: по одному регулярному выражению на категорию"""
+    weights: Dict[str, float] = field(default_factory=dict)
+    patterns: Dict[str, str] = field(default_factory=dict)
+    noise_words: str = ""  # Альтернатива слов-шума для удаления
+
+    @classmethod
+    def from_dict(cls, lexicon: Dict[str, dict]) -> 'Lexicon':
+        weights, patterns, noise = {}, {}, ""
+        for category, spec in lexicon.items():
+            terms = [re.escape(term.lower()) for term in spec.get('terms', [])]
+            if category == 'noise':
+                noise = "|".join(terms)
+                continue
+            parts = [f"{WORD_START}(?:{'|'.join(terms)})"] if terms else []
+            parts += spec.get('patterns', [])
+            if parts:
+                weights[category] = float(spec.get('weight', 1.0))
+                patterns[category] = "|".join(parts)
+        return cls(weights=weights, patterns=patterns, noise_words=noise)
+
+
+_lexicon: Optional[Lexicon] = None
+
+
+def load_lexicon(path: Optional[str] = None) -> Lexicon:
+    """
+    Словарь значимости: DEFAULT_LEXICON, дополненный JSON файлом RELEVANCE_LEXICON.
+
+    Формат файла: {"complaint": {"weight": 3, "terms": ["..."], "patterns": ["..."]}, ...};
+    категории из файла заменяют одноимённые стандартные, новые — добавляются.
+    """
+    global _lexicon
+    path = path if path is not None else RELEVANCE_LEXICON
+    if _lexicon is not None and path == RELEVANCE_LEXICON:
+        return _lexicon
+
+    lexicon = dict(DEFAULT_LEXICON)
+    if path:
+        with open(path, encoding='utf-8') as f:
+            lexicon.update(json.load(f))
+        logger.info(f"📚 Словарь значимости: {path}")
+
+    compiled = Lexicon.from_dict(lexicon)
+    if path == RELEVANCE_LEXICON:
+        _lexicon = compiled
+    return compiled
+
+
+def _normalize(texts: pd.Series) -> pd.Series:
+    return texts.fillna('').astype(str).str.lower()
+
+
+def score_messages(texts: pd.Series, lexicon: Optional[Lexicon] = None) -> np.ndarray:
+    """
+    Оценка значимости каждого сообщения: сумма весов найденных категорий + бонус за длину.
+
+    Args:
+        texts: Тексты сообщений
+        lexicon: Словарь (по умолчанию load_lexicon())
+
+    Returns:
+        Массив оценок (0 — ни одного признака и пустой текст)
+    """
+    lexicon = lexicon or load_lexicon()
+    lowered = _normalize(texts)
+    scores = np.zeros(len(lowered), dtype=np.float64)
+    for category, pattern in lexicon.patterns.items():
+        scores += lexicon.weights[category] * lowered.str.contains(pattern, regex=True).to_numpy(dtype=bool)
+    lengths = lowered.str.len().to_numpy(dtype=np.float64)
+    return scores + LENGTH_BONUS * np.minimum(lengths / LENGTH_BONUS_CHARS, 1.0)
+
+
+def noise_mask(texts: pd.Series, lexicon: Optional[Lexicon] = None) -> np.ndarray:
+    """
+    Сообщения-шум: состоят только из благодарностей/подтверждений и не содержат признаков значимости.
+
+    Пустые и эмодзи-only сообщения отбрасывает compact_messages(), здесь — «спасибо», «ок», «понял» и т.п.
+    """
+    lexicon = lexicon or load_lexicon()
+    mask = np.zeros(len(texts), dtype=bool)
+    if not lexicon.noise_words:
+        return mask
+    lowered = _normalize(texts)
+    # Шум — короткие сообщения: длинные не проверяются
+    candidates = np.flatnonzero((lowered.str.len() <= NOISE_MAX_CHARS).to_numpy(dtype=bool))
+    lowered = lowered.iloc[candidates]
+
+    words = lowered.str.replace("[^0-9a-zа-яё]+", " ", regex=True).str.strip()
+    # Двойные пробелы: у каждого слова свои границы, подряд идущие слова удаляются за один проход
+    padded = " " + words.str.replace(" ", "  ", regex=False) + " "
+    rest = padded.str.replace(f" (?:{lexicon.noise_words}) ", "", regex=True).str.strip()
+    only_noise = (rest == "").to_numpy(dtype=bool) & (words != "").to_numpy(dtype=bool)
+
+    for pattern in lexicon.patterns.values():
+        only_noise &= ~lowered.str.contains(pattern, regex=True).to_numpy(dtype=bool)
+    mask[candidates] = only_noise
+    return mask
+
+
+def _dilate(mask: np.ndarray, context: int) -> np.ndarray:
+    """Добавить к отмеченным строкам по context соседей с каждой стороны"""
+    result = mask.copy()
+    for shift in range(1, context + 1):
+        result[:-shift] |= mask[shift:]
+        result[shift:] |= mask[:-shift]
+    return result
+
+
+def select_categories(
+        texts: pd.Series,
+        categories: Iterable[str],
+        context: int = 0,
+        lexicon: Optional[Lexicon] = None,
+        eligible: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Сообщения с признаками заданных категорий словаря и их соседи.
+
+    Args:
+        texts: Тексты в хронологическом порядке
+        categories: Категории словаря (например, 'complaint', 'negative')
+        context: Соседей с каждой стороны
+        lexicon: Словарь (по умолчанию load_lexicon())
+        eligible: Маска строк, которые могут быть найдены (соседи — любые); None — все
+
+    Returns:
+        Маска выбранных строк
+    """
+    lexicon = lexicon or load_lexicon()
+    lowered = _normalize(texts)
+    mask = np.zeros(len(lowered), dtype=bool)
+    for category in categories:
+        if category in lexicon.patterns:
+            mask |= lowered.str.contains(lexicon.patterns[category], regex=True).to_numpy(dtype=bool)
+    if eligible is not None:
+        mask &= eligible
+    return _dilate(mask, context)
+
+
+def select_by_relevance(
+        frame: pd.DataFrame,
+        costs: np.ndarray,
+        budget: float,
+        context: Optional[int] = None
+) -> np.ndarray:
+    """
+    Самые значимые сообщения с соседями в пределах бюджета (стратегия выборки 'relevance').
+
+    Сообщения ранжируются по score_messages(); берутся первые m по рангу вместе
+    с context соседями (диалог не рвётся), m подбирается двоичным поиском по
+    фактической стоимости — O(n log n).
+
+    Args:
+        frame: Сообщения в хронологическом порядке (Date/From/Text)
+        costs: Оценка токенов каждой строки
+        budget: Бюджет токенов
+        context: Соседей с каждой стороны (по умолчанию RELEVANCE_CONTEXT)
+
+    Returns:
+        Маска выбранных строк
+    """
+    context = RELEVANCE_CONTEXT if context is None else context
+    scores = score_messages(frame['Text'])
+    order = np.argsort(-scores, kind='stable')
+    order = order[scores[order] > 0]
+
+    def mask_for(count: int) -> np.ndarray:
+        seeds = np.zeros(len(frame), dtype=bool)
+        seeds[order[:count]] = True
+        return _dilate(seeds, context)
+
+    low, high = 0, len(order)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if costs[mask_for(middle)].sum() <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return mask_for(low)
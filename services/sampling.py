@@ -0,0 +1,357 @@
+# services/sampling.py
+"""Выборка сообщений для чатов, не помещающихся в лимит токенов (векторные стратегии)"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from services.stats import parse_dates
+from services.relevance import select_by_relevance, score_messages
+from services.sessions import dialogue_ids, dialogue_chunks
+
+logger = logging.getLogger(__name__)
+
+LINE_OVERHEAD_CHARS = 12  # "ЧЧ:ММ Alias: " в компактном формате
+CHARS_PER_TOKEN = 3  # Как в оценке компактного формата (services/analyzer.py)
+MAX_RANGES_IN_REPORT = 40  # Сколько диапазонов строк перечислять в отчёте
+MAX_DROPPED_IN_REPORT = 15  # Сколько непокрытых дней / отправителей перечислять в отчёте
+# Веса составляющих ценности диалога в стратегии 'value' (каждая нормирована к 0..1)
+VALUE_WEIGHTS = {'relevance': 0.4, 'recency': 0.2, 'senders': 0.2, 'days': 0.2}
+VALUE_MIN_ITEMS = 50  # Диалог дороже budget / VALUE_MIN_ITEMS делится на части (иначе выборка — пара дней)
+
+
+@dataclass
+class SampleReport:
+    """Какие строки попали в выборку (добавляется в отчёт)"""
+    strategy: str
+    total_rows: int
+    kept_rows: int
+    budget_tokens: int
+    kept_tokens: int
+    total_days: int
+    kept_days: int
+    kept_lines: list = field(default_factory=list)  # Номера строк CSV (с заголовком — строка 1)
+    dropped_days: list = field(default_factory=list)  # Дни (ДД-ММ-ГГГГ) без сообщений в выборке
+    dropped_senders: list = field(default_factory=list)  # Отправители без сообщений в выборке
+
+    def line_ranges(self) -> list:
+        """Номера строк CSV, сжатые в диапазоны: [(2, 40), (55, 55), ...]"""
+        if not self.kept_lines:
+            return []
+        lines = np.sort(np.asarray(self.kept_lines))
+        breaks = np.flatnonzero(np.diff(lines) != 1) + 1
+        starts = np.concatenate([[0], breaks])
+        ends = np.concatenate([breaks - 1, [len(lines) - 1]])
+        return list(zip(lines[starts].tolist(), lines[ends].tolist()))
+
+    def describe(self) -> str:
+        """Однострочное описание для логов и промпта"""
+        return (
+            f"выборка «{SAMPLING_LABELS.get(self.strategy, self.strategy)}»: "
+            f"{self.kept_rows:,} из {self.total_rows:,} сообщений, "
+            f"дней {self.kept_days} из {self.total_days}, ~{self.kept_tokens:,} токенов"
+        )
+
+    def to_text(self) -> str:
+        """Раздел отчёта о выборке"""
+        ranges = self.line_ranges()
+        shown = ", ".join(f"{a}" if a == b else f"{a}–{b}" for a, b in ranges[:MAX_RANGES_IN_REPORT])
+        if len(ranges) > MAX_RANGES_IN_REPORT:
+            shown += f" и ещё {len(ranges) - MAX_RANGES_IN_REPORT} диапазонов"
+        return "\n".join([
+            "## Выборка данных",
+            "",
+            "Чат не поместился в лимит запроса целиком, качественный анализ выполнен по выборке. "
+            "Статистика менеджеров и времени ответа рассчитана по всем сообщениям.",
+            "",
+            f"- **Стратегия**: {SAMPLING_LABELS.get(self.strategy, self.strategy)}",
+            f"- **Сообщений в выборке**: {self.kept_rows:,} из {self.total_rows:,}",
+            f"- **Дней покрыто**: {self.kept_days} из {self.total_days}",
+            f"- **Строки CSV в выборке**: {shown}",
+            *self._dropped_lines(),
+        ])
+
+    def _dropped_lines(self) -> list:
+        """Что не вошло в выборку: дни и отправители без единого сообщения"""
+        lines = []
+        for title, items in (("Дни без сообщений в выборке", self.dropped_days),
+                             ("Отправители без сообщений в выборке", self.dropped_senders)):
+            if items:
+                shown = ", ".join(items[:MAX_DROPPED_IN_REPORT])
+                if len(items) > MAX_DROPPED_IN_REPORT:
+                    shown += f" и ещё {len(items) - MAX_DROPPED_IN_REPORT}"
+                lines.append(f"- **{title}**: {shown}")
+        return lines
+
+
+def row_costs(df: pd.DataFrame, max_message_chars: Optional[int] = None) -> np.ndarray:
+    """Оценка токенов каждой строки в компактном формате"""
+    lengths = df['Text'].fillna('').astype(str).str.len().to_numpy(dtype=np.int64)
+    if max_message_chars:
+        lengths = np.minimum(lengths, max_message_chars)
+    return (lengths + LINE_OVERHEAD_CHARS) / CHARS_PER_TOKEN
+
+
+def _even_mask(codes: np.ndarray, fractions: np.ndarray) -> np.ndarray:
+    """
+    Равномерно прореженная маска внутри каждой группы.
+
+    Строка с порядковым номером r в группе размера n остаётся, если
+    floor((r + 1) * f) > floor(r * f), где f — доля группы; это даёт
+    ~f * n строк, распределённых по группе равномерно.
+    """
+    rank = pd.Series(codes).groupby(codes).cumcount().to_numpy()
+    f = fractions[codes]
+    return np.floor((rank + 1) * f + 1e-9) > np.floor(rank * f + 1e-9)
+
+
+def _water_fill(needs: np.ndarray, budget: float) -> np.ndarray:
+    """
+    Распределить бюджет между группами поровну, не давая группе больше её потребности:
+    уровень L такой, что sum(min(need, L)) = budget.
+    """
+    if needs.sum() <= budget:
+        return needs.astype(float)
+    order = np.sort(needs)
+    cumulative = np.concatenate([[0.0], np.cumsum(order)[:-1]])
+    remaining = len(order) - np.arange(len(order))
+    levels = (budget - cumulative) / remaining
+    # Первая группа, которая не помещается целиком, задаёт уровень
+    idx = np.flatnonzero(levels < order)[0]
+    return np.minimum(needs, levels[idx])
+
+
+def _stratified(codes: np.ndarray, costs: np.ndarray, budget: float) -> np.ndarray:
+    """Стратифицированная выборка: бюджет делится поровну между группами"""
+    groups = codes.max() + 1 if len(codes) else 0
+    needs = np.bincount(codes, weights=costs, minlength=groups)
+    allocation = _water_fill(needs, budget)
+    fractions = np.divide(allocation, needs, out=np.zeros_like(allocation), where=needs > 0)
+    return _even_mask(codes, np.minimum(fractions, 1.0))
+
+
+def _head(frame: pd.DataFrame, costs: np.ndarray, budget: float) -> np.ndarray:
+    """Самые ранние сообщения"""
+    return np.cumsum(costs) <= budget
+
+
+def _tail(frame: pd.DataFrame, costs: np.ndarray, budget: float) -> np.ndarray:
+    """Самые свежие сообщения"""
+    return (np.cumsum(costs[::-1]) <= budget)[::-1]
+
+
+def _by_day(frame: pd.DataFrame, costs: np.ndarray, budget: float) -> np.ndarray:
+    """Стратификация по календарным дням"""
+    codes, _ = pd.factorize(frame['Date'].dt.normalize())
+    return _stratified(codes, costs, budget)
+
+
+def _by_sender(frame: pd.DataFrame, costs: np.ndarray, budget: float) -> np.ndarray:
+    """Стратификация по отправителям (каждый менеджер и клиент представлен)"""
+    codes, _ = pd.factorize(frame['From'])
+    return _stratified(codes, costs, budget)
+
+
+def _by_dialogue(frame: pd.DataFrame, costs: np.ndarray, budget: float) -> np.ndarray:
+    """Целые диалоги, равномерно по всему периоду"""
+    ids = dialogue_ids(frame['Date'])
+    dialogue_costs = np.bincount(ids, weights=costs)
+    fraction = min(budget / dialogue_costs.sum(), 1.0) if dialogue_costs.sum() else 1.0
+
+    # Диалоги разного размера — прореживаем с запасом, пока не поместимся
+    for _ in range(20):
+        picked = _even_mask(np.zeros(len(dialogue_costs), dtype=np.int64), np.array([fraction]))
+        if dialogue_costs[picked].sum() <= budget:
+            break
+        fraction *= 0.9
+    return picked[ids]
+
+
+def _time_uniform(frame: pd.DataFrame, costs: np.ndarray, budget: float) -> np.ndarray:
+    """Равномерно по времени: первое сообщение в каждом из k равных интервалов"""
+    times = frame['Date'].to_numpy().astype('datetime64[s]').astype(np.int64)
+    k = int(budget / max(costs.mean(), 1e-9)) if len(costs) else 0
+
+    mask = np.zeros(len(times), dtype=bool)
+    for _ in range(20):
+        if k <= 0:
+            break
+        edges = np.linspace(times[0], times[-1], k + 1)[:-1]
+        mask[:] = False
+        mask[np.unique(np.searchsorted(times, edges, side='left'))] = True
+        if costs[mask].sum() <= budget:
+            break
+        k = int(k * 0.9)
+    return mask
+
+
+def _normalized(values: np.ndarray) -> np.ndarray:
+    top = values.max() if len(values) else 0.0
+    return values / top if top > 0 else np.zeros_like(values, dtype=np.float64)
+
+
+def item_values(frame: pd.DataFrame, items: np.ndarray, costs: np.ndarray) -> pd.DataFrame:
+    """
+    Ценность каждого элемента выборки (диалога или его части) по составляющим, каждая 0..1:
+
+    - relevance — сумма значимости сообщений (services/relevance.py);
+    - recency — чем позже элемент, тем выше (линейно по периоду);
+    - senders — редкие отправители ценнее: сумма 1/(элементов отправителя);
+    - days — покрытие дней: лучший по ценности на токен элемент дня получает 1,
+      второй — 1/2 и т.д. (убывающая отдача без пересчёта в жадном цикле).
+
+    Args:
+        frame: Сообщения в хронологическом порядке (Date/From/Text)
+        items: Номер элемента каждой строки (по возрастанию)
+        costs: Оценка токенов строк
+
+    Returns:
+        DataFrame (индекс — номер элемента) с колонками VALUE_WEIGHTS, Cost и Value (взвешенная сумма)
+    """
+    scores = np.bincount(items, weights=score_messages(frame['Text']))
+    item_costs = np.bincount(items, weights=costs)
+    times = frame['Date'].to_numpy().astype('datetime64[s]')
+    starts = times[np.flatnonzero(np.r_[True, items[1:] != items[:-1]])]
+    seconds = starts.astype(np.int64)
+    span = seconds[-1] - seconds[0]
+    recency = (seconds - seconds[0]) / span if span > 0 else np.ones(len(starts))
+
+    pairs = pd.DataFrame({'Item': items, 'From': frame['From'].to_numpy()}).drop_duplicates()
+    sender_items = pairs.groupby('From')['Item'].transform('size')
+    senders = np.bincount(pairs['Item'], weights=1.0 / sender_items, minlength=len(starts))
+
+    values = pd.DataFrame({
+        'relevance': _normalized(scores),
+        'recency': recency,
+        'senders': _normalized(senders),
+        'Cost': item_costs,
+    })
+    base = sum(VALUE_WEIGHTS[name] * values[name] for name in ('relevance', 'recency', 'senders'))
+    day_rank = (base / np.maximum(item_costs, 1e-9)).groupby(starts.astype('datetime64[D]')).rank(
+        ascending=False, method='first'
+    )
+    values['days'] = 1.0 / day_rank
+    values['Value'] = base + VALUE_WEIGHTS['days'] * values['days']
+    return values
+
+
+def _by_value(frame: pd.DataFrame, costs: np.ndarray, budget: float) -> np.ndarray:
+    """
+    Жадный рюкзак: максимум суммарной ценности (item_values) в пределах бюджета.
+
+    Элементы — целые диалоги; диалог дороже 1/VALUE_MIN_ITEMS бюджета делится
+    на части по строкам. Элементы сортируются по ценности на токен (O(n log n))
+    и берутся, пока помещаются; остаток бюджета добирается следующими по порядку
+    элементами, которые в него помещаются.
+    """
+    if len(frame) == 0:
+        return np.zeros(0, dtype=bool)
+    items = dialogue_chunks(dialogue_ids(frame['Date']), costs, budget / VALUE_MIN_ITEMS)
+    # Строка дороже лимита элемента пропускает номера — перенумеровываем подряд
+    items = np.cumsum(np.r_[False, items[1:] != items[:-1]])
+    values = item_values(frame, items, costs)
+    value = values['Value'].to_numpy()
+    item_costs = values['Cost'].to_numpy()
+
+    order = np.argsort(-value / np.maximum(item_costs, 1e-9), kind='stable')
+    fits = np.cumsum(item_costs[order]) <= budget
+    taken = order[fits]
+    rest = order[~fits]
+    left = budget - item_costs[taken].sum()
+    rest = rest[item_costs[rest] <= left]
+    taken = np.concatenate([taken, rest[np.cumsum(item_costs[rest]) <= left]])
+
+    picked = np.zeros(len(item_costs), dtype=bool)
+    picked[taken] = True
+    logger.info(
+        f"🎒 Элементов в выборке: {picked.sum():,} из {len(picked):,}, "
+        f"ценности сохранено {value[picked].sum() / max(value.sum(), 1e-9):.0%}"
+    )
+    return picked[items]
+
+
+# Стратегия: (DataFrame, стоимость строк, бюджет токенов) -> маска строк
+SAMPLING_STRATEGIES: Dict[str, Callable[[pd.DataFrame, np.ndarray, float], np.ndarray]] = {
+    'head': _head,
+    'tail': _tail,
+    'day': _by_day,
+    'sender': _by_sender,
+    'dialogue': _by_dialogue,
+    'uniform': _time_uniform,
+    'relevance': select_by_relevance,
+    'value': _by_value,
+}
+
+SAMPLING_LABELS = {
+    'head': "первые сообщения периода",
+    'tail': "последние сообщения периода",
+    'day': "равномерно по дням",
+    'sender': "равномерно по отправителям",
+    'dialogue': "целые диалоги по всему периоду",
+    'uniform': "равномерно по времени",
+    'relevance': "значимые сообщения (вопросы, жалобы, заказы) с контекстом",
+    'value': "самые ценные диалоги на токен (значимость, свежесть, редкие отправители, покрытие дней)",
+}
+
+
+def sample_messages(
+        df: pd.DataFrame,
+        budget_tokens: int,
+        strategy: str = 'day',
+        max_message_chars: Optional[int] = None
+) -> tuple:
+    """
+    Отобрать сообщения в пределах бюджета токенов.
+
+    Args:
+        df: Данные чата (Date/From/Text) в порядке файла
+        budget_tokens: Бюджет токенов на данные
+        strategy: Ключ SAMPLING_STRATEGIES
+        max_message_chars: Обрезка длинных сообщений при компактизации (для оценки стоимости)
+
+    Returns:
+        (DataFrame выборки в порядке файла, SampleReport)
+
+    Raises:
+        ValueError: Неизвестная стратегия
+    """
+    if strategy not in SAMPLING_STRATEGIES:
+        raise ValueError(
+            f"Неизвестная стратегия выборки: {strategy}. Доступны: {', '.join(SAMPLING_STRATEGIES)}"
+        )
+
+    frame = pd.DataFrame({
+        'Date': parse_dates(df['Date']),
+        'From': df['From'],
+        'Text': df['Text'],
+    }, index=df.index).dropna(subset=['Date'])
+    # Экспорт пишется от новых к старым — стратегии работают в хронологическом порядке
+    frame = frame.sort_values('Date', kind='mergesort')
+
+    costs = row_costs(frame, max_message_chars)
+    mask = SAMPLING_STRATEGIES[strategy](frame, costs, float(budget_tokens))
+
+    kept_index = frame.index[mask]
+    sampled = df.loc[df.index.isin(kept_index)]
+    days = frame['Date'].dt.normalize()
+    dropped_days = days[~days.isin(days[mask])].drop_duplicates()
+    senders = frame['From'].astype(str)
+
+    report = SampleReport(
+        strategy=strategy,
+        total_rows=len(df),
+        kept_rows=len(sampled),
+        budget_tokens=budget_tokens,
+        kept_tokens=int(costs[mask].sum()),
+        total_days=int(days.nunique()),
+        kept_days=int(days[mask].nunique()),
+        # Метки RangeIndex после чтения CSV сохраняются при фильтрации: строка 0 — вторая строка файла
+        kept_lines=(np.asarray(kept_index, dtype=np.int64) + 2).tolist(),
+        dropped_days=dropped_days.dt.strftime('%d-%m-%Y').tolist(),
+        dropped_senders=sorted(set(senders) - set(senders[mask])),
+    )
+    logger.info(f"🎯 {report.describe()}")
+    return sampled, report
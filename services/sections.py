@@ -0,0 +1,226 @@
+# services/sections.py
+"""Стандартный отчёт по разделам: независимые параллельные запросы, каждому — только нужные ему данные"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Callable, List
+
+import anthropic
+import pandas as pd
+
+from core.config import CONFLICT_CONTEXT
+from services.analyzer import ModelTiers, plan_analysis, run_analysis_plan
+from services.relevance import select_categories
+from services.sessions import summarize_dialogues, format_dialogues_text
+from services.stats import sender_roles, compute_chat_stats, format_stats_text, parse_dates, ROLE_CLIENT
+from services.streaming import ResponseStream
+from services.tokens import PreflightEstimate, UsageTracker, STRATEGY_SECTIONS
+
+logger = logging.getLogger(__name__)
+
+CONFLICT_CATEGORIES = ('complaint', 'negative')  # Категории словаря значимости (services/relevance.py)
+SECTION_FORMAT = (
+    "Формат: структурированный текст без таблиц, без заголовка раздела, без номеров строк и сообщений, "
+    "без методики обработки, без рекомендаций в конце. На русском языке."
+)
+
+
+@dataclass(frozen=True)
+class ReportSection:
+    """Раздел отчёта, который пишет Claude: заголовок, отбор данных и задача ({csv_content} — данные)"""
+    key: str
+    title: str
+    select: Callable[[pd.DataFrame], pd.DataFrame]
+    task: str
+    empty_text: str  # Текст раздела, если отбирать нечего (запрос не отправляется)
+
+
+def client_messages(df: pd.DataFrame) -> pd.DataFrame:
+    """Только сообщения клиентов: для частых запросов ответы менеджеров не нужны"""
+    return df[(sender_roles(df) == ROLE_CLIENT).to_numpy()]
+
+
+def conflict_candidates(df: pd.DataFrame, context: Optional[int] = None) -> pd.DataFrame:
+    """
+    Кандидаты в конфликты: жалобы и негатив клиентов по словарю значимости с соседними сообщениями.
+
+    Находятся только сообщения клиентов (Role == client); соседи для контекста — любые.
+
+    Args:
+        df: Данные чата (Date/From/Text)
+        context: Соседей с каждой стороны (по умолчанию CONFLICT_CONTEXT)
+
+    Returns:
+        Строки df (в хронологическом порядке)
+    """
+    context = CONFLICT_CONTEXT if context is None else context
+    dates = parse_dates(df['Date'])
+    ordered = df.loc[dates.sort_values(kind='mergesort').index]
+    is_client = (sender_roles(ordered) == ROLE_CLIENT).to_numpy()
+    mask = select_categories(ordered['Text'], CONFLICT_CATEGORIES, context, eligible=is_client)
+    return ordered[mask]
+
+
+REPORT_SECTIONS: List[ReportSection] = [
+    ReportSection(
+        key='requests',
+        title="Самые частые запросы клиентов",
+        select=client_messages,
+        task=f"""Ниже — сообщения клиентов из чата со службой поддержки (ответы менеджеров исключены; компактный формат: легенда отправителей, заголовки дней, время ЧЧ:ММ; пометка [×N] — похожее сообщение встречалось N раз, приведён первый пример):
+{{csv_content}}
+
+Темы, выделенные локально по всем сообщениям клиентов (количества точные; в данных выше похожие сообщения схлопнуты, а при большом чате часть может быть пропущена):
+{{topics}}
+
+Составь раздел отчёта «Самые частые запросы клиентов»: повторяющиеся вопросы и темы обращений, что позволит доработать Ysell и другие процессы. Опирайся на выделенные темы и их количества: объедини или переименуй их по смыслу сообщений. Для каждой темы укажи число сообщений.
+{SECTION_FORMAT}""",
+        empty_text="Сообщения клиентов не найдены.",
+    ),
+    ReportSection(
+        key='conflicts',
+        title="Причины конфликтов и недовольства клиентов",
+        select=conflict_candidates,
+        task=f"""Ниже — фрагменты чата со службой поддержки, где клиенты жалуются или выражают недовольство, вместе с соседними сообщениями для контекста (компактный формат: легенда отправителей, заголовки дней, время ЧЧ:ММ; S — менеджеры, C — клиенты):
+{{csv_content}}
+
+Составь раздел отчёта «Причины конфликтов и недовольства клиентов»: выяви основные проблемные области и что приводило к недовольству.
+{SECTION_FORMAT}""",
+        empty_text="Жалоб и признаков недовольства клиентов не найдено.",
+    ),
+]
+
+
+@dataclass
+class SectionedPlan:
+    """План отчёта по разделам: план запроса на каждый раздел и общие локальные разделы"""
+    sections: list  # [(ReportSection, AnalysisPlan или None — данных нет)]
+    stats_text: str
+    dialogues_text: str = ""
+    clusters_text: str = ""
+
+    @property
+    def estimate(self) -> PreflightEstimate:
+        """Сводная оценка: запросы разделов выполняются параллельно, токены суммируются"""
+        estimates = [plan.estimate for _, plan in self.sections if plan is not None]
+        return PreflightEstimate(
+            strategy=STRATEGY_SECTIONS,
+            raw_tokens=sum(e.raw_tokens for e in estimates),
+            compact_tokens=sum(e.compact_tokens for e in estimates),
+            request_tokens=max((e.request_tokens for e in estimates), default=0),
+            total_tokens=sum(e.total_tokens for e in estimates),
+            requests=sum(e.requests for e in estimates),
+            exact=bool(estimates) and all(e.exact for e in estimates),
+        )
+
+    @property
+    def appendix(self) -> str:
+        """Локальные разделы: менеджеры и время ответа, диалоги, частые сообщения"""
+        return "\n\n".join(s for s in (self.stats_text, self.dialogues_text, self.clusters_text) if s)
+
+
+def plan_sections(
+        df: pd.DataFrame,
+        client: Optional[anthropic.Anthropic] = None,
+        models: Optional[ModelTiers] = None,
+        sections: Optional[List[ReportSection]] = None,
+        stats_text: Optional[str] = None,
+        dialogues_text: Optional[str] = None
+) -> SectionedPlan:
+    """
+    План отчёта по разделам: каждому разделу — свой отбор данных и свой план запроса.
+
+    Разделы со статистикой (менеджеры, время ответа, диалоги) считаются
+    локально и запросов не требуют.
+
+    Args:
+        df: Данные чата (Date/From/Text)
+        client: Клиент Claude API для точного подсчёта токенов
+        models: Модели по уровням
+        sections: Разделы (по умолчанию REPORT_SECTIONS)
+        stats_text: Готовая статистика (по умолчанию считается по df)
+        dialogues_text: Готовая сводка диалогов (по умолчанию считается по df)
+
+    Returns:
+        SectionedPlan
+    """
+    models = models or ModelTiers()
+    # Сводка диалогов — одна на отчёт, а не на каждый раздел
+    if dialogues_text is None:
+        dialogues_text = format_dialogues_text(summarize_dialogues(df))
+    planned = []
+    for section in sections or REPORT_SECTIONS:
+        selected = section.select(df)
+        if selected.empty:
+            planned.append((section, None))
+            continue
+        plan = plan_analysis(
+            selected, section.task, client=client, stats_text="", models=models, dialogues_text=dialogues_text
+        )
+        logger.info(f"📑 Раздел «{section.title}»: {len(selected):,} сообщений; {plan.estimate.describe()}")
+        planned.append((section, plan))
+
+    # Повторы считаются по ролям раздельно — кластеры клиентов совпадают с кластерами по всему файлу
+    clusters_text = next(
+        (plan.clusters_text for section, plan in planned if section.select is client_messages and plan), ""
+    )
+    if stats_text is None:
+        stats_text = format_stats_text(compute_chat_stats(df))
+    return SectionedPlan(
+        sections=planned,
+        stats_text=stats_text,
+        dialogues_text=dialogues_text,
+        clusters_text=clusters_text,
+    )
+
+
+def run_sections(
+        client: anthropic.Anthropic,
+        plan: SectionedPlan,
+        on_wait: Optional[Callable[[float], None]] = None,
+        usage: Optional[UsageTracker] = None,
+        stream: Optional[ResponseStream] = None,
+        models: Optional[ModelTiers] = None
+) -> str:
+    """
+    Выполнить запросы разделов параллельно и собрать текст отчёта.
+
+    Время ответа — самый долгий раздел, а не один большой запрос по всему чату.
+    В stream передаются только этапы (тексты разделов идут одновременно).
+
+    Returns:
+        Текст разделов Claude (без локальной статистики)
+
+    Raises:
+        ValueError: Пустой ответ по разделу
+    """
+    models = models or ModelTiers()
+    active = [(section, section_plan) for section, section_plan in plan.sections if section_plan is not None]
+    total = len(active)
+    done = [0]
+    done_lock = threading.Lock()
+    if stream is not None:
+        stream.set_stage(f"📑 Разделы отчёта: 0/{total}")
+
+    def run(item) -> str:
+        section, section_plan = item
+        text = run_analysis_plan(client, section_plan, section.task, on_wait=on_wait, usage=usage, models=models)
+        if not text:
+            raise ValueError(f"Пустой ответ от Claude API: {section.title}")
+        logger.info(f"✅ Раздел «{section.title}» готов")
+        if stream is not None:
+            with done_lock:
+                done[0] += 1
+                stage = f"📑 Разделы отчёта: {done[0]}/{total}"
+            stream.set_stage(stage)
+        return text
+
+    texts = {}
+    if active:
+        with ThreadPoolExecutor(max_workers=total, thread_name_prefix="section") as executor:
+            texts = dict(zip((section.key for section, _ in active), executor.map(run, active)))
+
+    return "\n\n".join(
+        f"## {section.title}\n\n{texts.get(section.key, section.empty_text)}" for section, _ in plan.sections
+    )
@@ -0,0 +1,191 @@
+# services/sessions.py
+"""Разбиение чата на диалоги (векторно): номера, длительность, время первого ответа, части без разрыва диалогов"""
+
+import logging
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from core.config import DIALOGUE_GAP_MINUTES
+from services.stats import prepare_messages, ROLE_CLIENT, ROLE_SUPPORT, _fmt_minutes
+
+logger = logging.getLogger(__name__)
+
+MAX_PERIOD_DAYS = 32  # Самый длинный период выровненных частей (степени двойки: 1, 2, 4... дней)
+
+
+def dialogue_ids(dates: pd.Series, gap_minutes: Optional[int] = None) -> np.ndarray:
+    """
+    Номера диалогов для отсортированных по времени сообщений:
+    новый диалог — после паузы больше gap_minutes (по умолчанию DIALOGUE_GAP_MINUTES) или со сменой дня.
+    """
+    gap_minutes = DIALOGUE_GAP_MINUTES if gap_minutes is None else gap_minutes
+    values = dates.to_numpy()
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.int64)
+    gaps = np.diff(values) > np.timedelta64(gap_minutes, 'm')
+    new_day = np.diff(dates.dt.normalize().to_numpy()) > np.timedelta64(0, 'D')
+    starts = np.concatenate([[True], gaps | new_day])
+    return np.cumsum(starts) - 1
+
+
+def summarize_dialogues(df: pd.DataFrame, gap_minutes: Optional[int] = None) -> pd.DataFrame:
+    """
+    Сводка по диалогам: границы, длительность, первое обращение клиента и первый ответ менеджера.
+
+    Первый ответ — первое сообщение менеджера в том же диалоге не раньше
+    первого сообщения клиента (groupby без циклов по строкам).
+
+    Args:
+        df: Данные чата (Date/From/Text) в любом порядке
+        gap_minutes: Пауза, после которой начинается новый диалог
+
+    Returns:
+        DataFrame (индекс — номер диалога): Start, End, Duration (сек), Messages,
+        FirstResponse (сек, NaN — клиент не писал или ответа нет), HasClient
+    """
+    return dialogues_from_messages(prepare_messages(df), gap_minutes)
+
+
+def dialogues_from_messages(messages: pd.DataFrame, gap_minutes: Optional[int] = None) -> pd.DataFrame:
+    """Сводка по диалогам из уже подготовленных сообщений (prepare_messages)"""
+    ids = dialogue_ids(messages['Date'], gap_minutes)
+    dates = messages['Date']
+    roles = messages['Role'].to_numpy()
+
+    grouped = dates.groupby(ids)
+    summary = pd.DataFrame({
+        'Start': grouped.min(),
+        'End': grouped.max(),
+        'Messages': grouped.size(),
+    })
+    summary['Duration'] = (summary['End'] - summary['Start']).dt.total_seconds()
+
+    first_client = dates.where(roles == ROLE_CLIENT).groupby(ids).min().reindex(summary.index)
+    client_start = first_client.to_numpy()[ids]
+    is_reply = (roles == ROLE_SUPPORT) & (dates.to_numpy() >= client_start)
+    first_reply = dates.where(is_reply).groupby(ids).min().reindex(summary.index)
+
+    summary['HasClient'] = first_client.notna().to_numpy()
+    summary['FirstResponse'] = (first_reply - first_client).dt.total_seconds()
+    return summary
+
+
+def dialogue_chunks(ids: np.ndarray, costs: np.ndarray, max_tokens: float) -> np.ndarray:
+    """
+    Номера частей для строк: части набираются целыми диалогами до max_tokens.
+
+    Диалог делится по строкам только если сам не помещается в лимит части.
+
+    Args:
+        ids: Номера диалогов строк (dialogue_ids, по возрастанию)
+        costs: Оценка токенов строк
+        max_tokens: Лимит токенов части
+
+    Returns:
+        Номер части для каждой строки (по возрастанию)
+    """
+    chunk_ids = np.empty(len(ids), dtype=np.int64)
+    if len(ids) == 0:
+        return chunk_ids
+
+    max_tokens = max(max_tokens, 1)
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    ends = np.r_[starts[1:], len(ids)]
+    cumulative = np.r_[0, np.cumsum(costs)]
+
+    current, used = 0, 0
+    for start, end in zip(starts, ends):
+        dialogue_tokens = cumulative[end] - cumulative[start]
+        if used and used + dialogue_tokens > max_tokens:
+            current, used = current + 1, 0
+        if dialogue_tokens > max_tokens:
+            within = (cumulative[start + 1:end + 1] - cumulative[start] - 1) // max_tokens
+            chunk_ids[start:end] = current + within
+            current, used = current + int(within[-1]) + 1, 0
+        else:
+            chunk_ids[start:end] = current
+            used += dialogue_tokens
+    return chunk_ids
+
+
+def period_chunks(dates: pd.Series, ids: np.ndarray, costs: np.ndarray, max_tokens: float) -> np.ndarray:
+    """
+    Номера частей с границами, не зависящими от начала выгрузки.
+
+    Сообщения делятся на календарные периоды одинаковой длины (степень
+    двойки дней, отсчёт от 1970-01-01), внутри периода части набираются
+    целыми диалогами (dialogue_chunks). Поэтому у «последних 30 дней» и
+    «последних 60 дней» одного чата общие периоды дают одинаковые части —
+    заметки по ним берутся из кэша (services/map_cache.py).
+
+    Args:
+        dates: Даты сообщений (по возрастанию)
+        ids: Номера диалогов строк (dialogue_ids)
+        costs: Оценка токенов строк
+        max_tokens: Лимит токенов части
+
+    Returns:
+        Номер части для каждой строки (по возрастанию)
+    """
+    chunk_ids = np.empty(len(ids), dtype=np.int64)
+    if len(ids) == 0:
+        return chunk_ids
+
+    days = dates.to_numpy().astype('datetime64[D]').astype(np.int64)
+    # Длина периода — по средней нагрузке за активный день, с округлением до степени двойки:
+    # небольшие колебания объёма между выгрузками не меняют границы
+    per_day = float(np.sum(costs)) / len(np.unique(days))
+    span = 1
+    while span * 2 <= MAX_PERIOD_DAYS and per_day * span * 2 <= max_tokens:
+        span *= 2
+    periods = days // span
+
+    # Диалог не переходит через смену дня, значит и через границу периода
+    starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+    ends = np.r_[starts[1:], len(ids)]
+    offset = 0
+    for start, end in zip(starts, ends):
+        within = dialogue_chunks(ids[start:end], costs[start:end], max_tokens)
+        chunk_ids[start:end] = offset + within
+        offset += int(within[-1]) + 1
+    return chunk_ids
+
+
+def format_dialogues_text(dialogues: pd.DataFrame) -> str:
+    """
+    Раздел отчёта о диалогах (точный локальный расчёт).
+
+    Args:
+        dialogues: Результат summarize_dialogues()
+
+    Returns:
+        Markdown раздел или пустая строка (нет сообщений)
+    """
+    if dialogues.empty:
+        return ""
+
+    with_client = dialogues[dialogues['HasClient']]
+    answered = with_client['FirstResponse'].dropna() / 60
+    duration = dialogues['Duration'] / 60
+
+    lines = [
+        "## Диалоги",
+        "",
+        f"Новый диалог начинается после паузы больше {DIALOGUE_GAP_MINUTES} мин или со сменой дня.",
+        "",
+        f"- **Всего диалогов**: {len(dialogues)}, с обращением клиента — {len(with_client)}, "
+        f"без ответа менеджера — {len(with_client) - len(answered)}",
+        f"- **Длительность диалога**: среднее — {_fmt_minutes(duration.mean())}, "
+        f"медиана — {_fmt_minutes(duration.median())}",
+        f"- **Сообщений в диалоге**: среднее — {dialogues['Messages'].mean():.1f}, "
+        f"максимум — {int(dialogues['Messages'].max())}",
+    ]
+    if not answered.empty:
+        lines.append(
+            f"- **Первый ответ в диалоге**: среднее — {_fmt_minutes(answered.mean())}, "
+            f"медиана — {_fmt_minutes(answered.median())}, "
+            f"90% диалогов — не дольше {_fmt_minutes(answered.quantile(0.9))}"
+        )
+    return "\n".join(lines)
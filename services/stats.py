@@ -0,0 +1,581 @@
+# services/stats.py
+"""Локальный (детерминированный) расчёт статистики по чату: роли, время ответа, менеджеры"""
+
+import re
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from core.config import ROLE_RULES
+
+logger = logging.getLogger(__name__)
+
+# Формат даты в CSV экспорте (services/telegram.py)
+EXPORT_DATE_FORMAT = '%d-%m-%Y %H:%M:%S'
+
+# Менеджеры: имя отправителя содержит одну из подстрок (без учёта регистра)
+SUPPORT_PATTERNS = ['Fulfillment-Box Support', 'Support', 'Fulfillment-Box']
+
+# Системные/сервисные отправители — не клиенты и не менеджеры
+SYSTEM_SENDERS = ['Unknown']
+
+# Колонка чата в сводном анализе нескольких чатов (services/cross_chat.py)
+CHAT_COLUMN = 'Chat'
+
+ROLE_SUPPORT = 'support'
+ROLE_CLIENT = 'client'
+ROLE_SYSTEM = 'system'
+
+DAYS_RU = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье']
+
+
+def parse_dates(dates: pd.Series) -> pd.Series:
+    """Парсинг колонки Date (формат экспорта, с запасным вариантом dayfirst)"""
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        return dates
+    parsed = pd.to_datetime(dates, format=EXPORT_DATE_FORMAT, errors='coerce')
+    if parsed.isna().mean() > 0.5:
+        parsed = pd.to_datetime(dates, dayfirst=True, errors='coerce')
+    return parsed
+
+
+@dataclass
+class RoleRules:
+    """
+    Правила ролей отправителей: подстроки и регулярные выражения имён, ID отправителей Telegram.
+
+    Выражения компилируются один раз при создании правил и применяются к уникальным
+    именам; правила по ID (support_ids / client_ids) сильнее правил по имени.
+    """
+    support_patterns: list = field(default_factory=lambda: list(SUPPORT_PATTERNS))
+    support_regex: list = field(default_factory=list)
+    support_ids: list = field(default_factory=list)
+    client_ids: list = field(default_factory=list)
+    system_senders: list = field(default_factory=lambda: list(SYSTEM_SENDERS))
+
+    def __post_init__(self):
+        parts = [re.escape(p) for p in self.support_patterns] + list(self.support_regex)
+        self._support_re = re.compile('|'.join(parts), re.IGNORECASE) if parts else None
+        self._system = set(self.system_senders)
+
+    @classmethod
+    def from_dict(cls, spec: dict) -> 'RoleRules':
+        """
+        Правила из JSON: {"support_patterns": [...], "support_regex": [...], "support_ids": [...],
+        "client_ids": [...], "system_senders": [...]}; отсутствующие ключи — значения по умолчанию.
+
+        Raises:
+            ValueError: Неизвестный ключ, не список или некорректное регулярное выражение
+        """
+        if not isinstance(spec, dict):
+            raise ValueError("Правила ролей — JSON объект")
+        known = cls.__dataclass_fields__
+        unknown = [key for key in spec if key not in known]
+        if unknown:
+            raise ValueError(f"Неизвестные ключи правил ролей: {', '.join(unknown)}. Допустимые: {', '.join(known)}")
+        for key, values in spec.items():
+            if not isinstance(values, list):
+                raise ValueError(f"Правила ролей: {key} — список")
+        try:
+            return cls(
+                **{key: [str(v) for v in values] for key, values in spec.items() if not key.endswith('_ids')},
+                **{key: [int(v) for v in values] for key, values in spec.items() if key.endswith('_ids')},
+            )
+        except re.error as e:
+            raise ValueError(f"Некорректное регулярное выражение в правилах ролей: {e}")
+        except (TypeError, ValueError):
+            raise ValueError("Правила ролей: support_ids и client_ids — числовые ID отправителей")
+
+    def to_dict(self) -> dict:
+        return {key: list(getattr(self, key)) for key in self.__dataclass_fields__}
+
+    def name_role(self, name: str) -> str:
+        """Роль по имени отправителя"""
+        if name in self._system:
+            return ROLE_SYSTEM
+        if self._support_re is not None and self._support_re.search(name):
+            return ROLE_SUPPORT
+        return ROLE_CLIENT
+
+    def classify(self, senders: pd.Series, sender_ids: Optional[pd.Series] = None) -> pd.Series:
+        """
+        Векторная классификация: правила имён — по уникальным именам, правила ID — по всей колонке.
+
+        Args:
+            senders: Колонка From
+            sender_ids: ID отправителей Telegram той же длины (None — только правила имён)
+
+        Returns:
+            Series ролей (name='Role') с индексом senders
+        """
+        codes, uniques = pd.factorize(senders)
+        # Последний элемент — для пропусков (код -1): отправитель Unknown
+        names = [str(name) for name in uniques] + ['Unknown']
+        roles = np.array([self.name_role(name) for name in names], dtype=object)[codes]
+
+        if sender_ids is not None and (self.support_ids or self.client_ids):
+            ids = pd.to_numeric(pd.Series(sender_ids), errors='coerce').to_numpy()
+            roles = np.where(np.isin(ids, self.support_ids), ROLE_SUPPORT, roles)
+            roles = np.where(np.isin(ids, self.client_ids), ROLE_CLIENT, roles)
+
+        return pd.Series(roles, index=senders.index, name='Role')
+
+
+ROLES = (ROLE_SUPPORT, ROLE_CLIENT, ROLE_SYSTEM)
+
+_role_rules: Optional[RoleRules] = None
+
+
+def parse_role_rules(text: str) -> RoleRules:
+    """
+    Правила ролей из JSON строки (персональные правила пользователя бота).
+
+    Raises:
+        ValueError: Некорректный JSON или правила
+    """
+    try:
+        spec = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Некорректный JSON правил ролей: {e}")
+    return RoleRules.from_dict(spec)
+
+
+def load_role_rules(path: Optional[str] = None) -> RoleRules:
+    """
+    Правила ролей: стандартные (SUPPORT_PATTERNS, SYSTEM_SENDERS), дополненные JSON файлом ROLE_RULES.
+
+    Ключи файла заменяют одноимённые стандартные списки (см. RoleRules.from_dict).
+    """
+    global _role_rules
+    path = path if path is not None else ROLE_RULES
+    if _role_rules is not None and path == ROLE_RULES:
+        return _role_rules
+
+    rules = RoleRules()
+    if path:
+        with open(path, encoding='utf-8') as f:
+            rules = RoleRules.from_dict(json.load(f))
+        logger.info(f"👥 Правила ролей: {path}")
+
+    if path == ROLE_RULES:
+        _role_rules = rules
+    return rules
+
+
+def classify_senders(
+        senders: pd.Series,
+        rules: Optional[RoleRules] = None,
+        sender_ids: Optional[pd.Series] = None
+) -> pd.Series:
+    """
+    Векторная классификация отправителей на support / client / system.
+
+    Args:
+        senders: Колонка From
+        rules: Правила ролей (по умолчанию load_role_rules())
+        sender_ids: ID отправителей для правил по ID
+
+    Returns:
+        Series ролей (name='Role')
+    """
+    return (rules or load_role_rules()).classify(senders, sender_ids)
+
+
+def sender_roles(df: pd.DataFrame, rules: Optional[RoleRules] = None) -> pd.Series:
+    """
+    Роли сообщений: колонка Role (экспорт, ingest), иначе — классификация по From.
+
+    Пустые и неизвестные значения Role дополняются классификацией по имени.
+    """
+    if 'Role' not in df.columns:
+        return classify_senders(df['From'], rules)
+    explicit = df['Role'].astype(object)
+    known = explicit.isin(ROLES).to_numpy()
+    if known.all():
+        return pd.Series(explicit.to_numpy(), index=df.index, name='Role')
+    fallback = classify_senders(df['From'], rules).to_numpy()
+    return pd.Series(np.where(known, explicit.to_numpy(), fallback), index=df.index, name='Role')
+
+
+def prepare_messages(df: pd.DataFrame, extra_columns: tuple = ()) -> pd.DataFrame:
+    """
+    Подготовка сообщений к расчётам: парсинг дат, роли, сортировка по времени.
+
+    Для нескольких чатов (колонка Chat) сортировка — по чату, затем по времени.
+
+    Args:
+        df: Данные чата
+        extra_columns: Дополнительные колонки df, которые нужно сохранить (например, Text)
+
+    Returns:
+        DataFrame с колонками Date (datetime), From, Role, Day, IsWeekend (и Chat, если есть)
+    """
+    prepared = pd.DataFrame({
+        'Date': parse_dates(df['Date']),
+        'From': df['From'].fillna('Unknown').astype(str),
+    })
+    prepared['Role'] = sender_roles(df).to_numpy()
+    for column in extra_columns:
+        prepared[column] = df[column]
+    order = ['Date']
+    if CHAT_COLUMN in df.columns:
+        prepared[CHAT_COLUMN] = df[CHAT_COLUMN].astype('category')
+        order = [CHAT_COLUMN, 'Date']
+
+    prepared = prepared.dropna(subset=['Date'])
+    # Экспорт пишется от новых к старым — сортируем по возрастанию (стабильно)
+    prepared = prepared.sort_values(order, kind='mergesort').reset_index(drop=True)
+    prepared['Day'] = prepared['Date'].dt.normalize()
+    prepared['IsWeekend'] = prepared['Date'].dt.dayofweek >= 5
+    return prepared
+
+
+def compute_responses(messages: pd.DataFrame) -> pd.DataFrame:
+    """
+    Для каждого сообщения клиента находит первый ответ менеджера в тот же день.
+
+    Поиск выполняется через np.searchsorted по позициям сообщений менеджеров
+    в общей ленте (все роли, по времени) — O(n log n) без циклов по строкам.
+    Системные сообщения остаются в ленте и лишь не считаются ответом. Для
+    нескольких чатов (колонка Chat) лента упорядочена по чату и времени: ответ
+    засчитывается только в том же чате.
+
+    Args:
+        messages: Результат prepare_messages()
+
+    Returns:
+        DataFrame: Day, IsWeekend, Manager (NaN если нет ответа), Delay (секунды, NaN если нет ответа)
+        и Chat для нескольких чатов
+    """
+    is_client = (messages['Role'] == ROLE_CLIENT).to_numpy()
+    is_support = (messages['Role'] == ROLE_SUPPORT).to_numpy()
+    client = messages[is_client]
+    support = messages[is_support]
+
+    responses = pd.DataFrame({
+        'Day': client['Day'].to_numpy(),
+        'IsWeekend': client['IsWeekend'].to_numpy(),
+        'Manager': pd.Series([None] * len(client), dtype=object).to_numpy(),
+        'Delay': np.full(len(client), np.nan),
+    })
+    if CHAT_COLUMN in messages.columns:
+        responses[CHAT_COLUMN] = client[CHAT_COLUMN].array
+
+    if client.empty or support.empty:
+        return responses
+
+    support_times = support['Date'].to_numpy()
+    client_times = client['Date'].to_numpy()
+
+    # Первый ответ менеджера после сообщения клиента в ленте
+    support_positions = np.flatnonzero(is_support)
+    idx = np.searchsorted(support_positions, np.flatnonzero(is_client), side='right')
+    has_next = idx < len(support_positions)
+    safe_idx = np.where(has_next, idx, 0)
+
+    reply_days = support['Day'].to_numpy()[safe_idx]
+    same_day = has_next & (reply_days == client['Day'].to_numpy())
+    if CHAT_COLUMN in messages.columns:
+        codes = messages[CHAT_COLUMN].cat.codes
+        same_day &= codes[support.index].to_numpy()[safe_idx] == codes[client.index].to_numpy()
+
+    delays = (support_times[safe_idx] - client_times) / np.timedelta64(1, 's')
+    managers = support['From'].to_numpy()[safe_idx]
+
+    responses['Delay'] = np.where(same_day, delays, np.nan)
+    responses['Manager'] = np.where(same_day, managers, None)
+    return responses
+
+
+# Интервалы гистограммы времени ответа (секунды): до минуты — по секунде, дальше — с шагом 2%
+DELAY_BIN_EDGES = np.unique(np.r_[np.arange(60), np.round(60 * 1.02 ** np.arange(370))]).astype(np.int64)
+UNANSWERED_BIN = -1  # «Интервал» вопросов без ответа в тот же день
+
+
+def delay_histogram(responses: pd.DataFrame) -> pd.DataFrame:
+    """
+    Гистограмма ответов: число вопросов и сумма задержек по (IsWeekend, Manager, [Chat], Bin).
+
+    Размер не зависит от числа сообщений (дни типа × менеджеры × чаты × интервалы).
+    Вопросы без ответа — Bin = UNANSWERED_BIN, Manager = ''.
+
+    Args:
+        responses: Результат compute_responses()
+
+    Returns:
+        DataFrame: IsWeekend, Manager, [Chat], Bin, Count, Total (секунды)
+    """
+    delays = responses['Delay'].to_numpy(dtype=float)
+    answered = ~np.isnan(delays)
+    bins = np.searchsorted(DELAY_BIN_EDGES, np.where(answered, delays, 0), side='right') - 1
+    frame = pd.DataFrame({
+        'IsWeekend': responses['IsWeekend'].to_numpy(dtype=bool),
+        'Manager': np.where(answered, responses['Manager'].to_numpy(dtype=object), ''),
+        'Bin': np.where(answered, bins, UNANSWERED_BIN),
+        'Count': np.ones(len(responses), dtype=np.int64),
+        'Total': np.where(answered, delays, 0.0),
+    })
+    if CHAT_COLUMN in responses.columns:
+        frame.insert(2, CHAT_COLUMN, responses[CHAT_COLUMN].astype(object).to_numpy())
+    return _sum_bins(frame)
+
+
+def _sum_bins(frame: pd.DataFrame) -> pd.DataFrame:
+    """Сложить строки гистограммы с одинаковыми ключами"""
+    keys = [column for column in frame.columns if column not in ('Count', 'Total')]
+    return frame.groupby(keys, sort=True).sum().reset_index()
+
+
+def _binned_summary(histogram: pd.DataFrame, by: list) -> pd.DataFrame:
+    """
+    Число ответов, среднее и медиана задержки (секунды) по группам by.
+
+    Среднее точное (по суммам). Медиана — среднее значений интервала, в который
+    она попадает: точная до минуты и с погрешностью не больше 2% дальше.
+    """
+    answered = histogram[histogram['Bin'] != UNANSWERED_BIN].sort_values(by + ['Bin'], kind='mergesort')
+    if answered.empty:
+        return pd.DataFrame(columns=['count', 'mean', 'median'], dtype=float)
+    grouped = answered.groupby(by, sort=True)
+    counts = answered['Count']
+    end = grouped['Count'].cumsum()
+    start = end - counts
+    total = grouped['Count'].transform('sum')
+    values = answered['Total'] / counts
+
+    # Для чётного числа ответов медиана — среднее двух центральных значений
+    middle = []
+    for rank in ((total - 1) // 2, total // 2):
+        middle.append(values.where((start <= rank) & (rank < end)).groupby([answered[c] for c in by]).max())
+    summary = pd.DataFrame({'count': grouped['Count'].sum(), 'sum': grouped['Total'].sum()})
+    summary['mean'] = summary['sum'] / summary['count']
+    summary['median'] = (middle[0] + middle[1]) / 2
+    return summary[['count', 'mean', 'median']]
+
+
+@dataclass
+class ChatStats:
+    """
+    Результат локального расчёта статистики.
+
+    Хранит гистограмму времени ответа (delay_histogram: число и сумма задержек
+    по интервалам) и количество сообщений по отправителям — размер не зависит от
+    числа сообщений, а несколько ChatStats объединяются сложением: количества и
+    среднее точные, медиана — по интервалам гистограммы.
+    """
+    delays: pd.DataFrame
+    sender_counts: pd.Series
+    role_counts: pd.Series
+    managers: list = field(default_factory=list)
+    first_date: Optional[pd.Timestamp] = None
+    last_date: Optional[pd.Timestamp] = None
+
+    @property
+    def total_messages(self) -> int:
+        return int(self.sender_counts.sum())
+
+    @property
+    def questions(self) -> int:
+        """Вопросов клиентов"""
+        return int(self.delays['Count'].sum())
+
+    @property
+    def unanswered(self) -> int:
+        """Вопросов без ответа в тот же день"""
+        return int(self.delays.loc[self.delays['Bin'] == UNANSWERED_BIN, 'Count'].sum())
+
+    def merge(self, other: 'ChatStats') -> 'ChatStats':
+        """Объединить статистику двух наборов сообщений"""
+        return ChatStats.combine([self, other])
+
+    @classmethod
+    def combine(cls, parts: list) -> 'ChatStats':
+        """Объединить статистику нескольких наборов сообщений (гистограммы складываются один раз)"""
+        dates = [part.first_date for part in parts if part.first_date is not None]
+        last_dates = [part.last_date for part in parts if part.last_date is not None]
+        sender_counts = parts[0].sender_counts
+        role_counts = parts[0].role_counts
+        for part in parts[1:]:
+            sender_counts = sender_counts.add(part.sender_counts, fill_value=0)
+            role_counts = role_counts.add(part.role_counts, fill_value=0)
+        return cls(
+            delays=_sum_bins(pd.concat([part.delays for part in parts], ignore_index=True)),
+            sender_counts=sender_counts.astype(int),
+            role_counts=role_counts.astype(int),
+            managers=sorted(set().union(*(part.managers for part in parts))),
+            first_date=min(dates) if dates else None,
+            last_date=max(last_dates) if last_dates else None,
+        )
+
+    def to_json(self) -> str:
+        """Сериализация для хранения между анализами (инкрементальный режим)"""
+        return json.dumps({
+            'delays': {col: self.delays[col].tolist() for col in self.delays.columns},
+            'sender_counts': {str(k): int(v) for k, v in self.sender_counts.items()},
+            'role_counts': {str(k): int(v) for k, v in self.role_counts.items()},
+            'managers': list(self.managers),
+            'first_date': self.first_date.isoformat() if self.first_date is not None else None,
+            'last_date': self.last_date.isoformat() if self.last_date is not None else None,
+        }, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, data: str) -> 'ChatStats':
+        """Восстановление из to_json() (и из прежнего формата — ответы построчно)"""
+        raw = json.loads(data)
+        if 'delays' in raw:
+            delays = pd.DataFrame(raw['delays'])
+            delays['IsWeekend'] = delays['IsWeekend'].astype(bool)
+            delays['Manager'] = delays['Manager'].astype(object)
+            delays['Bin'] = delays['Bin'].astype(np.int64)
+            delays['Count'] = delays['Count'].astype(np.int64)
+            delays['Total'] = delays['Total'].astype(float)
+        else:
+            responses = pd.DataFrame(raw['responses'])
+            delays = delay_histogram(responses.assign(
+                IsWeekend=responses['IsWeekend'].astype(bool), Delay=responses['Delay'].astype(float)
+            ))
+        return cls(
+            delays=delays,
+            sender_counts=pd.Series(raw['sender_counts'], dtype=int),
+            role_counts=pd.Series(raw['role_counts'], dtype=int),
+            managers=raw['managers'],
+            first_date=pd.Timestamp(raw['first_date']) if raw['first_date'] else None,
+            last_date=pd.Timestamp(raw['last_date']) if raw['last_date'] else None,
+        )
+
+    def day_type_summary(self) -> pd.DataFrame:
+        """Среднее и медиана времени ответа (минуты) для будней и выходных"""
+        summary = _binned_summary(self.delays, ['IsWeekend']) / [1, 60, 60]
+        summary = summary.reindex([False, True])
+        summary.index = ['Будни', 'Выходные']
+        summary['questions'] = self.delays.groupby('IsWeekend')['Count'].sum().reindex([False, True]).fillna(0).to_numpy()
+        return summary
+
+    def manager_summary(self) -> pd.DataFrame:
+        """Статистика по менеджерам: сообщения, отвеченные вопросы, время ответа"""
+        grouped = _binned_summary(self.delays, ['Manager', 'IsWeekend'])[['mean', 'median']]
+        grouped = grouped.unstack('IsWeekend') / 60 if not grouped.empty else grouped
+        answered = self.delays[self.delays['Bin'] != UNANSWERED_BIN].groupby('Manager')['Count'].sum()
+
+        summary = pd.DataFrame(index=pd.Index(self.managers, name='Manager'))
+        summary['messages'] = self.sender_counts.reindex(summary.index).fillna(0).astype(int)
+        summary['answered'] = answered.reindex(summary.index).fillna(0).astype(int)
+        for stat in ('mean', 'median'):
+            for is_weekend, suffix in ((False, 'weekday'), (True, 'weekend')):
+                column = (stat, is_weekend)
+                values = grouped[column] if column in grouped.columns else pd.Series(dtype=float)
+                summary[f'{stat}_{suffix}'] = values.reindex(summary.index)
+        return summary.sort_values(['answered', 'messages'], ascending=False)
+
+    def chat_summary(self) -> pd.DataFrame:
+        """По чатам (сводный анализ): вопросы, с ответом, медиана и среднее (минуты)"""
+        timing = _binned_summary(self.delays, [CHAT_COLUMN])
+        summary = pd.DataFrame({'questions': self.delays.groupby(CHAT_COLUMN)['Count'].sum()})
+        summary['answered'] = timing['count'].reindex(summary.index).fillna(0).astype(int)
+        summary['median'] = timing['median'].reindex(summary.index) / 60
+        summary['mean'] = timing['mean'].reindex(summary.index) / 60
+        return summary
+
+
+def compute_chat_stats(df: pd.DataFrame) -> ChatStats:
+    """
+    Полный локальный расчёт статистики по DataFrame экспорта (Date/From/Text).
+
+    Args:
+        df: Данные чата
+
+    Returns:
+        ChatStats
+    """
+    stats = stats_from_messages(prepare_messages(df))
+    logger.info(
+        f"📐 Локальная статистика: {stats.total_messages} сообщений, "
+        f"{stats.questions} вопросов клиентов, {len(stats.managers)} менеджеров"
+    )
+    return stats
+
+
+def stats_from_messages(messages: pd.DataFrame) -> ChatStats:
+    """
+    Статистика по подготовленным сообщениям (без записи в лог — для расчёта по блокам).
+
+    Args:
+        messages: Результат prepare_messages()
+
+    Returns:
+        ChatStats
+    """
+    return ChatStats(
+        delays=delay_histogram(compute_responses(messages)),
+        sender_counts=messages['From'].value_counts(),
+        role_counts=messages['Role'].value_counts(),
+        managers=sorted(messages.loc[messages['Role'] == ROLE_SUPPORT, 'From'].unique().tolist()),
+        first_date=messages['Date'].min() if not messages.empty else None,
+        last_date=messages['Date'].max() if not messages.empty else None,
+    )
+
+
+def _fmt_minutes(value) -> str:
+    """Форматирование минут для отчёта"""
+    if value is None or pd.isna(value):
+        return "нет данных"
+    if value < 1:
+        return f"{value * 60:.0f} сек"
+    if value < 60:
+        return f"{value:.1f} мин"
+    return f"{value / 60:.1f} ч"
+
+
+def format_stats_text(stats: ChatStats) -> str:
+    """
+    Текстовое представление статистики (Markdown-подобный формат для DOCX и промпта).
+
+    Args:
+        stats: Результат compute_chat_stats()
+
+    Returns:
+        Текст разделов "Количество вопросов по менеджерам" и "Время ответа"
+    """
+    lines = ["## Количество вопросов по каждому менеджеру", ""]
+
+    managers = stats.manager_summary()
+    if managers.empty:
+        lines.append("Сообщения менеджеров не найдены.")
+    for manager, row in managers.iterrows():
+        lines.append(
+            f"- **{manager}**: ответов на вопросы — {int(row['answered'])}, "
+            f"всего сообщений — {int(row['messages'])}"
+        )
+
+    lines += [
+        "",
+        f"Всего вопросов клиентов: {stats.questions}, без ответа в тот же день: {stats.unanswered}",
+        "",
+        "## Среднее время ответа менеджеров",
+        "",
+    ]
+
+    for day_type, row in stats.day_type_summary().iterrows():
+        lines.append(
+            f"- **{day_type}**: среднее — {_fmt_minutes(row['mean'])}, "
+            f"медиана — {_fmt_minutes(row['median'])} "
+            f"(вопросов: {int(row['questions'])}, с ответом: {int(row['count']) if pd.notna(row['count']) else 0})"
+        )
+
+    if not managers.empty:
+        lines += ["", "### По менеджерам", ""]
+        for manager, row in managers.iterrows():
+            if row['answered'] == 0:
+                continue
+            lines.append(
+                f"- **{manager}**: будни — среднее {_fmt_minutes(row['mean_weekday'])}, "
+                f"медиана {_fmt_minutes(row['median_weekday'])}; "
+                f"выходные — среднее {_fmt_minutes(row['mean_weekend'])}, "
+                f"медиана {_fmt_minutes(row['median_weekend'])}"
+            )
+
+    return "\n".join(lines)
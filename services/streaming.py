@@ -0,0 +1,138 @@
+# services/streaming.py
+"""Приём потоковых ответов Claude API: накопление текста, учёт токенов, троттлинг прогресса"""
+
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Optional, Callable
+
+from services.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_INTERVAL_SECONDS = 3.0  # Не чаще одного уведомления о прогрессе за интервал
+
+
+@dataclass
+class StreamStatus:
+    """Снимок прогресса для уведомлений (бот, GUI, логи)"""
+    stage: str
+    output_tokens: int  # Токенов ответа получено (оценка до завершения запроса)
+    elapsed: float  # Секунд с начала задачи
+    first_token_after: Optional[float] = None  # Секунд до первого фрагмента ответа
+
+    def describe(self) -> str:
+        """Короткое описание для статусного сообщения"""
+        return f"{self.stage}: ~{self.output_tokens:,} токенов, {self.elapsed:.0f} сек"
+
+
+class ResponseStream:
+    """
+    Приёмник потокового ответа.
+
+    create_message() вызывает begin() перед каждой попыткой запроса,
+    feed() на каждый фрагмент текста и end() с итоговым сообщением.
+    Подписчик on_text получает текст по мере поступления (например, сигнал
+    начала ответа в services/multi_prompt.py).
+    on_progress вызывается не чаще одного раза в interval секунд.
+
+    DOCX по фрагментам не собирается: документ рендерится по итоговому тексту
+    в пуле процессов (services/docx_render.py), чтобы разбор Markdown не занимал
+    GIL бота; быструю обратную связь дают уведомления о прогрессе.
+    """
+
+    def __init__(
+            self,
+            on_progress: Optional[Callable[[StreamStatus], None]] = None,
+            on_text: Optional[Callable[[str], None]] = None,
+            interval: float = PROGRESS_INTERVAL_SECONDS
+    ):
+        self.on_progress = on_progress
+        self.on_text = on_text
+        self.interval = interval
+
+        self.stage = "Анализ"
+        self.output_tokens = 0  # Завершённые запросы (точно, по usage)
+        self._chars = []  # Фрагменты текущего запроса
+        self._started_at = time.monotonic()
+        self._first_token_at: Optional[float] = None
+        self._last_notify = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def text(self) -> str:
+        """Текст текущего (последнего) запроса"""
+        return "".join(self._chars)
+
+    @property
+    def current_tokens(self) -> int:
+        """Оценка токенов ответа с учётом текущего незавершённого запроса"""
+        return self.output_tokens + estimate_tokens(self.text)
+
+    def set_stage(self, stage: str):
+        """Сменить этап (всегда уведомляет подписчика)"""
+        with self._lock:
+            self.stage = stage
+        self._notify(force=True)
+
+    def begin(self):
+        """Начало попытки запроса: текст незавершённой попытки отбрасывается"""
+        with self._lock:
+            had_text = bool(self._chars)
+            self._chars = []
+        if had_text:
+            logger.info("🔁 Повтор потокового запроса — частичный ответ отброшен")
+
+    def feed(self, text: str):
+        """Очередной фрагмент ответа"""
+        if not text:
+            return
+        with self._lock:
+            if self._first_token_at is None:
+                self._first_token_at = time.monotonic()
+                logger.info(
+                    f"⚡ Первый фрагмент ответа через {self._first_token_at - self._started_at:.1f} сек"
+                )
+            self._chars.append(text)
+        if self.on_text:
+            self.on_text(text)
+        self._notify()
+
+    def end(self, message=None):
+        """Запрос завершён: фиксируем точное количество токенов ответа"""
+        usage = getattr(message, "usage", None)
+        with self._lock:
+            if usage is not None:
+                self.output_tokens += usage.output_tokens or 0
+            else:
+                self.output_tokens += estimate_tokens("".join(self._chars))
+            self._chars = []
+        self._notify(force=True)
+
+    def status(self) -> StreamStatus:
+        """Текущий прогресс"""
+        now = time.monotonic()
+        return StreamStatus(
+            stage=self.stage,
+            output_tokens=self.current_tokens,
+            elapsed=now - self._started_at,
+            first_token_after=(
+                self._first_token_at - self._started_at if self._first_token_at is not None else None
+            ),
+        )
+
+    def _notify(self, force: bool = False):
+        """Уведомить подписчика с ограничением частоты"""
+        if not self.on_progress:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_notify < self.interval:
+                return
+            self._last_notify = now
+        try:
+            self.on_progress(self.status())
+        except Exception as e:
+            # Ошибка уведомления не должна прерывать анализ
+            logger.warning(f"⚠️ Ошибка колбэка прогресса: {e}")
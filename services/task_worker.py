@@ -2,18 +2,25 @@
 """Task Worker для обработки задач экспорта и анализа в фоновом режиме"""
 
 import asyncio
+import html
 import logging
 import os
 from typing import Optional
 from aiogram import Bot
 from aiogram.types import FSInputFile
-from aiogram.exceptions import TelegramForbiddenError
+from aiogram.exceptions import TelegramForbiddenError, TelegramBadRequest
 
 from core.queue import task_queue, Task, TaskType, TaskStatus
 from core.config import BOT_TOKEN
 from core.db_manager import get_db_manager
 from services.telegram import export_telegram_csv
-from services.analyzer import analyze_csv_with_claude, save_to_docx
+from services.analyzer import analyze_csv_with_claude, ModelTiers, resolve_model_tiers
+from services.docx_render import render_docx_async
+from services.incremental import IncrementalState, analyze_csv_incremental, preflight_incremental
+from services.multi_prompt import analyze_csv_multi, resolve_prompt_specs
+from services.streaming import ResponseStream, StreamStatus
+from services.tokens import UsageTracker, check_user_budget, resolve_daily_budget
+from services.watchlist import read_manifest, manifest_path, format_hits_text
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +33,7 @@ class TaskWorker:
     - EXPORT: экспорт чата в CSV
     - ANALYZE: анализ CSV через Claude API
     - EXPORT_ANALYZE: экспорт + анализ
+    - MULTI_ANALYZE: несколько отчётов по одному CSV
     """
 
     def __init__(self):
@@ -61,6 +69,27 @@ class TaskWorker:
             logger.warning(f"Cannot send document to user {user_id} (bot account)")
             return False
 
+    async def _notify_watchlist(self, user_id: int, file_path: str, chat_id):
+        """Уведомление о совпадениях ключевых слов: сводка и манифест экспорта со ссылками на сообщения"""
+        manifest = read_manifest(file_path)
+        if not manifest:
+            return
+        settings = await get_db_manager().get_user_settings(user_id)
+        if settings and settings.watchlist_notify is False:
+            return
+        hits_text = format_hits_text(manifest['watchlist'])
+        if not hits_text:
+            return
+        await self._safe_send_document(
+            user_id,
+            document=FSInputFile(str(manifest_path(file_path))),
+            caption=(
+                f"🔎 <b>Ключевые слова</b>\n\n"
+                f"📱 Чат: <code>{chat_id}</code>\n\n"
+                f"{html.escape(hits_text)}"
+            )
+        )
+
     async def start(self):
         """Запустить worker"""
         if not BOT_TOKEN:
@@ -88,6 +117,8 @@ class TaskWorker:
                     await self._process_analyze(task)
                 elif task.task_type == TaskType.EXPORT_ANALYZE:
                     await self._process_export_analyze(task)
+                elif task.task_type == TaskType.MULTI_ANALYZE:
+                    await self._process_multi_analyze(task)
 
                 # Пометить задачу как обработанную
                 task_queue.task_done()
@@ -106,6 +137,157 @@ class TaskWorker:
             await self.bot.session.close()
         logger.info("✅ Worker остановлен")
 
+    async def _preflight(
+            self,
+            user,
+            settings,
+            file_path: str,
+            custom_prompt: str,
+            previous: Optional[IncrementalState] = None
+    ):
+        """
+        Оценить токены анализа и проверить дневной бюджет пользователя
+
+        Args:
+            previous: Состояние инкрементального анализа (оцениваются только новые сообщения)
+
+        Returns:
+            PreflightEstimate
+
+        Raises:
+            TokenBudgetError: Если бюджет будет превышен
+        """
+        loop = asyncio.get_event_loop()
+        estimate = await loop.run_in_executor(
+            None,
+            preflight_incremental,
+            file_path,
+            previous,
+            user.claude_api_key,
+            custom_prompt,
+            resolve_model_tiers(settings)
+        )
+
+        db = get_db_manager()
+        used_today = await db.get_tokens_used_today(user.user_id)
+        check_user_budget(estimate.total_tokens, used_today, resolve_daily_budget(settings))
+        return estimate
+
+    async def _record_usage(self, user_id: int, usage: UsageTracker):
+        """Сохранить израсходованные токены в БД"""
+        db = get_db_manager()
+        for model, totals in usage.by_model.items():
+            await db.add_token_usage(user_id, model, totals["input"], totals["output"])
+            logger.info(
+                f"📊 Usage user {user_id}, {model}: "
+                f"in={totals['input']}, out={totals['output']}, requests={totals['requests']}"
+            )
+        if usage.by_tier:
+            logger.info(f"📊 Usage user {user_id} по уровням моделей: {usage.describe_tiers()}")
+
+    async def _safe_edit_message(self, message, text: str) -> bool:
+        """
+        Безопасное редактирование статусного сообщения
+
+        Returns:
+            bool: True если сообщение обновлено
+        """
+        try:
+            await message.edit_text(text)
+            return True
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # "message is not modified", удалённое сообщение и т.п. — не критично
+            logger.debug(f"Cannot edit status message: {e}")
+            return False
+
+    async def _analyze_to_docx(
+            self,
+            user_id: int,
+            api_key: str,
+            file_path: str,
+            custom_prompt: Optional[str],
+            source_filename: str,
+            output_path: str,
+            header: str,
+            chat_key: Optional[str] = None,
+            previous: Optional[IncrementalState] = None,
+            models: Optional[ModelTiers] = None
+    ) -> str:
+        """
+        Анализ с потоковым ответом: прогресс в статусном сообщении, DOCX рендерится в пуле процессов
+
+        Args:
+            header: Первая часть статусного сообщения (задача, файл)
+            chat_key: Идентификатор чата — включает инкрементальный режим
+            previous: Сохранённое состояние чата (для chat_key)
+            models: Модели по уровням (с учётом настроек пользователя)
+
+        Returns:
+            Полный текст анализа
+        """
+        loop = asyncio.get_event_loop()
+        status_message = None
+        try:
+            status_message = await self.bot.send_message(user_id, f"{header}\n\n⏳ Отправляю данные в Claude API...")
+        except TelegramForbiddenError:
+            logger.warning(f"Cannot send message to user {user_id} (bot account)")
+
+        def on_progress(status: StreamStatus):
+            # Вызывается из потока анализа — передаём обновление в event loop бота
+            if status_message is not None:
+                asyncio.run_coroutine_threadsafe(
+                    self._safe_edit_message(status_message, f"{header}\n\n{status.describe()}"),
+                    loop
+                )
+
+        models = models or ModelTiers()
+        stream = ResponseStream(on_progress=on_progress)
+        usage = UsageTracker()
+
+        if chat_key is None:
+            analysis_text = await loop.run_in_executor(
+                None,
+                lambda: analyze_csv_with_claude(
+                    file_path,
+                    api_key,  # Per-user Claude API key
+                    custom_prompt,  # Custom prompt or None
+                    usage=usage,
+                    stream=stream,
+                    models=models
+                )
+            )
+            await self._record_usage(user_id, usage)
+        else:
+            # Инкрементальный режим: только новые сообщения + сводка прошлого отчёта
+            try:
+                analysis_text, new_state = await loop.run_in_executor(
+                    None,
+                    lambda: analyze_csv_incremental(
+                        file_path,
+                        previous,
+                        api_key,
+                        custom_prompt,
+                        usage=usage,
+                        stream=stream,
+                        models=models
+                    )
+                )
+            finally:
+                await self._record_usage(user_id, usage)
+            await get_db_manager().save_chat_state(user_id, chat_key, **new_state.to_record())
+
+        # Рендеринг DOCX вне event loop и GIL бота — по итоговому тексту, а не по фрагментам потока:
+        # сборка по ходу ответа шла бы в процессе бота
+        await render_docx_async(analysis_text, output_path, source_filename, models.report)
+
+        if status_message is not None:
+            final = stream.status()
+            await self._safe_edit_message(
+                status_message,
+                f"{header}\n\n✅ Ответ получен: ~{final.output_tokens:,} токенов за {final.elapsed:.0f} сек"
+            )
+        return analysis_text
+
     async def _process_export(self, task: Task):
         """
         Обработать задачу экспорта
@@ -155,6 +337,7 @@ class TaskWorker:
                     f"📄 Файл: <code>{filename}</code>"
                 )
             )
+            await self._notify_watchlist(user_id, file_path, chat_id)
 
             await task_queue.mark_completed(task.task_id)
             logger.info(f"✅ Task #{task.task_id} completed successfully")
@@ -216,31 +399,13 @@ class TaskWorker:
                     f"Please configure it using /settings command."
                 )
 
-            # Уведомление о начале
-            await self._safe_send_message(
-                user_id,
-                f"🤖 <b>Анализ начался</b>\n\n"
-                f"🆔 Задача: #{task.task_id}\n"
-                f"📄 Файл: <code>{filename}</code>\n\n"
-                f"⏳ Отправляю данные в Claude API..."
-            )
-
             # Выполнить анализ через Claude API с per-user ключом и кастомным промптом
             logger.info(f"Starting analysis for task #{task.task_id}, user {user_id}")
 
             # Получить кастомный промпт из настроек пользователя
             settings = await db.get_user_settings(user_id)
             custom_prompt = settings.custom_prompt if settings else None
-
-            # Запустить анализ в отдельном потоке (т.к. analyze_csv_with_claude синхронный)
-            loop = asyncio.get_event_loop()
-            analysis_text = await loop.run_in_executor(
-                None,
-                analyze_csv_with_claude,
-                file_path,
-                user.claude_api_key,  # Per-user Claude API key
-                custom_prompt  # Custom prompt or None
-            )
+            models = resolve_model_tiers(settings)
 
             # Создать DOCX файл в per-user папке
             base_filename = os.path.basename(filename)
@@ -251,12 +416,20 @@ class TaskWorker:
             os.makedirs(user_output_folder, exist_ok=True)
             output_path = os.path.join(user_output_folder, output_filename)
 
-            await loop.run_in_executor(
-                None,
-                save_to_docx,
-                analysis_text,
+            # Анализ с потоковым ответом (прогресс в статусном сообщении)
+            await self._analyze_to_docx(
+                user_id,
+                user.claude_api_key,
+                file_path,
+                custom_prompt,
+                base_filename,
                 output_path,
-                base_filename
+                header=(
+                    f"🤖 <b>Анализ начался</b>\n\n"
+                    f"🆔 Задача: #{task.task_id}\n"
+                    f"📄 Файл: <code>{filename}</code>"
+                ),
+                models=models
             )
 
             # Отправить DOCX файл
@@ -271,7 +444,7 @@ class TaskWorker:
                     f"✅ <b>Анализ завершен!</b>\n\n"
                     f"🆔 Задача: #{task.task_id}\n"
                     f"📄 Файл: <code>{filename}</code>\n"
-                    f"🤖 Модель: Claude Sonnet 4\n"
+                    f"🤖 Модель: <code>{models.report}</code>\n"
                     f"📊 Результат: <code>{output_filename}</code>"
                 )
             )
@@ -347,41 +520,49 @@ class TaskWorker:
                 document=document,
                 caption=f"✅ Экспорт завершен: <code>{filename}</code>"
             )
-
-            # Шаг 2: Анализ
-            await self._safe_send_message(
-                user_id,
-                f"🤖 <b>Шаг 2/2: Анализ через Claude API...</b>\n\n"
-                f"⏳ Это может занять некоторое время."
-            )
-
-            logger.info(f"Step 2/2: Analysis for task #{task.task_id}, user {user_id}")
+            await self._notify_watchlist(user_id, file_path, chat_id)
 
             # Получить кастомный промпт из настроек пользователя
             settings = await db.get_user_settings(user_id)
             custom_prompt = settings.custom_prompt if settings else None
+            models = resolve_model_tiers(settings)
 
-            loop = asyncio.get_event_loop()
-            analysis_text = await loop.run_in_executor(
-                None,
-                analyze_csv_with_claude,
-                file_path,
-                user.claude_api_key,  # Per-user Claude API key
-                custom_prompt  # Custom prompt or None
-            )
+            # Состояние прошлого анализа этого чата (инкрементальный режим)
+            chat_key = str(chat_id)
+            previous = IncrementalState.from_record(await db.get_chat_state(user_id, chat_key))
+            if previous and not previous.matches(custom_prompt):
+                previous = None  # Промпт изменился — сводка прошлого отчёта неприменима
+
+            # Оценка токенов и проверка бюджета до отправки в Claude
+            estimate = await self._preflight(user, settings, file_path, custom_prompt, previous)
+
+            # Шаг 2: Анализ
+            logger.info(f"Step 2/2: Analysis for task #{task.task_id}, user {user_id}")
 
-            # Создать DOCX в per-user папке
             output_filename = filename.replace('.csv', '_analysis.docx')
             user_output_folder = os.path.join("data", "users", str(user_id), "analysis")
             os.makedirs(user_output_folder, exist_ok=True)
             output_path = os.path.join(user_output_folder, output_filename)
 
-            await loop.run_in_executor(
-                None,
-                save_to_docx,
-                analysis_text,
+            await self._analyze_to_docx(
+                user_id,
+                user.claude_api_key,
+                file_path,
+                custom_prompt,
+                filename,
                 output_path,
-                filename
+                header=(
+                    "🤖 <b>Шаг 2/2: Анализ через Claude API...</b>\n\n"
+                    + (
+                        f"➕ Обновление отчёта от {previous.last_message_at:%d.%m.%Y %H:%M}: "
+                        f"отправляются только новые сообщения\n"
+                        if previous else ""
+                    )
+                    + estimate.describe_html()
+                ),
+                chat_key=chat_key,
+                previous=previous,
+                models=models
             )
 
             # Отправить DOCX
@@ -433,3 +614,111 @@ class TaskWorker:
                 )
 
             await task_queue.mark_failed(task.task_id)
+
+    async def _process_multi_analyze(self, task: Task):
+        """
+        Обработать задачу нескольких отчётов по одному CSV
+
+        Args:
+            task: Задача с данными {file_path, filename, prompts, output}
+        """
+        user_id = task.user_id
+        file_path = task.data.get('file_path')
+        filename = task.data.get('filename', 'unknown.csv')
+        output = task.data.get('output', 'combined')
+
+        try:
+            db = get_db_manager()
+            user = await db.get_user(user_id)
+
+            if not user:
+                raise ValueError(f"User {user_id} not found")
+
+            if not user.claude_api_key:
+                raise ValueError(
+                    f"Claude API key not configured for user {user_id}. "
+                    f"Please configure it using /settings command."
+                )
+
+            settings = await db.get_user_settings(user_id)
+            custom_prompt = settings.custom_prompt if settings else None
+            models = resolve_model_tiers(settings)
+            specs = resolve_prompt_specs(task.data.get('prompts') or [], custom_prompt)
+
+            logger.info(f"Starting multi-analysis for task #{task.task_id}, user {user_id}: {len(specs)} prompts")
+
+            header = (
+                f"📑 <b>Анализ: {len(specs)} отчётов</b>\n\n"
+                f"🆔 Задача: #{task.task_id}\n"
+                f"📄 Файл: <code>{filename}</code>"
+            )
+            loop = asyncio.get_event_loop()
+            status_message = None
+            try:
+                status_message = await self.bot.send_message(user_id, f"{header}\n\n⏳ Отправляю данные в Claude API...")
+            except TelegramForbiddenError:
+                logger.warning(f"Cannot send message to user {user_id} (bot account)")
+
+            def on_progress(status: StreamStatus):
+                if status_message is not None:
+                    asyncio.run_coroutine_threadsafe(
+                        self._safe_edit_message(status_message, f"{header}\n\n{status.describe()}"),
+                        loop
+                    )
+
+            stream = ResponseStream(on_progress=on_progress)
+            usage = UsageTracker()
+            try:
+                result = await loop.run_in_executor(
+                    None,
+                    lambda: analyze_csv_multi(
+                        file_path, specs, user.claude_api_key, usage=usage, stream=stream, models=models
+                    )
+                )
+            finally:
+                await self._record_usage(user_id, usage)
+
+            user_output_folder = os.path.join("data", "users", str(user_id), "analysis")
+            os.makedirs(user_output_folder, exist_ok=True)
+            base_name = os.path.basename(filename).replace('.csv', '')
+
+            if output == 'separate':
+                documents = [
+                    (os.path.join(user_output_folder, f"{base_name}_report{index + 1}_analysis.docx"), text)
+                    for index, (_, text) in enumerate(result.separate())
+                ]
+            else:
+                documents = [(os.path.join(user_output_folder, f"{base_name}_reports_analysis.docx"), result.combined())]
+
+            # Документы рендерятся в пуле процессов параллельно
+            await asyncio.gather(*[
+                render_docx_async(text, path, filename, models.report) for path, text in documents
+            ])
+
+            for path, _ in documents:
+                await self._safe_send_document(
+                    user_id,
+                    document=FSInputFile(path),
+                    caption=(
+                        f"✅ <b>Анализ завершен!</b>\n\n"
+                        f"🆔 Задача: #{task.task_id}\n"
+                        f"📄 Файл: <code>{filename}</code>\n"
+                        f"📊 Результат: <code>{os.path.basename(path)}</code>"
+                    )
+                )
+
+            await task_queue.mark_completed(task.task_id)
+            logger.info(f"✅ Задача #{task.task_id} (несколько отчётов) завершена успешно")
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка при анализе задачи #{task.task_id}: {e}", exc_info=True)
+
+            await self._safe_send_message(
+                user_id,
+                f"❌ <b>Ошибка анализа</b>\n\n"
+                f"🆔 Задача: #{task.task_id}\n"
+                f"📄 Файл: <code>{filename}</code>\n\n"
+                f"Ошибка: {str(e)}"
+            )
+
+            await task_queue.mark_failed(task.task_id)
@@ -14,8 +14,12 @@ from telethon.errors import SessionPasswordNeededError
 import os
 from typing import Optional
 
+import pandas as pd
+
 from core.db_manager import get_db_manager
 from core.config import API_ID, API_HASH, PHONE, SESSION_FILE
+from services.stats import RoleRules, classify_senders, load_role_rules, parse_role_rules
+from services.watchlist import Watchlist, WatchlistSink, load_watchlist, parse_watchlist, write_manifest
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -37,6 +41,55 @@ def clean_filename(name):
     return re.sub(r'[\\/*?:"<>|]', "", name).replace(" ", "_")
 
 
+# Колонки CSV экспорта: Role — после Text, начало заголовка совпадает с прежним форматом
+EXPORT_FIELDNAMES = ['Date', 'From', 'Text', 'Role']
+
+
+def user_role_rules(settings) -> RoleRules:
+    """Правила ролей пользователя бота (некорректные — глобальные ROLE_RULES)"""
+    if settings and settings.role_rules:
+        try:
+            return parse_role_rules(settings.role_rules)
+        except ValueError as e:
+            logger.warning(f"⚠️ Правила ролей пользователя {settings.user_id} не применены: {e}")
+    return load_role_rules()
+
+
+def assign_roles(messages_data: list, sender_ids: list, rules: RoleRules):
+    """Колонка Role для выгруженных сообщений: одна векторная классификация на весь экспорт"""
+    if not messages_data:
+        return
+    senders = pd.Series([row['From'] for row in messages_data])
+    roles = classify_senders(senders, rules, sender_ids=pd.Series(sender_ids, dtype=object))
+    for row, role in zip(messages_data, roles.tolist()):
+        row['Role'] = role
+
+
+def user_watchlist(settings) -> Watchlist:
+    """Ключевые слова пользователя бота (не заданы или некорректны — глобальный WATCHLIST)"""
+    if settings and settings.watchlist:
+        try:
+            return parse_watchlist(settings.watchlist)
+        except ValueError as e:
+            logger.warning(f"⚠️ Ключевые слова пользователя {settings.user_id} не применены: {e}")
+    return load_watchlist()
+
+
+def write_export_manifest(csv_path: str, chat_title: str, period: tuple, messages: int, sink: WatchlistSink):
+    """Манифест экспорта рядом с CSV (только если задан список ключевых слов)"""
+    if not len(sink.watchlist):
+        return
+    path = write_manifest(csv_path, {
+        'file': os.path.basename(csv_path),
+        'chat': chat_title,
+        'period': {'start': period[0], 'end': period[1]},
+        'exported_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'messages': messages,
+        'watchlist': sink.to_dict(),
+    })
+    logger.info(f"🔎 Ключевые слова: {sink.matched} сообщений с совпадениями, манифест {path}")
+
+
 async def export_telegram_csv(
     user_id: int,
     chat: str,
@@ -170,7 +223,10 @@ async def export_telegram_csv(
         logger.info(f"File: {output_file}")
 
         messages_data = []
+        sender_ids = []
         message_count = 0
+        # Ключевые слова проверяются по ходу выгрузки: один проход по тексту на сообщение
+        sink = WatchlistSink(user_watchlist(settings))
 
         # Получить настройки фильтрации из БД
         exclude_user_id = settings.exclude_user_id if settings else 0
@@ -203,24 +259,29 @@ async def export_telegram_csv(
                 continue
 
             clean_text = msg.message.replace('\n', ' ').replace('\r', ' ').strip()
+            date_text = msg.date.strftime('%d-%m-%Y %H:%M:%S')
 
             messages_data.append({
-                'Date': msg.date.strftime('%d-%m-%Y %H:%M:%S'),
+                'Date': date_text,
                 'From': sender,
                 'Text': clean_text
             })
+            sender_ids.append(msg.sender_id)
+            sink.feed(msg.id, date_text, sender, clean_text)
 
             message_count += 1
             if message_count % 100 == 0:
                 logger.info(f"Processed messages: {message_count}")
 
+        assign_roles(messages_data, sender_ids, user_role_rules(settings))
+
         # Создать per-user папку для экспортов
         user_export_folder = os.path.join("data", "users", str(user_id), "exports")
         os.makedirs(user_export_folder, exist_ok=True)
         output_filepath = os.path.join(user_export_folder, output_file)
 
         # Использовать временный файл для предотвращения частичной записи
-        fieldnames = ['Date', 'From', 'Text']
+        fieldnames = EXPORT_FIELDNAMES
         with tempfile.NamedTemporaryFile(mode='w', newline='', encoding='utf-8-sig',
                                          dir=user_export_folder, delete=False) as tmp_f:
             temp_filepath = tmp_f.name
@@ -231,6 +292,8 @@ async def export_telegram_csv(
         # Переместить временный файл в финальное место только после успешной записи
         shutil.move(temp_filepath, output_filepath)
 
+        write_export_manifest(output_filepath, chat_title, (s_str, e_str), len(messages_data), sink)
+
         logger.info(f"✅ Export completed: {output_filepath}")
         logger.info(f"📊 Exported messages: {len(messages_data)}")
 
@@ -396,7 +459,9 @@ async def export_telegram_csv_legacy(
         logger.info(f"[LEGACY] File: {output_file}")
 
         messages_data = []
+        sender_ids = []
         message_count = 0
+        sink = WatchlistSink(load_watchlist())
 
         # Export messages
         async for msg in client.iter_messages(entity, limit=limit, offset_date=parsed_end_date):
@@ -417,24 +482,29 @@ async def export_telegram_csv_legacy(
                     sender = msg.sender.title
 
             clean_text = msg.message.replace('\n', ' ').replace('\r', ' ').strip()
+            date_text = msg.date.strftime('%d-%m-%Y %H:%M:%S')
 
             messages_data.append({
-                'Date': msg.date.strftime('%d-%m-%Y %H:%M:%S'),
+                'Date': date_text,
                 'From': sender,
                 'Text': clean_text
             })
+            sender_ids.append(msg.sender_id)
+            sink.feed(msg.id, date_text, sender, clean_text)
 
             message_count += 1
             if message_count % 100 == 0:
                 logger.info(f"[LEGACY] Processed messages: {message_count}")
 
+        assign_roles(messages_data, sender_ids, load_role_rules())
+
         # Save to input_csv folder (legacy behavior)
         input_folder = get_input_folder()
         input_folder.mkdir(parents=True, exist_ok=True)
         output_filepath = os.path.join(str(input_folder), output_file)
 
         # Использовать временный файл для предотвращения частичной записи
-        fieldnames = ['Date', 'From', 'Text']
+        fieldnames = EXPORT_FIELDNAMES
         with tempfile.NamedTemporaryFile(mode='w', newline='', encoding='utf-8-sig',
                                          dir=str(input_folder), delete=False) as tmp_f:
             temp_filepath = tmp_f.name
@@ -445,6 +515,8 @@ async def export_telegram_csv_legacy(
         # Переместить временный файл в финальное место только после успешной записи
         shutil.move(temp_filepath, output_filepath)
 
+        write_export_manifest(output_filepath, chat_title, (s_str, e_str), len(messages_data), sink)
+
         logger.info(f"[LEGACY] ✅ Export completed: {output_filepath}")
         logger.info(f"[LEGACY] 📊 Exported messages: {len(messages_data)}")
 
@@ -0,0 +1,223 @@
+# services/tokens.py
+"""Оценка токенов, бюджеты и выбор стратегии анализа до отправки в Claude API"""
+
+import re
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import anthropic
+
+from core.config import USER_DAILY_TOKEN_BUDGET
+
+logger = logging.getLogger(__name__)
+
+# Стратегии анализа
+STRATEGY_SINGLE = "single"  # Данные как есть, одним запросом
+STRATEGY_COMPACT = "compact"  # Сжатые данные, одним запросом
+STRATEGY_CHUNKED = "chunked"  # Map-reduce по частям
+STRATEGY_SAMPLED = "sampled"  # Выборка сообщений, одним запросом
+STRATEGY_SECTIONS = "sections"  # Разделы отчёта параллельными запросами (services/sections.py)
+
+STRATEGY_LABELS = {
+    STRATEGY_SINGLE: "один запрос",
+    STRATEGY_COMPACT: "сжатие + один запрос",
+    STRATEGY_CHUNKED: "по частям (map-reduce)",
+    STRATEGY_SAMPLED: "выборка + один запрос",
+    STRATEGY_SECTIONS: "разделы отчёта параллельно",
+}
+
+# Уровни моделей
+TIER_MAP = "map"  # Заметки по частям, извлечение (быстрая дешёвая модель)
+TIER_REPORT = "report"  # Итоговый отчёт (сильная модель)
+
+# Локальная оценка: ASCII ~4 символа на токен, кириллица и прочее ~2.5
+ASCII_CHARS_PER_TOKEN = 4.0
+OTHER_CHARS_PER_TOKEN = 2.5
+
+_NON_ASCII_RE = re.compile(r'[^\x00-\x7f]')
+
+
+class TokenBudgetError(ValueError):
+    """Запрос или задача превышает бюджет токенов"""
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Быстрая локальная оценка количества токенов (без обращения к API).
+
+    Args:
+        text: Текст запроса
+
+    Returns:
+        Приблизительное количество токенов
+    """
+    if not text:
+        return 0
+    non_ascii = len(_NON_ASCII_RE.findall(text))
+    ascii_chars = len(text) - non_ascii
+    return int(ascii_chars / ASCII_CHARS_PER_TOKEN + non_ascii / OTHER_CHARS_PER_TOKEN) + 1
+
+
+def count_tokens(client: Optional[anthropic.Anthropic], prompt: str, model: str) -> tuple:
+    """
+    Точный подсчёт токенов через count-tokens endpoint с локальным fallback.
+
+    Args:
+        client: Клиент Claude API (None — только локальная оценка)
+        prompt: Текст запроса
+        model: Модель Claude
+
+    Returns:
+        (количество токенов, True если значение точное)
+    """
+    if client is not None:
+        try:
+            result = client.messages.count_tokens(
+                model=model,
+                messages=[{"role": "user", "content": prompt}]
+            )
+            return result.input_tokens, True
+        except Exception as e:
+            logger.warning(f"⚠️ count_tokens недоступен, используется локальная оценка: {e}")
+    return estimate_tokens(prompt), False
+
+
+def choose_strategy(raw_tokens: int, compact_tokens: int, budget: int, prefer_compact: bool = True) -> str:
+    """
+    Выбор стратегии анализа по размеру данных.
+
+    Args:
+        raw_tokens: Токены запроса с данными как есть
+        compact_tokens: Токены запроса со сжатыми данными
+        budget: Лимит входных токенов на один запрос
+        prefer_compact: Сжимать данные даже если они помещаются как есть
+
+    Returns:
+        STRATEGY_SINGLE | STRATEGY_COMPACT | STRATEGY_CHUNKED
+    """
+    if not prefer_compact and raw_tokens <= budget:
+        return STRATEGY_SINGLE
+    if compact_tokens <= budget:
+        return STRATEGY_COMPACT
+    return STRATEGY_CHUNKED
+
+
+def check_request_budget(tokens: int, budget: int, what: str = "Запрос"):
+    """Проверка лимита токенов на один запрос"""
+    if budget and tokens > budget:
+        raise TokenBudgetError(
+            f"{what} содержит ~{tokens:,} токенов — больше лимита {budget:,} на один запрос"
+        )
+
+
+def check_user_budget(estimated_tokens: int, used_today: int, daily_budget: int):
+    """
+    Проверка дневного бюджета пользователя.
+
+    Args:
+        estimated_tokens: Оценка токенов новой задачи
+        used_today: Уже израсходовано сегодня
+        daily_budget: Дневной бюджет (0 — без ограничений)
+    """
+    if daily_budget and used_today + estimated_tokens > daily_budget:
+        remaining = max(daily_budget - used_today, 0)
+        raise TokenBudgetError(
+            f"Задача потребует ~{estimated_tokens:,} токенов, "
+            f"а в дневном бюджете осталось {remaining:,} из {daily_budget:,}"
+        )
+
+
+@dataclass
+class PreflightEstimate:
+    """Результат предварительной оценки анализа"""
+    strategy: str
+    raw_tokens: int
+    compact_tokens: int
+    request_tokens: int  # Самый большой отдельный запрос
+    total_tokens: int  # Все запросы задачи (входные + ожидаемые выходные)
+    requests: int = 1
+    exact: bool = False
+
+    def describe(self) -> str:
+        """Однострочное описание для логов"""
+        source = "count_tokens" if self.exact else "оценка"
+        return (
+            f"Токены ({source}): как есть ~{self.raw_tokens:,}, сжато ~{self.compact_tokens:,}; "
+            f"стратегия: {STRATEGY_LABELS[self.strategy]}, запросов: {self.requests}, "
+            f"всего ~{self.total_tokens:,}"
+        )
+
+    def describe_html(self) -> str:
+        """Описание для сообщения бота"""
+        approx = "" if self.exact else "~"
+        return (
+            f"📏 Объём: {approx}{self.request_tokens:,} токенов на запрос, "
+            f"всего {approx}{self.total_tokens:,}\n"
+            f"🧭 Стратегия: {STRATEGY_LABELS[self.strategy]}"
+            + (f" ({self.requests} запросов)" if self.requests > 1 else "")
+        )
+
+
+@dataclass
+class UsageTracker:
+    """Потокобезопасный учёт фактически израсходованных токенов (по моделям и уровням)"""
+    by_model: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    by_tier: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(
+            self,
+            model: str,
+            input_tokens: int,
+            output_tokens: int,
+            tier: str = TIER_REPORT,
+            cache_read: int = 0
+    ):
+        with self._lock:
+            for key, bucket in ((model, self.by_model), (tier, self.by_tier)):
+                totals = bucket.setdefault(key, {"input": 0, "output": 0, "requests": 0, "cache_read": 0})
+                totals["input"] += input_tokens or 0
+                totals["output"] += output_tokens or 0
+                totals["requests"] += 1
+                totals["cache_read"] += cache_read or 0
+
+    def add_message(self, model: str, message, tier: str = TIER_REPORT):
+        """
+        Учесть usage из ответа Messages API.
+
+        Запись в кэш промпта считается входными токенами (оплачивается не дешевле),
+        чтение из кэша — отдельно в cache_read (в дневной бюджет не входит).
+        """
+        usage = getattr(message, "usage", None)
+        if usage is not None:
+            cache_write = getattr(usage, "cache_creation_input_tokens", 0) or 0
+            cache_read = getattr(usage, "cache_read_input_tokens", 0) or 0
+            self.add(
+                model, (usage.input_tokens or 0) + cache_write, usage.output_tokens,
+                tier=tier, cache_read=cache_read
+            )
+
+    @property
+    def total_tokens(self) -> int:
+        with self._lock:
+            return sum(t["input"] + t["output"] for t in self.by_model.values())
+
+    def describe_tiers(self) -> str:
+        """Расход по уровням для логов"""
+        with self._lock:
+            return "; ".join(
+                f"{tier}: in={t['input']:,}, out={t['output']:,}, "
+                f"из кэша={t['cache_read']:,}, запросов={t['requests']}"
+                for tier, t in sorted(self.by_tier.items())
+            ) or "нет запросов"
+
+
+def resolve_daily_budget(settings) -> int:
+    """
+    Дневной бюджет пользователя: персональный (UserSettings.daily_token_budget)
+    или глобальный USER_DAILY_TOKEN_BUDGET. 0 — без ограничений.
+    """
+    personal = getattr(settings, "daily_token_budget", None) if settings else None
+    return USER_DAILY_TOKEN_BUDGET if personal is None else personal
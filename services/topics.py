@@ -0,0 +1,314 @@
+# services/topics.py
+"""Темы обращений клиентов локально: TF-IDF по словам и биграммам + сферический k-means (NumPy)"""
+
+import logging
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from core.config import TOPIC_COUNT
+from services.dedup import normalize_texts
+from services.stats import sender_roles, ROLE_CLIENT
+
+logger = logging.getLogger(__name__)
+
+MIN_WORD_CHARS = 3  # Короче — не признак («да», «ок»)
+MIN_STEM_CHARS = 4  # Окончание не отрезается, если от слова останется меньше
+MIN_TERM_MESSAGES = 2  # Признак должен встречаться хотя бы в стольких сообщениях
+MAX_TERM_SHARE = 0.9  # ...и не больше чем в этой доле сообщений (неинформативен)
+MAX_FEATURES = 5000  # Самых частых признаков в словаре
+FIT_DOCS = 20000  # Уникальных текстов для подбора центров; остальные только распределяются по темам
+MAX_ITERATIONS = 30
+RESTARTS = 8  # Запусков k-means с разной инициализацией: остаётся лучший
+LABEL_TERMS = 4  # Признаков в названии темы
+EXAMPLES = 3  # Примеров сообщений на тему
+EXAMPLE_MAX_CHARS = 150
+TOPICS_SEED = 20240601  # Фиксированная инициализация: одинаковые темы при каждом запуске
+
+# Окончания русских слов (от длинных к коротким): «доставку», «доставки», «доставкой» -> «доставк»
+RU_ENDINGS = sorted({
+    'иями', 'ями', 'ами', 'иях', 'ях', 'ах', 'ием', 'ем', 'ом', 'ией', 'ей', 'ой', 'ий', 'ый', 'ого', 'его',
+    'ому', 'ему', 'ыми', 'ими', 'ых', 'их', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ую', 'юю', 'ов', 'ев',
+    'ам', 'ям', 'ешь', 'ет', 'ете', 'ут', 'ют', 'ит', 'ат', 'ят', 'ила', 'ило', 'или', 'ала', 'али', 'ал',
+    'ил', 'ла', 'ли', 'ть', 'ться', 'тся', 'ся', 'сь', 'ия', 'ие', 'ии', 'ью', 'а', 'я', 'о', 'е', 'ы',
+    'и', 'у', 'ю', 'ь', 'й',
+}, key=len, reverse=True)
+
+# Служебные слова и вежливые формулы: встречаются во всех темах
+STOP_WORDS = frozenset("""
+и в во не что он на я с со как а то все всё она так его но да ты к у же вы за бы по только ее её мне было вот от
+меня еще ещё нет о из ему теперь когда даже ну ли если уже или ни быть был него до вас нибудь уж вам ведь там потом
+себя ничего ей может они тут где есть надо ней для мы тебя их чем была сам чтоб без будто чего раз тоже себе под
+будет ж тогда кто этот того потому этого какой совсем ним здесь этом один почти мой тем чтобы нее сейчас были куда
+зачем всех никогда можно при наконец два об другой хоть после над больше тот через эти нас про всего них какая
+много разве три эту моя впрочем хорошо свою этой перед иногда лучше чуть том нельзя такой им более всегда конечно
+всю между это наш наша наши ваш ваша ваши вашей нашей нам вами также либо пока очень просто есть будут было будем
+здравствуйте здравствуй добрый доброе день утро вечер привет коллеги пожалуйста спасибо благодарю подскажите скажите
+уточните просьба прошу извините можете могу могли сможете хотел хотела хотим нужно надо
+""".split())
+
+
+def stem(word: str) -> str:
+    """Грубый стемминг: отрезать самое длинное подходящее окончание"""
+    for ending in RU_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_CHARS:
+            return word[:-len(ending)]
+    return word
+
+
+def _features(texts: pd.Series, weights: np.ndarray) -> tuple:
+    """
+    Признаки текстов: основы слов и биграммы соседних основ (служебные слова пропускаются).
+
+    Тексты нормализованы (слова через один пробел), поэтому все слова разбираются
+    одним split; фильтр и стемминг — только по уникальным словам.
+
+    Returns:
+        (rows, cols — номер текста и признака для каждого вхождения, названия признаков в самой частой форме слов)
+    """
+    counts = np.where(texts.str.len().to_numpy() > 0, texts.str.count(' ').to_numpy() + 1, 0)
+    word_codes, words = pd.factorize(pd.Series(" ".join(texts.to_numpy(dtype=object)).split(), dtype=object))
+    docs = np.repeat(np.arange(len(texts)), counts)
+
+    valid = np.fromiter(
+        (len(word) >= MIN_WORD_CHARS and word.isalpha() and word not in STOP_WORDS for word in words),
+        dtype=bool, count=len(words),
+    )
+    base_codes, bases = pd.factorize(pd.Series([stem(word) for word in words], dtype=object))
+    keep = valid[word_codes]
+    docs, word_codes = docs[keep], word_codes[keep]
+    tokens = base_codes[word_codes]
+
+    # Самая частая форма основы (в сообщениях): «доставк» -> «доставка»
+    word_weight = np.bincount(word_codes, weights=weights[docs], minlength=len(words))
+    order = np.lexsort((-word_weight, base_codes))
+    first = order[np.r_[True, base_codes[order][1:] != base_codes[order][:-1]]]
+    forms = np.empty(len(bases), dtype=object)
+    forms[base_codes[first]] = np.asarray(words, dtype=object)[first]
+
+    # Биграммы: соседние основы одного текста
+    pairs = np.flatnonzero(docs[1:] == docs[:-1])
+    pair_codes, pair_keys = pd.factorize(tokens[pairs] * len(bases) + tokens[pairs + 1])
+    names = np.concatenate([
+        forms,
+        np.array([f"{forms[key // len(bases)]} {forms[key % len(bases)]}" for key in pair_keys], dtype=object),
+    ])
+    rows = np.concatenate([docs, docs[pairs]])
+    cols = np.concatenate([tokens, len(bases) + pair_codes])
+    order = np.argsort(rows, kind='stable')
+    return rows[order], cols[order], names
+
+
+def _tfidf(rows: np.ndarray, cols: np.ndarray, names: np.ndarray, size: int, weights: np.ndarray) -> tuple:
+    """
+    Разреженная матрица TF-IDF в координатном формате (строки по возрастанию), строки нормированы.
+
+    Returns:
+        (rows, cols, data, названия оставленных признаков)
+    """
+    if not len(cols):
+        return rows, cols, np.zeros(0), names[:0]
+
+    # Повторы признака в тексте: сублинейный TF
+    keys, counts = np.unique(rows * len(names) + cols, return_counts=True)
+    rows, cols = keys // len(names), keys % len(names)
+    tf = 1 + np.log(counts)
+
+    # Частота признака — в сообщениях (уникальный текст весит столько, сколько раз встречался)
+    frequency = np.bincount(cols, weights=weights[rows], minlength=len(names))
+    total = weights.sum()
+    allowed = (frequency >= MIN_TERM_MESSAGES) & (frequency <= MAX_TERM_SHARE * total)
+    candidates = np.flatnonzero(allowed)
+    kept = candidates[np.argsort(-frequency[candidates], kind='stable')[:MAX_FEATURES]]
+
+    remap = np.full(len(names), -1)
+    remap[kept] = np.arange(len(kept))
+    keep = remap[cols] >= 0
+    rows, cols, tf = rows[keep], remap[cols[keep]], tf[keep]
+
+    data = tf * (np.log((1 + total) / (1 + frequency[kept])) + 1)[cols]
+    norms = np.sqrt(np.bincount(rows, weights=data ** 2, minlength=size))
+    return rows, cols, data / norms[rows], names[kept]
+
+
+def _similarity(rows: np.ndarray, cols: np.ndarray, data: np.ndarray, size: int,
+                centroids: np.ndarray) -> np.ndarray:
+    """Косинусное сходство строк с центрами (size, k): разреженная строка × плотный центр"""
+    return np.column_stack([
+        np.bincount(rows, weights=data * centroid[cols], minlength=size) for centroid in centroids
+    ])
+
+
+def _centroids(rows, cols, data, labels, weights, k: int, features: int) -> np.ndarray:
+    """Центры тем: взвешенная сумма строк, нормированная на единичную длину"""
+    sums = np.bincount(
+        labels[rows] * features + cols, weights=data * weights[rows], minlength=k * features
+    ).reshape(k, features)
+    norms = np.linalg.norm(sums, axis=1, keepdims=True)
+    return np.divide(sums, norms, out=np.zeros_like(sums), where=norms > 0)
+
+
+def _spherical_kmeans(rows, cols, data, weights, k: int, features: int, rng) -> tuple:
+    """
+    Сферический k-means (косинусное сходство) с инициализацией k-means++.
+
+    Returns:
+        (центры (k, features), суммарное взвешенное сходство с ближайшим центром)
+    """
+    size = len(weights)
+    centroids = np.zeros((k, features))
+
+    def centroid_of(doc: int) -> np.ndarray:
+        vector = np.zeros(features)
+        start, end = np.searchsorted(rows, [doc, doc + 1])
+        vector[cols[start:end]] = data[start:end]
+        return vector
+
+    centroids[0] = centroid_of(int(np.argmax(weights)))
+    best = _similarity(rows, cols, data, size, centroids[:1])[:, 0]
+    for index in range(1, k):
+        distance = np.clip(1 - best, 0, None) * weights
+        if distance.sum() <= 0:
+            centroids = centroids[:index]
+            break
+        centroids[index] = centroid_of(int(rng.choice(size, p=distance / distance.sum())))
+        best = np.maximum(best, _similarity(rows, cols, data, size, centroids[index:index + 1])[:, 0])
+
+    labels = None
+    for _ in range(MAX_ITERATIONS):
+        similarity = _similarity(rows, cols, data, size, centroids)
+        updated = similarity.argmax(axis=1)
+        if labels is not None and np.array_equal(updated, labels):
+            break
+        labels = updated
+        moved = _centroids(rows, cols, data, labels, weights, len(centroids), features)
+        # Опустевшая тема сохраняет прежний центр
+        empty = ~moved.any(axis=1)
+        moved[empty] = centroids[empty]
+        centroids = moved
+    return centroids, float((similarity.max(axis=1) * weights).sum())
+
+
+def _label(centroid: np.ndarray, names: np.ndarray) -> str:
+    """Название темы: самые весомые признаки центра; слово из уже взятого признака не повторяется"""
+    labels, covered = [], set()
+    for index in np.argsort(-centroid, kind='stable'):
+        if centroid[index] <= 0 or len(labels) >= LABEL_TERMS:
+            break
+        words = names[index].split()
+        if covered.intersection(words):
+            continue
+        covered.update(words)
+        labels.append(names[index])
+    return ", ".join(labels)
+
+
+def extract_topics(df: pd.DataFrame, count: Optional[int] = None) -> pd.DataFrame:
+    """
+    Темы обращений клиентов по всему файлу (без Claude).
+
+    Одинаковые после нормализации сообщения считаются один раз с весом;
+    центры тем подбираются по FIT_DOCS уникальным текстам, затем каждое
+    сообщение клиента относится к ближайшей теме — количества точные.
+
+    Args:
+        df: Данные чата (From/Text, Role — если есть)
+        count: Сколько тем выделить (по умолчанию TOPIC_COUNT; 0 — не выделять)
+
+    Returns:
+        DataFrame Topic/Count/Share/Examples по убыванию Count (пустой — тем нет)
+    """
+    count = TOPIC_COUNT if count is None else count
+    empty = pd.DataFrame({'Topic': [], 'Count': [], 'Share': [], 'Examples': []})
+    if count <= 0:
+        return empty
+
+    texts = df['Text'][(sender_roles(df) == ROLE_CLIENT).to_numpy()]
+    codes, uniques = pd.factorize(normalize_texts(texts))
+    if not len(uniques):
+        return empty
+    weights = np.bincount(codes, minlength=len(uniques)).astype(float)
+    _, first_seen = np.unique(codes, return_index=True)
+    originals = texts.iloc[first_seen].astype(str).to_numpy()
+
+    rows, cols, names = _features(pd.Series(uniques), weights)
+    rows, cols, data, names = _tfidf(rows, cols, names, len(uniques), weights)
+    features = len(names)
+    with_terms = np.unique(rows)
+    if not features or not len(with_terms):
+        return empty
+
+    rng = np.random.default_rng(TOPICS_SEED)
+    fit = with_terms
+    if len(fit) > FIT_DOCS:
+        probability = weights[with_terms] / weights[with_terms].sum()
+        fit = np.sort(rng.choice(with_terms, FIT_DOCS, replace=False, p=probability))
+    position = np.full(len(uniques), -1)
+    position[fit] = np.arange(len(fit))
+    in_fit = position[rows] >= 0
+    runs = [
+        _spherical_kmeans(
+            position[rows[in_fit]], cols[in_fit], data[in_fit], weights[fit],
+            min(count, len(fit)), features, rng,
+        )
+        for _ in range(RESTARTS)
+    ]
+    centroids, _ = max(runs, key=lambda run: run[1])
+
+    similarity = _similarity(rows, cols, data, len(uniques), centroids)
+    labels = similarity.argmax(axis=1)
+    best = similarity[np.arange(len(uniques)), labels]
+    assigned = np.zeros(len(uniques), dtype=bool)
+    assigned[with_terms] = True
+
+    totals = np.bincount(labels[assigned], weights=weights[assigned], minlength=len(centroids))
+    result = []
+    for topic in np.argsort(-totals, kind='stable'):
+        if not totals[topic]:
+            continue
+        members = np.flatnonzero(assigned & (labels == topic))
+        # Ближайшие к центру сообщения с разным набором слов (без вариантов одной фразы с «спасибо»)
+        closest = {}
+        for member in members[np.argsort(-best[members], kind='stable')]:
+            start, end = np.searchsorted(rows, [member, member + 1])
+            closest.setdefault(cols[start:end].tobytes(), member)
+            if len(closest) >= EXAMPLES:
+                break
+        result.append({
+            'Topic': _label(centroids[topic], names),
+            'Count': int(totals[topic]),
+            'Share': totals[topic] / len(texts),
+            'Examples': [_shorten(originals[member]) for member in closest.values()],
+        })
+
+    logger.info(f"🏷 Темы обращений: {len(result)} по {len(texts):,} сообщениям клиентов, признаков {features:,}")
+    return pd.DataFrame(result)
+
+
+def _shorten(text: str) -> str:
+    text = text.strip()
+    return text if len(text) <= EXAMPLE_MAX_CHARS else text[:EXAMPLE_MAX_CHARS] + '…'
+
+
+def format_topics_text(topics: Optional[pd.DataFrame], top: Optional[int] = None) -> str:
+    """
+    Раздел «Темы обращений клиентов» (Markdown): название, точное число сообщений, примеры.
+
+    Args:
+        topics: Результат extract_topics()
+        top: Сколько тем показать (по умолчанию все)
+
+    Returns:
+        Markdown раздел или пустая строка (тем нет)
+    """
+    if topics is None or topics.empty:
+        return ""
+    lines = [
+        "## Темы обращений клиентов", "",
+        "Выделены локально по всем сообщениям клиентов (TF-IDF + кластеризация), количества точные.", "",
+    ]
+    for row in topics.head(top).itertuples(index=False):
+        examples = "; ".join(f"«{example}»" for example in row.Examples)
+        lines.append(f"- **{row.Topic}** — сообщений: {row.Count} ({row.Share:.0%}); примеры: {examples}")
+    return "\n".join(lines)
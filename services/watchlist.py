@@ -0,0 +1,219 @@
+# services/watchlist.py
+"""Списки ключевых слов: автомат Ахо-Корасик, один проход по тексту при любом числе слов"""
+
+import json
+import logging
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from core.config import WATCHLIST, WATCHLIST_MAX_REFS
+
+logger = logging.getLogger(__name__)
+
+MAX_KEYWORDS = 5000
+MIN_KEYWORD_CHARS = 2
+REF_TEXT_CHARS = 200  # Обрезка текста сообщения в манифесте
+NOTIFY_TOP = 15  # Слов в уведомлении бота
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+def fold(text: str) -> str:
+    """Приведение для сравнения: регистр и ё→е (длина строки не меняется)"""
+    return text.lower().replace('ё', 'е')
+
+
+class Watchlist:
+    """
+    Скомпилированный список ключевых слов.
+
+    Слово находится в начале слова текста («возврат» — в «возврата», но не в «невозврат»),
+    без учёта регистра; номера заказов и артикулы — так же, как слова.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords: List[str] = []
+        seen = set()
+        for keyword in keywords:
+            folded = fold(keyword.strip())
+            if folded and folded not in seen:
+                seen.add(folded)
+                self.keywords.append(keyword.strip())
+
+        # Бор: переходы по символам, ссылки неудач и слова, заканчивающиеся в состоянии
+        self._goto: List[Dict[str, int]] = [{}]
+        self._output: List[List[int]] = [[]]
+        self._lengths = [len(fold(keyword)) for keyword in self.keywords]
+        for index, keyword in enumerate(self.keywords):
+            state = 0
+            for char in fold(keyword):
+                following = self._goto[state].get(char)
+                if following is None:
+                    following = self._goto[state][char] = len(self._goto)
+                    self._goto.append({})
+                    self._output.append([])
+                state = following
+            self._output[state].append(index)
+
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in self._goto[state].items():
+                queue.append(following)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[following] = self._goto[fallback].get(char, 0)
+                self._output[following] = self._output[following] + self._output[self._fail[following]]
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def find(self, text: str) -> List[int]:
+        """
+        Номера найденных в тексте слов (по одному разу, в порядке первого вхождения).
+
+        Один проход по символам текста: стоимость не зависит от числа слов.
+        """
+        if not self.keywords or not text:
+            return []
+        folded = fold(text)
+        goto, fail, output, lengths = self._goto, self._fail, self._output, self._lengths
+        found, seen = [], set()
+        state = 0
+        for position, char in enumerate(folded):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in output[state]:
+                start = position - lengths[index] + 1
+                if index not in seen and (start == 0 or not folded[start - 1].isalnum()):
+                    seen.add(index)
+                    found.append(index)
+        return found
+
+    def to_text(self) -> str:
+        return "\n".join(self.keywords)
+
+
+def parse_watchlist(text: str) -> Watchlist:
+    """
+    Список слов из текста: по одному на строку или через запятую.
+
+    Raises:
+        ValueError: Слишком много слов или слишком короткое слово
+    """
+    keywords = [part.strip() for line in text.splitlines() for part in line.split(',') if part.strip()]
+    if len(keywords) > MAX_KEYWORDS:
+        raise ValueError(f"Слишком много ключевых слов: {len(keywords)} (максимум {MAX_KEYWORDS})")
+    short = [keyword for keyword in keywords if len(keyword) < MIN_KEYWORD_CHARS]
+    if short:
+        raise ValueError(f"Слишком короткие ключевые слова (меньше {MIN_KEYWORD_CHARS} символов): {short[:5]}")
+    return Watchlist(keywords)
+
+
+_watchlist: Optional[Watchlist] = None
+
+
+def load_watchlist(path: Optional[str] = None) -> Watchlist:
+    """
+    Глобальный список слов: текстовый файл WATCHLIST (пусто — список пуст).
+    """
+    global _watchlist
+    path = path if path is not None else WATCHLIST
+    if _watchlist is not None and path == WATCHLIST:
+        return _watchlist
+
+    watchlist = Watchlist([])
+    if path:
+        watchlist = parse_watchlist(Path(path).read_text(encoding='utf-8'))
+        logger.info(f"🔎 Список ключевых слов: {path} ({len(watchlist)} слов)")
+
+    if path == WATCHLIST:
+        _watchlist = watchlist
+    return watchlist
+
+
+class WatchlistSink:
+    """
+    Приёмник экспорта: каждое сообщение проверяется по списку слов при выгрузке.
+
+    Считает сообщения с каждым словом и хранит первые WATCHLIST_MAX_REFS ссылок на них.
+    """
+
+    def __init__(self, watchlist: Watchlist, max_refs: Optional[int] = None):
+        self.watchlist = watchlist
+        self.max_refs = WATCHLIST_MAX_REFS if max_refs is None else max_refs
+        self.counts = [0] * len(watchlist)
+        self.refs: List[List[dict]] = [[] for _ in range(len(watchlist))]
+        self.scanned = 0
+        self.matched = 0
+
+    def feed(self, message_id: Optional[int], date: str, sender: str, text: str) -> List[str]:
+        """Проверить сообщение; возвращает найденные слова"""
+        self.scanned += 1
+        found = self.watchlist.find(text)
+        if not found:
+            return []
+        self.matched += 1
+        ref = {'id': message_id, 'date': date, 'from': sender, 'text': text[:REF_TEXT_CHARS]}
+        for index in found:
+            self.counts[index] += 1
+            if len(self.refs[index]) < self.max_refs:
+                self.refs[index].append(ref)
+        return [self.watchlist.keywords[index] for index in found]
+
+    def to_dict(self) -> dict:
+        """Раздел watchlist манифеста экспорта"""
+        return {
+            'keywords': len(self.watchlist),
+            'messages_scanned': self.scanned,
+            'messages_matched': self.matched,
+            'hits': {
+                keyword: {'count': count, 'messages': refs}
+                for keyword, count, refs in zip(self.watchlist.keywords, self.counts, self.refs)
+                if count
+            },
+        }
+
+
+def manifest_path(csv_path: str) -> Path:
+    """Манифест рядом с CSV: <имя>.manifest.json"""
+    path = Path(csv_path)
+    return path.with_name(path.stem + MANIFEST_SUFFIX)
+
+
+def write_manifest(csv_path: str, manifest: dict) -> Path:
+    """Записать манифест экспорта (JSON, UTF-8)"""
+    path = manifest_path(csv_path)
+    path.write_text(json.dumps(manifest, ensure_ascii=False, indent=1), encoding='utf-8')
+    return path
+
+
+def read_manifest(csv_path: str) -> Optional[dict]:
+    """Манифест экспорта (None — не записывался)"""
+    path = manifest_path(csv_path)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def format_hits_text(watchlist_section: dict, top: int = NOTIFY_TOP) -> str:
+    """
+    Сводка совпадений для уведомления: слова по убыванию числа сообщений.
+
+    Returns:
+        Текст или пустая строка (совпадений нет)
+    """
+    hits = sorted(watchlist_section.get('hits', {}).items(), key=lambda item: -item[1]['count'])
+    if not hits:
+        return ""
+    lines = [f"• {keyword} — {hit['count']}" for keyword, hit in hits[:top]]
+    if len(hits) > top:
+        lines.append(f"… и ещё слов: {len(hits) - top}")
+    lines.append(
+        f"Сообщений с совпадениями: {watchlist_section['messages_matched']} "
+        f"из {watchlist_section['messages_scanned']}"
+    )
+    return "\n".join(lines)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""Тесты сжатия данных чата перед отправкой в Claude"""
+
+import pandas as pd
+
+from services.analyzer import compact_messages, render_compact
+
+
+def _sample_chat() -> pd.DataFrame:
+    return pd.DataFrame({
+        'Date': [
+            '08-01-2024 09:10:00', '08-01-2024 09:01:00', '08-01-2024 09:00:00',
+            '08-01-2024 09:00:00', '08-01-2024 08:00:00', '06-01-2024 10:00:00',
+        ],
+        'From': ['Bob Support', 'Client B', 'Client B', 'Client B', 'Client B', 'Client A'],
+        'Text': ['ответ', 'где заказ?', 'привет', 'привет', '👍', 'вопрос ' * 10],
+    })
+
+
+def test_compaction_steps():
+    """Тест 1: эмодзи, дубли, склейка и обрезка"""
+    compacted, report = compact_messages(_sample_chat(), max_message_chars=20)
+    assert report.dropped_empty == 1
+    assert report.dropped_duplicates == 1
+    assert report.merged == 1
+    assert report.truncated == 1
+    assert report.tokens_after < report.tokens_before
+    assert compacted['Text'].tolist()[1] == 'привет | где заказ?'
+
+
+def test_render_compact():
+    """Тест 2: легенда отправителей и заголовки дней"""
+    compacted, _ = compact_messages(_sample_chat())
+    text = render_compact(compacted)
+    assert 'S1=Bob Support' in text
+    assert '# 08-01-2024 (Понедельник)' in text
+    assert '09:10 S1: ответ' in text
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Тесты сводного анализа нескольких чатов (без сетевых запросов)"""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+import services.analyzer as analyzer
+import services.cross_chat as cross_chat
+from services.cross_chat import load_chats, compute_cross_chat_stats, plan_cross_chat
+from services.stats import compute_chat_stats, format_stats_text
+from services.tokens import STRATEGY_CHUNKED, STRATEGY_COMPACT
+
+
+def _write_chat(path, rows: list):
+    pd.DataFrame(rows, columns=['Date', 'From', 'Text']).to_csv(path, sep=';', index=False, encoding='utf-8-sig')
+    return str(path)
+
+
+def test_cross_chat_stats_match_per_chat(tmp_path):
+    """Тест 1: ответ ищется только в своём чате; итог по всем чатам совпадает с отдельными расчётами"""
+    alpha = _write_chat(tmp_path / "alpha.csv", [
+        ('03-03-2025 10:00:00', 'Иван', 'Где поставка?'),
+        ('03-03-2025 10:10:00', 'Anna Support', 'Сегодня'),
+        ('03-03-2025 12:00:00', 'Иван', 'А документы?'),
+    ])
+    beta = _write_chat(tmp_path / "beta.csv", [
+        ('03-03-2025 11:55:00', 'Пётр', 'Добрый день'),
+        ('03-03-2025 12:30:00', 'Bob Support', 'Здравствуйте'),
+    ])
+
+    df = load_chats([alpha, beta], max_workers=2)
+    overall, table = compute_cross_chat_stats(df)
+
+    # Ответ Bob в 12:30 (beta) не засчитывается вопросу Ивана в 12:00 (alpha)
+    assert table.loc['alpha', ['questions', 'answered', 'managers', 'clients']].tolist() == [2, 1, 1, 1]
+    assert table.loc['beta', 'median'] == 35
+    separate = [compute_chat_stats(pd.read_csv(path, sep=';', encoding='utf-8-sig')) for path in (alpha, beta)]
+    combined = separate[0].merge(separate[1])
+    assert format_stats_text(overall) == format_stats_text(combined)
+    assert overall.questions == combined.questions == 3 and overall.unanswered == 1
+
+
+def test_aggregate_shares_map_requests(tmp_path, monkeypatch):
+    """Тест 2: мелкие чаты делят части map-этапа — запросов меньше, чем чатов; итоговый запрос один"""
+    letters = np.array(list("абвгдежзиклмнопрстуфхцчшэюя"))
+    paths = []
+    for chat in range(6):
+        rows = [
+            (f"0{day + 1}-03-2025 1{hour}:00:00", 'Support' if hour % 2 else f"Клиент {chat}",
+             "".join(np.random.default_rng(chat * 100 + day * 10 + hour).choice(letters, 60)))
+            for day in range(3) for hour in range(4)
+        ]
+        paths.append(_write_chat(tmp_path / f"chat{chat}.csv", rows))
+
+    monkeypatch.setattr(analyzer, "MAP_CACHE_MB", 0)
+    monkeypatch.setattr(analyzer, "STREAM_RESPONSES", False)
+    df = load_chats(paths)
+    assert plan_cross_chat(df).estimate.strategy == STRATEGY_COMPACT
+
+    requests = []
+
+    def create(model, max_tokens, messages):
+        requests.append((max_tokens, messages[0]["content"]))
+        return SimpleNamespace(headers={}, parse=lambda: SimpleNamespace(
+            content=[SimpleNamespace(text="сравнение чатов")],
+            usage=SimpleNamespace(input_tokens=10, output_tokens=5),
+        ))
+
+    fake = SimpleNamespace(
+        api_key="test-cross-chat",
+        messages=SimpleNamespace(with_raw_response=SimpleNamespace(create=create)),
+    )
+    monkeypatch.setattr(cross_chat, "get_client", lambda api_key=None: fake)
+    monkeypatch.setattr(cross_chat, "MAX_REQUEST_TOKENS", 2600)
+    monkeypatch.setattr(cross_chat, "MAP_CHUNK_TOKENS", 2600)
+
+    plan = plan_cross_chat(load_chats(paths))
+    assert plan.estimate.strategy == STRATEGY_CHUNKED
+    assert 1 < len(plan.chunks) < len(paths)
+
+    result = cross_chat.analyze_chats_aggregate(paths)
+    map_prompts = [prompt for max_tokens, prompt in requests if max_tokens == analyzer.MAP_MAX_TOKENS]
+    assert len(map_prompts) == len(plan.chunks) and len(requests) == len(plan.chunks) + 1
+    assert all(f"## Чат: chat{chat}" in "".join(map_prompts) for chat in range(6))
+    assert result.startswith("сравнение чатов") and "## Сравнение чатов" in result
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""Тесты менеджера БД (временная SQLite база)"""
+
+import asyncio
+
+import core.database as database
+from core.db_manager import DatabaseManager
+
+
+def test_delete_user_removes_dependent_rows(tmp_path, monkeypatch):
+    """Тест 1: удаление пользователя удаляет его настройки, расход токенов и состояния чатов"""
+    monkeypatch.setattr(database, "DATABASE_URL", f"sqlite+aiosqlite:///{tmp_path / 'bot.db'}")
+
+    async def scenario():
+        await database.init_database()
+        try:
+            db = DatabaseManager()
+            for user_id in (1, 2):
+                await db.create_user(user_id, username=f"user{user_id}")
+                await db.add_token_usage(user_id, "test-model", 100, 10)
+                await db.save_chat_state(user_id, "@chat", messages_analyzed=5, summary="сводка")
+
+            assert await db.delete_user(1)
+            assert await db.get_user(1) is None
+            assert await db.get_user_settings(1) is None
+            assert await db.get_chat_state(1, "@chat") is None
+            assert await db.get_tokens_used_today(1) == 0
+
+            # Данные другого пользователя не затронуты
+            assert (await db.get_chat_state(2, "@chat")).summary == "сводка"
+            assert await db.get_tokens_used_today(2) == 110
+        finally:
+            await database.close_database()
+            monkeypatch.setattr(database, "_async_session_maker", None)
+
+    asyncio.run(scenario())
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Тесты схлопывания похожих сообщений (MinHash + LSH)"""
+
+import pandas as pd
+
+from services.analyzer import compact_messages, plan_analysis
+from services.dedup import cluster_near_duplicates, collapse_near_duplicates
+
+
+def test_clusters_and_collapse():
+    """Тест 1: номера заказов и пунктуация не мешают, короткие и разные сообщения не объединяются"""
+    texts = pd.Series([
+        "Где мой заказ 123456?", "где мой заказ №777", "Здравствуйте, пришёл брак в коробке",
+        "Где мой заказ??", "да", "да",
+    ])
+    labels = cluster_near_duplicates(texts).tolist()
+    assert labels == [0, 0, 2, 0, 4, 5]
+
+    data = pd.DataFrame({'From': ['C1', 'C2', 'C3', 'Bob Support', 'C1', 'C2'], 'Text': texts})
+    collapsed, clusters = collapse_near_duplicates(data)
+    # Сообщение менеджера с клиентскими не объединяется
+    assert collapsed['Text'].tolist()[0] == "Где мой заказ 123456? [×2]"
+    assert len(collapsed) == 5
+    assert clusters[['Role', 'Count']].values.tolist() == [['client', 2]]
+
+    empty, _ = collapse_near_duplicates(data.iloc[0:0])
+    assert empty.empty
+
+
+def test_frequency_section_in_appendix():
+    """Тест 2: раздел частых сообщений считается по всему файлу и попадает в отчёт"""
+    df = pd.DataFrame({
+        'Date': [f'0{day}-03-2025 10:00:00' for day in range(1, 7)],
+        'From': ['Иван', 'Пётр', 'Анна', 'Иван', 'Fulfillment-Box Support', 'Анна'],
+        'Text': [
+            'Когда будет отгрузка товара?', 'когда будет отгрузка товара', 'Где накладная по поставке?',
+            'Когда будет отгрузка товара!!', 'Проверим', 'Спасибо',
+        ],
+    })
+    compacted, report = compact_messages(df)
+    assert report.collapsed == 2
+    assert compacted['Text'].str.contains(r'\[×3\]').sum() == 1
+
+    plan = plan_analysis(df)
+    assert "«Когда будет отгрузка товара?» — сообщений: 3" in plan.appendix
+    assert "[×N]" in plan.prompt
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Тесты рендеринга Markdown в DOCX и пула процессов рендеринга"""
+
+from docx import Document
+
+from services.docx_render import new_document, markdown_to_docx, render_in_pool, shutdown_render_pool
+
+REPORT = """# Отчёт
+
+1. **Частые запросы**
+
+- Доставка **срочная** и *обычная*
+  - вложенный пункт
+    - третий уровень
+- Возвраты
+
+| Менеджер | Вопросов |
+|---|---:|
+| Анна | **12** |
+| Иван | 7 |
+
+Обычный абзац с `кодом`."""
+
+
+def test_markdown_blocks():
+    """Тест 1: заголовки, вложенные списки, таблица, встроенная разметка"""
+    doc = new_document()
+    markdown_to_docx(doc, REPORT)
+
+    styles = [(p.style.name, p.text) for p in doc.paragraphs]
+    assert ("Heading 1", "Отчёт") in styles
+    assert ("Heading 2", "1. Частые запросы") in styles
+    assert ("List Bullet", "Доставка срочная и обычная") in styles
+    assert ("List Bullet 2", "вложенный пункт") in styles
+    assert ("List Bullet 3", "третий уровень") in styles
+    assert ("List Bullet", "Возвраты") in styles
+
+    bullet = next(p for p in doc.paragraphs if p.text.startswith("Доставка"))
+    assert [r.text for r in bullet.runs if r.bold] == ["срочная"]
+    assert [r.text for r in bullet.runs if r.italic] == ["обычная"]
+
+    assert len(doc.tables) == 1
+    table = doc.tables[0]
+    assert [[c.text for c in row.cells] for row in table.rows] == [
+        ["Менеджер", "Вопросов"], ["Анна", "12"], ["Иван", "7"]
+    ]
+    assert doc.paragraphs[-1].text == "Обычный абзац с кодом."
+
+
+def test_render_in_pool(tmp_path):
+    """Тест 2: рендеринг в отдельном процессе сохраняет документ"""
+    output = tmp_path / "report.docx"
+    try:
+        render_in_pool(REPORT, str(output), "chat.csv", "test-model")
+    finally:
+        shutdown_render_pool()
+
+    doc = Document(str(output))
+    texts = [p.text for p in doc.paragraphs]
+    assert "Модель анализа: test-model" in texts
+    assert "Возвраты" in texts
+    assert len(doc.tables) == 1
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""Тесты анализатора на локальном fake Messages API (tools/fake_anthropic.py)"""
+
+import services.analyzer as analyzer
+from services.analyzer import get_client, create_message, message_text
+from services.streaming import ResponseStream
+from services.tokens import UsageTracker
+from tools.fake_anthropic import FakeAnthropicServer, FakeProfile
+
+FAST = FakeProfile(latency_ms=5, latency_sigma=0.1, tokens_per_second=100_000, output_tokens=40,
+                   retry_after=0, seed=0)
+
+
+def test_client_base_url_and_streaming(monkeypatch):
+    """Тест 1: get_client() ходит на CLAUDE_BASE_URL, потоковый ответ собирается целиком"""
+    with FakeAnthropicServer(FAST) as server:
+        monkeypatch.setattr(analyzer, "CLAUDE_BASE_URL", server.url)
+        monkeypatch.setattr(analyzer, "STREAM_RESPONSES", True)
+        client = get_client("test-fake-stream")
+
+        fragments = []
+        usage = UsageTracker()
+        message = create_message(client, "Привет", usage=usage, max_tokens=25, model="fake-report",
+                                  stream=ResponseStream(on_text=fragments.append))
+
+        assert len(message_text(message).split()) == 25
+        assert "".join(fragments) == message_text(message)
+        stats = server.snapshot()
+        assert stats.streamed == 1 and stats.models == {"fake-report": 1}
+        assert usage.by_model["fake-report"]["output"] == 25
+
+
+def test_retries_after_rate_limit(monkeypatch):
+    """Тест 2: 429 с retry-after повторяется, запрос в итоге успешен"""
+    with FakeAnthropicServer(FAST) as server:
+        monkeypatch.setattr(analyzer, "CLAUDE_BASE_URL", server.url)
+        monkeypatch.setattr(analyzer, "STREAM_RESPONSES", False)
+        server.script('rate_limit', 'rate_limit', 'ok')
+
+        message = create_message(get_client("test-fake-429"), "Привет", max_tokens=10, model="fake-report")
+
+        assert message_text(message)
+        stats = server.snapshot()
+        assert (stats.requests, stats.rate_limited) == (3, 2)
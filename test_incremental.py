@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""Тесты инкрементального анализа (без запросов к Claude)"""
+
+import pandas as pd
+
+from services.incremental import IncrementalState, select_new_messages, next_state, build_context
+from services.stats import ChatStats, compute_chat_stats, format_stats_text
+
+
+def _chat(days: int) -> pd.DataFrame:
+    rows = []
+    for day in range(1, days + 1):
+        rows.append({'Date': f'{day:02d}-03-2025 10:00:00', 'From': 'Иван', 'Text': 'Где заказ?'})
+        rows.append({'Date': f'{day:02d}-03-2025 10:05:00', 'From': 'Fulfillment-Box Support', 'Text': 'Отправлен'})
+    return pd.DataFrame(rows)
+
+
+def test_new_messages_and_merged_stats():
+    """Тест 1: отбираются только новые сообщения, статистика совпадает с полным расчётом"""
+    first = select_new_messages(_chat(3), None)
+    state = next_state(first, "## Темы\n- статус заказа", None)
+    assert state.last_message_at == pd.Timestamp('2025-03-03 10:05:00')
+
+    part = select_new_messages(_chat(5), state)
+    assert part.is_incremental and len(part.new_messages) == 4
+    assert format_stats_text(part.stats) == format_stats_text(compute_chat_stats(_chat(5)))
+    assert "статус заказа" in build_context(part)
+
+
+def test_state_roundtrip_and_prompt_change():
+    """Тест 2: состояние переживает сохранение, смена промпта даёт полный анализ"""
+    state = next_state(select_new_messages(_chat(2), None), "отчёт", "мой промпт")
+    record = type('Record', (), state.to_record())()
+    restored = IncrementalState.from_record(record)
+    assert isinstance(restored.stats, ChatStats)
+    assert restored.matches("мой промпт")
+
+    part = select_new_messages(_chat(4), restored, custom_prompt="другой промпт")
+    assert not part.is_incremental and len(part.new_messages) == 8
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""Тесты быстрого чтения CSV (определение формата, типы колонок, чтение блоками)"""
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+import services.ingest as ingest
+from services.ingest import sniff_format, read_chat_csv, iter_chat_csv, read_chat_for_analysis
+from services.sampling import sample_messages
+from services.sessions import summarize_dialogues, format_dialogues_text
+from services.stats import compute_chat_stats, format_stats_text
+
+# Память чтения, при которой выборка — около 150 строк (7 из 30 дней по 20 сообщений)
+MEMORY_FOR_150_ROWS = 150 * ingest.ROW_BYTES * ingest.ANALYSIS_FACTOR * ingest.SAMPLE_SHARE
+
+
+def _write(path, text: str, encoding: str):
+    path.write_bytes(text.encode(encoding))
+    return str(path)
+
+
+def test_export_signature(tmp_path):
+    """Тест 1: собственный экспорт распознаётся без угадывания"""
+    path = _write(tmp_path / "export.csv", "Date;From;Text\n01-02-2025 10:00:00;Иван;Привет\n", "utf-8-sig")
+    csv_format = sniff_format(path)
+    assert csv_format.is_export and csv_format.sep == ';'
+
+    df = read_chat_csv(path, csv_format)
+    assert list(df.columns) == ['Date', 'From', 'Text', 'Role']
+    assert isinstance(df['From'].dtype, pd.CategoricalDtype)
+    assert df['Date'].iloc[0] == pd.Timestamp('2025-02-01 10:00:00')
+
+
+def test_foreign_cp1251_comma(tmp_path):
+    """Тест 2: cp1251 с запятыми, лишняя колонка, пустой отправитель, перенос строки в кавычках"""
+    text = (
+        "Id,Date,From,Text\n"
+        "1,01-02-2025 10:00:00,Иван,\"Привет, мир\"\n"
+        "2,01-02-2025 10:05:00,,\"две\nстроки\"\n"
+    )
+    path = _write(tmp_path / "foreign.csv", text, "cp1251")
+    csv_format = sniff_format(path)
+    assert (csv_format.encoding, csv_format.sep, csv_format.is_export) == ('cp1251', ',', False)
+
+    df = read_chat_csv(path)
+    assert list(df.columns) == ['Date', 'From', 'Text', 'Role']
+    assert df['From'].tolist() == ['Иван', 'Unknown']
+    assert df['Role'].tolist() == ['client', 'system']
+    assert df['Text'].iloc[1] == "две\nстроки"
+
+
+def test_export_role_column(tmp_path):
+    """Тест 3: колонка Role из экспорта читается как есть, пустые значения — по правилам имён"""
+    text = (
+        "Date;From;Text;Role\n"
+        "01-02-2025 10:00:00;Иван;Привет;support\n"
+        "01-02-2025 10:05:00;Anna Support;Ответ;\n"
+    )
+    path = _write(tmp_path / "export.csv", text, "utf-8-sig")
+    csv_format = sniff_format(path)
+    assert csv_format.is_export and csv_format.columns == ['Date', 'From', 'Text', 'Role']
+
+    df = read_chat_csv(path, csv_format)
+    assert isinstance(df['Role'].dtype, pd.CategoricalDtype)
+    assert df['Role'].tolist() == ['support', 'support']
+
+
+def _write_days(path, days: int, per_day: int, newest_first: bool = False) -> str:
+    rows = [
+        (f"{day + 1:02d}-03-2025 1{hour % 10}:{hour // 10:02d}:00",
+         'Anna Support' if hour % 2 else f"Клиент {day % 3}", f"День {day}, сообщение {hour}: где заказ?")
+        for day in range(days) for hour in range(per_day)
+    ]
+    if newest_first:
+        rows.sort(reverse=True, key=lambda row: (row[0][6:10], row[0][3:5], row[0][:2], row[0][11:]))
+    pd.DataFrame(rows, columns=['Date', 'From', 'Text']).to_csv(path, sep=';', index=False, encoding='utf-8-sig')
+    return str(path)
+
+
+def test_iter_chunks_match_full_read(tmp_path, monkeypatch):
+    """Тест 4: блоки (pyarrow и pandas) в сумме совпадают с чтением целиком, метки строк — сквозные"""
+    path = _write_days(tmp_path / "chat.csv", days=10, per_day=20)
+    full = read_chat_csv(path)
+    for arrow in (True, False):
+        monkeypatch.setattr(ingest, "PYARROW_AVAILABLE", arrow and ingest.PYARROW_AVAILABLE)
+        chunks = list(iter_chat_csv(path, chunk_bytes=2048))
+        assert len(chunks) > 3
+        joined = pd.concat([chunk.astype({'From': str, 'Role': str}) for chunk in chunks])
+        assert joined.index.tolist() == full.index.tolist()
+        assert joined['Text'].tolist() == full['Text'].tolist()
+        assert joined['From'].tolist() == full['From'].astype(str).tolist()
+        assert (joined['Date'] == full['Date']).all()
+
+
+def test_bounded_read_samples_whole_days(tmp_path, monkeypatch):
+    """Тест 5: большой файл — статистика и диалоги по блокам как по всему файлу, тексты — целые дни"""
+    path = _write_days(tmp_path / "big.csv", days=30, per_day=20, newest_first=True)
+    full = read_chat_csv(path)
+    size = os.path.getsize(path)
+
+    whole = size * ingest.ANALYSIS_FACTOR
+    small = read_chat_for_analysis(path, memory_bytes=whole * ingest.SAMPLE_SHARE)
+    assert small.stats is None and len(small.frame) == len(full)
+
+    memory = MEMORY_FOR_150_ROWS
+    chat = read_chat_for_analysis(path, memory_bytes=memory, chunk_bytes=4096)
+    assert chat.sampled and chat.rows == len(full) and chat.days_total == 30
+    assert 0 < chat.days_sampled < 30
+    # Выборка с её анализом — в пределах памяти
+    frame_bytes = chat.frame.memory_usage(deep=True).sum()
+    assert frame_bytes * ingest.ANALYSIS_FACTOR <= memory // ingest.SAMPLE_SHARE * 1.05
+
+    # В выборке — целые дни: все сообщения выбранных дней и только они, с метками строк файла
+    days = chat.frame['Date'].dt.normalize()
+    selected = full[full['Date'].dt.normalize().isin(days)]
+    assert days.nunique() == chat.days_sampled
+    assert chat.frame.index.tolist() == selected.index.tolist()
+    assert chat.frame['Text'].tolist() == selected['Text'].tolist()
+
+    # Дни, разрезанные границами блоков, считаются целиком: результат как у расчёта по всему файлу
+    assert format_stats_text(chat.stats) == format_stats_text(compute_chat_stats(full))
+    assert format_dialogues_text(chat.dialogues) == format_dialogues_text(summarize_dialogues(full))
+
+    # Строк выборки не больше SAMPLE_MAX_ROWS — тоже целыми днями
+    monkeypatch.setattr(ingest, "SAMPLE_MAX_ROWS", 50)
+    capped = read_chat_for_analysis(path, memory_bytes=memory, chunk_bytes=4096)
+    assert len(capped.frame) == capped.days_sampled * 20 == 40
+
+    # Инкрементальный анализ: только сообщения после границы
+    since = pd.Timestamp('2025-03-25 23:59:59')
+    recent = read_chat_for_analysis(path, memory_bytes=memory, chunk_bytes=4096, since=since)
+    assert recent.rows == int((full['Date'] > since).sum()) == recent.stats.total_messages
+
+
+def test_sample_report_lines_of_chunked_file(tmp_path):
+    """Тест 6: номера строк CSV в отчёте о выборке указывают на строки файла и после чтения блоками"""
+    path = _write_days(tmp_path / "big.csv", days=30, per_day=20, newest_first=True)
+    chat = read_chat_for_analysis(path, memory_bytes=MEMORY_FOR_150_ROWS, chunk_bytes=4096)
+    assert chat.sampled
+
+    sampled, report = sample_messages(chat.frame, budget_tokens=1000, strategy='day')
+    assert 0 < report.kept_rows < len(chat.frame)
+
+    lines = open(path, encoding='utf-8-sig').read().splitlines()
+    texts = [lines[number - 1].split(';')[2] for number in report.kept_lines]
+    assert sorted(texts) == sorted(sampled['Text'])
+
+
+def _write_random_chat(path, days: int, per_day: int) -> str:
+    """Чат от новых к старым: разные тексты разной длины, клиенты и менеджеры вперемешку"""
+    rng = np.random.default_rng(7)
+    total = days * per_day
+    seconds = np.sort(rng.integers(0, days * 86400, total))[::-1]
+    dates = (pd.Timestamp('2025-01-01') + pd.to_timedelta(seconds, unit='s')).strftime('%d-%m-%Y %H:%M:%S')
+    words = np.array(['заказ', 'доставка', 'оплата', 'возврат', 'курьер', 'когда', 'почему', 'спасибо', 'номер'])
+    lengths = rng.integers(2, 40, total)
+    texts = [' '.join(words[rng.integers(0, len(words), n)]) + f" #{i}" for i, n in enumerate(lengths)]
+    senders = np.where(rng.random(total) < 0.4, 'Anna Support', np.char.add('Клиент ', rng.integers(0, 500, total).astype(str)))
+    pd.DataFrame({'Date': dates, 'From': senders, 'Text': texts}).to_csv(
+        path, sep=';', index=False, encoding='utf-8-sig'
+    )
+    return str(path)
+
+
+# Чтение и оценка файла в отдельном процессе: пик памяти Python и numpy (tracemalloc) и pyarrow (пул)
+PEAK_SCRIPT = """
+import sys, tracemalloc
+import services.ingest as ingest
+from services import analyzer
+
+ingest.INGEST_MEMORY_MB = int(sys.argv[2])
+tracemalloc.start()
+estimate = analyzer.preflight_analysis(sys.argv[1])
+python_peak = tracemalloc.get_traced_memory()[1]
+arrow_peak = ingest.pa.default_memory_pool().max_memory() if ingest.PYARROW_AVAILABLE else 0
+print(python_peak + arrow_peak, bool(estimate.describe()))
+"""
+
+
+def test_preflight_peak_memory_within_limit(tmp_path):
+    """Тест 7: пик памяти чтения и оценки большого файла — в пределах INGEST_MEMORY_MB"""
+    limit_mb = 16
+    path = _write_random_chat(tmp_path / "big.csv", days=30, per_day=500)
+    chat = read_chat_for_analysis(path, memory_bytes=limit_mb * 1024 * 1024)
+    assert chat.sampled and chat.days_sampled > 0
+
+    result = subprocess.run(
+        [sys.executable, '-c', PEAK_SCRIPT, path, str(limit_mb)],
+        capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    peak, described = result.stdout.split()
+    assert described == 'True'
+    assert int(peak) <= limit_mb * 1024 * 1024
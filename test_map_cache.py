@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Тесты кэша заметок map-этапа (без сетевых запросов)"""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+import services.analyzer as analyzer
+from services.analyzer import plan_analysis, run_analysis_plan
+from services.map_cache import MapCache
+from services.tokens import STRATEGY_CHUNKED
+
+
+def test_lru_eviction(tmp_path):
+    """Тест 1: при превышении размера вытесняются давно не использованные заметки"""
+    cache = MapCache(tmp_path / "cache.db", max_bytes=3 * (1 + 100))
+    for key in "abc":
+        cache.put(key, "x" * 100)
+    assert cache.get("a") == "x" * 100  # «a» использована — теперь самая свежая
+
+    cache.put("d", "x" * 100)
+    assert cache.get("b") is None
+    assert all(cache.contains(key) for key in "acd")
+    assert cache.total_bytes() <= cache.max_bytes
+    cache.close()
+
+
+REPEATED_QUESTION = "Подскажите, где мой заказ? Трек не обновляется уже несколько дней"
+
+
+def _chat(days: int, end: pd.Timestamp = pd.Timestamp('2025-03-31'), repeated: bool = False) -> pd.DataFrame:
+    """
+    Последние days дней до end одного чата: непохожие друг на друга сообщения (не схлопываются).
+
+    repeated — клиент каждый день в 10:00 задаёт один и тот же вопрос (схлопывается в [×N]).
+    Текст сообщения зависит от даты, а не от начала периода.
+    """
+    letters = np.array(list("абвгдежзиклмнопрстуфхцчшэюя"))
+    rows = []
+    for day in range(days):
+        date = end - pd.Timedelta(days=day)
+        seed = (date - pd.Timestamp('2025-01-01')).days
+        for hour in range(10, 14):
+            text = "".join(np.random.default_rng(seed * 100 + hour).choice(letters, 60))
+            rows.append({
+                'Date': f"{date:%d-%m-%Y} {hour}:00:00",
+                'From': 'Fulfillment-Box Support' if hour % 2 else f"Клиент {seed % 5}",
+                'Text': REPEATED_QUESTION if repeated and hour == 10 else text,
+            })
+    return pd.DataFrame(rows)
+
+
+def test_overlapping_periods_reuse_notes(tmp_path, monkeypatch):
+    """Тест 2: после анализа 30 дней анализ 60 дней запрашивает заметки только по новым частям"""
+    cache = MapCache(tmp_path / "cache.db", max_bytes=1024 * 1024)
+    monkeypatch.setattr(analyzer, "get_map_cache", lambda max_mb: cache)
+    monkeypatch.setattr(analyzer, "STREAM_RESPONSES", False)
+    map_requests = []
+
+    def create(model, max_tokens, messages):
+        prompt = messages[0]["content"]
+        if max_tokens == analyzer.MAP_MAX_TOKENS:
+            map_requests.append(prompt)
+        return SimpleNamespace(headers={}, parse=lambda: SimpleNamespace(
+            content=[SimpleNamespace(text=f"заметки {len(prompt)}")],
+            usage=SimpleNamespace(input_tokens=10, output_tokens=5),
+        ))
+
+    client = SimpleNamespace(
+        api_key="test-map-cache",
+        messages=SimpleNamespace(with_raw_response=SimpleNamespace(create=create)),
+    )
+
+    def run(days: int):
+        plan = plan_analysis(_chat(days), request_budget=1300)
+        assert plan.estimate.strategy == STRATEGY_CHUNKED
+        run_analysis_plan(client, plan)
+        return plan
+
+    first = run(30)
+    first_requests = len(map_requests)
+    assert first_requests == len(first.chunks) > 2
+
+    second = run(60)
+    new_requests = len(map_requests) - first_requests
+    reused = len(set(first.chunks) & set(second.chunks))
+    assert reused >= len(first.chunks) - 1  # Отличаться может только часть на границе периода
+    assert new_requests == len(second.chunks) - reused
+    assert second.estimate.requests == new_requests + 1
+
+
+def test_repeated_messages_do_not_break_reuse():
+    """Тест 3: повторы схлопываются внутри части — сдвиг периода не меняет общие части"""
+    end = pd.Timestamp('2025-03-31')
+    first = plan_analysis(_chat(60, end - pd.Timedelta(days=14), repeated=True), request_budget=1300)
+    second = plan_analysis(_chat(60, end, repeated=True), request_budget=1300)
+    assert first.estimate.strategy == second.estimate.strategy == STRATEGY_CHUNKED
+    for chunk in second.chunks:
+        # Вопрос схлопнут в первый день части: N — дней в этой части, а не во всём периоде
+        days = sum(line.startswith("# ") for line in chunk.splitlines())
+        assert f"{REPEATED_QUESTION} [×{days}]" in chunk or days == 1
+
+    # Общие 46 дней из 60 — совпадают все части внутри пересечения, кроме части на границе
+    reused = len(set(first.chunks) & set(second.chunks))
+    assert reused >= len(second.chunks) * 46 // 60 - 1
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Тесты маршрутизации запросов по моделям: map — дешёвая модель, отчёт — сильная (без сетевых запросов)"""
+
+from types import SimpleNamespace
+
+import services.analyzer as analyzer
+from services.analyzer import AnalysisPlan, ModelTiers, resolve_model_tiers, run_analysis_plan
+from services.tokens import PreflightEstimate, UsageTracker, STRATEGY_CHUNKED, TIER_MAP, TIER_REPORT
+
+
+class FakeMessages:
+    """Messages API без сети: запоминает модель каждого запроса"""
+
+    def __init__(self):
+        self.models = []
+
+    def create(self, model, max_tokens, messages):
+        self.models.append(model)
+        return SimpleNamespace(
+            content=[SimpleNamespace(text=f"ответ {model}")],
+            usage=SimpleNamespace(input_tokens=100, output_tokens=10),
+        )
+
+
+def test_chunked_routes_tiers(monkeypatch):
+    """Тест 1: заметки по частям — модель map, итоговый отчёт — модель report; учёт по уровням"""
+    monkeypatch.setattr(analyzer, "STREAM_RESPONSES", False)
+    monkeypatch.setattr(analyzer, "MAP_CACHE_MB", 0)
+    messages = FakeMessages()
+    raw = SimpleNamespace(create=lambda **kwargs: SimpleNamespace(
+        headers={}, parse=lambda: messages.create(**kwargs)
+    ))
+    client = SimpleNamespace(api_key="test-routing", messages=SimpleNamespace(with_raw_response=raw))
+
+    plan = AnalysisPlan(
+        estimate=PreflightEstimate(STRATEGY_CHUNKED, 0, 0, 0, 0, requests=4),
+        stats_text="",
+        chunks=["часть 1", "часть 2", "часть 3"],
+    )
+    usage = UsageTracker()
+    text = run_analysis_plan(client, plan, usage=usage, models=ModelTiers(report="strong", map="cheap"))
+
+    assert text == "ответ strong"
+    assert sorted(messages.models) == ["cheap", "cheap", "cheap", "strong"]
+    assert messages.models[-1] == "strong"
+    assert usage.by_tier[TIER_MAP]["requests"] == 3
+    assert usage.by_tier[TIER_REPORT]["requests"] == 1
+
+
+def test_user_overrides():
+    """Тест 2: настройки пользователя переопределяют модели развёртывания"""
+    defaults = resolve_model_tiers(None)
+    assert defaults == ModelTiers()
+
+    settings = SimpleNamespace(report_model=None, map_model="claude-haiku-custom")
+    models = resolve_model_tiers(settings)
+    assert models.report == defaults.report
+    assert models.map == "claude-haiku-custom"
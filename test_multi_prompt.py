@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Тесты нескольких отчётов по одному чату с общим кэшируемым префиксом (без сетевых запросов)"""
+
+import threading
+from types import SimpleNamespace
+
+import pandas as pd
+
+import services.analyzer as analyzer
+import services.multi_prompt as multi_prompt
+from services.multi_prompt import PromptSpec, analyze_csv_multi, resolve_prompt_specs
+
+
+def _fake_client(requests: list):
+    lock = threading.Lock()
+
+    def create(model, max_tokens, messages):
+        content = messages[0]["content"]
+        with lock:
+            requests.append(content)
+        text = f"отчёт: {content[1]['text'][:10]}"
+        return SimpleNamespace(
+            headers={},
+            parse=lambda: SimpleNamespace(
+                content=[SimpleNamespace(text=text)],
+                usage=SimpleNamespace(input_tokens=50, output_tokens=10, cache_read_input_tokens=1000),
+            ),
+        )
+
+    messages = SimpleNamespace(with_raw_response=SimpleNamespace(create=create))
+    return SimpleNamespace(api_key="test-multi", messages=messages)
+
+
+def test_shared_cached_prefix(tmp_path, monkeypatch):
+    """Тест 1: все запросы начинаются одним префиксом с cache_control, отчёты в порядке промптов"""
+    path = tmp_path / "chat.csv"
+    pd.DataFrame({
+        'Date': ['01-03-2025 10:00:00', '01-03-2025 10:05:00'],
+        'From': ['Иван', 'Fulfillment-Box Support'],
+        'Text': ['Где заказ?', 'Отправлен'],
+    }).to_csv(path, sep=';', index=False, encoding='utf-8-sig')
+
+    requests = []
+    monkeypatch.setattr(analyzer, "STREAM_RESPONSES", False)
+    monkeypatch.setattr(multi_prompt, "get_client", lambda api_key=None: _fake_client(requests))
+
+    specs = [PromptSpec("A", "Задача А: {csv_content}"), PromptSpec("B", "Задача Б"), PromptSpec("C")]
+    result = analyze_csv_multi(str(path), specs, "key")
+
+    assert len(requests) == 3
+    prefixes = {content[0]["text"] for content in requests}
+    assert len(prefixes) == 1 and "Где заказ?" in prefixes.pop()
+    assert all(content[0]["cache_control"] == {"type": "ephemeral"} for content in requests)
+    tasks = [content[1]["text"] for content in requests]
+    assert "Задача А: " + multi_prompt.DATA_REFERENCE in tasks
+    assert not any("{csv_content}" in task for task in tasks)
+
+    assert [title for title, _ in result.reports] == ["A", "B", "C"]
+    combined = result.combined()
+    assert combined.index("# A") < combined.index("# B") < combined.index("# C")
+    assert len(result.separate()) == 3
+
+
+def test_resolve_presets():
+    """Тест 2: ключи готовых отчётов и промпт пользователя"""
+    specs = resolve_prompt_specs(["quality", "custom"], "Мой промпт")
+    assert specs[0].title == multi_prompt.PROMPT_PRESETS["quality"][0]
+    assert specs[1].prompt == "Мой промпт"
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""Тесты переменных пользовательского промпта (без сетевых запросов)"""
+
+import pandas as pd
+
+import services.prompt_template as prompt_template
+from services.analyzer import plan_analysis
+from services.prompt_template import PromptContext, render_prompt, unknown_variables
+from services.tokens import STRATEGY_SINGLE
+
+
+def _chat() -> pd.DataFrame:
+    return pd.DataFrame({
+        'Date': [f'0{day}-03-2025 10:0{minute}:00' for day in (1, 2) for minute in range(4)],
+        'From': ['Иван', 'Fulfillment-Box Support', 'Иван', 'Fulfillment-Box Support',
+                 'Анна', 'Fulfillment-Box Support', 'Иван', 'Fulfillment-Box Support'],
+        'Text': ['Где поставка?', 'Едет', 'Спасибо', 'Пожалуйста',
+                 'Нужна отгрузка', 'Оформим', 'Когда забор?', 'Сегодня'],
+    })
+
+
+def test_variables_are_lazy_and_memoized(monkeypatch):
+    """Тест 1: считаются только упомянутые переменные и каждая — один раз; неизвестные не трогаются"""
+    calls = []
+    original = prompt_template.PROMPT_VARIABLES['top_senders']
+    monkeypatch.setitem(prompt_template.PROMPT_VARIABLES, 'top_senders', prompt_template.PromptVariable(
+        original.description, lambda context, arg: calls.append(arg) or original.compute(context, arg), 10
+    ))
+
+    context = PromptContext(_chat())
+    text = render_prompt("Топ:\n{top_senders:1}\n{top_senders:1}\n{sample:3}\n{unknown} {\"json\": 1}", context)
+
+    assert calls == [1]
+    assert text.startswith("Топ:\n- Fulfillment-Box Support (менеджер): 4 сообщений\n- Fulfillment")
+    assert "Иван (клиент)" not in text
+    assert "{unknown} {\"json\": 1}" in text
+    assert "{sample" not in text
+    # Статистика и диалоги не понадобились — не считались
+    assert ('_stats',) not in context._memo and ('dialogues', None) not in context._memo
+    assert unknown_variables("{stats} {csv_content} {unknown}") == ['unknown']
+
+
+def test_prompt_without_data_placeholder():
+    """Тест 2: без {csv_content} сообщения не отправляются, переменные подставлены"""
+    plan = plan_analysis(_chat(), "Сводка по дням:\n{daily_volume}\nОцени нагрузку.")
+
+    assert plan.estimate.strategy == STRATEGY_SINGLE
+    assert plan.data == ""
+    assert "Где поставка?" not in plan.prompt
+    assert "01-03-2025 (Суббота): сообщений 4, от клиентов 2" in plan.prompt
+    assert plan.task == "Сводка по дням:\n- 01-03-2025 (Суббота): сообщений 4, от клиентов 2\n" \
+                        "- 02-03-2025 (Воскресенье): сообщений 4, от клиентов 2\nОцени нагрузку."
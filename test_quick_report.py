@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Тесты мгновенного отчёта без Claude"""
+
+import pandas as pd
+from docx import Document
+
+import services.quick_report as quick_report
+from services.quick_report import compute_quick_report, build_quick_report
+
+
+def _sample_chat() -> pd.DataFrame:
+    return pd.DataFrame({
+        'Date': [
+            '08-01-2024 23:00:00',  # Пн, без ответа в тот же день
+            '08-01-2024 09:10:00',
+            '08-01-2024 09:00:00',
+            '08-01-2024 08:00:00',
+            '06-01-2024 10:05:00',  # Сб
+            '06-01-2024 10:00:00',
+        ],
+        'From': ['Client C', 'Bob Fulfillment-Box', 'Client B', 'Client B', 'Anna Support', 'Client A'],
+        'Text': ['где посылка?', 'ответ', 'где заказ', 'привет', 'ответ', 'вопрос'],
+    })
+
+
+def test_quick_report_numbers():
+    """Тест 1: объём по дням/часам, отправители, время ответа и вопросы без ответа"""
+    report = compute_quick_report(_sample_chat(), "chat.csv")
+
+    assert report.messages == 6 and report.senders_total == 5
+    assert report.by_day.tolist() == [2, 0, 4]  # Воскресенье без сообщений — 0
+    assert report.by_hour[9] == 2 and report.by_hour.sum() == 6
+    assert report.busiest.iloc[0].tolist() == ['Понедельник', '09:00–09:59', 2]
+    assert report.senders.iloc[0][['From', 'Role', 'Messages']].tolist() == ['Client B', 'client', 2]
+    # Client A: 5 мин, Client B: 70 и 10 мин (оба сообщения до ответа в 09:10), Client C: без ответа
+    assert sorted(report.delays.tolist()) == [5, 10, 70]
+    assert report.delay_bins['5–15 мин'] == 2 and report.delay_bins['1–2 ч'] == 1
+    assert (report.questions, report.unanswered_total) == (4, 1)
+    assert report.unanswered[['From', 'Text']].iloc[0].tolist() == ['Client C', 'где посылка?']
+
+
+def test_build_docx_without_charts(tmp_path, monkeypatch):
+    """Тест 2: без matplotlib отчёт строится таблицами"""
+    monkeypatch.setattr(quick_report, "MATPLOTLIB_AVAILABLE", False)
+    csv_path = tmp_path / "chat.csv"
+    _sample_chat().to_csv(csv_path, sep=';', index=False, encoding='utf-8-sig')
+
+    summary = build_quick_report(str(csv_path), str(tmp_path / "chat_stats.docx"))
+
+    assert "Сообщений: 6" in summary
+    doc = Document(str(tmp_path / "chat_stats.docx"))
+    assert doc.paragraphs[0].text == "Статистика чата: chat.csv"
+    headers = [table.rows[0].cells[0].text for table in doc.tables]
+    assert headers[:5] == ["День", "Час", "День недели", "Отправитель", "Время ответа"] and headers[-1] == "Дата"
+    assert len(doc.tables[0].rows) == 1 + 3
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Тесты rate limiter для Claude API (без сетевых запросов)"""
+
+import time
+from datetime import datetime, timedelta, timezone
+
+from services.rate_limiter import RateLimiter, TokenBucket, parse_retry_after
+
+
+def test_bucket_wait_time():
+    """Тест 1: ожидание рассчитывается по скорости пополнения"""
+    bucket = TokenBucket(per_minute=60)
+    bucket.tokens = 0
+    assert abs(bucket.wait_time(1) - 1.0) < 1e-6
+    # Запрос больше ёмкости ждёт только полный bucket
+    assert abs(bucket.wait_time(1000) - 60.0) < 1e-6
+
+
+def test_acquire_without_wait():
+    """Тест 2: в пределах лимита запросы проходят без ожидания"""
+    limiter = RateLimiter(requests_per_minute=10, tokens_per_minute=10000)
+    for _ in range(5):
+        assert limiter.acquire(1000) == 0.0
+
+
+def test_headers_clamp_remaining():
+    """Тест 3: остаток из заголовков ограничивает локальный bucket"""
+    limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=100000)
+    reset = (datetime.now(timezone.utc) + timedelta(seconds=30)).isoformat()
+    limiter.update_from_headers({
+        "anthropic-ratelimit-requests-limit": "600",
+        "anthropic-ratelimit-requests-remaining": "0",
+        "anthropic-ratelimit-requests-reset": reset,
+    })
+    assert limiter._requests.capacity == 600
+    assert limiter._requests.tokens <= 0
+    # Запросы заблокированы до момента сброса лимита
+    assert limiter._blocked_until - time.monotonic() > 25
+
+
+def test_retry_after_pause():
+    """Тест 4: retry-after приостанавливает все запросы"""
+    limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=100000)
+    limiter.update_from_headers({"retry-after": "0.2"})
+    waits = []
+    started = time.monotonic()
+    limiter.acquire(1, on_wait=waits.append)
+    assert waits and waits[0] > 0
+    assert time.monotonic() - started >= 0.15
+
+
+def test_parse_retry_after():
+    """Тест 5: парсинг заголовка retry-after"""
+    assert parse_retry_after({"retry-after": "12"}) == 12.0
+    assert parse_retry_after({"retry-after": "abc"}) is None
+    assert parse_retry_after({}) is None
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""Тесты локальной оценки значимости сообщений и стратегии выборки 'relevance'"""
+
+import numpy as np
+import pandas as pd
+
+from services.relevance import score_messages, noise_mask, select_by_relevance
+
+
+def test_score_and_noise():
+    """Тест 1: шум — только благодарности/подтверждения, жалобы и вопросы выше обычных сообщений"""
+    texts = pd.Series([
+        "спасибо", "Ок", "Спасибо большое!", "понял, спасибо",
+        "привет", "Где мой заказ 1234567?", "опять задержка отгрузки!!", "спасибо, а когда поставка?",
+    ])
+    assert noise_mask(texts).tolist() == [True, True, True, True, False, False, False, False]
+
+    scores = score_messages(texts)
+    assert scores[5] > scores[4] and scores[6] > scores[4]
+    assert scores[7] > scores[0]
+
+
+def test_select_within_budget():
+    """Тест 2: выборка укладывается в бюджет и берёт соседей значимого сообщения"""
+    texts = ["обычное сообщение"] * 20
+    texts[10] = "Верните деньги, товар пришёл с браком!!"
+    frame = pd.DataFrame({'Date': range(20), 'From': ['Клиент'] * 20, 'Text': texts})
+    costs = np.full(20, 10.0)
+
+    mask = select_by_relevance(frame, costs, budget=35, context=1)
+    assert costs[mask].sum() <= 35
+    assert mask[9] and mask[10] and mask[11]
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Тесты стратегий выборки сообщений"""
+
+import numpy as np
+import pandas as pd
+
+from services.sampling import sample_messages, row_costs, SAMPLING_STRATEGIES
+
+
+def _chat(days: int = 30, per_day: int = 40) -> pd.DataFrame:
+    """Чат в порядке экспорта (от новых к старым)"""
+    dates = pd.Timestamp('2025-01-01 09:00') + pd.to_timedelta(
+        np.repeat(np.arange(days), per_day), unit='D'
+    ) + pd.to_timedelta(np.tile(np.arange(per_day) * 10, days), unit='m')
+    senders = np.where(np.arange(days * per_day) % 2, 'Fulfillment-Box Support', 'Иван')
+    df = pd.DataFrame({'Date': dates, 'From': senders, 'Text': ['текст сообщения'] * (days * per_day)})
+    return df.iloc[::-1].reset_index(drop=True)
+
+
+def test_all_strategies_fit_budget():
+    """Тест 1: каждая стратегия укладывается в бюджет"""
+    df = _chat()
+    budget = int(row_costs(df).sum() / 5)
+    for strategy in SAMPLING_STRATEGIES:
+        sampled, report = sample_messages(df, budget, strategy=strategy)
+        assert 0 < len(sampled) < len(df), strategy
+        assert report.kept_tokens <= budget, strategy
+        assert report.kept_rows == len(sampled)
+
+
+def test_day_strategy_covers_period():
+    """Тест 2: выборка по дням покрывает все дни, tail — только последние"""
+    df = _chat()
+    budget = int(row_costs(df).sum() / 5)
+    _, by_day = sample_messages(df, budget, strategy='day')
+    _, tail = sample_messages(df, budget, strategy='tail')
+    assert by_day.kept_days == by_day.total_days == 30
+    assert tail.kept_days < 10
+    # Экспорт от новых к старым: последние сообщения — первые строки файла
+    assert tail.line_ranges()[0][0] == 2
+
+
+def test_value_strategy_prefers_valuable_dialogues():
+    """Тест 3: рюкзак по ценности берёт диалоги с жалобами и объясняет, что не вошло"""
+    df = _chat(days=10, per_day=4)
+    df['Text'] = 'обычный текст сообщения в переписке с клиентами'
+    complaint = df['Date'].dt.day == 3
+    df.loc[complaint, 'Text'] = 'Жалоба: заказ потерян, верните деньги, проблема с доставкой'
+    budget = int(row_costs(df).sum() / 4)
+
+    sampled, report = sample_messages(df, budget, strategy='value')
+    assert report.kept_tokens <= budget
+    assert complaint[sampled.index].sum() == complaint.sum()
+    assert len(report.dropped_days) == report.total_days - report.kept_days > 0
+    assert "Дни без сообщений в выборке" in report.to_text()
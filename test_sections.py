@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Тесты стандартного отчёта по разделам (параллельные запросы, без сетевых запросов)"""
+
+import threading
+from types import SimpleNamespace
+
+import pandas as pd
+
+import services.analyzer as analyzer
+import services.sections as sections
+from services.analyzer import analyze_csv_with_claude
+from services.sections import client_messages, conflict_candidates
+from services.sessions import summarize_dialogues
+
+
+def _chat() -> pd.DataFrame:
+    return pd.DataFrame({
+        'Date': [f'01-03-2025 1{minute}:00:00' for minute in range(8)],
+        'From': ['Иван', 'Fulfillment-Box Support', 'Пётр', 'Fulfillment-Box Support',
+                 'Анна', 'Fulfillment-Box Support', 'Иван', 'Fulfillment-Box Support'],
+        'Text': ['Когда поставка на склад', 'Завтра', 'Подскажите адрес склада', 'Адрес в профиле',
+                 'Опять задержка отгрузки, это ужас', 'Разбираемся', 'Курьер приехал', 'Отлично'],
+    })
+
+
+def test_section_inputs():
+    """Тест 1: частым запросам — только клиенты, конфликтам — жалобы с соседями"""
+    df = _chat()
+    assert set(client_messages(df)['From']) == {'Иван', 'Пётр', 'Анна'}
+
+    conflicts = conflict_candidates(df, context=1)
+    assert conflicts['Text'].tolist() == ['Адрес в профиле', 'Опять задержка отгрузки, это ужас', 'Разбираемся']
+
+
+def test_conflicts_found_only_in_client_messages():
+    """Тест 1б: жалоба менеджера не делает фрагмент кандидатом в конфликты"""
+    df = _chat()
+    df.loc[4, 'From'] = 'Fulfillment-Box Support'
+    assert conflict_candidates(df, context=1).empty
+
+
+def test_dialogues_summarized_once(monkeypatch):
+    """Тест 1в: сводка диалогов считается один раз на отчёт, а не в каждом разделе"""
+    calls = []
+
+    def counting(df, gap_minutes=None):
+        calls.append(len(df))
+        return summarize_dialogues(df, gap_minutes)
+
+    monkeypatch.setattr(analyzer, "summarize_dialogues", counting)
+    monkeypatch.setattr(sections, "summarize_dialogues", counting)
+    plan = sections.plan_sections(_chat(), stats_text="")
+    assert calls == [len(_chat())]
+    assert all(section_plan.dialogues_text == plan.dialogues_text for _, section_plan in plan.sections)
+
+
+def test_sections_run_in_parallel(tmp_path, monkeypatch):
+    """Тест 2: по запросу на раздел, каждый со своими данными; разделы собираются по порядку"""
+    path = tmp_path / "chat.csv"
+    _chat().to_csv(path, sep=';', index=False, encoding='utf-8-sig')
+
+    requests = []
+    lock = threading.Lock()
+
+    def create(model, max_tokens, messages):
+        prompt = messages[0]["content"]
+        with lock:
+            requests.append(prompt)
+        text = "текст конфликтов" if "конфликтов" in prompt else "текст запросов"
+        return SimpleNamespace(headers={}, parse=lambda: SimpleNamespace(
+            content=[SimpleNamespace(text=text)],
+            usage=SimpleNamespace(input_tokens=10, output_tokens=5),
+        ))
+
+    fake = SimpleNamespace(
+        api_key="test-sections",
+        messages=SimpleNamespace(with_raw_response=SimpleNamespace(create=create)),
+    )
+    monkeypatch.setattr(analyzer, "STREAM_RESPONSES", False)
+    monkeypatch.setattr(analyzer, "SECTION_PARALLEL", 1)
+    monkeypatch.setattr(analyzer, "get_client", lambda api_key=None: fake)
+
+    result = analyze_csv_with_claude(str(path), "key")
+
+    assert len(requests) == 2
+    requests_prompt = next(p for p in requests if "частые запросы" in p)
+    assert "Адрес в профиле" not in requests_prompt and "Подскажите адрес склада" in requests_prompt
+    conflicts_prompt = next(p for p in requests if "конфликтов" in p)
+    assert "Когда поставка на склад" not in conflicts_prompt
+
+    assert result.index("## Самые частые запросы клиентов\n\nтекст запросов") < result.index(
+        "## Причины конфликтов и недовольства клиентов\n\nтекст конфликтов"
+    )
+    assert "## Количество вопросов по каждому менеджеру" in result
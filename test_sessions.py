@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""Тесты разбиения чата на диалоги"""
+
+import numpy as np
+import pandas as pd
+
+from services.sessions import summarize_dialogues, dialogue_chunks, format_dialogues_text
+
+
+def test_dialogue_summary():
+    """Тест 1: пауза и смена дня начинают диалог, первый ответ — после первого вопроса клиента"""
+    df = pd.DataFrame({
+        # Экспорт от новых к старым
+        'Date': [
+            '02-03-2025 09:00:00', '01-03-2025 12:00:00',
+            '01-03-2025 10:20:00', '01-03-2025 10:05:00', '01-03-2025 10:00:00', '01-03-2025 09:58:00',
+        ],
+        'From': ['Иван', 'Fulfillment-Box Support', 'Иван', 'Fulfillment-Box Support', 'Иван', 'Fulfillment-Box Support'],
+        'Text': ['Ещё вопрос', 'Напоминаем', 'Спасибо', 'Отправлен', 'Где заказ?', 'Доброе утро'],
+    })
+    dialogues = summarize_dialogues(df, gap_minutes=30)
+
+    assert dialogues['Messages'].tolist() == [4, 1, 1]
+    assert dialogues['Duration'].tolist() == [22 * 60, 0, 0]
+    # Приветствие менеджера до вопроса клиента — не ответ
+    assert dialogues['FirstResponse'].iloc[0] == 5 * 60
+    assert dialogues['HasClient'].tolist() == [True, False, True]
+    assert np.isnan(dialogues['FirstResponse'].iloc[2])
+
+    text = format_dialogues_text(dialogues)
+    assert "**Всего диалогов**: 3, с обращением клиента — 2, без ответа менеджера — 1" in text
+
+
+def test_chunks_keep_dialogues_whole():
+    """Тест 2: части набираются целыми диалогами, слишком большой диалог делится по строкам"""
+    ids = np.array([0, 0, 1, 1, 1, 2, 3, 3, 3, 3, 3])
+    costs = np.full(len(ids), 10.0)
+
+    chunks = dialogue_chunks(ids, costs, max_tokens=40)
+    assert chunks.tolist() == [0, 0, 1, 1, 1, 1, 2, 2, 2, 2, 3]
+    for dialogue in (0, 1, 2):
+        assert len(set(chunks[ids == dialogue])) == 1
+    assert all(np.bincount(chunks, weights=costs) <= 40)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Тесты локального расчёта статистики чата"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from services.stats import (
+    DELAY_BIN_EDGES,
+    ChatStats,
+    compute_chat_stats, compute_responses, prepare_messages, classify_senders, format_stats_text, parse_role_rules
+)
+
+
+def _sample_chat() -> pd.DataFrame:
+    """Экспорт в порядке от новых к старым, как пишет services/telegram.py"""
+    return pd.DataFrame({
+        'Date': [
+            '08-01-2024 23:00:00',  # Пн, без ответа в тот же день
+            '08-01-2024 09:10:00',
+            '08-01-2024 09:00:00',
+            '08-01-2024 08:00:00',
+            '06-01-2024 10:05:00',  # Сб
+            '06-01-2024 10:00:00',
+        ],
+        'From': ['Client C', 'Bob Fulfillment-Box', 'Client B', 'Client B', 'Anna Support', 'Client A'],
+        'Text': ['?', 'ответ', 'где заказ', 'привет', 'ответ', 'вопрос'],
+    })
+
+
+def test_classify_senders():
+    """Тест 1: роли по подстрокам имени"""
+    roles = classify_senders(pd.Series(['Anna Support', 'Client', 'Unknown', 'fulfillment-box']))
+    assert roles.tolist() == ['support', 'client', 'system', 'support']
+
+
+def test_role_rules():
+    """Тест 1б: свои правила — регулярные выражения имён, ID отправителей сильнее имени"""
+    rules = parse_role_rules('{"support_patterns": [], "support_regex": ["^менеджер\\\\b"], "client_ids": [7]}')
+    senders = pd.Series(['Менеджер Анна', 'Anna Support', 'менеджер Олег', None])
+    roles = classify_senders(senders, rules, sender_ids=pd.Series([1, 2, 7, None]))
+    assert roles.tolist() == ['support', 'client', 'client', 'system']
+
+
+def test_first_reply_same_day():
+    """Тест 2: первый ответ менеджера в тот же день"""
+    delays = compute_responses(prepare_messages(_sample_chat()))['Delay'].tolist()
+    assert delays[:3] == [300.0, 4200.0, 600.0]
+    assert pd.isna(delays[3])
+
+
+def test_day_type_summary():
+    """Тест 3: среднее и медиана для будней и выходных (минуты)"""
+    summary = compute_chat_stats(_sample_chat()).day_type_summary()
+    assert summary.loc['Будни', 'mean'] == 40.0
+    assert summary.loc['Выходные', 'median'] == 5.0
+    assert summary.loc['Будни', 'questions'] == 3
+
+
+def test_merge_matches_full():
+    """Тест 4: объединение статистики частей равно статистике целого"""
+    df = _sample_chat()
+    merged = compute_chat_stats(df.iloc[:4]).merge(compute_chat_stats(df.iloc[4:]))
+    full = compute_chat_stats(df)
+    assert merged.manager_summary().equals(full.manager_summary())
+    assert 'Bob Fulfillment-Box' in format_stats_text(merged)
+
+
+def test_system_message_between_question_and_reply():
+    """Тест 5: системное сообщение между вопросом и ответом остаётся в ленте, но ответом не считается"""
+    df = pd.DataFrame({
+        'Date': ['08-01-2024 10:05:00', '08-01-2024 10:01:00', '08-01-2024 10:00:00'],
+        'From': ['Anna Support', 'Unknown', 'Client A'],
+        'Text': ['ответ', 'закреплено сообщение', 'где заказ'],
+    })
+    responses = compute_responses(prepare_messages(df))
+    assert responses['Delay'].tolist() == [300.0]
+    assert responses['Manager'].tolist() == ['Anna Support']
+    assert compute_chat_stats(df).role_counts['system'] == 1
+
+
+def test_histogram_summary_close_to_exact():
+    """Тест 6: гистограмма ответов — среднее точное, медиана в пределах 2%, размер не растёт с числом сообщений"""
+    rng = np.random.default_rng(7)
+    days = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 60, 4000), unit='D')
+    client_times = days + pd.to_timedelta(rng.integers(8 * 3600, 12 * 3600, 4000), unit='s')
+    reply_times = client_times + pd.to_timedelta(rng.lognormal(6, 1.2, 4000).astype(int) + 1, unit='s')
+    df = pd.DataFrame({
+        'Date': np.r_[client_times, reply_times],
+        'From': ['Client'] * 4000 + list(rng.choice(['Anna Support', 'Bob Support'], 4000)),
+        'Text': 'x',
+    })
+    exact = compute_responses(prepare_messages(df)).dropna(subset=['Delay'])
+    summary = compute_chat_stats(df).day_type_summary()
+    for is_weekend, day_type in ((False, 'Будни'), (True, 'Выходные')):
+        delays = exact.loc[exact['IsWeekend'] == is_weekend, 'Delay'] / 60
+        assert np.isclose(summary.loc[day_type, 'mean'], delays.mean())
+        assert abs(summary.loc[day_type, 'median'] - delays.median()) <= 0.02 * delays.median()
+
+    stats = compute_chat_stats(df)
+    assert len(stats.delays) <= 2 * 2 * len(DELAY_BIN_EDGES) + 2
+    assert stats.questions == len(compute_responses(prepare_messages(df)))
+
+
+def test_state_json_round_trip_and_legacy():
+    """Тест 7: статистика восстанавливается из JSON, в том числе из прежнего формата (ответы построчно)"""
+    stats = compute_chat_stats(_sample_chat())
+    assert format_stats_text(ChatStats.from_json(stats.to_json())) == format_stats_text(stats)
+
+    responses = compute_responses(prepare_messages(_sample_chat()))
+    legacy = json.loads(stats.to_json())
+    del legacy['delays']
+    legacy['responses'] = {
+        'Day': responses['Day'].dt.strftime('%Y-%m-%d').tolist(),
+        'IsWeekend': responses['IsWeekend'].tolist(),
+        'Manager': responses['Manager'].tolist(),
+        'Delay': responses['Delay'].tolist(),
+    }
+    assert format_stats_text(ChatStats.from_json(json.dumps(legacy))) == format_stats_text(stats)
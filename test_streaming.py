@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""Тесты приёма потокового ответа (без сетевых запросов)"""
+
+from services.streaming import ResponseStream
+
+
+def test_progress_throttled():
+    """Тест 1: прогресс уведомляется не чаще интервала, смена этапа — всегда"""
+    statuses = []
+    stream = ResponseStream(on_progress=statuses.append, interval=60)
+    stream.begin()
+    for _ in range(100):
+        stream.feed("токен ")
+    assert len(statuses) == 1
+    stream.set_stage("Итог")
+    assert len(statuses) == 2 and statuses[-1].stage == "Итог"
+    assert statuses[-1].first_token_after is not None
+
+
+def test_retry_discards_partial_text():
+    """Тест 2: повтор запроса отбрасывает частичный текст, подписчик получает все фрагменты"""
+    fragments = []
+    stream = ResponseStream(on_text=fragments.append)
+
+    stream.begin()
+    stream.feed("## Черновик\n- пункт")
+    stream.begin()  # Повтор после обрыва
+    stream.feed("## Отчёт\nтекст")
+    assert stream.text == "## Отчёт\nтекст"
+    assert fragments == ["## Черновик\n- пункт", "## Отчёт\nтекст"]
+
+    stream.end()
+    assert stream.text == "" and stream.output_tokens > 0
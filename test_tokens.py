@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""Тесты оценки токенов и бюджетов (без сетевых запросов)"""
+
+import pytest
+
+from services.tokens import (
+    estimate_tokens, count_tokens, choose_strategy, check_user_budget, TokenBudgetError,
+    STRATEGY_SINGLE, STRATEGY_COMPACT, STRATEGY_CHUNKED
+)
+
+
+def test_estimate_tokens():
+    """Тест 1: кириллица оценивается дороже латиницы"""
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("привет" * 100) > estimate_tokens("hello!" * 100)
+
+
+def test_count_tokens_fallback():
+    """Тест 2: без клиента используется локальная оценка"""
+    tokens, exact = count_tokens(None, "hello world", "any-model")
+    assert tokens == estimate_tokens("hello world")
+    assert exact is False
+
+
+def test_choose_strategy():
+    """Тест 3: выбор стратегии по размеру"""
+    assert choose_strategy(100, 50, 1000, prefer_compact=False) == STRATEGY_SINGLE
+    assert choose_strategy(100, 50, 1000) == STRATEGY_COMPACT
+    assert choose_strategy(5000, 2000, 1000) == STRATEGY_CHUNKED
+
+
+def test_user_budget():
+    """Тест 4: дневной бюджет пользователя"""
+    check_user_budget(500, 400, 1000)
+    check_user_budget(10 ** 9, 0, 0)  # 0 — без ограничений
+    with pytest.raises(TokenBudgetError):
+        check_user_budget(700, 400, 1000)
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""Тесты локального выделения тем обращений клиентов"""
+
+import pandas as pd
+
+from services.prompt_template import PromptContext, render_prompt
+from services.topics import extract_topics, stem
+
+
+def _chat() -> pd.DataFrame:
+    texts = (
+        ["Где мой заказ 123456?", "заказ 777 не доставлен", "когда доставка заказа?"] * 20
+        + ["Нужен счёт на оплату", "выставите счет на оплату", "счета на оплату не пришли"] * 10
+        + ["спасибо", "ок"] * 5
+    )
+    senders = ['Клиент'] * len(texts)
+    texts.append("где заказ клиента?")
+    senders.append('Anna Support')
+    return pd.DataFrame({'Date': '03-03-2025 10:00:00', 'From': senders, 'Text': texts})
+
+
+def test_stem_merges_inflections():
+    """Тест 1: формы одного слова дают одну основу"""
+    assert stem('доставку') == stem('доставки') == stem('доставкой') == 'доставк'
+    assert stem('заказ') == 'заказ' and stem('api') == 'api'
+
+
+def test_topics_exact_counts():
+    """Тест 2: две темы с точными количествами по клиентам; «спасибо» без темы; переменная {topics}"""
+    topics = extract_topics(_chat(), count=2)
+
+    assert topics['Count'].tolist() == [60, 30]
+    assert topics['Topic'].iloc[0].startswith('заказ') and 'оплату' in topics['Topic'].iloc[1]
+    assert all(len(examples) == 3 for examples in topics['Examples'])
+    assert topics['Share'].iloc[0] == 60 / 100
+
+    prompt = render_prompt("Темы:\n{topics:1}", PromptContext(_chat()))
+    assert prompt.startswith("Темы:\n## Темы обращений клиентов") and prompt.count("\n- **") == 1
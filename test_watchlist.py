@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""Тесты списков ключевых слов (автомат Ахо-Корасик) и манифеста экспорта"""
+
+from services.watchlist import Watchlist, WatchlistSink, parse_watchlist, read_manifest, write_manifest, format_hits_text
+
+
+def test_matches_like_naive_search():
+    """Тест 1: совпадения как у наивного поиска по началу слова; регистр и ё не важны"""
+    keywords = ["возврат", "претензи", "he", "she", "hers", "his", "заказ 123", "Ёлка"]
+    watchlist = Watchlist(keywords)
+    texts = ["Оформите ВОЗВРАТ", "невозврат", "she said his hers", "ushers", "заказ 1234, претензия", "елка", ""]
+
+    def naive(text: str) -> set:
+        folded = text.lower().replace('ё', 'е')
+        return {
+            keyword for keyword in keywords
+            for start in range(len(folded))
+            if folded.startswith(keyword.lower().replace('ё', 'е'), start)
+            and (start == 0 or not folded[start - 1].isalnum())
+        }
+
+    for text in texts:
+        assert {keywords[index] for index in watchlist.find(text)} == naive(text)
+    assert parse_watchlist("возврат, претензия\nSKU-1, возврат").keywords == ["возврат", "претензия", "SKU-1"]
+
+
+def test_sink_counts_and_manifest(tmp_path):
+    """Тест 2: счётчики по словам, ссылки ограничены, манифест читается обратно"""
+    sink = WatchlistSink(parse_watchlist("возврат\nбрак\nштраф"), max_refs=2)
+    for message_id in range(5):
+        sink.feed(message_id, "01-03-2025 10:00:00", "Клиент", "Возврат: брак" if message_id % 2 else "возврат")
+    sink.feed(9, "01-03-2025 11:00:00", "Менеджер", "Принято")
+
+    section = sink.to_dict()
+    assert (section['messages_scanned'], section['messages_matched']) == (6, 5)
+    assert {keyword: hit['count'] for keyword, hit in section['hits'].items()} == {'возврат': 5, 'брак': 2}
+    assert [ref['id'] for ref in section['hits']['возврат']['messages']] == [0, 1]
+
+    csv_path = str(tmp_path / "chat.csv")
+    write_manifest(csv_path, {'file': 'chat.csv', 'watchlist': section})
+    assert read_manifest(csv_path)['watchlist'] == section
+    assert format_hits_text(section).splitlines()[0] == "• возврат — 5"
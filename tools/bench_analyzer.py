@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пропускной способности анализа на локальном fake Messages API (без расходов на Claude)
+
+Для каждого режима анализа и уровня параллельности: анализов в минуту,
+p50/p95 времени одного анализа, запросов к API, ответов 429/5xx и неудачных анализов.
+
+Запуск:
+    python tools/bench_analyzer.py                                      # все режимы, параллельность 1, 4, 16
+    python tools/bench_analyzer.py --modes single chunked --concurrency 1 8 --analyses 16
+    python tools/bench_analyzer.py --rate-limit 0.05 --errors 0.02 --retry-after 0.5
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.fake_anthropic import FakeAnthropicServer, profile_arguments, profile_from_args  # noqa: E402
+
+MODES = ['single', 'sections', 'chunked', 'sampled', 'multi', 'folder']
+DEFAULT_CONCURRENCY = [1, 4, 16]
+SMALL_ROWS = 2_000
+LARGE_ROWS = 40_000
+# Лимит запроса в режимах chunked/sampled: большой чат гарантированно не помещается
+OVERSIZE_REQUEST_TOKENS = 30_000
+OVERSIZE_CHUNK_TOKENS = 10_000
+
+
+def configure_environment(url: str):
+    """Настройки до импорта services: адрес fake API, лимиты аккаунта без ограничений, без кэша заметок"""
+    os.environ['CLAUDE_BASE_URL'] = url
+    os.environ.setdefault('CLAUDE_API_KEY', 'bench-key')
+    os.environ['CLAUDE_RPM_LIMIT'] = '100000'
+    os.environ['CLAUDE_TPM_LIMIT'] = '1000000000'
+    os.environ['MAP_CACHE_MB'] = '0'
+
+
+@contextmanager
+def patched(module, **values):
+    """Временно заменить настройки модуля (как monkeypatch в тестах)"""
+    previous = {name: getattr(module, name) for name in values}
+    for name, value in values.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(module, name, value)
+
+
+def percentile(values: list, q: float) -> float:
+    return float(np.percentile(values, q)) if values else float('nan')
+
+
+def run_mode(mode: str, concurrency: int, analyses: int, files: dict, workdir: str) -> tuple:
+    """
+    Выполнить analyses анализов в режиме mode с параллельностью concurrency.
+
+    Returns:
+        (длительности успешных анализов, число неудачных, общее время)
+    """
+    from services import analyzer
+    from services.multi_prompt import analyze_csv_multi, resolve_prompt_specs
+
+    settings = {'SECTION_PARALLEL': 1 if mode == 'sections' else 0}
+    if mode in ('chunked', 'sampled'):
+        settings.update(
+            MAX_REQUEST_TOKENS=OVERSIZE_REQUEST_TOKENS,
+            MAP_CHUNK_TOKENS=OVERSIZE_CHUNK_TOKENS,
+            OVERSIZE_MODE='chunked' if mode == 'chunked' else 'sample',
+        )
+    path = files['large'] if mode in ('chunked', 'sampled') else files['small']
+    # Свой ключ — свой rate limiter: паузы после 429 одного прогона не влияют на следующий
+    api_key = f"bench-{mode}-{concurrency}"
+
+    with patched(analyzer, **settings):
+        started = time.perf_counter()
+        if mode == 'folder':
+            durations, failed = _run_folder(analyzer, concurrency, analyses, path, workdir)
+        else:
+            def one(_) -> tuple:
+                begin = time.perf_counter()
+                try:
+                    if mode == 'multi':
+                        result = analyze_csv_multi(path, resolve_prompt_specs(['default', 'quality']), api_key)
+                        ok = bool(result.reports)
+                    else:
+                        ok = not analyzer.analyze_csv_with_claude(path, api_key).startswith("Ошибка")
+                except Exception:
+                    ok = False
+                return ok, time.perf_counter() - begin
+
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                outcomes = list(executor.map(one, range(analyses)))
+            durations = [seconds for ok, seconds in outcomes if ok]
+            failed = len(outcomes) - len(durations)
+        return durations, failed, time.perf_counter() - started
+
+
+def _run_folder(analyzer, concurrency: int, analyses: int, path: str, workdir: str) -> tuple:
+    """analyze_csv_folder по analyses копиям чата: время файла — от начала анализа до готового DOCX"""
+    input_dir = tempfile.mkdtemp(dir=workdir)
+    output_dir = tempfile.mkdtemp(dir=workdir)
+    for index in range(analyses):
+        shutil.copy(path, os.path.join(input_dir, f"chat_{index}.csv"))
+
+    started_at, durations = {}, []
+
+    def progress(current, total, filename, status):
+        if status == 'analyzing':
+            started_at[filename] = time.perf_counter()
+        elif status == 'done':
+            durations.append(time.perf_counter() - started_at[filename])
+
+    try:
+        result = analyzer.analyze_csv_folder(input_dir, output_dir, progress, max_workers=concurrency)
+        failed = result['errors']
+    except Exception:
+        failed = analyses - len(durations)
+    return durations, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк анализа на fake Messages API")
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--concurrency', nargs='+', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--analyses', type=int, default=0, help="анализов на прогон (по умолчанию 2 × параллельность)")
+    profile_arguments(parser)
+    args = parser.parse_args()
+
+    with FakeAnthropicServer(profile_from_args(args)) as server, tempfile.TemporaryDirectory() as workdir:
+        configure_environment(server.url)
+        # services читают настройки при импорте — только после configure_environment
+        import logging
+        from tools.bench_ingest import make_chat
+        logging.disable(logging.WARNING)
+
+        files = {}
+        for name, rows in (('small', SMALL_ROWS), ('large', LARGE_ROWS)):
+            files[name] = os.path.join(workdir, f"{name}.csv")
+            make_chat(rows).to_csv(files[name], sep=';', index=False, encoding='utf-8-sig')
+
+        profile = server.profile
+        print(f"Fake API {server.url}: задержка ~{profile.latency_ms:g} мс (σ={profile.latency_sigma:g}), "
+              f"{profile.tokens_per_second:g} ток/с, 429: {profile.rate_limit_rate:.0%}, 5xx: {profile.error_rate:.0%}")
+        print(f"{'Режим':<9} | {'Парал.':>6} | {'Анализов':>8} | {'В мин':>7} | {'p50, с':>7} | {'p95, с':>7} | "
+              f"{'Запросов':>8} | {'429':>4} | {'5xx':>4} | {'Неудач':>6}")
+        print("-" * 96)
+
+        for mode in args.modes:
+            for concurrency in args.concurrency:
+                analyses = args.analyses or 2 * concurrency
+                before = server.snapshot()
+                durations, failed, wall = run_mode(mode, concurrency, analyses, files, workdir)
+                after = server.snapshot()
+                print(
+                    f"{mode:<9} | {concurrency:>6} | {analyses:>8} | {len(durations) / wall * 60:>7.1f} | "
+                    f"{percentile(durations, 50):>7.2f} | {percentile(durations, 95):>7.2f} | "
+                    f"{after.requests - before.requests:>8} | {after.rate_limited - before.rate_limited:>4} | "
+                    f"{after.errors - before.errors:>4} | {failed:>6}"
+                )
+
+
+if __name__ == '__main__':
+    main()
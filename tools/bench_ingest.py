@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк чтения CSV: старый цикл перебора кодировок/разделителей против services.ingest
+
+Запуск:
+    python tools/bench_ingest.py                 # 10k, 100k, 1M строк
+    python tools/bench_ingest.py 10000 50000     # свои размеры
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ingest import read_chat_csv, PYARROW_AVAILABLE  # noqa: E402
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+SENDERS = ['Fulfillment-Box Support', 'Иван Петров', 'ООО Ромашка', 'Анна', 'Unknown']
+
+
+def read_csv_legacy(file_path: str) -> pd.DataFrame:
+    """Прежняя реализация _read_csv_flexible (до 12 полных попыток чтения)"""
+    encodings = ['utf-8-sig', 'utf-8', 'cp1251', 'latin-1']
+    separators = [';', ',', '\t']
+
+    for encoding in encodings:
+        for sep in separators:
+            try:
+                df = pd.read_csv(file_path, sep=sep, encoding=encoding)
+                if len(df.columns) > 1:
+                    return df
+            except Exception:
+                continue
+
+    return pd.read_csv(file_path, sep=None, encoding='utf-8-sig', engine='python')
+
+
+def make_chat(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Синтетический чат в формате экспорта"""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2025-01-01')
+    dates = start + pd.to_timedelta(np.sort(rng.integers(0, 365 * 24 * 3600, rows)), unit='s')
+    words = np.array(['заказ', 'доставка', 'когда', 'спасибо', 'склад', 'отгрузка', 'номер', 'ok', 'привет'])
+    text_lengths = rng.integers(1, 12, rows)
+    texts = [' '.join(rng.choice(words, n)) for n in text_lengths]
+    return pd.DataFrame({
+        'Date': dates.strftime('%d-%m-%Y %H:%M:%S'),
+        'From': rng.choice(SENDERS, rows),
+        'Text': texts,
+    })
+
+
+def timed(func, *args) -> tuple:
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    print(f"pyarrow: {'да' if PYARROW_AVAILABLE else 'нет (движок C)'}")
+    print(f"{'Строк':>10} | {'Файл':<22} | {'Старое, с':>10} | {'Новое, с':>10} | {'Ускорение':>9}")
+    print("-" * 74)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in sizes:
+            chat = make_chat(rows)
+            variants = {
+                'экспорт (utf-8-sig ;)': dict(sep=';', encoding='utf-8-sig'),
+                'внешний (cp1251 ,)': dict(sep=',', encoding='cp1251'),
+            }
+            for name, options in variants.items():
+                path = os.path.join(tmp, f"chat_{rows}_{options['encoding']}.csv")
+                chat.to_csv(path, index=False, **options)
+
+                old_time, old_df = timed(read_csv_legacy, path)
+                new_time, new_df = timed(read_chat_csv, path)
+                assert len(old_df) == len(new_df) == rows
+
+                print(
+                    f"{rows:>10,} | {name:<22} | {old_time:>10.3f} | {new_time:>10.3f} | "
+                    f"{old_time / new_time:>8.1f}x"
+                )
+
+
+if __name__ == '__main__':
+    main()
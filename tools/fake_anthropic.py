@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Локальный fake Messages API для нагрузочных тестов без расходов на Claude
+
+Имитирует задержку ответа (логнормальное распределение), потоковую выдачу (SSE),
+429 с retry-after и 5xx, заголовки anthropic-ratelimit-* и count_tokens.
+
+Запуск:
+    python tools/fake_anthropic.py                          # http://127.0.0.1:8765
+    python tools/fake_anthropic.py --port 9000 --rate-limit 0.05 --errors 0.02
+
+Анализатор направляется на сервер настройкой CLAUDE_BASE_URL=http://127.0.0.1:8765
+"""
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+import numpy as np
+
+CHARS_PER_TOKEN = 3  # Как в оценке services/tokens.py
+STREAM_STEP_TOKENS = 10  # Токенов в одной порции потокового ответа
+WORDS = ['клиенты', 'спрашивают', 'о', 'сроках', 'поставки', 'на', 'склад', 'и', 'статусе', 'отгрузки',
+         'жалобы', 'связаны', 'с', 'задержками', 'ответа', 'менеджеров', 'в', 'выходные']
+
+
+@dataclass
+class FakeProfile:
+    """Поведение сервера: задержки, скорость выдачи, доли ошибок"""
+    latency_ms: float = 400.0  # Медиана времени до первого байта ответа
+    latency_sigma: float = 0.5  # Разброс (σ логнормального распределения)
+    tokens_per_second: float = 300.0  # Скорость выдачи текста ответа
+    output_tokens: int = 300  # Длина ответа (не больше max_tokens запроса)
+    rate_limit_rate: float = 0.0  # Доля ответов 429
+    retry_after: float = 1.0  # retry-after в ответе 429, с
+    error_rate: float = 0.0  # Доля ответов 5xx
+    error_status: int = 529  # 500 | 529 (overloaded)
+    requests_limit: int = 4000  # anthropic-ratelimit-requests-limit
+    tokens_limit: int = 2_000_000  # anthropic-ratelimit-input-tokens-limit
+    seed: Optional[int] = None
+
+
+@dataclass
+class FakeStats:
+    """Счётчики сервера"""
+    requests: int = 0
+    streamed: int = 0
+    rate_limited: int = 0
+    errors: int = 0
+    count_tokens: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    models: dict = field(default_factory=dict)
+
+    def copy(self) -> 'FakeStats':
+        return FakeStats(**{**self.__dict__, 'models': dict(self.models)})
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, как у настоящего API
+    server: '_Server'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get('content-length') or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, status: int, payload: dict, headers: Optional[dict] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('content-type', 'application/json')
+        self.send_header('content-length', str(len(body)))
+        self.send_header('request-id', f"req_{uuid.uuid4().hex[:24]}")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        fake = self.server.fake
+        path = self.path.split('?', 1)[0]
+        payload = self._read_json()
+        input_tokens = len(json.dumps(payload.get('messages', []), ensure_ascii=False)) // CHARS_PER_TOKEN
+
+        if path.endswith('/v1/messages/count_tokens'):
+            fake.count('count_tokens')
+            self._send_json(200, {'input_tokens': input_tokens})
+            return
+        if not path.endswith('/v1/messages'):
+            self._send_json(404, {'type': 'error', 'error': {'type': 'not_found_error', 'message': path}})
+            return
+
+        outcome, latency = fake.draw()
+        fake.count('requests')
+        time.sleep(latency)
+
+        if outcome == 'rate_limit':
+            fake.count('rate_limited')
+            self._send_json(
+                429, {'type': 'error', 'error': {'type': 'rate_limit_error', 'message': 'fake 429'}},
+                {'retry-after': f"{fake.profile.retry_after:g}", **fake.limit_headers(0, exhausted=True)}
+            )
+            return
+        if outcome == 'error':
+            fake.count('errors')
+            error_type = 'overloaded_error' if fake.profile.error_status == 529 else 'api_error'
+            self._send_json(fake.profile.error_status,
+                            {'type': 'error', 'error': {'type': error_type, 'message': 'fake error'}})
+            return
+
+        model = payload.get('model', 'fake-model')
+        output_tokens = max(1, min(fake.profile.output_tokens, int(payload.get('max_tokens') or 1)))
+        words = [WORDS[i % len(WORDS)] for i in range(output_tokens)]
+        with fake.lock:
+            fake.stats.input_tokens += input_tokens
+            fake.stats.output_tokens += output_tokens
+            fake.stats.models[model] = fake.stats.models.get(model, 0) + 1
+
+        message_id = f"msg_{uuid.uuid4().hex[:24]}"
+        if payload.get('stream'):
+            fake.count('streamed')
+            self._stream(message_id, model, words, input_tokens)
+            return
+
+        time.sleep(output_tokens / fake.profile.tokens_per_second)
+        self._send_json(200, {
+            'id': message_id, 'type': 'message', 'role': 'assistant', 'model': model,
+            'content': [{'type': 'text', 'text': ' '.join(words)}],
+            'stop_reason': 'end_turn', 'stop_sequence': None,
+            'usage': {'input_tokens': input_tokens, 'output_tokens': output_tokens},
+        }, fake.limit_headers(input_tokens))
+
+    def _stream(self, message_id: str, model: str, words: list, input_tokens: int):
+        """Ответ в формате SSE Messages API: текст порциями со скоростью tokens_per_second"""
+        fake = self.server.fake
+        self.send_response(200)
+        self.send_header('content-type', 'text/event-stream')
+        self.send_header('transfer-encoding', 'chunked')
+        for name, value in fake.limit_headers(input_tokens).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        def event(name: str, data: dict):
+            self._send_chunk(f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8'))
+
+        event('message_start', {'type': 'message_start', 'message': {
+            'id': message_id, 'type': 'message', 'role': 'assistant', 'model': model, 'content': [],
+            'stop_reason': None, 'stop_sequence': None,
+            'usage': {'input_tokens': input_tokens, 'output_tokens': 1},
+        }})
+        event('content_block_start', {'type': 'content_block_start', 'index': 0,
+                                      'content_block': {'type': 'text', 'text': ''}})
+        for start in range(0, len(words), STREAM_STEP_TOKENS):
+            part = words[start:start + STREAM_STEP_TOKENS]
+            time.sleep(len(part) / fake.profile.tokens_per_second)
+            text = (' ' if start else '') + ' '.join(part)
+            event('content_block_delta', {'type': 'content_block_delta', 'index': 0,
+                                          'delta': {'type': 'text_delta', 'text': text}})
+        event('content_block_stop', {'type': 'content_block_stop', 'index': 0})
+        event('message_delta', {'type': 'message_delta',
+                                'delta': {'stop_reason': 'end_turn', 'stop_sequence': None},
+                                'usage': {'output_tokens': len(words)}})
+        event('message_stop', {'type': 'message_stop'})
+        self._send_chunk(b"")
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    fake: 'FakeAnthropicServer'
+
+
+class FakeAnthropicServer:
+    """
+    Fake Messages API в фоновом потоке.
+
+    Пример:
+        with FakeAnthropicServer(FakeProfile(rate_limit_rate=0.1)) as server:
+            client = anthropic.Anthropic(api_key="test", base_url=server.url, max_retries=0)
+    """
+
+    def __init__(self, profile: Optional[FakeProfile] = None, host: str = "127.0.0.1", port: int = 0):
+        self.profile = profile or FakeProfile()
+        self.stats = FakeStats()
+        self.lock = threading.Lock()
+        self._rng = np.random.default_rng(self.profile.seed)
+        self._scripted = deque()
+        self._httpd = _Server((host, port), _Handler)
+        self._httpd.fake = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name: str):
+        with self.lock:
+            setattr(self.stats, name, getattr(self.stats, name) + 1)
+
+    def script(self, *outcomes: str):
+        """Задать исходы следующих запросов ('ok' | 'rate_limit' | 'error'), затем — случайные по профилю"""
+        with self.lock:
+            self._scripted.extend(outcomes)
+
+    def draw(self) -> tuple:
+        """Исход запроса ('ok' | 'rate_limit' | 'error') и задержка до ответа, с"""
+        profile = self.profile
+        with self.lock:
+            roll = self._rng.random()
+            latency = self._rng.lognormal(np.log(max(profile.latency_ms, 1e-3) / 1000), profile.latency_sigma)
+            scripted = self._scripted.popleft() if self._scripted else None
+        if scripted is not None:
+            return scripted, latency
+        if roll < profile.rate_limit_rate:
+            # 429 отдаётся быстрее обычного ответа: генерации нет
+            return 'rate_limit', latency / 4
+        if roll < profile.rate_limit_rate + profile.error_rate:
+            return 'error', latency
+        return 'ok', latency
+
+    def limit_headers(self, input_tokens: int, exhausted: bool = False) -> dict:
+        """Заголовки anthropic-ratelimit-*: лимиты профиля; при 429 остаток запросов — 0"""
+        return {
+            'anthropic-ratelimit-requests-limit': str(self.profile.requests_limit),
+            'anthropic-ratelimit-requests-remaining': str(0 if exhausted else self.profile.requests_limit - 1),
+            'anthropic-ratelimit-input-tokens-limit': str(self.profile.tokens_limit),
+            'anthropic-ratelimit-input-tokens-remaining': str(max(self.profile.tokens_limit - input_tokens, 0)),
+        }
+
+    def snapshot(self) -> FakeStats:
+        """Копия счётчиков на текущий момент"""
+        with self.lock:
+            return self.stats.copy()
+
+    def start(self) -> 'FakeAnthropicServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-anthropic", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> 'FakeAnthropicServer':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def profile_arguments(parser: argparse.ArgumentParser):
+    """Параметры FakeProfile в командной строке (общие с tools/bench_analyzer.py)"""
+    parser.add_argument('--latency-ms', type=float, default=FakeProfile.latency_ms, help="медиана задержки, мс")
+    parser.add_argument('--sigma', type=float, default=FakeProfile.latency_sigma, help="разброс задержки (σ)")
+    parser.add_argument('--tps', type=float, default=FakeProfile.tokens_per_second, help="токенов ответа в секунду")
+    parser.add_argument('--output-tokens', type=int, default=FakeProfile.output_tokens)
+    parser.add_argument('--rate-limit', type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument('--retry-after', type=float, default=FakeProfile.retry_after)
+    parser.add_argument('--errors', type=float, default=0.0, help="доля ответов 5xx")
+    parser.add_argument('--error-status', type=int, default=FakeProfile.error_status)
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def profile_from_args(args: argparse.Namespace) -> FakeProfile:
+    return FakeProfile(
+        latency_ms=args.latency_ms, latency_sigma=args.sigma, tokens_per_second=args.tps,
+        output_tokens=args.output_tokens, rate_limit_rate=args.rate_limit, retry_after=args.retry_after,
+        error_rate=args.errors, error_status=args.error_status, seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Anthropic Messages API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    profile_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeAnthropicServer(profile_from_args(args), args.host, args.port).start()
+    print(f"Fake Messages API: {server.url} (CLAUDE_BASE_URL={server.url}); Ctrl+C — остановить")
+    try:
+        while True:
+            time.sleep(5)
+    except KeyboardInterrupt:
+        stats = server.snapshot()
+        print(f"\nЗапросов: {stats.requests}, 429: {stats.rate_limited}, 5xx: {stats.errors}")
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -468,7 +468,7 @@ class YsellAnalyzerApp:
 
     def _run_analysis_after_export(self):
         """Запуск анализа после экспорта"""
-        from services.analyzer import analyze_csv_folder, API_DELAY_SECONDS
+        from services.analyzer import analyze_csv_folder
 
         def progress_callback(current, total, filename, status):
             """Колбэк для обновления прогресса"""
@@ -477,7 +477,7 @@ class YsellAnalyzerApp:
             if status == "analyzing":
                 text = f"[{current}/{total}] 🤖 Анализ: {filename}"
             elif status == "waiting":
-                text = f"[{current}/{total}] ⏳ Пауза {API_DELAY_SECONDS} сек..."
+                text = f"[{current}/{total}] ⏳ Ожидание лимита API: {filename}"
             else:
                 text = f"[{current}/{total}] {filename}"
 
@@ -633,6 +633,14 @@ class YsellAnalyzerApp:
         # Обновляем счётчик
         self._refresh_csv_count()
 
+        # Сводный отчёт: все CSV одним анализом
+        self.aggregate_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(
+            main_frame,
+            text="Сводный отчёт по всем чатам (один анализ, сравнение чатов)",
+            variable=self.aggregate_var
+        ).pack(anchor="w", pady=(0, 5))
+
         # Кнопка анализа
         self.analyze_btn = ctk.CTkButton(
             main_frame,
@@ -645,6 +653,15 @@ class YsellAnalyzerApp:
         )
         self.analyze_btn.pack(fill="x", pady=(10, 0))
 
+        # Мгновенный отчёт без Claude
+        self.quick_stats_btn = ctk.CTkButton(
+            main_frame,
+            text="📊 Быстрая статистика (без Claude)",
+            command=self._start_quick_stats,
+            height=36
+        )
+        self.quick_stats_btn.pack(fill="x", pady=(8, 0))
+
         # Прогресс анализа
         self.analyze_progress_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
         self.analyze_progress_label = ctk.CTkLabel(
@@ -703,9 +720,10 @@ class YsellAnalyzerApp:
             return
 
         # Подтверждение
+        mode = "одним сводным отчётом" if self.aggregate_var.get() else "по отдельности"
         if not messagebox.askyesno(
                 "Подтверждение",
-                f"Будет проанализировано файлов: {len(csv_files)}\n\n"
+                f"Будет проанализировано файлов: {len(csv_files)} ({mode})\n\n"
                 "После анализа CSV файлы будут удалены.\n"
                 "Продолжить?"
         ):
@@ -725,7 +743,8 @@ class YsellAnalyzerApp:
 
     def _run_analysis(self):
         """Выполнение анализа (в отдельном потоке)"""
-        from services.analyzer import analyze_csv_folder, API_DELAY_SECONDS
+        from services.analyzer import analyze_csv_folder
+        from services.cross_chat import analyze_csv_folder_aggregate
 
         def progress_callback(current, total, filename, status):
             """Колбэк для обновления прогресса"""
@@ -734,7 +753,7 @@ class YsellAnalyzerApp:
             if status == "analyzing":
                 text = f"[{current}/{total}] 🤖 Анализ: {filename}"
             elif status == "waiting":
-                text = f"[{current}/{total}] ⏳ Пауза {API_DELAY_SECONDS} сек..."
+                text = f"[{current}/{total}] ⏳ Ожидание лимита API: {filename}"
             else:
                 text = f"[{current}/{total}] {filename}"
 
@@ -745,7 +764,10 @@ class YsellAnalyzerApp:
             self.root.after(0, lambda: self.analyze_progress.set(0))
             self.root.after(0, lambda: self.analyze_progress_label.configure(text="Запуск анализа..."))
 
-            result = analyze_csv_folder(progress_callback=progress_callback)
+            if self.aggregate_var.get():
+                result = analyze_csv_folder_aggregate(progress_callback=progress_callback)
+            else:
+                result = analyze_csv_folder(progress_callback=progress_callback)
 
             self.root.after(0, lambda: self.analyze_progress.set(1.0))
             self.root.after(0, lambda: self.analyze_progress_label.configure(text="✅ Анализ завершён"))
@@ -759,6 +781,37 @@ class YsellAnalyzerApp:
             self.root.after(0, lambda: self.analyze_progress_frame.pack_forget())
             self.root.after(0, self._refresh_csv_count)
 
+    def _start_quick_stats(self):
+        """Мгновенные отчёты по всем CSV: статистика локально, CSV файлы не удаляются"""
+        if not get_csv_files(get_input_folder()):
+            messagebox.showwarning(
+                "Нет файлов",
+                f"В папке {get_input_folder()} нет CSV файлов для анализа."
+            )
+            return
+
+        self.quick_stats_btn.configure(state="disabled")
+        self.analyze_progress_frame.pack(fill="x", pady=(15, 0))
+        self.analyze_progress_label.configure(text="📊 Считаю статистику...")
+
+        thread = threading.Thread(target=self._run_quick_stats, daemon=True)
+        thread.start()
+
+    def _run_quick_stats(self):
+        """Построение мгновенных отчётов (в отдельном потоке)"""
+        from services.quick_report import quick_report_folder
+
+        try:
+            result = quick_report_folder()
+            self.root.after(0, lambda r=result: self._show_analysis_result(r))
+
+        except Exception as e:
+            self.root.after(0, lambda err=str(e): messagebox.showerror("Ошибка", f"Ошибка статистики:\n{err}"))
+
+        finally:
+            self.root.after(0, lambda: self.quick_stats_btn.configure(state="normal"))
+            self.root.after(0, lambda: self.analyze_progress_frame.pack_forget())
+
     def _show_analysis_result(self, result: dict):
         """Показать результат анализа"""
         msg = f"✅ Успешно обработано: {result.get('success', 0)}\n"